@@ -2,23 +2,40 @@
 
 """A modular entity agent using the new component system."""
 
-from collections.abc import Mapping
+import asyncio
+from collections.abc import Callable, Mapping
 from concurrent import futures
 import functools
 import threading
 import traceback
 import types
-from typing import cast
+from typing import Any, cast
+import weakref
 
 from concordia.components.agent import no_op_context_processor
 from concordia.type_checks import entity
 from concordia.type_checks import entity_component
 from concordia.utils import concurrency
+from concordia.utils import telemetry
 from typing_extensions import override
 
 # TODO: b/313715068 - remove disable once pytype bug is fixed.
 # pytype: disable=override-error
 
+# The keys the act component and context processor are attributed to.
+ACT_COMPONENT_KEY = '__act__'
+CONTEXT_PROCESSOR_KEY = '__context_processor__'
+
+# How often `async_act` checks for the end of a synchronous call holding the
+# entity.
+_CONTROL_POLL_SECONDS = 0.01
+
+
+def _call_as_component(key: str, method: Callable[..., Any], *args) -> Any:
+  """Calls a component method, attributing its model calls to the component."""
+  with telemetry.scope(component=key):
+    return method(*args)
+
 
 class EntityAgent(entity_component.EntityWithComponents):
   """An agent that has its functionality defined by components.
@@ -28,6 +45,12 @@ class EntityAgent(entity_component.EntityWithComponents):
   call the ActComponent's `act` method when it needs to act, and the
   ObservationComponent's `observe` method when they need to process an
   observation.
+
+  `async_act` gathers the `async_pre_act` contexts of the components on the
+  event loop and awaits `async_get_action_attempt` of the act component, so
+  components calling the asynchronous methods of the language model act
+  without a thread. Components only implementing the synchronous methods run
+  in the worker threads of the event loop.
   """
 
   def __init__(
@@ -56,6 +79,11 @@ class EntityAgent(entity_component.EntityWithComponents):
     super().__init__()
     self._agent_name = agent_name
     self._control_lock = threading.Lock()
+    # Async callers wait on these, one per event loop, so that they do not
+    # hold a worker thread while the entity is busy.
+    self._async_control_locks: weakref.WeakKeyDictionary[
+        asyncio.AbstractEventLoop, asyncio.Lock
+    ] = weakref.WeakKeyDictionary()
     self._phase_lock = threading.Lock()
     self._phase = entity_component.Phase.READY
 
@@ -128,15 +156,15 @@ class EntityAgent(entity_component.EntityWithComponents):
       A ComponentsContext, that is, a mapping of component name to the result of
       the method call.
     """
-    # 1. Identify unique component instances.
-    unique_components = list(set(self._context_components.values()))
+    # 1. Identify unique component instances, by the first name of each.
+    unique_components = self._unique_components()
 
     # 2. Create and execute tasks for each unique component instance once.
     tasks_for_unique = {
-        str(id(component)): functools.partial(
-            getattr(component, method_name), *args
+        str(component_id): functools.partial(
+            _call_as_component, name, getattr(component, method_name), *args
         )
-        for component in unique_components
+        for component_id, (name, component) in unique_components.items()
     }
     results_by_component_id = concurrency.run_tasks(
         tasks_for_unique, executor=executor)
@@ -148,39 +176,131 @@ class EntityAgent(entity_component.EntityWithComponents):
 
     return types.MappingProxyType(final_results)
 
+  def _unique_components(
+      self,
+  ) -> dict[int, tuple[str, entity_component.ContextComponent]]:
+    """Returns each component instance with its first name, by its id."""
+    unique_components = {}
+    for name, component in self._context_components.items():
+      unique_components.setdefault(id(component), (name, component))
+    return unique_components
+
+  async def _async_pre_act(
+      self, action_spec: entity.ActionSpec
+  ) -> entity_component.ComponentContextMapping:
+    """Gathers the `async_pre_act` contexts of all components.
+
+    Like `_parallel_call_`, a component registered under multiple names is
+    called once.
+
+    Args:
+      action_spec: The action spec of the action.
+
+    Returns:
+      A mapping of component name to the context of the component.
+    """
+    unique_components = self._unique_components()
+
+    async def pre_act(
+        name: str, component: entity_component.ContextComponent
+    ) -> str:
+      with telemetry.scope(component=name):
+        return await component.async_pre_act(action_spec)
+
+    results = await asyncio.gather(*[
+        pre_act(name, component)
+        for name, component in unique_components.values()
+    ])
+    results_by_component_id = dict(zip(unique_components, results))
+    return types.MappingProxyType({
+        name: results_by_component_id[id(component)]
+        for name, component in self._context_components.items()
+    })
+
+  def _post_act(self, action_attempt: str) -> None:
+    """Informs the components of the action attempted and updates them."""
+    self._set_phase(entity_component.Phase.POST_ACT)
+    contexts = self._parallel_call_('post_act', action_attempt)
+    with telemetry.scope(component=CONTEXT_PROCESSOR_KEY):
+      self._context_processor.post_act(contexts)
+
+    self._set_phase(entity_component.Phase.UPDATE)
+    self._parallel_call_('update')
+
+    self._set_phase(entity_component.Phase.READY)
+
   @override
   def act(
       self, action_spec: entity.ActionSpec = entity.DEFAULT_ACTION_SPEC
   ) -> str:
-    with self._control_lock:
+    with self._control_lock, telemetry.scope(
+        entity=self._agent_name, output_type=action_spec.output_type
+    ):
       self._set_phase(entity_component.Phase.PRE_ACT)
       contexts = self._parallel_call_('pre_act', action_spec)
-      self._context_processor.pre_act(types.MappingProxyType(contexts))
-      action_attempt = self._act_component.get_action_attempt(
-          contexts, action_spec
-      )
+      with telemetry.scope(component=CONTEXT_PROCESSOR_KEY):
+        self._context_processor.pre_act(types.MappingProxyType(contexts))
+      with telemetry.scope(component=ACT_COMPONENT_KEY):
+        action_attempt = self._act_component.get_action_attempt(
+            contexts, action_spec
+        )
 
-      self._set_phase(entity_component.Phase.POST_ACT)
-      contexts = self._parallel_call_('post_act', action_attempt)
-      self._context_processor.post_act(contexts)
+      self._post_act(action_attempt)
 
-      self._set_phase(entity_component.Phase.UPDATE)
-      self._parallel_call_('update')
+      return action_attempt
 
-      self._set_phase(entity_component.Phase.READY)
+  def _async_control_lock(self) -> asyncio.Lock:
+    """Returns the lock async callers of the running loop wait on."""
+    loop = asyncio.get_running_loop()
+    with self._phase_lock:
+      lock = self._async_control_locks.get(loop)
+      if lock is None:
+        lock = asyncio.Lock()
+        self._async_control_locks[loop] = lock
+      return lock
 
-      return action_attempt
+  @override
+  async def async_act(
+      self, action_spec: entity.ActionSpec = entity.DEFAULT_ACTION_SPEC
+  ) -> str:
+    if concurrency.overrides_sync_only(self, 'act', 'async_act'):
+      return await super().async_act(action_spec)
+    async with self._async_control_lock():
+      # Only a synchronous `act` or `observe` can hold the entity here.
+      while not self._control_lock.acquire(blocking=False):
+        await asyncio.sleep(_CONTROL_POLL_SECONDS)
+      try:
+        with telemetry.scope(
+            entity=self._agent_name, output_type=action_spec.output_type
+        ):
+          self._set_phase(entity_component.Phase.PRE_ACT)
+          contexts = await self._async_pre_act(action_spec)
+          with telemetry.scope(component=CONTEXT_PROCESSOR_KEY):
+            self._context_processor.pre_act(types.MappingProxyType(contexts))
+          with telemetry.scope(component=ACT_COMPONENT_KEY):
+            action_attempt = await self._act_component.async_get_action_attempt(
+                contexts, action_spec
+            )
+
+          # Components store what they learned here, e.g. embedding memories.
+          await concurrency.to_thread(self._post_act, action_attempt)
+
+          return action_attempt
+      finally:
+        self._control_lock.release()
 
   @override
   def observe(self, observation: str) -> None:
-    with self._control_lock:
+    with self._control_lock, telemetry.scope(entity=self._agent_name):
       self._set_phase(entity_component.Phase.PRE_OBSERVE)
       contexts = self._parallel_call_('pre_observe', observation)
-      self._context_processor.pre_observe(contexts)
+      with telemetry.scope(component=CONTEXT_PROCESSOR_KEY):
+        self._context_processor.pre_observe(contexts)
 
       self._set_phase(entity_component.Phase.POST_OBSERVE)
       contexts = self._parallel_call_('post_observe')
-      self._context_processor.post_observe(contexts)
+      with telemetry.scope(component=CONTEXT_PROCESSOR_KEY):
+        self._context_processor.post_observe(contexts)
 
       self._set_phase(entity_component.Phase.UPDATE)
       self._parallel_call_('update')
@@ -251,14 +371,21 @@ class EntityAgent(entity_component.EntityWithComponents):
           'Agent must be in PRE_ACT phase for _process_single_stateless_act'
       )
 
-    # 1. PRE_ACT to gather context
-    executor = futures.ThreadPoolExecutor()
-    contexts = self._parallel_call_('pre_act', action_spec, executor=executor)
-    executor.shutdown(wait=True)
-    self._context_processor.pre_act(types.MappingProxyType(contexts))
-
-    # 2. Get action from ActComponent
-    action_attempt = self._act_component.get_action_attempt(
-        contexts, action_spec
-    )
-    return action_attempt
+    with telemetry.scope(
+        entity=self._agent_name, output_type=action_spec.output_type
+    ):
+      # 1. PRE_ACT to gather context
+      executor = futures.ThreadPoolExecutor()
+      contexts = self._parallel_call_(
+          'pre_act', action_spec, executor=executor
+      )
+      executor.shutdown(wait=True)
+      with telemetry.scope(component=CONTEXT_PROCESSOR_KEY):
+        self._context_processor.pre_act(types.MappingProxyType(contexts))
+
+      # 2. Get action from ActComponent
+      with telemetry.scope(component=ACT_COMPONENT_KEY):
+        action_attempt = self._act_component.get_action_attempt(
+            contexts, action_spec
+        )
+      return action_attempt
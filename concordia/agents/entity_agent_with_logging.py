@@ -4,6 +4,7 @@
 
 from collections.abc import Mapping
 import copy
+import threading
 import types
 from typing import Any
 
@@ -11,7 +12,13 @@ from concordia.agents import entity_agent
 from concordia.associative_memory import formative_memories
 from concordia.type_checks import entity as entity_lib
 from concordia.type_checks import entity_component
+from concordia.utils import concurrency
 from concordia.utils import measurements as measurements_lib
+from concordia.utils import telemetry
+from typing_extensions import override
+
+# The channel of the language model calls made since the previous action.
+LLM_CALLS_CHANNEL = '__llm_calls__'
 
 
 class EntityAgentWithLogging(entity_agent.EntityAgent,
@@ -39,6 +46,10 @@ class EntityAgentWithLogging(entity_agent.EntityAgent,
     channels in the given measurements object will be returned as a mapping of
     channel name to value.
 
+    Each action also publishes, in the `__llm_calls__` channel, the calls to
+    a `TelemetryLanguageModel` made since the previous action, including
+    while observing, aggregated by component key.
+
     Args:
       agent_name: The name of the agent.
       act_component: The component that will be used to act.
@@ -61,13 +72,64 @@ class EntityAgentWithLogging(entity_agent.EntityAgent,
         )
     if isinstance(act_component, entity_component.ComponentWithLogging):
       act_component.set_logging_channel(
-          self._component_logging.get_channel('__act__').append
+          self._component_logging.get_channel(
+              entity_agent.ACT_COMPONENT_KEY
+          ).append
       )
     if isinstance(context_processor, entity_component.ComponentWithLogging):
       context_processor.set_logging_channel(
-          self._component_logging.get_channel('__context_processor__').append
+          self._component_logging.get_channel(
+              entity_agent.CONTEXT_PROCESSOR_KEY
+          ).append
       )
     self._config = copy.deepcopy(config)
+    self._llm_calls = []
+    self._llm_calls_lock = threading.Lock()
+
+  @override
+  def act(
+      self, action_spec: entity_lib.ActionSpec = entity_lib.DEFAULT_ACTION_SPEC
+  ) -> str:
+    with telemetry.collect() as calls:
+      try:
+        return super().act(action_spec)
+      finally:
+        self._publish_llm_calls(calls)
+
+  @override
+  async def async_act(
+      self, action_spec: entity_lib.ActionSpec = entity_lib.DEFAULT_ACTION_SPEC
+  ) -> str:
+    if concurrency.overrides_sync_only(self, 'act', 'async_act'):
+      # The calls are published by `act`, run on a thread.
+      return await super().async_act(action_spec)
+    with telemetry.collect() as calls:
+      try:
+        return await super().async_act(action_spec)
+      finally:
+        self._publish_llm_calls(calls)
+
+  def _publish_llm_calls(self, calls: telemetry.CallLog) -> None:
+    """Publishes the calls of an action and of the observations before it."""
+    with self._llm_calls_lock:
+      records = self._llm_calls + calls.records()
+      self._llm_calls = []
+    # Without a TelemetryLanguageModel, the channel is never created.
+    if records or (
+        LLM_CALLS_CHANNEL in self._component_logging.available_channels()
+    ):
+      self._component_logging.publish_datum(
+          LLM_CALLS_CHANNEL, telemetry.summarize(records)
+      )
+
+  @override
+  def observe(self, observation: str) -> None:
+    with telemetry.collect() as calls:
+      try:
+        super().observe(observation)
+      finally:
+        with self._llm_calls_lock:
+          self._llm_calls.extend(calls.records())
 
   def get_all_logs(self):
     return self._component_logging.get_all_channels()
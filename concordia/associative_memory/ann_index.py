@@ -0,0 +1,266 @@
+"""Approximate nearest neighbour index for associative memory banks."""
+
+import dataclasses
+
+import numpy as np
+
+
+# Rows are assigned to lists in blocks of this many rows to bound the size of
+# the intermediate (rows x lists) score matrix.
+_ASSIGNMENT_BLOCK_SIZE = 16384
+
+
+@dataclasses.dataclass
+class _Partition:
+  """The lists of a trained index and the centroids they are assigned by."""
+
+  centroids: np.ndarray
+  # Rows of each list. Only the first `list_sizes[i]` entries of list i are
+  # valid, the rest is spare capacity.
+  lists: list[np.ndarray]
+  list_sizes: np.ndarray
+
+
+class IVFIndex:
+  """An inverted file (IVF) index for approximate maximum inner product search.
+
+  The embeddings are partitioned into lists by spherical k-means. A query is
+  only scored against the embeddings in the `num_probes` lists whose centroids
+  are most similar to it, which trades recall for latency: probing more lists
+  increases recall and cost, probing all lists is exact.
+
+  The index is trained once the bank reaches `min_train_size` rows and is
+  retrained whenever the bank has grown by `retrain_growth` since the last
+  training, so the partition keeps up with the data. Rows added in between are
+  assigned to the existing lists incrementally. Until the first training the
+  index declines to answer and the bank falls back to exact search, which is
+  faster for small banks anyway.
+
+  The index does not own the embeddings, it only stores row numbers. It is
+  updated and searched with the embedding matrix of the bank.
+
+  Searches may run concurrently with a single thread calling `update`, and
+  may pass fewer rows than were indexed, e.g. an older snapshot of the bank.
+  """
+
+  def __init__(
+      self,
+      *,
+      num_probes: int = 8,
+      num_lists: int | None = None,
+      min_train_size: int = 10_000,
+      retrain_growth: float = 4.0,
+      num_train_iterations: int = 10,
+      seed: int = 0,
+  ):
+    """Initializes the index.
+
+    Args:
+      num_probes: number of lists scored per query, the recall/latency knob.
+      num_lists: number of lists to partition the embeddings into. If None,
+        the square root of the number of rows at training time is used.
+      min_train_size: number of rows below which the index is not trained and
+        searches fall back to exact search.
+      retrain_growth: the index is retrained when the number of rows reaches
+        this multiple of the number of rows it was last trained on.
+      num_train_iterations: number of k-means iterations per training.
+      seed: seed for sampling the initial centroids.
+    """
+    if num_probes <= 0:
+      raise ValueError('num_probes must be positive.')
+    if retrain_growth <= 1.0:
+      raise ValueError('retrain_growth must be greater than 1.')
+    self._num_probes = num_probes
+    self._num_lists = num_lists
+    self._min_train_size = min_train_size
+    self._retrain_growth = retrain_growth
+    self._num_train_iterations = num_train_iterations
+    self._rng = np.random.default_rng(seed)
+
+    self._partition: _Partition | None = None
+    self._trained_size = 0
+    # Rows [0, _num_indexed) are in the lists. It is updated after the lists,
+    # so a concurrent search finds every row below the value it read.
+    self._num_indexed = 0
+
+  @property
+  def is_trained(self) -> bool:
+    return self._partition is not None
+
+  @property
+  def num_probes(self) -> int:
+    return self._num_probes
+
+  def set_num_probes(self, num_probes: int) -> None:
+    """Sets the number of lists scored per query."""
+    if num_probes <= 0:
+      raise ValueError('num_probes must be positive.')
+    self._num_probes = num_probes
+
+  def reset(self) -> None:
+    """Forgets all indexed rows and the trained partition."""
+    self._partition = None
+    self._trained_size = 0
+    self._num_indexed = 0
+
+  def update(self, embeddings: np.ndarray) -> None:
+    """Indexes the rows of `embeddings` that are not indexed yet.
+
+    Args:
+      embeddings: all embeddings of the bank, one per row. Rows previously
+        passed to `update` must be unchanged.
+    """
+    size = embeddings.shape[0]
+    if size < self._min_train_size:
+      return
+    if (
+        self._partition is None
+        or size >= self._trained_size * self._retrain_growth
+    ):
+      self._train(embeddings)
+      return
+    if size > self._num_indexed:
+      _add_rows(self._partition, embeddings, self._num_indexed, size)
+      self._num_indexed = size
+
+  def _train(self, embeddings: np.ndarray) -> None:
+    """Partitions all rows with spherical k-means and rebuilds the lists."""
+    size = embeddings.shape[0]
+    num_lists = self._num_lists or max(1, int(np.sqrt(size)))
+    num_lists = min(num_lists, size)
+    # k-means on a sample is enough to find good centroids.
+    sample_size = min(size, 64 * num_lists)
+    sample = embeddings[self._rng.choice(size, sample_size, replace=False)]
+    sample = _normalize(sample.astype(np.float32))
+    centroids = sample[self._rng.choice(sample_size, num_lists, replace=False)]
+    for _ in range(self._num_train_iterations):
+      assignments = np.argmax(sample @ centroids.T, axis=1)
+      sums = np.zeros_like(centroids)
+      np.add.at(sums, assignments, sample)
+      counts = np.bincount(assignments, minlength=num_lists)
+      # Empty lists keep their previous centroid.
+      nonempty = counts > 0
+      centroids[nonempty] = _normalize(sums[nonempty])
+
+    # The new partition is built aside and then swapped in, so concurrent
+    # searches see either the old or the new one.
+    partition = _Partition(
+        centroids=centroids,
+        lists=[np.empty(0, dtype=np.int64) for _ in range(num_lists)],
+        list_sizes=np.zeros(num_lists, dtype=np.int64),
+    )
+    _add_rows(partition, embeddings, 0, size)
+    self._partition = partition
+    self._trained_size = size
+    self._num_indexed = size
+
+  def search(
+      self,
+      embeddings: np.ndarray,
+      query: np.ndarray,
+      k: int,
+  ) -> np.ndarray | None:
+    """Returns the rows approximately most similar to the query.
+
+    Args:
+      embeddings: all embeddings of the bank, one per row.
+      query: the query embedding.
+      k: the number of rows to return.
+
+    Returns:
+      Up to k row numbers sorted by decreasing inner product with the query, or
+      None if the index is not trained, in which case the caller should fall
+      back to exact search.
+    """
+    # Read the number of indexed rows before the partition, see `update`.
+    num_indexed = min(self._num_indexed, embeddings.shape[0])
+    partition = self._partition
+    if partition is None:
+      return None
+    num_probes = min(self._num_probes, partition.centroids.shape[0])
+    centroid_scores = partition.centroids @ query
+    probes = np.argpartition(-centroid_scores, num_probes - 1)[:num_probes]
+    indexed = np.concatenate(
+        [partition.lists[i][:partition.list_sizes[i]] for i in probes]
+    )
+    candidates = np.concatenate([
+        indexed[indexed < num_indexed],
+        # Rows added after the last update are not in any list yet.
+        np.arange(num_indexed, embeddings.shape[0], dtype=np.int64),
+    ])
+    return candidates[top_k(embeddings[candidates] @ query, k)]
+
+
+def _add_rows(
+    partition: _Partition, embeddings: np.ndarray, start: int, stop: int
+) -> None:
+  """Assigns rows [start, stop) to their closest list."""
+  for block_start in range(start, stop, _ASSIGNMENT_BLOCK_SIZE):
+    block_stop = min(block_start + _ASSIGNMENT_BLOCK_SIZE, stop)
+    block = embeddings[block_start:block_stop]
+    assignments = np.argmax(block @ partition.centroids.T, axis=1)
+    rows = np.arange(block_start, block_stop, dtype=np.int64)
+    order = np.argsort(assignments, kind='stable')
+    list_ids, starts = np.unique(assignments[order], return_index=True)
+    for list_id, rows_of_list in zip(
+        list_ids, np.split(rows[order], starts[1:])
+    ):
+      _append_to_list(partition, list_id, rows_of_list)
+
+
+def _append_to_list(
+    partition: _Partition, list_id: int, rows: np.ndarray
+) -> None:
+  """Appends rows to a list, growing its capacity geometrically."""
+  size = partition.list_sizes[list_id]
+  new_size = size + rows.shape[0]
+  storage = partition.lists[list_id]
+  if new_size > storage.shape[0]:
+    grown = np.empty(max(new_size, 2 * storage.shape[0]), dtype=np.int64)
+    grown[:size] = storage[:size]
+    storage = partition.lists[list_id] = grown
+  # The rows are written before the size that makes them visible.
+  storage[size:new_size] = rows
+  partition.list_sizes[list_id] = new_size
+
+
+def top_k(scores: np.ndarray, k: int) -> np.ndarray:
+  """Returns the positions of the k highest scores, highest first.
+
+  Only the top k are sorted, so this costs O(n + k log k) for n scores.
+
+  Args:
+    scores: one-dimensional array of scores.
+    k: the number of positions to return.
+  """
+  if k < scores.shape[0]:
+    positions = np.argpartition(-scores, k - 1)[:k]
+  else:
+    positions = np.arange(scores.shape[0])
+  return positions[np.argsort(-scores[positions], kind='stable')]
+
+
+def top_k_per_row(scores: np.ndarray, k: int) -> np.ndarray:
+  """Returns the positions of the k highest scores of each row, highest first.
+
+  Args:
+    scores: two-dimensional array of scores, one row per query.
+    k: the number of positions to return per row.
+
+  Returns:
+    An array of shape (rows, min(k, columns)) of column positions.
+  """
+  if k < scores.shape[1]:
+    positions = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+  else:
+    positions = np.broadcast_to(np.arange(scores.shape[1]), scores.shape)
+  order = np.argsort(
+      -np.take_along_axis(scores, positions, axis=1), axis=1, kind='stable'
+  )
+  return np.take_along_axis(positions, order, axis=1)
+
+
+def _normalize(vectors: np.ndarray) -> np.ndarray:
+  """Scales the rows to unit norm, leaving all-zero rows unchanged."""
+  norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+  return vectors / np.where(norms > 0, norms, 1.0)
@@ -0,0 +1,88 @@
+r"""Benchmark of approximate against exact associative retrieval.
+
+Fills a memory bank with synthetic clustered embeddings and reports, for
+several numbers of probed lists, the recall@k of `ann_index.IVFIndex` against
+exact search and the latency of both.
+
+Usage:
+  python -m concordia.associative_memory.ann_index_benchmark \
+      --num_memories=200000 --dim=768 --k=25
+"""
+
+from collections.abc import Sequence
+import time
+
+from absl import app
+from absl import flags
+from concordia.associative_memory import ann_index
+import numpy as np
+
+
+_NUM_MEMORIES = flags.DEFINE_integer(
+    'num_memories', 100_000, 'Number of memories in the bank.'
+)
+_DIM = flags.DEFINE_integer('dim', 768, 'Embedding dimension.')
+_NUM_TOPICS = flags.DEFINE_integer(
+    'num_topics', 1000, 'Number of clusters the synthetic memories are from.'
+)
+_NUM_QUERIES = flags.DEFINE_integer('num_queries', 200, 'Number of queries.')
+_K = flags.DEFINE_integer('k', 25, 'Number of memories retrieved per query.')
+_NUM_PROBES = flags.DEFINE_list(
+    'num_probes', ['1', '4', '8', '16', '32', '64'],
+    'Numbers of probed lists to benchmark.',
+)
+_SEED = flags.DEFINE_integer('seed', 0, 'Random seed.')
+
+
+def _make_embeddings(
+    rng: np.random.Generator, num: int, topics: np.ndarray, noise: float
+) -> np.ndarray:
+  """Returns unit-norm embeddings drawn around random topics."""
+  embeddings = topics[rng.integers(topics.shape[0], size=num)]
+  embeddings = embeddings + noise * rng.standard_normal(
+      embeddings.shape, dtype=np.float32
+  )
+  return embeddings / np.linalg.norm(embeddings, axis=1, keepdims=True)
+
+
+def main(argv: Sequence[str]) -> None:
+  if len(argv) > 1:
+    raise app.UsageError('Too many command-line arguments.')
+
+  rng = np.random.default_rng(_SEED.value)
+  topics = rng.standard_normal((_NUM_TOPICS.value, _DIM.value), np.float32)
+  topics /= np.linalg.norm(topics, axis=1, keepdims=True)
+  noise = 1.0 / np.sqrt(_DIM.value)
+  embeddings = _make_embeddings(rng, _NUM_MEMORIES.value, topics, noise)
+  queries = _make_embeddings(rng, _NUM_QUERIES.value, topics, noise)
+  k = _K.value
+
+  start = time.perf_counter()
+  exact = [ann_index.top_k(embeddings @ query, k) for query in queries]
+  exact_latency = (time.perf_counter() - start) / len(queries)
+  print(f'memories: {_NUM_MEMORIES.value}, dim: {_DIM.value}, k: {k}')
+  print(f'exact: {exact_latency * 1e3:.3f} ms/query')
+
+  index = ann_index.IVFIndex(min_train_size=0, seed=_SEED.value)
+  start = time.perf_counter()
+  index.update(embeddings)
+  print(f'index build: {time.perf_counter() - start:.2f} s')
+
+  print(f'{"num_probes":>10} {"recall@k":>9} {"ms/query":>9} {"speedup":>8}')
+  for num_probes in _NUM_PROBES.value:
+    index.set_num_probes(int(num_probes))
+    start = time.perf_counter()
+    approximate = [index.search(embeddings, query, k) for query in queries]
+    latency = (time.perf_counter() - start) / len(queries)
+    recall = np.mean([
+        len(np.intersect1d(a, e)) / len(e)
+        for a, e in zip(approximate, exact)
+    ])
+    print(
+        f'{num_probes:>10} {recall:>9.3f} {latency * 1e3:>9.3f}'
+        f' {exact_latency / latency:>7.1f}x'
+    )
+
+
+if __name__ == '__main__':
+  app.run(main)
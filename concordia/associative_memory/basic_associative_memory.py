@@ -1,12 +1,20 @@
-
-
-
 """An associative memory with basic retrieval methods."""
 
-from collections.abc import Callable, Iterable, Sequence
+import bisect
+from collections.abc import Callable, Iterable, Mapping, Sequence
+from concurrent import futures
+import dataclasses
+import hashlib
 import io
+import itertools
+import os
+import re
 import threading
+from typing import Any
+import uuid
 
+from concordia.associative_memory import ann_index as ann_index_lib
+from concordia.associative_memory import lexical_index as lexical_index_lib
 from concordia.type_checks import entity_component
 import numpy as np
 import pandas as pd
@@ -14,13 +22,332 @@ import pandas as pd
 
 StringIO = io.StringIO
 
+# Number of rows allocated for the embedding matrix on the first `add`. The
+# matrix doubles in size whenever it runs out of room, so the amortized cost of
+# appending a memory is constant.
+_INITIAL_CAPACITY = 64
+_GROWTH_FACTOR = 2
+
+# Precisions embeddings can be stored at. `int8` stores each row scaled
+# symmetrically to [-127, 127] together with a float32 scale per row.
+EMBEDDING_DTYPES = ('float32', 'float16', 'int8')
+
+# Number of rows of a reduced precision matrix converted to float32 at a time
+# for scoring, which bounds the memory used by the conversion.
+_SCORING_BLOCK_SIZE = 16384
+
+# Modes of `AssociativeMemoryBank.retrieve_associative`.
+RETRIEVAL_MODES = ('dense', 'lexical', 'hybrid')
+
+# Format tag of states that refer to binary segment files, see
+# `AssociativeMemoryBank.set_checkpoint_directory`.
+SEGMENTS_STATE_FORMAT = 'segments'
+
+# Embeds a sequence of texts at once, returning an array of shape
+# (len(texts), embedding_dim).
+BatchEmbedder = Callable[[Sequence[str]], np.ndarray]
+
+# Called with the number of texts embedded so far and the number to embed.
+ProgressCallback = Callable[[int, int], None]
+
+# A bracketed tag such as `[observation]`, possibly preceded by whitespace.
+_TAG_PATTERN = re.compile(r'\s*(\[[^\[\]]*\])')
+
+
+def content_digest(text: str) -> str:
+  """Returns a stable digest of a memory text.
+
+  Unlike the builtin `hash`, the digest does not depend on the process, so it
+  can be stored in checkpoints and compared across runs.
+
+  Args:
+    text: the text of the memory.
+  """
+  return hashlib.blake2b(text.encode('utf-8'), digest_size=16).hexdigest()
+
+
+def quantize(
+    embeddings: np.ndarray, dtype: str
+) -> tuple[np.ndarray, np.ndarray | None]:
+  """Converts float embeddings to one of the `EMBEDDING_DTYPES`.
+
+  Args:
+    embeddings: the embeddings, one per row.
+    dtype: the precision to store them at.
+
+  Returns:
+    The stored values and, for `int8`, the scale of each row, such that the
+    embeddings are approximately `values * scales[:, None]`.
+  """
+  embeddings = np.asarray(embeddings, dtype=np.float32)
+  if dtype != 'int8':
+    return embeddings.astype(dtype), None
+  scales = np.abs(embeddings).max(axis=1) / 127.0
+  scales[scales == 0.0] = 1.0
+  values = np.rint(embeddings / scales[:, None])
+  return np.clip(values, -127, 127).astype(np.int8), scales
+
+
+def dequantize(values: np.ndarray, scales: np.ndarray | None) -> np.ndarray:
+  """Returns float32 embeddings from values and scales made by `quantize`."""
+  embeddings = np.asarray(values, dtype=np.float32)
+  if scales is not None:
+    embeddings = embeddings * np.asarray(scales, dtype=np.float32)[..., None]
+  return embeddings
+
+
+class _DequantizedMatrix:
+  """A reduced precision embedding matrix, dequantized as rows are indexed.
+
+  Indexing returns float32 rows, so the matrix can be used wherever only some
+  rows are read at a time, e.g. by `ann_index.IVFIndex`, without materializing
+  a float32 copy of the whole matrix.
+  """
+
+  def __init__(self, values: np.ndarray, scales: np.ndarray | None):
+    self._values = values
+    self._scales = scales
+    self.shape = values.shape
+    self.dtype = np.dtype(np.float32)
+
+  def __len__(self) -> int:
+    return self.shape[0]
+
+  def __getitem__(self, index) -> np.ndarray:
+    return dequantize(
+        self._values[index],
+        None if self._scales is None else self._scales[index],
+    )
+
+  def __array__(self, dtype=None, copy=None) -> np.ndarray:
+    del copy  # A new array is always returned.
+    return self[:] if dtype is None else self[:].astype(dtype)
+
+
+def embedder_id_of(embedder: Callable[[str], np.ndarray] | None) -> str | None:
+  """Returns the identity of an embedder, if it declares one.
+
+  An embedder declares its identity with a `model_name` attribute, as
+  `embedding_cache.CachingEmbedder` does.
+
+  Args:
+    embedder: a sentence embedder.
+  """
+  model_name = getattr(embedder, 'model_name', None)
+  return model_name if isinstance(model_name, str) else None
+
+
+def _embed(
+    sentence_embedder: Callable[[str], np.ndarray],
+    batch_embedder: BatchEmbedder | None,
+    texts: Sequence[str],
+) -> np.ndarray:
+  """Returns the embeddings of the texts, one row per text."""
+  if batch_embedder is not None:
+    embeddings = np.asarray(batch_embedder(texts), dtype=np.float32)
+    if embeddings.shape[0] != len(texts):
+      raise ValueError(
+          f'Batch embedder returned {embeddings.shape[0]} embeddings for '
+          f'{len(texts)} texts.'
+      )
+    return embeddings
+  return np.stack(
+      [np.asarray(sentence_embedder(text), dtype=np.float32) for text in texts]
+  )
+
+
+def embed_texts(
+    texts: Sequence[str],
+    sentence_embedder: Callable[[str], np.ndarray],
+    batch_embedder: BatchEmbedder | None = None,
+    *,
+    batch_size: int = 256,
+    num_threads: int = 1,
+    progress_callback: ProgressCallback | None = None,
+) -> np.ndarray:
+  """Embeds many texts in batches, on several threads if asked to.
+
+  Args:
+    texts: the texts to embed.
+    sentence_embedder: text embedding model.
+    batch_embedder: optional embedder of many texts at once. If None, each
+      batch is embedded one text at a time with `sentence_embedder`.
+    batch_size: number of texts per call of the batch embedder.
+    num_threads: number of batches embedded concurrently.
+    progress_callback: optional function called after each batch.
+
+  Returns:
+    The embeddings of the texts, one row per text.
+  """
+  if batch_size <= 0 or num_threads <= 0:
+    raise ValueError('batch_size and num_threads must be positive.')
+  if not texts:
+    return np.empty((0, 0), dtype=np.float32)
+  batches = [
+      texts[start:start + batch_size]
+      for start in range(0, len(texts), batch_size)
+  ]
+  results = [None] * len(batches)
+  num_done = 0
+  with futures.ThreadPoolExecutor(
+      max_workers=num_threads, thread_name_prefix='embed_texts'
+  ) as executor:
+    pending = {
+        executor.submit(_embed, sentence_embedder, batch_embedder, batch): i
+        for i, batch in enumerate(batches)
+    }
+    for future in futures.as_completed(pending):
+      i = pending[future]
+      results[i] = future.result()
+      num_done += len(batches[i])
+      if progress_callback is not None:
+        progress_callback(num_done, len(texts))
+  return np.concatenate(results)
+
+
+def leading_tags(text: str) -> list[str]:
+  """Returns the bracketed tags at the start of a text.
+
+  For example, the leading tags of `'[observation] [event] Alice left.'` are
+  `['[observation]', '[event]']`. Tags may be separated by whitespace.
+
+  Args:
+    text: the text of a memory.
+  """
+  tags = []
+  position = 0
+  while match := _TAG_PATTERN.match(text, position):
+    tags.append(match.group(1))
+    position = match.end()
+  return tags
+
+
+class StorageView:
+  """A read-only view of the first `size` memories of a bank.
+
+  A bank only ever appends rows past the end of its views and replaces its
+  arrays rather than resizing them in place, so a view stays valid while the
+  bank keeps growing and can be read without holding the bank's lock.
+  """
+
+  def __init__(
+      self,
+      texts: Sequence[str],
+      embeddings: np.ndarray | None,
+      size: int,
+      scales: np.ndarray | None = None,
+  ):
+    """Initializes the view.
+
+    Args:
+      texts: the texts of the bank, at least `size` of them.
+      embeddings: the embedding matrix of the bank, with at least `size` rows,
+        or None if the bank is empty. It may be stored at any of the
+        `EMBEDDING_DTYPES`.
+      size: the number of memories in the view.
+      scales: for an `int8` matrix, the scale of each row, see `quantize`.
+    """
+    self._texts = texts
+    self._embeddings = embeddings
+    self._scales = scales
+    self.size = size
+
+  def read_texts(self, start: int, stop: int) -> list[str]:
+    """Returns the texts of rows [start, stop), oldest first."""
+    return list(self._texts[start:min(stop, self.size)])
+
+  def texts_at(self, rows: Iterable[int]) -> list[str]:
+    """Returns the texts of the given rows, in the given order."""
+    return [self._texts[row] for row in rows]
+
+  def embedding_matrix(self) -> np.ndarray:
+    """Returns the float32 embeddings of the memories, one per row.
+
+    Embeddings stored at reduced precision are returned as an array-like that
+    dequantizes the rows it is indexed with.
+    """
+    if self._embeddings is None:
+      return np.empty((0, 0), dtype=np.float32)
+    if self._embeddings.dtype == np.float32:
+      return self._embeddings[:self.size]
+    return _DequantizedMatrix(
+        self._embeddings[:self.size],
+        None if self._scales is None else self._scales[:self.size],
+    )
+
+  def stored_embeddings(
+      self, start: int, stop: int
+  ) -> tuple[np.ndarray, np.ndarray | None]:
+    """Returns the embeddings of rows [start, stop) as stored, see `quantize`."""
+    if self._embeddings is None:
+      return np.empty((0, 0), dtype=np.float32), None
+    stop = min(stop, self.size)
+    scales = None if self._scales is None else self._scales[start:stop]
+    return self._embeddings[start:stop], scales
+
+  def _scores(self, queries: np.ndarray) -> np.ndarray:
+    """Returns the inner products of each query row with each memory."""
+    matrix = self.embedding_matrix()
+    if isinstance(matrix, np.ndarray):
+      return queries @ matrix.T
+    scores = np.empty((queries.shape[0], self.size), dtype=np.float32)
+    for start in range(0, self.size, _SCORING_BLOCK_SIZE):
+      stop = min(start + _SCORING_BLOCK_SIZE, self.size)
+      scores[:, start:stop] = queries @ matrix[start:stop].T
+    return scores
+
+  def exact_top_k(self, x: np.ndarray, k: int) -> np.ndarray:
+    """Returns the rows with the k highest inner products with x."""
+    return ann_index_lib.top_k(self._scores(x.reshape(1, -1))[0], k)
+
+  def exact_top_k_batch(self, queries: np.ndarray, k: int) -> np.ndarray:
+    """Returns, for each query row, the rows with the k highest products."""
+    return ann_index_lib.top_k_per_row(self._scores(queries), k)
+
+
+@dataclasses.dataclass(frozen=True)
+class _Snapshot:
+  """The memories and tag index visible to readers."""
+
+  view: StorageView
+  # Rows of each leading tag. Shared with the writer, which only appends rows
+  # past the end of `view`, or None if tags are not indexed.
+  tag_rows: dict[str, list[int]] | None
+  # Texts added with `extend_async` that are still being embedded. They come
+  # after the stored memories.
+  pending: tuple[str, ...] = ()
+
 
 class AssociativeMemoryBank:
-  """Class that implements associative memory."""
+  """Class that implements associative memory.
+
+  Memories are stored as a list of texts alongside a preallocated matrix
+  holding one embedding per row, at float32 or, to save memory, at one of the
+  reduced precisions in `EMBEDDING_DTYPES`. Associative retrieval is a single
+  matrix-vector product followed by a partial sort, or, for large banks, an
+  approximate search through an optional `ann_index.IVFIndex`.
+
+  Writers are serialized by a lock and publish an immutable snapshot of the
+  bank after each write. Readers work on the latest snapshot without taking
+  the lock, so concurrent retrievals neither block each other nor wait for
+  writers, which only hold the lock to append and index new rows.
+
+  Memories can also be added with `extend_async`, which embeds them on a
+  background thread. Their texts are visible right away to retrieval by
+  recency, tag, prefix or selector, while associative retrieval waits until
+  they are embedded.
+  """
 
   def __init__(
       self,
       sentence_embedder: Callable[[str], np.ndarray] | None = None,
+      batch_embedder: BatchEmbedder | None = None,
+      ann_index: ann_index_lib.IVFIndex | None = None,
+      index_tags: bool = True,
+      embedding_dtype: str = 'float32',
+      max_pending_batches: int = 16,
+      lexical_index: lexical_index_lib.BM25Index | None = None,
+      embedder_id: str | None = None,
   ):
     """Constructor.
 
@@ -28,29 +355,337 @@ class AssociativeMemoryBank:
       sentence_embedder: text embedding model, if None then skip setting the
         embedder on initialization of the object. It still must be set before
         calling `add` or `retrieve` methods.
+      batch_embedder: optional text embedding model that embeds a sequence of
+        texts in one call and returns a 2-D array with one row per text. It is
+        used by `extend`. If None, `extend` calls `sentence_embedder` once per
+        text.
+      ann_index: optional approximate nearest neighbour index used by
+        `retrieve_associative`. It is updated as memories are added. While the
+        bank is smaller than the index's training size, retrieval is exact.
+      index_tags: whether to index the leading bracketed tags of memories as
+        they are added, see `retrieve_by_tag`. Without the index, tag and
+        prefix queries scan the whole bank.
+      embedding_dtype: precision the embeddings are stored at, one of
+        `EMBEDDING_DTYPES`. `float16` halves the memory used by embeddings and
+        `int8` quarters it. Queries are always scored at full precision
+        against the dequantized embeddings.
+      max_pending_batches: number of `extend_async` batches that can wait for
+        the background embedder. Further calls block until one is done.
+      lexical_index: optional inverted index of the words of the memories,
+        updated as memories are added. It is needed by the `lexical` and
+        `hybrid` modes of `retrieve_associative`.
+      embedder_id: optional identity of the embedding model, recorded in the
+        state of the bank so that embeddings of different models are never
+        mixed, see `set_embedder` and `reembed`. If None, the identity the
+        embedder declares, if any, is used, see `embedder_id_of`.
+
+    Raises:
+      ValueError: if `embedding_dtype` is not supported.
     """
+    if embedding_dtype not in EMBEDDING_DTYPES:
+      raise ValueError(
+          f'Unsupported embedding dtype {embedding_dtype!r}, expected one of '
+          f'{EMBEDDING_DTYPES}.'
+      )
+    self._embedding_dtype = embedding_dtype
     self._memory_bank_lock = threading.Lock()
     self._embedder = sentence_embedder
+    self._batch_embedder = batch_embedder
+    self._embedder_id = embedder_id or embedder_id_of(sentence_embedder)
+    # Incremented by `reembed`: embeddings computed before are discarded.
+    self._embedder_epoch = 0
+    self._ann_index = ann_index
+    self._lexical_index = lexical_index
+    # Rows of the memories with each leading tag, oldest first, if indexed.
+    self._tag_rows: dict[str, list[int]] | None = {} if index_tags else None
+    # Rows whose texts are in the tag and lexical indexes.
+    self._num_text_indexed = 0
 
-    self._memory_bank = pd.DataFrame(columns=['text', 'embedding'])
     self._stored_hashes = set()
+    # Number of embedder calls avoided because the memory was a duplicate.
+    self._num_embeddings_saved = 0
+    # Directory that `get_state` writes binary segments to, if set, and the
+    # segments written there so far, covering the oldest memories.
+    self._checkpoint_directory = None
+    self._segments: list[str] = []
+    self._num_checkpointed = 0
+    # Batches of texts submitted by `extend_async` and not yet stored, oldest
+    # first, the digests of their texts, and the futures of their embedding.
+    self._pending_batches: list[tuple[str, ...]] = []
+    self._pending_hashes = set()
+    self._pending_futures: set[futures.Future[None]] = set()
+    # Texts of batches the embedder failed on, by their digests, embedded again
+    # with the next batch submitted by `extend_async`.
+    self._failed_texts: dict[str, str] = {}
+    self._pending_slots = threading.BoundedSemaphore(max_pending_batches)
+    self._executor: futures.ThreadPoolExecutor | None = None
+    self._init_storage()
+    self._commit()
+
+  def set_checkpoint_directory(self, directory: str | None) -> None:
+    """Makes `get_state` write the memories to binary files in a directory.
+
+    Each call to `get_state` then writes the memories added since the previous
+    call as a new segment: a raw float32 `.npy` file of embeddings and a text
+    file with one memory per line. The state itself only lists the segments, so
+    checkpointing a bank at every step writes every memory once. Segments are
+    never overwritten, so states taken earlier remain loadable.
+
+    Args:
+      directory: the directory to write segments to. If None, `get_state`
+        returns the whole bank serialized as JSON.
+    """
+    with self._memory_bank_lock:
+      if directory != self._checkpoint_directory:
+        self._checkpoint_directory = directory
+        self._segments = []
+        self._num_checkpointed = 0
+
+  def _write_segment(self) -> None:
+    """Writes memories added since the last segment. Assumes lock is held."""
+    size = self._num_stored()
+    if size == self._num_checkpointed:
+      return
+    os.makedirs(self._checkpoint_directory, exist_ok=True)
+    name = (
+        f'segment_{self._num_checkpointed:09d}_{size:09d}_'
+        f'{uuid.uuid4().hex[:8]}'
+    )
+    path = os.path.join(self._checkpoint_directory, name)
+    view = self._snapshot.view
+    embeddings, scales = view.stored_embeddings(self._num_checkpointed, size)
+    np.save(f'{path}.npy', embeddings)
+    if scales is not None:
+      np.save(f'{path}.scales.npy', scales)
+    with open(f'{path}.txt', 'w', encoding='utf-8', newline='') as f:
+      f.write('\n'.join(view.read_texts(self._num_checkpointed, size)))
+    self._segments.append(name)
+    self._num_checkpointed = size
 
   def get_state(self) -> entity_component.ComponentState:
     """Converts the AssociativeMemory to a dictionary."""
 
+    self.wait_for_pending()
     with self._memory_bank_lock:
+      if self._checkpoint_directory is not None:
+        self._write_segment()
+        return {
+            'format': SEGMENTS_STATE_FORMAT,
+            'directory': self._checkpoint_directory,
+            'segments': list(self._segments),
+            'num_memories': self._num_checkpointed,
+            'embedding_dtype': self._embedding_dtype,
+            'embedder_id': self._embedder_id,
+        }
       output = {
+          'embedding_dtype': self._embedding_dtype,
+          'embedder_id': self._embedder_id,
           'stored_hashes': list(self._stored_hashes),
-          'memory_bank': self._memory_bank.to_json(),
+          'memory_bank': self._make_data_frame(self._snapshot.view).to_json(),
       }
     return output
 
   def set_state(self, state: entity_component.ComponentState) -> None:
-    """Sets the AssociativeMemory from a dictionary."""
+    """Sets the AssociativeMemory from a dictionary.
 
+    The embeddings are stored at the precision of this bank, whatever the
+    precision of the bank the state was taken from.
+
+    Args:
+      state: a state returned by `get_state`.
+
+    Raises:
+      ValueError: if the state was embedded by another embedder than the one
+        of this bank.
+    """
+
+    self._check_embedder_id(state)
+    self.wait_for_pending()
+    if state.get('format') == SEGMENTS_STATE_FORMAT:
+      texts, embeddings = _read_segments(state['directory'], state['segments'])
+    else:
+      data = pd.read_json(StringIO(state['memory_bank']))
+      texts = [] if data.empty else data['text'].tolist()
+      embeddings = None if data.empty else np.stack(data['embedding'])
+
+    storage = self._build_storage(texts, embeddings)
     with self._memory_bank_lock:
-      self._stored_hashes = set(state['stored_hashes'])
-      self._memory_bank = pd.read_json(StringIO(state['memory_bank']))
+      self._embedder_id = self._embedder_id or state.get('embedder_id')
+      # Hashes are recomputed from the texts since states written by older
+      # versions stored process-dependent `hash` values.
+      self._stored_hashes = set(content_digest(text) for text in texts)
+      self._failed_texts = {}
+      self._swap_storage(storage)
+      self._reset_indexes()
+      if state.get('format') == SEGMENTS_STATE_FORMAT:
+        # Continue writing segments after the loaded ones.
+        self._checkpoint_directory = state['directory']
+        self._segments = list(state['segments'])
+        self._num_checkpointed = len(texts)
+      else:
+        self._segments = []
+        self._num_checkpointed = 0
+      self._commit()
+
+  def _check_embedder_id(
+      self, state: entity_component.ComponentState
+  ) -> None:
+    """Raises a ValueError if a state was embedded by another embedder."""
+    embedder_id = state.get('embedder_id')
+    if embedder_id and self._embedder_id and embedder_id != self._embedder_id:
+      raise ValueError(
+          f'The state holds embeddings of {embedder_id!r} but the memory bank '
+          f'embeds with {self._embedder_id!r}. Re-embed the state first, e.g. '
+          'with `embedder_migration.migrate_checkpoints`.'
+      )
+
+  # Storage of the texts and embeddings. Subclasses that store memories
+  # elsewhere override these methods, which all assume the lock is held, and
+  # provide a `StorageView` to read the stored memories.
+
+  def _init_storage(self) -> None:
+    """Prepares the storage when the bank is constructed."""
+    self._reset_storage()
+
+  def _reset_storage(self) -> None:
+    """Removes all memories from the storage."""
+    # A new list and matrix, since views of the old ones may still be in use.
+    self._texts: list[str] = []
+    # Rows [0, len(self._texts)) hold valid embeddings, the rest is spare
+    # capacity. None until the first memory fixes the embedding dimension.
+    self._embeddings: np.ndarray | None = None
+    # Scale of each row of an int8 matrix, with the same capacity.
+    self._scales: np.ndarray | None = None
+
+  def _build_storage(
+      self, texts: Sequence[str], embeddings: np.ndarray | None
+  ) -> Any:
+    """Returns new storage holding the given memories.
+
+    Does not need the lock: the storage is not used by the bank until it is
+    passed to `_swap_storage`, or released with `_discard_storage`.
+
+    Args:
+      texts: the texts of the memories.
+      embeddings: the embeddings of the texts, one per row, or None if there
+        are no texts.
+    """
+    if not texts:
+      return [], None, None
+    embeddings, scales = quantize(embeddings, self._embedding_dtype)
+    return list(texts), embeddings, scales
+
+  def _swap_storage(self, storage: Any) -> None:
+    """Replaces the stored memories with storage from `_build_storage`."""
+    # Views of the old list and matrix remain valid.
+    self._texts, self._embeddings, self._scales = storage
+
+  def _discard_storage(self, storage: Any) -> None:
+    """Releases storage from `_build_storage` that is not swapped in."""
+    del storage
+
+  def _num_stored(self) -> int:
+    """Returns the number of stored memories."""
+    return len(self._texts)
+
+  def _make_view(self) -> StorageView:
+    """Returns a view of the currently stored memories."""
+    return StorageView(
+        self._texts, self._embeddings, len(self._texts), self._scales
+    )
+
+  def _append_many(self, texts: Sequence[str], embeddings: np.ndarray) -> None:
+    """Appends rows to the bank. Assumes the lock is held.
+
+    Args:
+      texts: the texts of the memories.
+      embeddings: the embeddings of the texts, one per row.
+
+    Raises:
+      ValueError: if the embedding dimension differs from the stored ones.
+    """
+    embeddings, scales = quantize(embeddings, self._embedding_dtype)
+    size = len(self._texts)
+    if self._embeddings is None:
+      capacity = max(_INITIAL_CAPACITY, embeddings.shape[0])
+      self._embeddings = np.empty(
+          (capacity, embeddings.shape[1]), dtype=self._embedding_dtype
+      )
+      if scales is not None:
+        self._scales = np.empty(capacity, dtype=np.float32)
+    elif embeddings.shape[1] != self._embeddings.shape[1]:
+      raise ValueError(
+          f'Embedding dimension {embeddings.shape[1]} does not match the '
+          f'dimension of the memory bank {self._embeddings.shape[1]}.'
+      )
+    new_size = size + embeddings.shape[0]
+    if new_size > self._embeddings.shape[0]:
+      capacity = self._embeddings.shape[0]
+      while capacity < new_size:
+        capacity *= _GROWTH_FACTOR
+      grown = np.empty(
+          (capacity, self._embeddings.shape[1]), dtype=self._embedding_dtype
+      )
+      grown[:size] = self._embeddings[:size]
+      # Views of the old matrix remain valid.
+      self._embeddings = grown
+      if scales is not None:
+        grown_scales = np.empty(capacity, dtype=np.float32)
+        grown_scales[:size] = self._scales[:size]
+        self._scales = grown_scales
+    self._embeddings[size:new_size] = embeddings
+    if scales is not None:
+      self._scales[size:new_size] = scales
+    self._texts.extend(texts)
+
+  def _append(self, text: str, embedding: np.ndarray) -> None:
+    """Appends a row to the bank. Assumes the lock is held.
+
+    Args:
+      text: the text of the memory.
+      embedding: the embedding of the text.
+
+    Raises:
+      ValueError: if the embedding dimension differs from the stored ones.
+    """
+    self._append_many(
+        [text], np.asarray(embedding, dtype=np.float32).reshape(1, -1)
+    )
+
+  def _reset_indexes(self) -> None:
+    """Empties the indexes. Assumes the lock is held."""
+    if self._ann_index is not None:
+      self._ann_index.reset()
+    if self._tag_rows is not None:
+      self._tag_rows = {}
+    if self._lexical_index is not None:
+      self._lexical_index.reset()
+    self._num_text_indexed = 0
+
+  def _commit(self) -> None:
+    """Indexes newly appended rows and publishes them to readers.
+
+    Assumes the lock is held.
+    """
+    view = self._make_view()
+    if self._ann_index is not None and view.size:
+      self._ann_index.update(view.embedding_matrix())
+    if view.size > self._num_text_indexed and (
+        self._tag_rows is not None or self._lexical_index is not None
+    ):
+      texts = view.read_texts(self._num_text_indexed, view.size)
+      if self._tag_rows is not None:
+        for row, text in enumerate(texts, start=self._num_text_indexed):
+          for tag in leading_tags(text):
+            self._tag_rows.setdefault(tag, []).append(row)
+      if self._lexical_index is not None:
+        self._lexical_index.update(texts)
+    self._num_text_indexed = view.size
+    self._snapshot = _Snapshot(
+        view=view,
+        tag_rows=self._tag_rows,
+        pending=tuple(itertools.chain.from_iterable(self._pending_batches)),
+    )
 
   def add(
       self,
@@ -66,21 +701,28 @@ class AssociativeMemoryBank:
 
     # Remove all newline characters from memories.
     text = text.replace('\n', ' ')
+    hashed_contents = content_digest(text)
 
-    contents = {
-        'text': text,
-    }
-    hashed_contents = hash(tuple(contents.values()))
-    derived = {'embedding': self._embedder(text)}
-    new_df = pd.Series(contents | derived).to_frame().T.infer_objects()
-
+    # Check for duplicates before paying for the embedding.
     with self._memory_bank_lock:
-      if hashed_contents in self._stored_hashes:
+      if self._is_stored_or_pending(hashed_contents):
+        self._num_embeddings_saved += 1
+        return
+
+    while True:
+      epoch = self._embedder_epoch
+      embedding = self._embedder(text)
+      with self._memory_bank_lock:
+        # Embedded again if the bank switched embedders meanwhile.
+        if self._embedder_epoch != epoch:
+          continue
+        # Another thread may have added the same text while embedding.
+        if self._is_stored_or_pending(hashed_contents):
+          return
+        self._append(text, embedding)
+        self._stored_hashes.add(hashed_contents)
+        self._commit()
         return
-      self._memory_bank = pd.concat(
-          [self._memory_bank, new_df], ignore_index=True
-      )
-      self._stored_hashes.add(hashed_contents)
 
   def extend(
       self,
@@ -88,17 +730,199 @@ class AssociativeMemoryBank:
   ) -> None:
     """Adds the texts to the memory.
 
+    All texts are embedded together with the batch embedder, if one is set.
+
     Args:
       texts: list of strings to add to the memory
     """
+    if not self._embedder:
+      raise ValueError('Embedder must be set before calling `extend` method.')
+
+    with self._memory_bank_lock:
+      new_texts = self._new_texts(texts)
+    if not new_texts:
+      return
+
+    while True:
+      epoch = self._embedder_epoch
+      embeddings = self._embed_batch(list(new_texts.values()))
+      with self._memory_bank_lock:
+        # Embedded again if the bank switched embedders meanwhile.
+        if self._embedder_epoch == epoch:
+          self._store(new_texts, embeddings)
+          self._commit()
+          return
+
+  def extend_async(
+      self,
+      texts: Iterable[str],
+  ) -> futures.Future[None]:
+    """Adds the texts to the memory, embedding them in the background.
+
+    The texts are embedded by a single background thread, in the order the
+    batches are submitted. Until they are stored, they are already returned by
+    `retrieve_recent`, `scan`, `retrieve_by_tag`, `retrieve_by_prefix` and
+    `get_all_memories_as_text`, after the stored memories, while
+    `retrieve_associative` waits for them. Blocks if `max_pending_batches`
+    batches are already waiting.
+
+    If the embedder fails on a batch, its texts are no longer returned and are
+    embedded again with the next batch.
+
+    Args:
+      texts: list of strings to add to the memory
+
+    Returns:
+      A future that completes once the texts are stored, and raises the error
+      of the embedder if it failed.
+    """
+    if not self._embedder:
+      raise ValueError(
+          'Embedder must be set before calling `extend_async` method.'
+      )
+
+    texts = list(texts)
+    self._pending_slots.acquire()
+    try:
+      with self._memory_bank_lock:
+        new_texts = {
+            hashed_contents: text
+            for hashed_contents, text in self._failed_texts.items()
+            if not self._is_stored_or_pending(hashed_contents)
+        }
+        self._failed_texts = {}
+        new_texts.update(self._new_texts(texts))
+        if not new_texts:
+          future = futures.Future()
+          future.set_result(None)
+          self._pending_slots.release()
+          return future
+        self._pending_batches.append(tuple(new_texts.values()))
+        self._pending_hashes.update(new_texts)
+        self._commit()
+        if self._executor is None:
+          self._executor = futures.ThreadPoolExecutor(
+              max_workers=1, thread_name_prefix='memory_bank_embedding'
+          )
+        future = self._executor.submit(self._embed_pending, new_texts)
+        self._pending_futures.add(future)
+    except BaseException:
+      self._pending_slots.release()
+      raise
+    future.add_done_callback(self._discard_future)
+    return future
+
+  def _discard_future(self, future: futures.Future[None]) -> None:
+    """Forgets a batch submitted by `extend_async` once it is done."""
+    with self._memory_bank_lock:
+      self._pending_futures.discard(future)
+
+  def _embed_pending(self, new_texts: dict[str, str]) -> None:
+    """Embeds and stores a batch submitted by `extend_async`."""
+    batch = tuple(new_texts.values())
+    try:
+      while True:
+        epoch = self._embedder_epoch
+        embeddings = self._embed_batch(list(batch))
+        with self._memory_bank_lock:
+          # Embedded again if the bank switched embedders meanwhile.
+          if self._embedder_epoch == epoch:
+            # Stored and removed from the pending texts in one snapshot.
+            self._pending_batches.remove(batch)
+            self._pending_hashes.difference_update(new_texts)
+            try:
+              self._store(new_texts, embeddings)
+            finally:
+              self._commit()
+            return
+    except Exception:
+      with self._memory_bank_lock:
+        if batch in self._pending_batches:
+          self._pending_batches.remove(batch)
+          self._pending_hashes.difference_update(new_texts)
+        # Kept to be embedded again, with the next batch.
+        self._failed_texts.update(
+            (hashed_contents, text)
+            for hashed_contents, text in new_texts.items()
+            if hashed_contents not in self._stored_hashes
+        )
+        self._commit()
+      raise
+    finally:
+      self._pending_slots.release()
+
+  def wait_for_pending(self) -> None:
+    """Waits until the texts added with `extend_async` so far are embedded.
+
+    The errors of the embedder are not raised here but by the futures returned
+    by `extend_async`, and the texts it failed on are embedded again with the
+    next batch.
+    """
+    with self._memory_bank_lock:
+      pending_futures = list(self._pending_futures)
+    futures.wait(pending_futures)
+
+  def _new_texts(self, texts: Iterable[str]) -> dict[str, str]:
+    """Returns the texts to embed by their digests. Assumes lock is held.
+
+    Drops duplicates, both of stored or pending memories and within `texts`,
+    before paying for the embeddings.
+
+    Args:
+      texts: the texts to add.
+    """
+    new_texts = {}
+    num_texts = 0
     for text in texts:
-      self.add(text)
+      num_texts += 1
+      text = text.replace('\n', ' ')
+      hashed_contents = content_digest(text)
+      if not self._is_stored_or_pending(hashed_contents):
+        new_texts.setdefault(hashed_contents, text)
+    self._num_embeddings_saved += num_texts - len(new_texts)
+    return new_texts
+
+  def _is_stored_or_pending(self, hashed_contents: str) -> bool:
+    """Returns whether a text is stored or being embedded. Assumes lock held."""
+    return (
+        hashed_contents in self._stored_hashes
+        or hashed_contents in self._pending_hashes
+    )
+
+  def _store(self, new_texts: dict[str, str], embeddings: np.ndarray) -> None:
+    """Appends embedded texts by their digests. Assumes the lock is held."""
+    for (hashed_contents, text), embedding in zip(
+        new_texts.items(), embeddings
+    ):
+      # Another thread may have added the same text while embedding.
+      if self._is_stored_or_pending(hashed_contents):
+        continue
+      self._append(text, embedding)
+      self._stored_hashes.add(hashed_contents)
+
+  def _embed_batch(self, texts: Sequence[str]) -> np.ndarray:
+    """Returns the embeddings of the texts, one row per text."""
+    return _embed(self._embedder, self._batch_embedder, texts)
+
+  def _make_data_frame(self, view: StorageView) -> pd.DataFrame:
+    """Builds a dataframe of the memories in a view."""
+    if not view.size:
+      return pd.DataFrame(columns=['text', 'embedding'])
+    embeddings = np.array(view.embedding_matrix())
+    return pd.DataFrame(
+        {'text': view.read_texts(0, view.size), 'embedding': list(embeddings)}
+    )
 
   def get_data_frame(self) -> pd.DataFrame:
-    with self._memory_bank_lock:
-      return self._memory_bank.copy()
+    """Returns the memories as a dataframe with `text` and `embedding` columns.
 
-  def _get_top_k_cosine(self, x: np.ndarray, k: int):
+    The dataframe is built on demand and is a copy of the memory bank. It
+    includes pending memories once they are embedded.
+    """
+    self.wait_for_pending()
+    return self._make_data_frame(self._snapshot.view)
+
+  def _get_top_k_cosine(self, x: np.ndarray, k: int) -> Sequence[str]:
     """Returns the top k most cosine similar rows to an input vector x.
 
     Args:
@@ -106,63 +930,169 @@ class AssociativeMemoryBank:
       k: The number of rows to return.
 
     Returns:
-      Rows, sorted by cosine similarity in descending order.
+      Texts of the rows, sorted by cosine similarity in descending order.
     """
-    with self._memory_bank_lock:
-      cosine_similarities = self._memory_bank['embedding'].apply(
-          lambda y: np.dot(x, y)
-      )
+    x = np.asarray(x, dtype=np.float32).reshape(-1)
+    self.wait_for_pending()
+    view = self._snapshot.view
+    if not view.size:
+      return []
+    return view.texts_at(self._top_k_rows(view, x, k))
 
-      # Sort the cosine similarities in descending order.
-      cosine_similarities.sort_values(ascending=False, inplace=True)
+  def _top_k_rows(self, view: StorageView, x: np.ndarray, k: int) -> np.ndarray:
+    """Returns the rows of a non-empty view most similar to x."""
+    top_k = None
+    if self._ann_index is not None:
+      top_k = self._ann_index.search(view.embedding_matrix(), x, k)
+    if top_k is None:
+      top_k = view.exact_top_k(x, k)
+    return top_k
 
-      # Return the top k rows.
-      return self._memory_bank.iloc[cosine_similarities.head(k).index]
+  def _top_k_rows_batch(
+      self, view: StorageView, queries: np.ndarray, k: int
+  ) -> Sequence[np.ndarray]:
+    """Returns, for each query row, the rows of a non-empty view most similar."""
+    if self._ann_index is not None and self._ann_index.is_trained:
+      embeddings = view.embedding_matrix()
+      return [
+          self._ann_index.search(embeddings, query, k) for query in queries
+      ]
+    return view.exact_top_k_batch(queries, k)
 
-  def _pd_to_text(
-      self,
-      data: pd.DataFrame,
-  ) -> Sequence[str]:
-    """Formats a dataframe into list of strings.
+  def _get_top_k_lexical(self, query: str, k: int) -> Sequence[str]:
+    """Returns the texts of the k rows with the highest BM25 scores."""
+    self.wait_for_pending()
+    view = self._snapshot.view
+    rows, _ = self._lexical_index.search(query, k, view.size)
+    return view.texts_at(rows)
+
+  def _hybrid_rows(
+      self, view: StorageView, query: str, x: np.ndarray, k: int
+  ) -> tuple[np.ndarray, np.ndarray]:
+    """Rescores the lexical candidates of a query with their embeddings.
+
+    If fewer than k rows share a selective word with the query, the rows most
+    similar to x are added to the candidates, so k rows are always returned
+    when the view has as many.
 
     Args:
-      data: the dataframe to process
+      view: the non-empty view to retrieve from.
+      query: the query text.
+      x: the query embedding.
+      k: the number of rows to return.
 
     Returns:
-      A list of strings, one for each memory
+      The top k candidate rows by inner product with x, and their products.
     """
-    if data.empty:
-      return []
-    output = data['text']
+    candidates, _ = self._lexical_index.search(
+        query, max(k, self._lexical_index.num_candidates), view.size
+    )
+    if candidates.shape[0] < k:
+      candidates = np.union1d(candidates, self._top_k_rows(view, x, k))
+    scores = view.embedding_matrix()[candidates] @ x
+    top_k = ann_index_lib.top_k(scores, k)
+    return candidates[top_k], scores[top_k]
 
-    return output.tolist()
+  def _get_top_k_hybrid(
+      self, query: str, x: np.ndarray, k: int
+  ) -> Sequence[str]:
+    """Returns the texts of the top k rows of a hybrid retrieval."""
+    x = np.asarray(x, dtype=np.float32).reshape(-1)
+    self.wait_for_pending()
+    view = self._snapshot.view
+    if not view.size:
+      return []
+    rows, _ = self._hybrid_rows(view, query, x, k)
+    return view.texts_at(rows)
 
   def retrieve_associative(
       self,
       query: str,
       k: int = 1,
+      mode: str = 'dense',
   ) -> Sequence[str]:
     """Retrieve memories associatively.
 
     Args:
       query: a string to use for retrieval
       k: how many memories to retrieve
+      mode: one of `RETRIEVAL_MODES`. `dense` ranks all memories by the cosine
+        similarity of their embeddings to the query. `lexical` ranks the
+        memories sharing words with the query by their BM25 score, without
+        embedding the query. `hybrid` selects candidates with the lexical
+        index, which favours memories mentioning the names in the query, and
+        ranks them by cosine similarity, so only the candidates are scored
+        densely. The last two need a `lexical_index`.
 
     Returns:
-      List of strings corresponding to memories, sorted by cosine similarity
+      List of strings corresponding to memories, sorted by cosine similarity,
+      or by BM25 score in `lexical` mode
     """
-    if not self._embedder:
+    if mode not in RETRIEVAL_MODES:
+      raise ValueError(
+          f'Unknown retrieval mode {mode!r}, expected one of '
+          f'{RETRIEVAL_MODES}.'
+      )
+    if mode != 'dense' and self._lexical_index is None:
+      raise ValueError(
+          f'The {mode!r} retrieval mode needs a memory bank with a lexical '
+          'index.'
+      )
+    if not self._embedder and mode != 'lexical':
       raise ValueError('Embedder must be set before calling the '
                        '`retrieve_associative` method.')
 
     if k <= 0:
       raise ValueError('Limit must be positive.')
 
+    if mode == 'lexical':
+      return self._get_top_k_lexical(query, k)
+
     query_embedding = self._embedder(query)
 
-    data = self._get_top_k_cosine(query_embedding, k)
+    if mode == 'hybrid':
+      return self._get_top_k_hybrid(query, query_embedding, k)
+    return self._get_top_k_cosine(query_embedding, k)
 
-    return self._pd_to_text(data)
+  def retrieve_associative_batch(
+      self,
+      queries: Sequence[str],
+      k: int = 1,
+  ) -> list[Sequence[str]]:
+    """Retrieve memories associatively for several queries at once.
+
+    The queries are embedded together with the batch embedder, if one is set,
+    and scored against the bank with a single matrix-matrix product.
+
+    Args:
+      queries: strings to use for retrieval
+      k: how many memories to retrieve per query
+
+    Returns:
+      For each query, the list of strings corresponding to memories, sorted by
+      cosine similarity
+    """
+    if not self._embedder:
+      raise ValueError('Embedder must be set before calling the '
+                       '`retrieve_associative_batch` method.')
+
+    if k <= 0:
+      raise ValueError('Limit must be positive.')
+    if not queries:
+      return []
+
+    return self._get_top_k_cosine_batch(self._embed_batch(queries), k)
+
+  def _get_top_k_cosine_batch(
+      self, queries: np.ndarray, k: int
+  ) -> list[Sequence[str]]:
+    """Returns, for each query row, the texts of the k most similar rows."""
+    self.wait_for_pending()
+    view = self._snapshot.view
+    if not view.size:
+      return [[] for _ in queries]
+    top_k = self._top_k_rows_batch(view, queries, k)
+    return [view.texts_at(rows) for rows in top_k]
 
   def scan(self, selector_fn: Callable[[str], bool]):
     """Retrieve memories that match the selector function.
@@ -174,12 +1104,98 @@ class AssociativeMemoryBank:
     Returns:
       List of strings corresponding to memories, sorted by recency
     """
-    with self._memory_bank_lock:
-      if self._memory_bank.empty:
-        return []
-      is_selected = self._memory_bank['text'].apply(selector_fn)
-      data = self._memory_bank[is_selected]
-    return self._pd_to_text(data)
+    snapshot = self._snapshot
+    view = snapshot.view
+    return [
+        text
+        for text in itertools.chain(
+            view.read_texts(0, view.size), snapshot.pending
+        )
+        if selector_fn(text)
+    ]
+
+  def retrieve_by_tag(
+      self,
+      tag: str,
+      k: int | None = None,
+  ) -> Sequence[str]:
+    """Retrieves memories that have a tag among their leading tags.
+
+    With the tag index this takes time proportional to the number of memories
+    returned.
+
+    Args:
+      tag: a bracketed tag such as `'[observation]'`, see `leading_tags`.
+      k: if given, only the k most recent matching memories are returned.
+
+    Returns:
+      List of strings corresponding to memories, sorted by recency
+    """
+    if k is not None and k <= 0:
+      raise ValueError('Limit must be positive.')
+    snapshot = self._snapshot
+    pending = [text for text in snapshot.pending if tag in leading_tags(text)]
+    if k is not None:
+      if len(pending) >= k:
+        return pending[-k:]
+      k -= len(pending)
+    if snapshot.tag_rows is None:
+      rows = _scan_rows(
+          snapshot.view, lambda text: tag in leading_tags(text)
+      )
+      if k is not None:
+        rows = rows[-k:]
+    else:
+      rows, stop = _tag_rows_in_view(snapshot, tag)
+      rows = rows[0 if k is None else max(0, stop - k):stop]
+    return snapshot.view.texts_at(rows) + pending
+
+  def retrieve_by_prefix(
+      self,
+      prefix: str,
+      k: int | None = None,
+  ) -> Sequence[str]:
+    """Retrieves memories that start with a prefix.
+
+    If the prefix starts with complete bracketed tags, such as
+    `'[observation] [scene type]'`, only the memories with the rarest of these
+    tags are checked. Otherwise the whole bank is scanned.
+
+    Args:
+      prefix: the prefix of the memories to retrieve.
+      k: if given, only the k most recent matching memories are returned.
+
+    Returns:
+      List of strings corresponding to memories, sorted by recency
+    """
+    if k is not None and k <= 0:
+      raise ValueError('Limit must be positive.')
+    tags = leading_tags(prefix)
+    snapshot = self._snapshot
+    view = snapshot.view
+    pending = [text for text in snapshot.pending if text.startswith(prefix)]
+    if k is not None:
+      if len(pending) >= k:
+        return pending[-k:]
+      k -= len(pending)
+    if snapshot.tag_rows is None or not tags:
+      rows = _scan_rows(view, lambda text: text.startswith(prefix))
+      if k is not None:
+        rows = rows[-k:]
+      return view.texts_at(rows) + pending
+    # Every memory starting with the prefix has all of its tags.
+    candidates, stop = min(
+        (_tag_rows_in_view(snapshot, tag) for tag in tags),
+        key=lambda rows_and_stop: rows_and_stop[1],
+    )
+    texts = []
+    for i in range(stop - 1, -1, -1):
+      if k is not None and len(texts) == k:
+        break
+      (text,) = view.texts_at([candidates[i]])
+      if text.startswith(prefix):
+        texts.append(text)
+    return texts[::-1] + pending
 
   def retrieve_recent(
       self,
@@ -196,28 +1212,210 @@ class AssociativeMemoryBank:
     if k <= 0:
       raise ValueError('Limit must be positive.')
 
-    with self._memory_bank_lock:
-      if self._memory_bank.empty:
-        return []
-      return self._pd_to_text(self._memory_bank.iloc[-k:])
+    snapshot = self._snapshot
+    view = snapshot.view
+    pending = list(snapshot.pending[-k:])
+    k -= len(pending)
+    if not k:
+      return pending
+    return view.read_texts(max(0, view.size - k), view.size) + pending
 
   def __len__(self):
     """Returns the number of entries in the memory bank.
 
     Since memories cannot be deleted, the length cannot decrease, and can be
-    used to check if the contents of the memory bank have changed.
+    used to check if the contents of the memory bank have changed. Pending
+    memories added with `extend_async` are counted.
     """
-    with self._memory_bank_lock:
-      return len(self._memory_bank)
+    snapshot = self._snapshot
+    return snapshot.view.size + len(snapshot.pending)
 
   def get_all_memories_as_text(
       self,
   ) -> Sequence[str]:
     """Returns all memories in the memory bank as a sequence of strings."""
-    memories_data_frame = self.get_data_frame()
-    texts = self._pd_to_text(memories_data_frame)
-    return texts
+    snapshot = self._snapshot
+    view = snapshot.view
+    return view.read_texts(0, view.size) + list(snapshot.pending)
+
+  def get_stats(self) -> Mapping[str, int]:
+    """Returns statistics about the memory bank.
+
+    Returns:
+      A mapping with the number of stored memories, the number of memories
+      waiting to be embedded in the background, the number of memories the
+      background embedder failed on and that wait for the next batch, the
+      number of embedder calls that were skipped because the memory was a
+      duplicate, and the number of bytes used by the stored embeddings.
+    """
+    snapshot = self._snapshot
+    view = snapshot.view
+    embeddings, scales = view.stored_embeddings(0, view.size)
+    embedding_bytes = embeddings.nbytes
+    if scales is not None:
+      embedding_bytes += scales.nbytes
+    return {
+        'num_memories': view.size,
+        'num_pending': len(snapshot.pending),
+        'num_failed': len(self._failed_texts),
+        'num_embeddings_saved': self._num_embeddings_saved,
+        'embedding_bytes': embedding_bytes,
+    }
+
+  @property
+  def embedder_id(self) -> str | None:
+    """The identity of the model the stored memories were embedded with."""
+    return self._embedder_id
+
+  def set_embedder(
+      self,
+      embedder: Callable[[str], np.ndarray],
+      batch_embedder: BatchEmbedder | None = None,
+      embedder_id: str | None = None,
+  ):
+    """Sets the embedder (and optionally the batch embedder) for the bank.
+
+    To cache embeddings, pass an `embedding_cache.CachingEmbedder` and its
+    `embed_batch` method. The stored embeddings are kept, so the new embedder
+    must be the same model as the previous one; use `reembed` to switch to
+    another model.
+
+    Args:
+      embedder: text embedding model.
+      batch_embedder: optional embedder of many texts at once.
+      embedder_id: optional identity of the embedding model. If None, the
+        identity the embedder declares, if any, is used.
+
+    Raises:
+      ValueError: if the bank holds memories embedded by another model.
+    """
+    embedder_id = embedder_id or embedder_id_of(embedder)
+    with self._memory_bank_lock:
+      if (
+          embedder_id
+          and self._embedder_id
+          and embedder_id != self._embedder_id
+          and self._num_stored()
+      ):
+        raise ValueError(
+            f'The memory bank holds embeddings of {self._embedder_id!r}, '
+            f'which cannot be mixed with those of {embedder_id!r}. Use '
+            '`reembed` to switch embedders.'
+        )
+      self._embedder = embedder
+      self._batch_embedder = batch_embedder
+      self._embedder_id = embedder_id or self._embedder_id
+
+  def reembed(
+      self,
+      embedder: Callable[[str], np.ndarray],
+      batch_embedder: BatchEmbedder | None = None,
+      embedder_id: str | None = None,
+      *,
+      batch_size: int = 256,
+      num_threads: int = 1,
+      progress_callback: ProgressCallback | None = None,
+  ) -> None:
+    """Embeds all memories again with a new embedder and switches to it.
+
+    The memories are embedded into new storage without holding the lock, so
+    readers keep retrieving from the previous embeddings and writers keep
+    adding memories meanwhile. Memories added during the migration are then
+    embedded too, and the new storage replaces the previous one at once.
+    Checkpoint segments written so far hold the previous embeddings, so the
+    next `get_state` writes all memories again. Must not run concurrently
+    with `set_state`.
+
+    Args:
+      embedder: the new text embedding model.
+      batch_embedder: optional embedder of many texts at once.
+      embedder_id: optional identity of the new model. If None, the identity
+        the embedder declares, if any, is used.
+      batch_size: number of texts per call of the batch embedder.
+      num_threads: number of batches embedded concurrently.
+      progress_callback: optional function called after each batch with the
+        number of memories embedded so far and the number of memories.
+    """
+    self.wait_for_pending()
+    texts = []
+    embeddings = []
+    while True:
+      view = self._snapshot.view
+      if view.size > len(texts):
+        new_texts = view.read_texts(len(texts), view.size)
+        callback = None
+        if progress_callback is not None:
+          callback = lambda done, total, start=len(texts): progress_callback(
+              start + done, start + total
+          )
+        embeddings.append(embed_texts(
+            new_texts,
+            embedder,
+            batch_embedder,
+            batch_size=batch_size,
+            num_threads=num_threads,
+            progress_callback=callback,
+        ))
+        texts.extend(new_texts)
+        continue
+      storage = self._build_storage(
+          texts, np.concatenate(embeddings) if texts else None
+      )
+      with self._memory_bank_lock:
+        if self._num_stored() == len(texts):
+          self._swap_storage(storage)
+          self._reset_indexes()
+          self._segments = []
+          self._num_checkpointed = 0
+          self._embedder_epoch += 1
+          self._embedder = embedder
+          self._batch_embedder = batch_embedder
+          self._embedder_id = embedder_id or embedder_id_of(embedder)
+          self._commit()
+          return
+      # Memories were added while the storage was built: embed them too.
+      self._discard_storage(storage)
+
+
+def _scan_rows(
+    view: StorageView, selector_fn: Callable[[str], bool]
+) -> list[int]:
+  """Returns the rows of a view whose texts match the selector."""
+  texts = view.read_texts(0, view.size)
+  return [row for row, text in enumerate(texts) if selector_fn(text)]
+
+
+def _tag_rows_in_view(
+    snapshot: _Snapshot, tag: str
+) -> tuple[list[int], int]:
+  """Returns the indexed rows of a tag and how many are in the snapshot.
+
+  The writer may have indexed rows added after the snapshot was taken, so
+  only the first rows of the returned list are part of the snapshot. The list
+  is not copied since it can be long.
+
+  Args:
+    snapshot: the snapshot to read.
+    tag: the leading tag.
+  """
+  rows = snapshot.tag_rows.get(tag, [])
+  return rows, bisect.bisect_left(rows, snapshot.view.size)
+
 
-  def set_embedder(self, embedder: Callable[[str], np.ndarray]):
-    """Sets the embedder for the memory bank."""
-    self._embedder = embedder
+def _read_segments(
+    directory: str, segments: Sequence[str]
+) -> tuple[list[str], np.ndarray | None]:
+  """Reads the texts and embeddings of binary segments, oldest first."""
+  texts = []
+  embeddings = []
+  for name in segments:
+    path = os.path.join(directory, name)
+    scales = None
+    if os.path.exists(f'{path}.scales.npy'):
+      scales = np.load(f'{path}.scales.npy')
+    embeddings.append(dequantize(np.load(f'{path}.npy'), scales))
+    with open(f'{path}.txt', 'r', encoding='utf-8', newline='') as f:
+      texts.extend(f.read().split('\n'))
+  if not texts:
+    return [], None
+  return texts, np.concatenate(embeddings)
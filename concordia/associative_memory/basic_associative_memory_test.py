@@ -0,0 +1,693 @@
+"""Tests for the associative memory bank."""
+
+import os
+import tempfile
+import threading
+import time
+
+from absl.testing import absltest
+from concordia.associative_memory import ann_index
+from concordia.associative_memory import basic_associative_memory
+from concordia.associative_memory import lexical_index
+import numpy as np
+
+
+def _one_hot_embedder(text: str) -> np.ndarray:
+  """Embeds a text as a one-hot vector of its first character."""
+  embedding = np.zeros(26)
+  embedding[ord(text[0].lower()) - ord('a')] = 1.0
+  return embedding
+
+
+class AssociativeMemoryBankTest(absltest.TestCase):
+
+  def test_retrieve_associative_returns_most_similar(self):
+    bank = basic_associative_memory.AssociativeMemoryBank(
+        sentence_embedder=_one_hot_embedder
+    )
+    bank.extend(['apple', 'banana', 'cherry', 'avocado'])
+
+    self.assertCountEqual(
+        bank.retrieve_associative('a query', k=2), ['apple', 'avocado']
+    )
+    self.assertEqual(bank.retrieve_associative('carrot', k=1), ['cherry'])
+
+  def test_retrieve_associative_k_larger_than_bank(self):
+    bank = basic_associative_memory.AssociativeMemoryBank(
+        sentence_embedder=_one_hot_embedder
+    )
+    bank.extend(['apple', 'banana'])
+
+    self.assertEqual(bank.retrieve_associative('banjo', k=5)[0], 'banana')
+    self.assertLen(bank.retrieve_associative('banjo', k=5), 2)
+
+  def test_retrieve_associative_batch(self):
+    batches = []
+
+    def batch_embedder(texts):
+      batches.append(list(texts))
+      return np.stack([_one_hot_embedder(text) for text in texts])
+
+    bank = basic_associative_memory.AssociativeMemoryBank(
+        sentence_embedder=_one_hot_embedder, batch_embedder=batch_embedder
+    )
+    bank.extend(['apple', 'banana', 'cherry', 'avocado'])
+    batches.clear()
+
+    results = bank.retrieve_associative_batch(['a query', 'carrot', 'zoo'], k=2)
+
+    self.assertEqual(batches, [['a query', 'carrot', 'zoo']])
+    self.assertCountEqual(results[0], ['apple', 'avocado'])
+    self.assertEqual(results[1][0], 'cherry')
+    self.assertLen(results[2], 2)
+    self.assertEqual(bank.retrieve_associative_batch([], k=2), [])
+
+  def test_grows_beyond_initial_capacity(self):
+    bank = basic_associative_memory.AssociativeMemoryBank(
+        sentence_embedder=lambda text: np.ones(4) * len(text)
+    )
+    texts = [f'memory {i}' for i in range(1000)]
+    bank.extend(texts)
+
+    self.assertLen(bank, 1000)
+    self.assertEqual(bank.retrieve_recent(3), texts[-3:])
+    self.assertEqual(bank.get_all_memories_as_text(), texts)
+
+  def test_duplicates_are_not_added(self):
+    bank = basic_associative_memory.AssociativeMemoryBank(
+        sentence_embedder=_one_hot_embedder
+    )
+    bank.add('apple')
+    bank.add('apple')
+
+    self.assertLen(bank, 1)
+
+  def test_duplicates_are_not_embedded(self):
+    embedded = []
+
+    def embedder(text):
+      embedded.append(text)
+      return _one_hot_embedder(text)
+
+    bank = basic_associative_memory.AssociativeMemoryBank(
+        sentence_embedder=embedder
+    )
+    bank.add('apple')
+    bank.add('apple')
+    bank.extend(['apple', 'banana', 'banana'])
+
+    self.assertEqual(embedded, ['apple', 'banana'])
+    self.assertEqual(bank.get_all_memories_as_text(), ['apple', 'banana'])
+    self.assertEqual(bank.get_stats()['num_embeddings_saved'], 3)
+
+  def test_stored_hashes_are_stable(self):
+    bank = basic_associative_memory.AssociativeMemoryBank(
+        sentence_embedder=_one_hot_embedder
+    )
+    bank.add('apple')
+
+    self.assertEqual(
+        bank.get_state()['stored_hashes'],
+        [basic_associative_memory.content_digest('apple')],
+    )
+
+  def test_extend_uses_batch_embedder(self):
+    batches = []
+
+    def batch_embedder(texts):
+      batches.append(list(texts))
+      return np.stack([_one_hot_embedder(text) for text in texts])
+
+    bank = basic_associative_memory.AssociativeMemoryBank(
+        sentence_embedder=_one_hot_embedder, batch_embedder=batch_embedder
+    )
+    bank.extend(['apple', 'banana', 'cherry'])
+
+    self.assertEqual(batches, [['apple', 'banana', 'cherry']])
+    self.assertEqual(bank.retrieve_associative('bread', k=1), ['banana'])
+
+  def test_extend_rejects_wrong_batch_size(self):
+    bank = basic_associative_memory.AssociativeMemoryBank(
+        sentence_embedder=_one_hot_embedder,
+        batch_embedder=lambda texts: np.ones((1, 26)),
+    )
+    with self.assertRaises(ValueError):
+      bank.extend(['apple', 'banana'])
+
+  def test_ann_index_matches_exact_search_when_probing_all_lists(self):
+    rng = np.random.default_rng(0)
+    embeddings = {
+        f'memory {i}': rng.standard_normal(8) for i in range(500)
+    }
+    exact = basic_associative_memory.AssociativeMemoryBank(
+        sentence_embedder=embeddings.get
+    )
+    approximate = basic_associative_memory.AssociativeMemoryBank(
+        sentence_embedder=embeddings.get,
+        ann_index=ann_index.IVFIndex(
+            num_lists=10, num_probes=10, min_train_size=100
+        ),
+    )
+    for text in embeddings:
+      exact.add(text)
+      approximate.add(text)
+
+    for query in ['memory 0', 'memory 123', 'memory 499']:
+      self.assertEqual(
+          approximate.retrieve_associative(query, k=5),
+          exact.retrieve_associative(query, k=5),
+      )
+
+  def test_ann_index_finds_exact_match(self):
+    rng = np.random.default_rng(0)
+    embeddings = {}
+    for i in range(2000):
+      embedding = rng.standard_normal(16)
+      embeddings[f'memory {i}'] = embedding / np.linalg.norm(embedding)
+    bank = basic_associative_memory.AssociativeMemoryBank(
+        sentence_embedder=embeddings.get,
+        ann_index=ann_index.IVFIndex(num_probes=1, min_train_size=100),
+    )
+    bank.extend(list(embeddings)[:1000])
+    bank.extend(list(embeddings)[1000:])
+
+    for query in ['memory 7', 'memory 1500', 'memory 1999']:
+      self.assertEqual(bank.retrieve_associative(query, k=1), [query])
+    self.assertEqual(
+        bank.retrieve_associative_batch(['memory 7', 'memory 1999'], k=1),
+        [['memory 7'], ['memory 1999']],
+    )
+
+  def test_scan(self):
+    bank = basic_associative_memory.AssociativeMemoryBank(
+        sentence_embedder=_one_hot_embedder
+    )
+    bank.extend(['apple', 'banana', 'avocado'])
+
+    self.assertEqual(
+        bank.scan(lambda text: text.startswith('a')), ['apple', 'avocado']
+    )
+
+  def test_leading_tags(self):
+    self.assertEqual(
+        basic_associative_memory.leading_tags(
+            '[observation] [scene type]no_gap [event] later'
+        ),
+        ['[observation]', '[scene type]'],
+    )
+    self.assertEqual(basic_associative_memory.leading_tags('no [tag]'), [])
+
+  def test_retrieve_by_tag_and_prefix(self):
+    texts = [
+        '[observation] [event] Alice left.',
+        '[observation] [putative_event] Bob: wave.',
+        '[observation] [event] Bob waved.',
+        '[observation] [scene type] day',
+        'Alice mentioned an [event] in passing.',
+        '[observation] [scene type] night',
+    ]
+    for index_tags in (True, False):
+      with self.subTest(index_tags=index_tags):
+        bank = basic_associative_memory.AssociativeMemoryBank(
+            sentence_embedder=lambda text: np.ones(3), index_tags=index_tags
+        )
+        bank.extend(texts[:3])
+        for text in texts[3:]:
+          bank.add(text)
+
+        self.assertEqual(
+            bank.retrieve_by_tag('[event]'), [texts[0], texts[2]]
+        )
+        self.assertEqual(bank.retrieve_by_tag('[event]', k=1), [texts[2]])
+        self.assertEqual(bank.retrieve_by_tag('[missing]'), [])
+        self.assertEqual(
+            bank.retrieve_by_prefix('[observation] [scene type]', k=1),
+            [texts[5]],
+        )
+        self.assertEqual(
+            bank.retrieve_by_prefix('[observation] [scene type] d'),
+            [texts[3]],
+        )
+        self.assertEqual(bank.retrieve_by_prefix('Alice'), [texts[4]])
+
+  def test_tag_index_is_restored_with_state(self):
+    bank = basic_associative_memory.AssociativeMemoryBank(
+        sentence_embedder=lambda text: np.ones(3)
+    )
+    bank.extend(['[event] first', '[event] second', '[other] third'])
+    restored = basic_associative_memory.AssociativeMemoryBank(
+        sentence_embedder=lambda text: np.ones(3)
+    )
+    restored.add('[event] dropped')
+
+    restored.set_state(bank.get_state())
+    restored.add('[event] fourth')
+
+    self.assertEqual(
+        restored.retrieve_by_tag('[event]'),
+        ['[event] first', '[event] second', '[event] fourth'],
+    )
+
+  def test_state_round_trip(self):
+    bank = basic_associative_memory.AssociativeMemoryBank(
+        sentence_embedder=_one_hot_embedder
+    )
+    bank.extend(['apple', 'banana', 'cherry'])
+
+    restored = basic_associative_memory.AssociativeMemoryBank(
+        sentence_embedder=_one_hot_embedder
+    )
+    restored.set_state(bank.get_state())
+
+    self.assertEqual(
+        restored.get_all_memories_as_text(), ['apple', 'banana', 'cherry']
+    )
+    self.assertEqual(restored.retrieve_associative('bread', k=1), ['banana'])
+
+  def test_segment_state_writes_only_new_memories(self):
+    directory = self.enter_context(tempfile.TemporaryDirectory())
+    bank = basic_associative_memory.AssociativeMemoryBank(
+        sentence_embedder=_one_hot_embedder
+    )
+    bank.set_checkpoint_directory(directory)
+    bank.extend(['apple', 'banana'])
+    first_state = bank.get_state()
+    bank.add('cherry')
+    second_state = bank.get_state()
+    third_state = bank.get_state()
+
+    self.assertLen(first_state['segments'], 1)
+    self.assertLen(second_state['segments'], 2)
+    self.assertEqual(second_state, third_state)
+    self.assertEqual(
+        second_state['segments'][0], first_state['segments'][0]
+    )
+    self.assertLen(os.listdir(directory), 4)
+
+    restored = basic_associative_memory.AssociativeMemoryBank(
+        sentence_embedder=_one_hot_embedder
+    )
+    restored.set_state(first_state)
+    self.assertEqual(
+        restored.get_all_memories_as_text(), ['apple', 'banana']
+    )
+    restored.set_state(second_state)
+    self.assertEqual(
+        restored.get_all_memories_as_text(), ['apple', 'banana', 'cherry']
+    )
+    self.assertEqual(restored.retrieve_associative('crab', k=1), ['cherry'])
+    restored.add('date')
+    self.assertLen(restored.get_state()['segments'], 3)
+
+  def test_quantized_storage_matches_float32_retrieval(self):
+    rng = np.random.default_rng(0)
+    embeddings = {f'memory {i}': rng.standard_normal(32) for i in range(300)}
+    reference = basic_associative_memory.AssociativeMemoryBank(
+        sentence_embedder=embeddings.get
+    )
+    reference.extend(list(embeddings))
+    for dtype, bytes_per_memory in (('float16', 64), ('int8', 36)):
+      with self.subTest(dtype=dtype):
+        bank = basic_associative_memory.AssociativeMemoryBank(
+            sentence_embedder=embeddings.get, embedding_dtype=dtype
+        )
+        bank.extend(list(embeddings))
+
+        for query in ['memory 0', 'memory 150', 'memory 299']:
+          self.assertEqual(bank.retrieve_associative(query, k=1), [query])
+          self.assertEqual(
+              bank.retrieve_associative_batch([query], k=1), [[query]]
+          )
+        self.assertEqual(
+            bank.get_stats()['embedding_bytes'], 300 * bytes_per_memory
+        )
+        np.testing.assert_allclose(
+            np.stack(bank.get_data_frame()['embedding']),
+            np.stack(reference.get_data_frame()['embedding']),
+            atol=0.05,
+        )
+
+  def test_quantized_segment_state_round_trip(self):
+    directory = self.enter_context(tempfile.TemporaryDirectory())
+    bank = basic_associative_memory.AssociativeMemoryBank(
+        sentence_embedder=_one_hot_embedder, embedding_dtype='int8'
+    )
+    bank.set_checkpoint_directory(directory)
+    bank.extend(['apple', 'banana', 'cherry'])
+    state = bank.get_state()
+
+    restored = basic_associative_memory.AssociativeMemoryBank(
+        sentence_embedder=_one_hot_embedder, embedding_dtype='int8'
+    )
+    restored.set_state(state)
+
+    self.assertEqual(state['embedding_dtype'], 'int8')
+    self.assertLen(os.listdir(directory), 3)
+    np.testing.assert_array_equal(
+        np.stack(restored.get_data_frame()['embedding']),
+        np.stack(bank.get_data_frame()['embedding']),
+    )
+    self.assertEqual(restored.retrieve_associative('bread', k=1), ['banana'])
+
+  def test_segment_state_keeps_carriage_returns(self):
+    directory = self.enter_context(tempfile.TemporaryDirectory())
+    bank = basic_associative_memory.AssociativeMemoryBank(
+        sentence_embedder=_one_hot_embedder
+    )
+    bank.set_checkpoint_directory(directory)
+    bank.extend(['apple\rpie', 'banana\r\nsplit', 'cherry'])
+
+    restored = basic_associative_memory.AssociativeMemoryBank(
+        sentence_embedder=_one_hot_embedder
+    )
+    restored.set_state(bank.get_state())
+
+    self.assertEqual(
+        restored.get_all_memories_as_text(),
+        ['apple\rpie', 'banana\r split', 'cherry'],
+    )
+    self.assertEqual(restored.retrieve_associative('crab', k=1), ['cherry'])
+
+  def test_rejects_unknown_embedding_dtype(self):
+    with self.assertRaises(ValueError):
+      basic_associative_memory.AssociativeMemoryBank(embedding_dtype='int4')
+
+  def test_extend_async_shows_pending_texts(self):
+    release = threading.Event()
+
+    def batch_embedder(texts):
+      release.wait()
+      return np.ones((len(texts), 3))
+
+    bank = basic_associative_memory.AssociativeMemoryBank(
+        sentence_embedder=lambda text: np.ones(3),
+        batch_embedder=batch_embedder,
+    )
+    release.set()
+    bank.extend(['[event] stored'])
+    release.clear()
+    future = bank.extend_async(['[event] pending', 'other', '[event] stored'])
+
+    self.assertEqual(bank.get_stats()['num_pending'], 2)
+    self.assertLen(bank, 3)
+    self.assertEqual(bank.retrieve_recent(2), ['[event] pending', 'other'])
+    self.assertEqual(
+        bank.retrieve_by_tag('[event]'), ['[event] stored', '[event] pending']
+    )
+    self.assertEqual(bank.retrieve_by_prefix('[event] p'), ['[event] pending'])
+    self.assertEqual(bank.scan(lambda text: text == 'other'), ['other'])
+
+    release.set()
+    self.assertCountEqual(
+        bank.retrieve_associative('query', k=3),
+        ['[event] stored', '[event] pending', 'other'],
+    )
+    self.assertTrue(future.done())
+    self.assertEqual(bank.get_stats()['num_pending'], 0)
+    self.assertEqual(
+        bank.get_all_memories_as_text(),
+        ['[event] stored', '[event] pending', 'other'],
+    )
+
+  def test_add_skips_text_made_pending_while_embedding(self):
+    add_started = threading.Event()
+    release_add = threading.Event()
+    release_batch = threading.Event()
+
+    def sentence_embedder(text):
+      add_started.set()
+      release_add.wait(timeout=10)
+      return np.ones(3)
+
+    def batch_embedder(texts):
+      release_batch.wait(timeout=10)
+      return np.ones((len(texts), 3))
+
+    bank = basic_associative_memory.AssociativeMemoryBank(
+        sentence_embedder=sentence_embedder, batch_embedder=batch_embedder
+    )
+    thread = threading.Thread(target=bank.add, args=('apple',))
+    thread.start()
+    add_started.wait(timeout=10)
+    bank.extend_async(['apple'])
+    release_add.set()
+    thread.join()
+
+    self.assertEqual(bank.get_all_memories_as_text(), ['apple'])
+    release_batch.set()
+    bank.wait_for_pending()
+    self.assertEqual(bank.get_all_memories_as_text(), ['apple'])
+
+  def test_extend_async_reports_embedder_errors(self):
+    def batch_embedder(texts):
+      raise RuntimeError(f'Cannot embed {len(texts)} texts.')
+
+    bank = basic_associative_memory.AssociativeMemoryBank(
+        sentence_embedder=lambda text: np.ones(3),
+        batch_embedder=batch_embedder,
+    )
+    future = bank.extend_async(['apple'])
+
+    bank.wait_for_pending()
+    with self.assertRaises(RuntimeError):
+      future.result()
+    self.assertEmpty(bank.get_all_memories_as_text())
+    self.assertEqual(bank.get_stats()['num_failed'], 1)
+
+  def test_extend_async_embeds_failed_texts_with_the_next_batch(self):
+    fail = True
+
+    def batch_embedder(texts):
+      if fail:
+        raise RuntimeError(f'Cannot embed {len(texts)} texts.')
+      return np.ones((len(texts), 3))
+
+    bank = basic_associative_memory.AssociativeMemoryBank(
+        sentence_embedder=lambda text: np.ones(3),
+        batch_embedder=batch_embedder,
+    )
+    failed = bank.extend_async(['apple', 'banana'])
+    with self.assertRaises(RuntimeError):
+      failed.result(timeout=10)
+    fail = False
+    bank.extend_async(['banana', 'cherry']).result(timeout=10)
+
+    self.assertEqual(
+        bank.get_all_memories_as_text(), ['apple', 'banana', 'cherry']
+    )
+    self.assertEqual(bank.get_stats()['num_failed'], 0)
+
+  def test_extend_async_publishes_pending_texts_when_storing_fails(self):
+    bank = basic_associative_memory.AssociativeMemoryBank(
+        sentence_embedder=lambda text: np.ones(3),
+        batch_embedder=lambda texts: np.ones((len(texts), 4)),
+    )
+    bank.add('apple')
+    future = bank.extend_async(['banana'])
+
+    with self.assertRaises(ValueError):
+      future.result(timeout=10)
+    self.assertEqual(bank.get_all_memories_as_text(), ['apple'])
+    self.assertEqual(bank.get_stats()['num_pending'], 0)
+
+  def test_reads_are_consistent_during_concurrent_writes(self):
+    rng = np.random.default_rng(0)
+    embeddings = {
+        f'[tag{i % 3}] memory {i}': rng.standard_normal(8) for i in range(600)
+    }
+    bank = basic_associative_memory.AssociativeMemoryBank(
+        sentence_embedder=embeddings.get,
+        ann_index=ann_index.IVFIndex(num_probes=2, min_train_size=100),
+    )
+    texts = list(embeddings)
+    done = threading.Event()
+    errors = []
+
+    def read():
+      try:
+        while not done.is_set():
+          size = len(bank)
+          recent = bank.retrieve_recent(5)
+          if recent:
+            start = texts.index(recent[0])
+            self.assertEqual(recent, texts[start:start + len(recent)])
+          tagged = bank.retrieve_by_tag('[tag0]')
+          self.assertEqual(tagged, texts[0:3 * len(tagged):3])
+          self.assertGreaterEqual(len(bank), size)
+          retrieved = bank.retrieve_associative(texts[0], k=3)
+          self.assertLen(set(retrieved), len(retrieved))
+      except Exception as e:  # pylint: disable=broad-exception-caught
+        errors.append(e)
+
+    readers = [threading.Thread(target=read) for _ in range(4)]
+    for reader in readers:
+      reader.start()
+    for start in range(0, len(texts), 20):
+      bank.extend(texts[start:start + 20])
+    done.set()
+    for reader in readers:
+      reader.join()
+
+    self.assertEmpty(errors)
+    self.assertEqual(bank.get_all_memories_as_text(), texts)
+
+  def test_get_data_frame(self):
+    bank = basic_associative_memory.AssociativeMemoryBank(
+        sentence_embedder=_one_hot_embedder
+    )
+    bank.extend(['apple', 'banana'])
+
+    data = bank.get_data_frame()
+
+    self.assertEqual(data['text'].tolist(), ['apple', 'banana'])
+    np.testing.assert_array_equal(data['embedding'][1], _one_hot_embedder('b'))
+
+  def test_lexical_retrieval(self):
+    bank = basic_associative_memory.AssociativeMemoryBank(
+        sentence_embedder=_one_hot_embedder,
+        lexical_index=lexical_index.BM25Index(),
+    )
+    bank.extend([
+        'Alice met Bob at the market.',
+        'Bob went fishing.',
+        'Carol baked bread.',
+        'Dave and Erin danced.',
+    ])
+
+    self.assertEqual(
+        bank.retrieve_associative('where is Carol', k=2, mode='lexical'),
+        ['Carol baked bread.'],
+    )
+    self.assertEqual(
+        bank.retrieve_associative('Alice and Bob', k=1, mode='lexical'),
+        ['Alice met Bob at the market.'],
+    )
+
+  def test_hybrid_retrieval_rescores_lexical_candidates(self):
+    bank = basic_associative_memory.AssociativeMemoryBank(
+        sentence_embedder=_one_hot_embedder,
+        lexical_index=lexical_index.BM25Index(num_candidates=2),
+    )
+    bank.extend([f'{chr(ord("a") + i % 26)} memory {i}' for i in range(100)])
+    bank.extend(['zebra seen by Mallory', 'mallory lost a key'])
+
+    # Only the memories naming Mallory are candidates, ranked by embedding.
+    self.assertEqual(
+        bank.retrieve_associative('More about Mallory', k=2, mode='hybrid'),
+        ['mallory lost a key', 'zebra seen by Mallory'],
+    )
+    # Too few candidates are completed with the densely closest memories.
+    self.assertCountEqual(
+        bank.retrieve_associative('zoo Mallory', k=5, mode='hybrid'),
+        bank.retrieve_associative('zoo Mallory', k=5),
+    )
+
+  def test_lexical_index_is_restored_with_state(self):
+    bank = basic_associative_memory.AssociativeMemoryBank(
+        sentence_embedder=_one_hot_embedder
+    )
+    bank.extend(['apple pie', 'banana bread'])
+    restored = basic_associative_memory.AssociativeMemoryBank(
+        sentence_embedder=_one_hot_embedder,
+        lexical_index=lexical_index.BM25Index(),
+    )
+    restored.add('cherry bread')
+
+    restored.set_state(bank.get_state())
+
+    self.assertEqual(
+        restored.retrieve_associative('bread', k=2, mode='lexical'),
+        ['banana bread'],
+    )
+
+  def test_lexical_modes_need_lexical_index(self):
+    bank = basic_associative_memory.AssociativeMemoryBank(
+        sentence_embedder=_one_hot_embedder
+    )
+    with self.assertRaises(ValueError):
+      bank.retrieve_associative('apple', mode='hybrid')
+    with self.assertRaises(ValueError):
+      bank.retrieve_associative('apple', mode='sparse')
+
+  def test_state_records_embedder_id(self):
+    bank = basic_associative_memory.AssociativeMemoryBank(
+        sentence_embedder=_one_hot_embedder, embedder_id='one-hot'
+    )
+    bank.add('apple')
+    state = bank.get_state()
+    self.assertEqual(state['embedder_id'], 'one-hot')
+
+    other = basic_associative_memory.AssociativeMemoryBank(
+        sentence_embedder=_one_hot_embedder, embedder_id='other'
+    )
+    with self.assertRaises(ValueError):
+      other.set_state(state)
+    with self.assertRaises(ValueError):
+      bank.set_embedder(_one_hot_embedder, embedder_id='other')
+
+    unnamed = basic_associative_memory.AssociativeMemoryBank(
+        sentence_embedder=_one_hot_embedder
+    )
+    unnamed.set_state(state)
+    self.assertEqual(unnamed.embedder_id, 'one-hot')
+
+  def test_reembed_switches_embedder(self):
+    bank = basic_associative_memory.AssociativeMemoryBank(
+        sentence_embedder=_one_hot_embedder,
+        embedder_id='one-hot',
+        index_tags=True,
+    )
+    bank.extend(['apple', '[tag] banana', 'cherry'])
+    progress = []
+
+    # Embeds each text as the one-hot vector of its last character.
+    bank.reembed(
+        lambda text: _one_hot_embedder(text[::-1]),
+        embedder_id='reversed',
+        batch_size=2,
+        num_threads=2,
+        progress_callback=lambda done, total: progress.append((done, total)),
+    )
+    bank.add('date')
+
+    self.assertEqual(bank.embedder_id, 'reversed')
+    self.assertEqual(progress[-1], (3, 3))
+    self.assertEqual(bank.retrieve_associative('ay', k=1), ['cherry'])
+    self.assertEqual(bank.retrieve_by_tag('[tag]'), ['[tag] banana'])
+    self.assertEqual(
+        bank.get_all_memories_as_text(),
+        ['apple', '[tag] banana', 'cherry', 'date'],
+    )
+
+  def test_reembed_does_not_block_writers(self):
+    bank = basic_associative_memory.AssociativeMemoryBank(
+        sentence_embedder=_one_hot_embedder
+    )
+    bank.extend(['apple', 'banana'])
+    started = threading.Event()
+    release = threading.Event()
+
+    def reversed_embedder(text):
+      started.set()
+      release.wait(timeout=10)
+      return _one_hot_embedder(text[::-1])
+
+    thread = threading.Thread(target=bank.reembed, args=(reversed_embedder,))
+    thread.start()
+    started.wait()
+    start = time.monotonic()
+    bank.add('cherry')
+    self.assertLess(time.monotonic() - start, 5.0)
+    self.assertEqual(bank.retrieve_associative('crab', k=1), ['cherry'])
+    release.set()
+    thread.join()
+
+    # The memory added during the migration is embedded again.
+    self.assertEqual(bank.retrieve_associative('ay', k=1), ['cherry'])
+    self.assertEqual(
+        bank.get_all_memories_as_text(), ['apple', 'banana', 'cherry']
+    )
+
+
+if __name__ == '__main__':
+  absltest.main()
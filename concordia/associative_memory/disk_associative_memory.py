@@ -0,0 +1,504 @@
+"""An associative memory bank stored in append-only files on disk."""
+
+from collections.abc import Callable, Iterable, Sequence
+import glob
+import json
+import os
+from typing import Any
+import uuid
+import weakref
+
+from concordia.associative_memory import ann_index as ann_index_lib
+from concordia.associative_memory import basic_associative_memory
+from concordia.associative_memory import lexical_index as lexical_index_lib
+from concordia.type_checks import entity_component
+import numpy as np
+
+
+_EMBEDDINGS_FILE = 'embeddings.f32'
+_TEXTS_FILE = 'texts.log'
+_OFFSETS_FILE = 'offsets.i64'
+_METADATA_FILE = 'metadata.json'
+
+_FLOAT32_BYTES = 4
+_INT64_BYTES = 8
+
+
+def _remove_files(paths: Sequence[str]) -> None:
+  for path in paths:
+    try:
+      os.remove(path)
+    except OSError:
+      pass
+
+
+class _Generation:
+  """The embeddings, texts and offsets files of a bank.
+
+  A bank appends memories to the files of its current generation. To drop or
+  replace memories, it writes the memories it keeps to the files of a new
+  generation and switches to them, instead of changing files that readers of
+  earlier views may still use. The files of a retired generation are removed
+  once neither the bank nor any view uses them.
+
+  The first generation of a bank uses the file names without a suffix, which
+  are those of banks written before generations existed.
+  """
+
+  def __init__(self, directory: str, name: str = ''):
+    self.name = name
+    self._directory = directory
+
+  def path(self, file_name: str) -> str:
+    """Returns the path of one of the files of the generation."""
+    if self.name:
+      stem, extension = os.path.splitext(file_name)
+      file_name = f'{stem}.{self.name}{extension}'
+    return os.path.join(self._directory, file_name)
+
+  def paths(self) -> list[str]:
+    return [
+        self.path(file_name)
+        for file_name in (_EMBEDDINGS_FILE, _TEXTS_FILE, _OFFSETS_FILE)
+    ]
+
+  def retire(self) -> None:
+    """Removes the files once this object is no longer used."""
+    weakref.finalize(self, _remove_files, self.paths())
+
+
+class DiskStorageView(basic_associative_memory.StorageView):
+  """A read-only view of the first `size` memories of a disk bank."""
+
+  def __init__(
+      self,
+      generation: _Generation,
+      offsets: np.ndarray,
+      embeddings: np.ndarray | None,
+      size: int,
+      dim: int | None,
+      block_size: int,
+  ):
+    """Initializes the view.
+
+    Args:
+      generation: the files of the memories, kept while the view is used.
+      offsets: end offsets of the texts, at least `size` of them.
+      embeddings: memory-mapped embeddings, or None if the bank is empty.
+      size: the number of memories in the view.
+      dim: the embedding dimension, or None if the bank is empty.
+      block_size: number of rows scored at a time during retrieval.
+    """
+    super().__init__(texts=(), embeddings=embeddings, size=size)
+    self._generation = generation
+    self._texts_path = generation.path(_TEXTS_FILE)
+    self._offsets = offsets
+    self._dim = dim
+    self._block_size = block_size
+
+  def read_texts(self, start: int, stop: int) -> list[str]:
+    stop = min(stop, self.size)
+    if start >= stop:
+      return []
+    begin = int(self._offsets[start - 1]) if start else 0
+    ends = self._offsets[start:stop] - begin
+    with open(self._texts_path, 'rb') as f:
+      f.seek(begin)
+      data = f.read(int(ends[-1]))
+    starts = np.concatenate([[0], ends[:-1]])
+    return [
+        data[s:e].decode('utf-8') for s, e in zip(starts.tolist(), ends.tolist())
+    ]
+
+  def texts_at(self, rows: Iterable[int]) -> list[str]:
+    texts = []
+    with open(self._texts_path, 'rb') as f:
+      for row in rows:
+        begin = int(self._offsets[row - 1]) if row else 0
+        f.seek(begin)
+        texts.append(f.read(int(self._offsets[row]) - begin).decode('utf-8'))
+    return texts
+
+  def embedding_matrix(self) -> np.ndarray:
+    if self._embeddings is None:
+      return np.empty((0, self._dim or 0), dtype=np.float32)
+    return self._embeddings[:self.size]
+
+  def exact_top_k(self, x: np.ndarray, k: int) -> np.ndarray:
+    return self.exact_top_k_batch(x.reshape(1, -1), k)[0]
+
+  def exact_top_k_batch(self, queries: np.ndarray, k: int) -> np.ndarray:
+    return self.scored_top_k_batch(queries, k)[0]
+
+  def scored_top_k_batch(
+      self, queries: np.ndarray, k: int
+  ) -> tuple[np.ndarray, np.ndarray]:
+    """Scans the embeddings block by block, keeping the running top k.
+
+    Args:
+      queries: the query embeddings, one per row.
+      k: the number of rows to return per query.
+
+    Returns:
+      The top k rows of each query, and their inner products with the query.
+    """
+    num_queries = queries.shape[0]
+    best_rows = np.empty((num_queries, 0), dtype=np.int64)
+    best_scores = np.empty((num_queries, 0), dtype=np.float32)
+    for start in range(0, self.size, self._block_size):
+      stop = min(start + self._block_size, self.size)
+      scores = queries @ self._embeddings[start:stop].T
+      block_top_k = ann_index_lib.top_k_per_row(scores, k)
+      rows = np.concatenate([best_rows, block_top_k + start], axis=1)
+      candidate_scores = np.concatenate(
+          [best_scores, np.take_along_axis(scores, block_top_k, axis=1)],
+          axis=1,
+      )
+      keep = ann_index_lib.top_k_per_row(candidate_scores, k)
+      best_rows = np.take_along_axis(rows, keep, axis=1)
+      best_scores = np.take_along_axis(candidate_scores, keep, axis=1)
+    return best_rows, best_scores
+
+
+class DiskAssociativeMemoryBank(basic_associative_memory.AssociativeMemoryBank):
+  """An associative memory bank that keeps its memories on disk.
+
+  Embeddings are stored in an append-only float32 file accessed through
+  `np.memmap`, which grows `chunk_size` rows at a time. Texts are appended to a
+  log file, and the end offset of each text to an offset index file. Only the
+  offset index is held in memory; associative retrieval scans the embeddings
+  in blocks of `block_size` rows.
+
+  Offsets are written when the bank is flushed, after the embeddings and
+  texts they refer to. A row only counts as stored once its offset is written,
+  so a bank opened on the files of an interrupted run ignores any partially
+  written memory. The directory of an existing bank can be reopened to
+  continue it, and the state of the bank refers to its files instead of
+  containing the memories.
+
+  Files are only ever appended to. When memories are dropped, e.g. by
+  restoring an earlier state, or replaced, e.g. by `reembed`, the memories
+  kept are written to new files and the bank switches to them, so that
+  readers of earlier views are not affected.
+  """
+
+  def __init__(
+      self,
+      directory: str,
+      sentence_embedder: Callable[[str], np.ndarray] | None = None,
+      batch_embedder: basic_associative_memory.BatchEmbedder | None = None,
+      ann_index: ann_index_lib.IVFIndex | None = None,
+      index_tags: bool = True,
+      *,
+      chunk_size: int = 4096,
+      block_size: int = 65536,
+      lexical_index: lexical_index_lib.BM25Index | None = None,
+  ):
+    """Constructor.
+
+    Args:
+      directory: directory holding the files of the bank. Memories already
+        stored there are loaded.
+      sentence_embedder: text embedding model, see `AssociativeMemoryBank`.
+      batch_embedder: optional embedder of many texts at once.
+      ann_index: optional approximate nearest neighbour index.
+      index_tags: whether to index the leading tags of memories.
+      chunk_size: number of rows by which the embeddings file grows.
+      block_size: number of rows scored at a time during retrieval.
+      lexical_index: optional inverted index of the words of the memories.
+    """
+    if chunk_size <= 0 or block_size <= 0:
+      raise ValueError('chunk_size and block_size must be positive.')
+    self._directory = directory
+    self._chunk_size = chunk_size
+    self._block_size = block_size
+    super().__init__(
+        sentence_embedder=sentence_embedder,
+        batch_embedder=batch_embedder,
+        ann_index=ann_index,
+        index_tags=index_tags,
+        lexical_index=lexical_index,
+    )
+
+  @property
+  def directory(self) -> str:
+    return self._directory
+
+  def _init_storage(self) -> None:
+    """Opens the files in the directory, creating them if needed."""
+    os.makedirs(self._directory, exist_ok=True)
+    metadata = {}
+    metadata_path = os.path.join(self._directory, _METADATA_FILE)
+    if os.path.exists(metadata_path):
+      with open(metadata_path, 'r') as f:
+        metadata = json.load(f)
+    self._dim = metadata.get('dim')
+    self._generation = _Generation(
+        self._directory, metadata.get('generation', '')
+    )
+    self._remove_other_generations()
+    self._open_generation()
+    self._stored_hashes.update(
+        basic_associative_memory.content_digest(text)
+        for text in self._disk_view().read_texts(0, self._size)
+    )
+
+  def _remove_other_generations(self) -> None:
+    """Removes the files of generations left by an interrupted run."""
+    current = set(self._generation.paths())
+    stale = []
+    if self._generation.name:
+      stale.extend(_Generation(self._directory).paths())
+    for file_name in (_EMBEDDINGS_FILE, _TEXTS_FILE, _OFFSETS_FILE):
+      stale.extend(glob.glob(
+          _Generation(self._directory, '*').path(file_name)
+      ))
+    _remove_files([path for path in stale if path not in current])
+
+  def _open_generation(self) -> None:
+    """Opens the files of the current generation, creating them if needed."""
+    path = self._generation.path
+    for name in (_EMBEDDINGS_FILE, _TEXTS_FILE, _OFFSETS_FILE):
+      if not os.path.exists(path(name)):
+        open(path(name), 'wb').close()
+
+    offsets = np.fromfile(path(_OFFSETS_FILE), dtype=np.int64)
+    # Discard rows whose text or embedding was not completely written.
+    offsets = offsets[offsets <= os.path.getsize(path(_TEXTS_FILE))]
+    capacity = 0
+    if self._dim is not None:
+      capacity = os.path.getsize(path(_EMBEDDINGS_FILE)) // (
+          _FLOAT32_BYTES * self._dim
+      )
+    size = min(offsets.shape[0], capacity)
+    self._offsets = np.zeros(max(size, self._chunk_size), dtype=np.int64)
+    self._offsets[:size] = offsets[:size]
+    self._size = size
+    # No reader uses the files yet, so partial rows can be cut off in place.
+    text_bytes = int(self._offsets[size - 1]) if size else 0
+    os.truncate(path(_TEXTS_FILE), text_bytes)
+    os.truncate(path(_OFFSETS_FILE), size * _INT64_BYTES)
+
+    self._capacity = capacity
+    self._embeddings = None
+    self._map_embeddings()
+    self._texts_file = open(path(_TEXTS_FILE), 'ab')
+    self._offsets_file = open(path(_OFFSETS_FILE), 'ab')
+    # Rows whose offsets are written to the offsets file.
+    self._num_flushed = size
+
+  def _close_files(self) -> None:
+    """Flushes and closes the files of the current generation."""
+    self._flush()
+    self._texts_file.close()
+    self._offsets_file.close()
+    self._embeddings = None
+
+  def _write_metadata(self) -> None:
+    """Records the embedding dimension and the current generation."""
+    path = os.path.join(self._directory, _METADATA_FILE)
+    with open(f'{path}.tmp', 'w') as f:
+      json.dump({'dim': self._dim, 'generation': self._generation.name}, f)
+    # The replacement is atomic: it switches the bank to the generation.
+    os.replace(f'{path}.tmp', path)
+
+  def _map_embeddings(self) -> None:
+    """Memory-maps the embeddings file at its current capacity."""
+    self._embeddings = None
+    if self._capacity:
+      self._embeddings = np.memmap(
+          self._generation.path(_EMBEDDINGS_FILE),
+          dtype=np.float32,
+          mode='r+',
+          shape=(self._capacity, self._dim),
+      )
+
+  def _build_storage(
+      self, texts: Sequence[str], embeddings: np.ndarray | None
+  ) -> Any:
+    """Writes the memories to the files of a new generation."""
+    generation = _Generation(self._directory, uuid.uuid4().hex[:8])
+    data = [text.encode('utf-8') for text in texts]
+    dim = None
+    with open(generation.path(_EMBEDDINGS_FILE), 'wb') as f:
+      if data:
+        embeddings = np.asarray(embeddings, dtype=np.float32)
+        dim = embeddings.shape[1]
+        embeddings.tofile(f)
+    with open(generation.path(_TEXTS_FILE), 'wb') as f:
+      f.write(b''.join(data))
+    with open(generation.path(_OFFSETS_FILE), 'wb') as f:
+      np.cumsum([len(text) for text in data], dtype=np.int64).tofile(f)
+    return generation, dim
+
+  def _swap_storage(self, storage: Any) -> None:
+    """Switches the bank to the files of a new generation."""
+    generation, dim = storage
+    self._close_files()
+    previous = self._generation
+    self._generation = generation
+    self._dim = dim
+    self._write_metadata()
+    self._open_generation()
+    previous.retire()
+
+  def _discard_storage(self, storage: Any) -> None:
+    generation, _ = storage
+    generation.retire()
+
+  def _reset_storage(self) -> None:
+    """Switches the bank to new, empty files."""
+    self._swap_storage(self._build_storage([], None))
+
+  def _num_stored(self) -> int:
+    return self._size
+
+  def _make_view(self) -> basic_associative_memory.StorageView:
+    # Readers open the text log themselves, so it must be written through.
+    self._texts_file.flush()
+    return self._disk_view()
+
+  def _disk_view(self) -> DiskStorageView:
+    """Returns a view of the rows stored in the files."""
+    return DiskStorageView(
+        generation=self._generation,
+        offsets=self._offsets,
+        embeddings=self._embeddings,
+        size=self._size,
+        dim=self._dim,
+        block_size=self._block_size,
+    )
+
+  def _append(self, text: str, embedding: np.ndarray) -> None:
+    """Appends a row to the files. Assumes the lock is held.
+
+    Args:
+      text: the text of the memory.
+      embedding: the embedding of the text.
+
+    Raises:
+      ValueError: if the embedding dimension differs from the stored ones.
+    """
+    embedding = np.asarray(embedding, dtype=np.float32).reshape(-1)
+    if self._dim is None:
+      self._dim = embedding.shape[0]
+      self._write_metadata()
+    elif embedding.shape[0] != self._dim:
+      raise ValueError(
+          f'Embedding dimension {embedding.shape[0]} does not match the '
+          f'dimension of the memory bank {self._dim}.'
+      )
+
+    if self._size == self._capacity:
+      self._capacity += self._chunk_size
+      os.truncate(
+          self._generation.path(_EMBEDDINGS_FILE),
+          self._capacity * self._dim * _FLOAT32_BYTES,
+      )
+      self._map_embeddings()
+    if self._size == self._offsets.shape[0]:
+      grown = np.zeros(2 * self._offsets.shape[0], dtype=np.int64)
+      grown[:self._size] = self._offsets[:self._size]
+      self._offsets = grown
+
+    # The offset is only written by `_flush`: it marks the row as stored.
+    self._embeddings[self._size] = embedding
+    data = text.encode('utf-8')
+    self._texts_file.write(data)
+    end = (int(self._offsets[self._size - 1]) if self._size else 0) + len(data)
+    self._offsets[self._size] = end
+    self._size += 1
+
+  def _append_many(self, texts: Sequence[str], embeddings: np.ndarray) -> None:
+    for text, embedding in zip(texts, embeddings):
+      self._append(text, embedding)
+
+  def _flush(self) -> None:
+    """Writes buffered rows to the files. Assumes the lock is held.
+
+    The embeddings and texts are written before the offsets that mark their
+    rows as stored, so that a crash never leaves an offset without its row.
+    """
+    if self._num_flushed == self._size:
+      return
+    if self._embeddings is not None:
+      self._embeddings.flush()
+    self._texts_file.flush()
+    self._offsets_file.write(
+        self._offsets[self._num_flushed:self._size].tobytes()
+    )
+    self._offsets_file.flush()
+    self._num_flushed = self._size
+
+  def flush(self) -> None:
+    """Writes all buffered memories to disk."""
+    with self._memory_bank_lock:
+      self._flush()
+
+  def close(self) -> None:
+    """Flushes and closes the files of the bank."""
+    with self._memory_bank_lock:
+      self._close_files()
+
+  def get_state(self) -> entity_component.ComponentState:
+    """Returns a reference to the files of the bank.
+
+    The memories themselves are not serialized: the state records the
+    directory and the number of stored memories, which is enough to restore
+    the bank since its files are append-only.
+    """
+    self.wait_for_pending()
+    with self._memory_bank_lock:
+      self._flush()
+      return {
+          'directory': self._directory,
+          'num_memories': self._size,
+          'embedder_id': self._embedder_id,
+      }
+
+  def set_state(self, state: entity_component.ComponentState) -> None:
+    """Restores the bank from a state returned by `get_state`.
+
+    Memories added after the state was taken are dropped from the bank: the
+    memories of the state are copied to new files and the bank switches to
+    them, so that the files of the memories dropped stay readable for views
+    taken before, until they are no longer used and removed. States of an
+    in-memory `AssociativeMemoryBank` are also accepted, in which case their
+    memories are written to new files of this bank.
+
+    Args:
+      state: the state to restore.
+    """
+    if 'memory_bank' in state or (
+        state.get('format') == basic_associative_memory.SEGMENTS_STATE_FORMAT
+    ):
+      super().set_state(state)
+      return
+    self._check_embedder_id(state)
+    self.wait_for_pending()
+    with self._memory_bank_lock:
+      self._embedder_id = self._embedder_id or state.get('embedder_id')
+      if state['directory'] != self._directory:
+        self._close_files()
+        self._directory = state['directory']
+        self._stored_hashes = set()
+        self._reset_indexes()
+        self._init_storage()
+        self._commit()
+      num_memories = state['num_memories']
+      if num_memories > self._size:
+        raise ValueError(
+            f'The files in {self._directory} hold {self._size} memories, but '
+            f'the state refers to {num_memories}.'
+        )
+      if num_memories < self._size:
+        self._swap_storage(self._build_storage(
+            self._disk_view().read_texts(0, num_memories),
+            np.array(self._embeddings[:num_memories]),
+        ))
+        self._reset_indexes()
+        self._commit()
+        self._stored_hashes = set(
+            basic_associative_memory.content_digest(text)
+            for text in self._snapshot.view.read_texts(0, self._size)
+        )
@@ -0,0 +1,181 @@
+"""Tests for the disk-backed associative memory bank."""
+
+import gc
+import os
+import tempfile
+from unittest import mock
+
+from absl.testing import absltest
+from concordia.associative_memory import basic_associative_memory
+from concordia.associative_memory import disk_associative_memory
+import numpy as np
+
+
+def _one_hot_embedder(text: str) -> np.ndarray:
+  """Embeds a text as a one-hot vector of its first character."""
+  embedding = np.zeros(26)
+  embedding[ord(text[0].lower()) - ord('a')] = 1.0
+  return embedding
+
+
+class DiskAssociativeMemoryBankTest(absltest.TestCase):
+
+  def setUp(self):
+    super().setUp()
+    self._directory = self.enter_context(tempfile.TemporaryDirectory())
+
+  def _make_bank(self, **kwargs):
+    return disk_associative_memory.DiskAssociativeMemoryBank(
+        self._directory, sentence_embedder=_one_hot_embedder, **kwargs
+    )
+
+  def test_matches_in_memory_bank(self):
+    texts = [f'{chr(ord("a") + i % 26)} memory {i}' for i in range(300)]
+    bank = self._make_bank(chunk_size=16, block_size=7)
+    reference = basic_associative_memory.AssociativeMemoryBank(
+        sentence_embedder=_one_hot_embedder
+    )
+    bank.extend(texts[:100])
+    for text in texts[100:]:
+      bank.add(text)
+    reference.extend(texts)
+
+    self.assertLen(bank, 300)
+    self.assertEqual(bank.retrieve_recent(5), reference.retrieve_recent(5))
+    self.assertEqual(
+        bank.get_all_memories_as_text(), reference.get_all_memories_as_text()
+    )
+    self.assertCountEqual(
+        bank.retrieve_associative('query', k=11),
+        reference.retrieve_associative('query', k=11),
+    )
+    for result, expected in zip(
+        bank.retrieve_associative_batch(['query', 'bread'], k=11),
+        reference.retrieve_associative_batch(['query', 'bread'], k=11),
+    ):
+      self.assertCountEqual(result, expected)
+    self.assertEqual(
+        bank.scan(lambda text: text.endswith('7')),
+        reference.scan(lambda text: text.endswith('7')),
+    )
+
+  def test_reopen_directory(self):
+    bank = self._make_bank()
+    bank.extend(['apple', 'banana', 'cherry'])
+    bank.close()
+
+    reopened = self._make_bank()
+    reopened.add('banana')
+    reopened.add('date')
+
+    self.assertEqual(
+        reopened.get_all_memories_as_text(),
+        ['apple', 'banana', 'cherry', 'date'],
+    )
+    self.assertEqual(reopened.retrieve_associative('bread', k=1), ['banana'])
+
+  def test_tag_index_is_rebuilt_on_reopen(self):
+    bank = disk_associative_memory.DiskAssociativeMemoryBank(
+        self._directory, sentence_embedder=lambda text: np.ones(3)
+    )
+    bank.extend(['[event] first', '[other] second'])
+    bank.close()
+
+    reopened = disk_associative_memory.DiskAssociativeMemoryBank(
+        self._directory, sentence_embedder=lambda text: np.ones(3)
+    )
+    reopened.add('[event] third')
+
+    self.assertEqual(
+        reopened.retrieve_by_tag('[event]'), ['[event] first', '[event] third']
+    )
+    self.assertEqual(
+        reopened.retrieve_by_prefix('[other] s'), ['[other] second']
+    )
+
+  def test_state_references_files(self):
+    bank = self._make_bank()
+    bank.extend(['apple', 'banana'])
+    state = bank.get_state()
+    bank.add('cherry')
+
+    self.assertEqual(
+        state,
+        {'directory': self._directory, 'num_memories': 2, 'embedder_id': None},
+    )
+    bank.set_state(state)
+    self.assertEqual(bank.get_all_memories_as_text(), ['apple', 'banana'])
+    bank.add('cherry')
+    self.assertLen(bank, 3)
+
+  def test_rows_are_not_stored_until_flushed(self):
+    bank = self._make_bank()
+    bank.add('apple')
+    bank.flush()
+    bank.add('banana')
+
+    # A crash while the embeddings are written leaves no offset for the row.
+    with mock.patch.object(
+        bank._embeddings, 'flush', side_effect=OSError('disk full')
+    ):
+      with self.assertRaises(OSError):
+        bank.flush()
+
+    self.assertEqual(self._make_bank().get_all_memories_as_text(), ['apple'])
+
+  def test_set_state_keeps_earlier_views_readable(self):
+    bank = self._make_bank()
+    bank.extend(['apple', 'banana'])
+    state = bank.get_state()
+    bank.add('cherry')
+    view = bank._snapshot.view
+    files = set(os.listdir(self._directory)) - {'metadata.json'}
+
+    bank.set_state(state)
+    bank.add('date')
+
+    self.assertEqual(view.read_texts(0, 3), ['apple', 'banana', 'cherry'])
+    self.assertEqual(view.texts_at([2]), ['cherry'])
+    self.assertEqual(
+        bank.get_all_memories_as_text(), ['apple', 'banana', 'date']
+    )
+    del view
+    gc.collect()
+    # The files of the dropped memories are removed once no view uses them.
+    self.assertNoCommonElements(files, os.listdir(self._directory))
+    bank.close()
+    self.assertEqual(
+        self._make_bank().get_all_memories_as_text(),
+        ['apple', 'banana', 'date'],
+    )
+
+  def test_reembed_keeps_earlier_views_readable(self):
+    bank = self._make_bank()
+    bank.extend(['apple', 'banana'])
+    view = bank._snapshot.view
+
+    bank.reembed(lambda text: _one_hot_embedder(text[::-1]))
+
+    self.assertEqual(view.read_texts(0, 2), ['apple', 'banana'])
+    self.assertEqual(bank.retrieve_associative('pie', k=1), ['apple'])
+    bank.close()
+    np.testing.assert_array_equal(
+        self._make_bank().get_data_frame()['embedding'][0],
+        _one_hot_embedder('elppa'),
+    )
+
+  def test_set_state_of_in_memory_bank(self):
+    reference = basic_associative_memory.AssociativeMemoryBank(
+        sentence_embedder=_one_hot_embedder
+    )
+    reference.extend(['apple', 'banana'])
+    bank = self._make_bank()
+    bank.add('cherry')
+
+    bank.set_state(reference.get_state())
+
+    self.assertEqual(bank.get_all_memories_as_text(), ['apple', 'banana'])
+
+
+if __name__ == '__main__':
+  absltest.main()
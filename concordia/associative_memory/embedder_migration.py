@@ -0,0 +1,249 @@
+"""Re-embeds saved memory banks and checkpoints with a new embedder.
+
+Embeddings of different models cannot be compared, so switching the embedder
+of a simulation means embedding every saved memory again. The functions here
+do it in batches on several threads and can be resumed: each segment file and
+each checkpoint file is written to the output directory once it is complete,
+and the ones already there are skipped when a migration is restarted.
+
+See `reembed_checkpoints` for a command line tool.
+"""
+
+from collections.abc import Callable, Sequence
+import glob
+import json
+import os
+from typing import Any
+
+from concordia.associative_memory import basic_associative_memory
+import numpy as np
+import pandas as pd
+
+
+# Called with the name of the item being migrated, the number of its memories
+# embedded so far and the number of its memories.
+MigrationProgressCallback = Callable[[str, int, int], None]
+
+_SEGMENT_PATTERN = 'segment_*.txt'
+
+
+class Embedder:
+  """The embedder memories are migrated to and how to run it."""
+
+  def __init__(
+      self,
+      sentence_embedder: Callable[[str], np.ndarray],
+      batch_embedder: basic_associative_memory.BatchEmbedder | None = None,
+      embedder_id: str | None = None,
+      *,
+      batch_size: int = 256,
+      num_threads: int = 1,
+      progress_callback: MigrationProgressCallback | None = None,
+  ):
+    """Initializes the embedder.
+
+    Args:
+      sentence_embedder: the new text embedding model.
+      batch_embedder: optional embedder of many texts at once.
+      embedder_id: identity of the new model, recorded in migrated states. If
+        None, the identity the embedder declares, if any, is used.
+      batch_size: number of texts per call of the batch embedder.
+      num_threads: number of batches embedded concurrently.
+      progress_callback: optional function reporting the progress of each
+        migrated item.
+    """
+    self._sentence_embedder = sentence_embedder
+    self._batch_embedder = batch_embedder
+    self.embedder_id = embedder_id or basic_associative_memory.embedder_id_of(
+        sentence_embedder
+    )
+    self._batch_size = batch_size
+    self._num_threads = num_threads
+    self._progress_callback = progress_callback
+
+  def embed(self, name: str, texts: Sequence[str]) -> np.ndarray:
+    """Embeds the texts of an item, reporting progress under its name."""
+    progress_callback = None
+    if self._progress_callback is not None:
+      progress_callback = lambda done, total: self._progress_callback(
+          name, done, total
+      )
+    return basic_associative_memory.embed_texts(
+        texts,
+        self._sentence_embedder,
+        self._batch_embedder,
+        batch_size=self._batch_size,
+        num_threads=self._num_threads,
+        progress_callback=progress_callback,
+    )
+
+
+def _write_atomically(path: str, write: Callable[[str], None]) -> None:
+  """Writes a file through a temporary one, so it is complete if it exists."""
+  temporary_path = f'{path}.tmp'
+  write(temporary_path)
+  os.replace(temporary_path, path)
+
+
+def migrate_segments(
+    source_directory: str, target_directory: str, embedder: Embedder
+) -> int:
+  """Re-embeds the checkpoint segments of a memory bank.
+
+  Segments are written by `AssociativeMemoryBank.get_state` once a checkpoint
+  directory is set. Each segment is written to the target directory under the
+  same name, with float32 embeddings. Segments already in the target
+  directory are skipped.
+
+  Args:
+    source_directory: the directory of the segments.
+    target_directory: the directory to write the re-embedded segments to.
+    embedder: the new embedder.
+
+  Returns:
+    The number of memories embedded.
+  """
+  os.makedirs(target_directory, exist_ok=True)
+  num_embedded = 0
+  for text_path in sorted(
+      glob.glob(os.path.join(source_directory, _SEGMENT_PATTERN))
+  ):
+    name = os.path.basename(text_path)[:-len('.txt')]
+    target = os.path.join(target_directory, name)
+    # The embeddings are written last: they mark the segment as migrated.
+    if os.path.exists(f'{target}.npy'):
+      continue
+    with open(text_path, 'r', encoding='utf-8', newline='') as f:
+      texts = f.read().split('\n')
+    embeddings = embedder.embed(name, texts)
+    _write_atomically(
+        f'{target}.txt',
+        lambda path: _copy_text(text_path, path),
+    )
+    _write_atomically(
+        f'{target}.npy',
+        lambda path: _save_array(path, embeddings),
+    )
+    num_embedded += len(texts)
+  return num_embedded
+
+
+def _save_array(path: str, array: np.ndarray) -> None:
+  # A file object stops `np.save` from appending `.npy` to the path.
+  with open(path, 'wb') as f:
+    np.save(f, array.astype(np.float32))
+
+
+def _copy_text(source: str, target: str) -> None:
+  with open(source, 'r', encoding='utf-8', newline='') as f:
+    data = f.read()
+  with open(target, 'w', encoding='utf-8', newline='') as f:
+    f.write(data)
+
+
+def migrate_state(
+    state: Any,
+    embedder: Embedder,
+    directory_map: Callable[[str], str] = lambda directory: directory,
+    name: str = 'state',
+) -> Any:
+  """Returns a copy of a state with its memory banks re-embedded.
+
+  The state may be the state of a memory bank, or any nesting of dicts and
+  lists containing such states, like the state of an entity or a simulation
+  checkpoint. Banks serialized in the state are embedded again. Banks whose
+  memories are in segment files only have their directory replaced by
+  `directory_map`; the segments themselves are migrated by `migrate_segments`.
+  States of `DiskAssociativeMemoryBank`s are left unchanged, since they refer
+  to the files of a live bank, which can be migrated with its `reembed`.
+
+  Args:
+    state: the state to migrate.
+    embedder: the new embedder.
+    directory_map: maps the segment directory of a bank to the directory its
+      migrated segments are in.
+    name: the name of the state, used to report progress.
+
+  Returns:
+    The migrated state.
+  """
+  if isinstance(state, list):
+    return [
+        migrate_state(item, embedder, directory_map, f'{name}[{i}]')
+        for i, item in enumerate(state)
+    ]
+  if not isinstance(state, dict):
+    return state
+  if state.get('format') == basic_associative_memory.SEGMENTS_STATE_FORMAT:
+    return dict(
+        state,
+        directory=directory_map(state['directory']),
+        embedder_id=embedder.embedder_id,
+    )
+  if isinstance(state.get('memory_bank'), str):
+    data = pd.read_json(basic_associative_memory.StringIO(state['memory_bank']))
+    texts = [] if data.empty else data['text'].tolist()
+    if texts:
+      embeddings = embedder.embed(name, texts)
+      data = pd.DataFrame({'text': texts, 'embedding': list(embeddings)})
+    return dict(
+        state,
+        memory_bank=data.to_json(),
+        embedder_id=embedder.embedder_id,
+    )
+  return {
+      key: migrate_state(value, embedder, directory_map, f'{name}.{key}')
+      for key, value in state.items()
+  }
+
+
+def migrate_checkpoints(
+    checkpoint_path: str, output_path: str, embedder: Embedder
+) -> None:
+  """Re-embeds a directory of simulation checkpoints.
+
+  The segment directories found under `checkpoint_path` are migrated with
+  `migrate_segments` to the same relative paths under `output_path`, then each
+  JSON checkpoint file is migrated with `migrate_state`, pointing its banks to
+  the migrated segments. Files already in `output_path` are skipped, so an
+  interrupted migration continues where it stopped.
+
+  Args:
+    checkpoint_path: the directory of the checkpoints, as written by
+      `simulation.generic.Simulation.save_checkpoint`.
+    output_path: the directory to write the migrated checkpoints to.
+    embedder: the new embedder.
+  """
+  checkpoint_path = os.path.abspath(checkpoint_path)
+  output_path = os.path.abspath(output_path)
+
+  def directory_map(directory: str) -> str:
+    directory = os.path.abspath(directory)
+    if os.path.commonpath([directory, checkpoint_path]) != checkpoint_path:
+      return directory
+    return os.path.join(output_path, os.path.relpath(directory, checkpoint_path))
+
+  segment_directories = sorted(set(
+      os.path.dirname(path)
+      for path in glob.glob(
+          os.path.join(checkpoint_path, '**', _SEGMENT_PATTERN), recursive=True
+      )
+  ))
+  for directory in segment_directories:
+    migrate_segments(directory, directory_map(directory), embedder)
+
+  for path in sorted(glob.glob(os.path.join(checkpoint_path, '*.json'))):
+    target = os.path.join(output_path, os.path.basename(path))
+    if os.path.exists(target):
+      continue
+    with open(path, 'r') as f:
+      checkpoint = json.load(f)
+    migrated = migrate_state(
+        checkpoint, embedder, directory_map, os.path.basename(path)
+    )
+    _write_atomically(target, lambda path: _write_json(path, migrated))
+
+
+def _write_json(path: str, data: Any) -> None:
+  with open(path, 'w') as f:
+    json.dump(data, f)
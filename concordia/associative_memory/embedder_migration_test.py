@@ -0,0 +1,131 @@
+"""Tests for re-embedding saved memory banks."""
+
+import json
+import os
+import tempfile
+
+from absl.testing import absltest
+from concordia.associative_memory import basic_associative_memory
+from concordia.associative_memory import embedder_migration
+import numpy as np
+
+
+def _one_hot_embedder(text: str) -> np.ndarray:
+  """Embeds a text as a one-hot vector of its first character."""
+  embedding = np.zeros(26)
+  embedding[ord(text[0].lower()) - ord('a')] = 1.0
+  return embedding
+
+
+def _reversed_embedder(text: str) -> np.ndarray:
+  """Embeds a text as a one-hot vector of its last character."""
+  return _one_hot_embedder(text[::-1])
+
+
+class EmbedderMigrationTest(absltest.TestCase):
+
+  def setUp(self):
+    super().setUp()
+    self._directory = self.enter_context(tempfile.TemporaryDirectory())
+    self._checkpoint_path = os.path.join(self._directory, 'checkpoints')
+    self._output_path = os.path.join(self._directory, 'migrated')
+    self._calls = []
+
+    def embedder(text):
+      self._calls.append(text)
+      return _reversed_embedder(text)
+
+    self._embedder = embedder_migration.Embedder(
+        embedder, embedder_id='reversed', batch_size=2
+    )
+
+  def _write_checkpoint(self, bank, step):
+    bank.set_checkpoint_directory(
+        os.path.join(self._checkpoint_path, 'memories', 'alice')
+    )
+    checkpoint = {'entities': {'alice': {'memory': bank.get_state()}}}
+    os.makedirs(self._checkpoint_path, exist_ok=True)
+    path = os.path.join(self._checkpoint_path, f'step_{step}_checkpoint.json')
+    with open(path, 'w') as f:
+      json.dump(checkpoint, f)
+
+  def _load_bank(self, step):
+    path = os.path.join(self._output_path, f'step_{step}_checkpoint.json')
+    with open(path, 'r') as f:
+      state = json.load(f)['entities']['alice']['memory']
+    bank = basic_associative_memory.AssociativeMemoryBank(
+        sentence_embedder=_reversed_embedder, embedder_id='reversed'
+    )
+    bank.set_state(state)
+    return bank
+
+  def test_migrate_checkpoints(self):
+    bank = basic_associative_memory.AssociativeMemoryBank(
+        sentence_embedder=_one_hot_embedder, embedder_id='one-hot'
+    )
+    bank.extend(['apple', 'banana'])
+    self._write_checkpoint(bank, 1)
+    bank.add('cherry')
+    self._write_checkpoint(bank, 2)
+
+    embedder_migration.migrate_checkpoints(
+        self._checkpoint_path, self._output_path, self._embedder
+    )
+
+    # Each memory is embedded once, although it is in both checkpoints.
+    self.assertCountEqual(self._calls, ['apple', 'banana', 'cherry'])
+    migrated = self._load_bank(2)
+    self.assertEqual(migrated.embedder_id, 'reversed')
+    self.assertEqual(
+        migrated.get_all_memories_as_text(), ['apple', 'banana', 'cherry']
+    )
+    self.assertEqual(migrated.retrieve_associative('ay', k=1), ['cherry'])
+    self.assertLen(self._load_bank(1), 2)
+
+  def test_migration_resumes(self):
+    bank = basic_associative_memory.AssociativeMemoryBank(
+        sentence_embedder=_one_hot_embedder
+    )
+    bank.extend(['apple', 'banana'])
+    self._write_checkpoint(bank, 1)
+    embedder_migration.migrate_checkpoints(
+        self._checkpoint_path, self._output_path, self._embedder
+    )
+    bank.add('cherry')
+    self._write_checkpoint(bank, 2)
+    self._calls.clear()
+
+    embedder_migration.migrate_checkpoints(
+        self._checkpoint_path, self._output_path, self._embedder
+    )
+
+    self.assertEqual(self._calls, ['cherry'])
+    self.assertLen(self._load_bank(2), 3)
+
+  def test_migrate_serialized_state(self):
+    bank = basic_associative_memory.AssociativeMemoryBank(
+        sentence_embedder=_one_hot_embedder, embedder_id='one-hot'
+    )
+    bank.extend(['apple', 'banana', 'cherry'])
+    progress = []
+    embedder = embedder_migration.Embedder(
+        _reversed_embedder,
+        progress_callback=lambda *args: progress.append(args),
+    )
+
+    state = embedder_migration.migrate_state(
+        {'memory': bank.get_state(), 'step': 3}, embedder, name='alice'
+    )
+
+    self.assertEqual(state['step'], 3)
+    self.assertIsNone(state['memory']['embedder_id'])
+    self.assertEqual(progress[-1], ('alice.memory', 3, 3))
+    migrated = basic_associative_memory.AssociativeMemoryBank(
+        sentence_embedder=_reversed_embedder
+    )
+    migrated.set_state(state['memory'])
+    self.assertEqual(migrated.retrieve_associative('ay', k=1), ['cherry'])
+
+
+if __name__ == '__main__':
+  absltest.main()
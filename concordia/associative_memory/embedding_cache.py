@@ -0,0 +1,254 @@
+"""A caching wrapper for sentence embedders."""
+
+import collections
+from collections.abc import Callable, Mapping, Sequence
+import hashlib
+import json
+import os
+import threading
+
+from concordia.associative_memory import basic_associative_memory
+import numpy as np
+
+
+_KEYS_FILE = 'keys.txt'
+_VECTORS_FILE = 'vectors.f32'
+_METADATA_FILE = 'metadata.json'
+
+
+def _cache_key(model_name: str, text: str) -> str:
+  """Returns the cache key of a text embedded by the named model."""
+  return hashlib.blake2b(
+      f'{model_name}\0{text}'.encode('utf-8'), digest_size=16
+  ).hexdigest()
+
+
+class _DiskStore:
+  """Append-only on-disk store of embeddings, memory-mapped for reading.
+
+  The store is a directory holding a raw float32 file with one embedding per
+  row and a text file with the key of each row, one per line. Rows are only
+  ever appended, so a store can be shared by consecutive runs and entries
+  written by an interrupted run are simply ignored if incomplete.
+  """
+
+  def __init__(self, directory: str, model_name: str):
+    self._directory = directory
+    self._model_name = model_name
+    os.makedirs(directory, exist_ok=True)
+    self._keys_path = os.path.join(directory, _KEYS_FILE)
+    self._vectors_path = os.path.join(directory, _VECTORS_FILE)
+    metadata_path = os.path.join(directory, _METADATA_FILE)
+
+    self._dim = None
+    if os.path.exists(metadata_path):
+      with open(metadata_path, 'r') as f:
+        metadata = json.load(f)
+      if metadata['model_name'] != model_name:
+        raise ValueError(
+            f'Embedding cache at {directory} was written by '
+            f'{metadata["model_name"]}, not {model_name}.'
+        )
+      self._dim = metadata['dim']
+    self._metadata_path = metadata_path
+
+    keys = []
+    if os.path.exists(self._keys_path):
+      with open(self._keys_path, 'r') as f:
+        keys = f.read().split()
+    num_rows = 0
+    if self._dim is not None and os.path.exists(self._vectors_path):
+      num_rows = os.path.getsize(self._vectors_path) // (4 * self._dim)
+    # Keep only rows for which both the key and the vector were written.
+    self._index = {key: row for row, key in enumerate(keys[:num_rows])}
+    self._num_rows = len(self._index)
+    if len(keys) != self._num_rows or num_rows != self._num_rows:
+      self._truncate()
+    self._vectors = None
+
+  def _truncate(self) -> None:
+    """Drops partially written rows left over by an interrupted run."""
+    keys = sorted(self._index, key=self._index.get)
+    with open(self._keys_path, 'w') as f:
+      f.write(''.join(f'{key}\n' for key in keys))
+    if self._dim is not None and os.path.exists(self._vectors_path):
+      with open(self._vectors_path, 'r+b') as f:
+        f.truncate(self._num_rows * self._dim * 4)
+
+  def __len__(self) -> int:
+    return self._num_rows
+
+  def get(self, key: str) -> np.ndarray | None:
+    """Returns the stored embedding for the key, or None if missing."""
+    row = self._index.get(key)
+    if row is None:
+      return None
+    if self._vectors is None or row >= self._vectors.shape[0]:
+      # Remap to pick up rows appended since the file was last mapped.
+      self._vectors = np.memmap(
+          self._vectors_path,
+          dtype=np.float32,
+          mode='r',
+          shape=(self._num_rows, self._dim),
+      )
+    return np.array(self._vectors[row])
+
+  def put(self, keys: Sequence[str], embeddings: np.ndarray) -> None:
+    """Appends embeddings to the store, skipping keys already present."""
+    new_rows = [i for i, key in enumerate(keys) if key not in self._index]
+    if not new_rows:
+      return
+    embeddings = np.asarray(embeddings, dtype=np.float32)
+    if self._dim is None:
+      self._dim = embeddings.shape[1]
+      with open(self._metadata_path, 'w') as f:
+        json.dump({'model_name': self._model_name, 'dim': self._dim}, f)
+    with open(self._vectors_path, 'ab') as f:
+      f.write(np.ascontiguousarray(embeddings[new_rows]).tobytes())
+    with open(self._keys_path, 'a') as f:
+      f.write(''.join(f'{keys[i]}\n' for i in new_rows))
+    for i in new_rows:
+      self._index[keys[i]] = self._num_rows
+      self._num_rows += 1
+
+
+class CachingEmbedder:
+  """Wraps a sentence embedder with a content-addressed embedding cache.
+
+  Embeddings are keyed by a digest of the text and the embedding model name, and
+  kept in a bounded in-memory LRU cache. Optionally they are also written to an
+  on-disk store that survives restarts, so re-running a scenario does not embed
+  the same memories again.
+
+  An instance can be used anywhere a sentence embedder is expected, and its
+  `embed_batch` method anywhere a batch embedder is expected, e.g.
+  `memory_bank.set_embedder(cache, cache.embed_batch)`.
+  """
+
+  def __init__(
+      self,
+      embedder: Callable[[str], np.ndarray],
+      *,
+      model_name: str,
+      batch_embedder: basic_associative_memory.BatchEmbedder | None = None,
+      max_entries: int = 100_000,
+      cache_dir: str | None = None,
+  ):
+    """Initializes the caching embedder.
+
+    Args:
+      embedder: the sentence embedder to wrap.
+      model_name: name of the embedding model, part of the cache key so that
+        embeddings from different models are never mixed.
+      batch_embedder: optional embedder of many texts at once, used for cache
+        misses in `embed_batch`.
+      max_entries: maximum number of embeddings kept in memory. The least
+        recently used ones are evicted first.
+      cache_dir: optional directory of the on-disk store. If None, embeddings
+        are only cached in memory.
+    """
+    if max_entries <= 0:
+      raise ValueError('max_entries must be positive.')
+    self._embedder = embedder
+    self._batch_embedder = batch_embedder
+    self._model_name = model_name
+    self._max_entries = max_entries
+    self._lock = threading.Lock()
+    self._entries: collections.OrderedDict[str, np.ndarray] = (
+        collections.OrderedDict()
+    )
+    self._disk_store = None
+    if cache_dir is not None:
+      self._disk_store = _DiskStore(
+          os.path.join(cache_dir, _cache_key(model_name, '')), model_name
+      )
+    self._hits = 0
+    self._disk_hits = 0
+    self._misses = 0
+
+  @property
+  def model_name(self) -> str:
+    return self._model_name
+
+  def _lookup(self, key: str) -> np.ndarray | None:
+    """Returns the cached embedding for the key. Assumes the lock is held."""
+    embedding = self._entries.get(key)
+    if embedding is not None:
+      self._entries.move_to_end(key)
+      self._hits += 1
+      return embedding
+    if self._disk_store is not None:
+      embedding = self._disk_store.get(key)
+      if embedding is not None:
+        embedding.setflags(write=False)
+        self._insert(key, embedding)
+        self._hits += 1
+        self._disk_hits += 1
+        return embedding
+    self._misses += 1
+    return None
+
+  def _insert(self, key: str, embedding: np.ndarray) -> None:
+    """Adds an embedding to the in-memory cache. Assumes the lock is held."""
+    self._entries[key] = embedding
+    self._entries.move_to_end(key)
+    while len(self._entries) > self._max_entries:
+      self._entries.popitem(last=False)
+
+  def __call__(self, text: str) -> np.ndarray:
+    """Returns the embedding of a text, computing it only on a cache miss."""
+    return self.embed_batch([text])[0]
+
+  def embed_batch(self, texts: Sequence[str]) -> np.ndarray:
+    """Returns the embeddings of the texts, one row per text.
+
+    All cache misses are embedded together with the batch embedder, if set.
+
+    Args:
+      texts: the texts to embed.
+    """
+    keys = [_cache_key(self._model_name, text) for text in texts]
+    embeddings = [None] * len(texts)
+    missing = {}
+    with self._lock:
+      for i, key in enumerate(keys):
+        embeddings[i] = self._lookup(key)
+        if embeddings[i] is None:
+          missing.setdefault(key, []).append(i)
+
+    if missing:
+      missing_texts = [texts[rows[0]] for rows in missing.values()]
+      if self._batch_embedder is not None:
+        computed = np.asarray(
+            self._batch_embedder(missing_texts), dtype=np.float32
+        )
+      else:
+        computed = np.stack([
+            np.asarray(self._embedder(text), dtype=np.float32)
+            for text in missing_texts
+        ])
+      computed.setflags(write=False)
+      with self._lock:
+        for (key, rows), embedding in zip(missing.items(), computed):
+          self._insert(key, embedding)
+          for i in rows:
+            embeddings[i] = embedding
+        if self._disk_store is not None:
+          self._disk_store.put(list(missing), computed)
+
+    return np.stack(embeddings) if embeddings else np.empty((0, 0))
+
+  def get_stats(self) -> Mapping[str, float]:
+    """Returns the hit and miss counts and the hit rate of the cache."""
+    with self._lock:
+      lookups = self._hits + self._misses
+      return {
+          'hits': self._hits,
+          'disk_hits': self._disk_hits,
+          'misses': self._misses,
+          'hit_rate': self._hits / lookups if lookups else 0.0,
+          'num_entries': len(self._entries),
+          'num_disk_entries': (
+              len(self._disk_store) if self._disk_store is not None else 0
+          ),
+      }
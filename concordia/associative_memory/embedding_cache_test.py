@@ -0,0 +1,101 @@
+"""Tests for the caching embedder."""
+
+import tempfile
+
+from absl.testing import absltest
+from concordia.associative_memory import embedding_cache
+import numpy as np
+
+
+class _CountingEmbedder:
+
+  def __init__(self):
+    self.calls = []
+
+  def __call__(self, text: str) -> np.ndarray:
+    self.calls.append(text)
+    return np.array([len(text), text.count('a'), 1.0])
+
+
+class CachingEmbedderTest(absltest.TestCase):
+
+  def test_repeated_texts_are_embedded_once(self):
+    embedder = _CountingEmbedder()
+    cache = embedding_cache.CachingEmbedder(embedder, model_name='test')
+
+    first = cache('banana')
+    second = cache('banana')
+
+    np.testing.assert_array_equal(first, second)
+    self.assertEqual(embedder.calls, ['banana'])
+    stats = cache.get_stats()
+    self.assertEqual(stats['hits'], 1)
+    self.assertEqual(stats['misses'], 1)
+    self.assertEqual(stats['hit_rate'], 0.5)
+
+  def test_embed_batch_only_embeds_misses(self):
+    embedder = _CountingEmbedder()
+    batches = []
+
+    def batch_embedder(texts):
+      batches.append(list(texts))
+      return np.stack([embedder(text) for text in texts])
+
+    cache = embedding_cache.CachingEmbedder(
+        embedder, model_name='test', batch_embedder=batch_embedder
+    )
+    cache('apple')
+    result = cache.embed_batch(['apple', 'kiwi', 'kiwi'])
+
+    self.assertEqual(batches, [['apple'], ['kiwi']])
+    self.assertEqual(result.shape, (3, 3))
+    np.testing.assert_array_equal(result[1], result[2])
+
+  def test_lru_eviction(self):
+    embedder = _CountingEmbedder()
+    cache = embedding_cache.CachingEmbedder(
+        embedder, model_name='test', max_entries=2
+    )
+    cache('a')
+    cache('b')
+    cache('a')
+    cache('c')  # Evicts 'b', the least recently used.
+    cache('a')
+    cache('b')
+
+    self.assertEqual(embedder.calls, ['a', 'b', 'c', 'b'])
+
+  def test_model_name_is_part_of_the_key(self):
+    directory = self.enter_context(tempfile.TemporaryDirectory())
+    embedding_cache.CachingEmbedder(
+        _CountingEmbedder(), model_name='first', cache_dir=directory
+    )('apple')
+
+    embedder = _CountingEmbedder()
+    embedding_cache.CachingEmbedder(
+        embedder, model_name='second', cache_dir=directory
+    )('apple')
+
+    self.assertEqual(embedder.calls, ['apple'])
+
+  def test_disk_store_survives_restarts(self):
+    directory = self.enter_context(tempfile.TemporaryDirectory())
+    cache = embedding_cache.CachingEmbedder(
+        _CountingEmbedder(), model_name='test', cache_dir=directory
+    )
+    expected = cache.embed_batch(['apple', 'banana'])
+
+    embedder = _CountingEmbedder()
+    restarted = embedding_cache.CachingEmbedder(
+        embedder, model_name='test', cache_dir=directory
+    )
+    result = restarted.embed_batch(['apple', 'banana', 'cherry'])
+
+    self.assertEqual(embedder.calls, ['cherry'])
+    np.testing.assert_array_equal(result[:2], expected)
+    self.assertEqual(restarted.get_stats()['disk_hits'], 2)
+    self.assertEqual(restarted.get_stats()['num_disk_entries'], 3)
+
+
+if __name__ == '__main__':
+  absltest.main()
@@ -8,6 +8,7 @@ import re
 from typing import Any
 
 from concordia.associative_memory import basic_associative_memory as associative_memory
+from concordia.associative_memory import shared_memory_bank
 from concordia.document import interactive_document
 from concordia.language_model import language_model
 from dateutil.relativedelta import relativedelta  # pylint: disable=g-importing-member
@@ -73,13 +74,16 @@ class MemoryFactory:
   def __init__(
       self,
       embedder: Callable[[str], np.ndarray],
+      batch_embedder: associative_memory.BatchEmbedder | None = None,
   ):
     """Initializes the memory factory.
 
     Args:
       embedder: The text embedder to use
+      batch_embedder: Optional embedder of many texts at once
     """
     self._embedder = embedder
+    self._batch_embedder = batch_embedder
 
   def make_blank_memory(
       self,
@@ -94,6 +98,27 @@ class MemoryFactory:
 
     return associative_memory.AssociativeMemoryBank(
         sentence_embedder=self._embedder,
+        batch_embedder=self._batch_embedder,
+    )
+
+  def make_shared_segment(
+      self, texts: Sequence[str]
+  ) -> shared_memory_bank.SharedMemorySegment:
+    """Embeds memories to be shared by many memory banks."""
+    return shared_memory_bank.SharedMemorySegment.embed(
+        texts,
+        sentence_embedder=self._embedder,
+        batch_embedder=self._batch_embedder,
+    )
+
+  def make_shared_base_memory(
+      self, shared_segment: shared_memory_bank.SharedMemorySegment
+  ) -> shared_memory_bank.SharedBaseMemoryBank:
+    """Creates a memory holding only the memories of a shared segment."""
+    return shared_memory_bank.SharedBaseMemoryBank(
+        shared_segment,
+        sentence_embedder=self._embedder,
+        batch_embedder=self._batch_embedder,
     )
 
 
@@ -105,27 +130,40 @@ class FormativeMemoryFactory:
       *,
       model: language_model.LanguageModel,
       embedder: Callable[[str], np.ndarray],
+      batch_embedder: associative_memory.BatchEmbedder | None = None,
       shared_memories: Sequence[str] = (),
       delimiter_symbol: str = '***',
       current_date: datetime.datetime | None = None,
+      share_memory_embeddings: bool = False,
   ):
     """Initializes the formative memory factory.
 
     Args:
       model: the language model to use for generating memories
       embedder: The text embedder to use
+      batch_embedder: Optional embedder of many texts at once, used to embed
+        all memories of an agent in a single call
       shared_memories: memories to be added to all agents
       delimiter_symbol: the delimiter to use when splitting the generated
         episodes
       current_date: (optional) the date of the simulation, used to calculate
         the age of each individual at the time of the simulation.
+      share_memory_embeddings: whether to embed the shared memories once and
+        build the memory bank of every agent on top of them, see
+        `shared_memory_bank.SharedBaseMemoryBank`. The states of these banks
+        only hold the memories specific to each agent.
     """
     self._model = model
     self._delimiter_symbol = delimiter_symbol
-    self._blank_memory_factory_call = MemoryFactory(
-        embedder=embedder).make_blank_memory
+    self._memory_factory = MemoryFactory(
+        embedder=embedder, batch_embedder=batch_embedder)
+    self._blank_memory_factory_call = self._memory_factory.make_blank_memory
     self._shared_memories = shared_memories
     self._current_date = current_date
+    self._shared_segment = None
+    if share_memory_embeddings:
+      self._shared_segment = self._memory_factory.make_shared_segment(
+          shared_memories)
 
   def make_backstory(self, agent_config: AgentConfig) -> str:
     """Creates a backstory for an agent based on the data provided.
@@ -194,6 +232,17 @@ class FormativeMemoryFactory:
       agent_config: structured description of an agent
       sentences_per_episode: Max number of sentences per episode
     """
+    memory.extend(self._make_formative_episodes(
+        agent_config=agent_config,
+        sentences_per_episode=sentences_per_episode,
+    ))
+
+  def _make_formative_episodes(
+      self,
+      agent_config: AgentConfig,
+      sentences_per_episode: int = 3,
+  ) -> list[str]:
+    """Returns the formative memories of the agent, in chronological order."""
     description = self.make_backstory(agent_config)
     prompt = interactive_document.InteractiveDocument(self._model)
     prompt.statement('Creative Writing Master Class\n')
@@ -259,6 +308,7 @@ class FormativeMemoryFactory:
           f'({len(formative_ages_list)}). This is just a warning and '
           'probably not problematic.')
 
+    memories = []
     for episode_age, episode in zip(agent_config.formative_ages, episodes):
       if agent_config.date_of_birth is not None:
         timestamp = (
@@ -266,14 +316,15 @@ class FormativeMemoryFactory:
         memory_to_add = f'[{timestamp}] {episode}'
       else:
         memory_to_add = episode
-      memory.add(memory_to_add)
+      memories.append(memory_to_add)
 
     if self._current_date and agent_config.date_of_birth is not None:
       age = relativedelta(self._current_date, agent_config.date_of_birth).years
       timestamp = self._current_date
-      memory.add(
+      memories.append(
           f'[{timestamp}] {agent_config.name} is {age} years old.',
       )
+    return memories
 
   def make_memories(
       self,
@@ -282,31 +333,31 @@ class FormativeMemoryFactory:
   ) -> associative_memory.AssociativeMemoryBank:
     """Creates agent memory from the agent config."""
 
-    mem = self._blank_memory_factory_call()
+    # Memories are collected first and then embedded together in one batch.
     # All players share generic memories.
-    for item in self._shared_memories:
-      mem.add(item)
+    memories = list(self._shared_memories)
 
     context = agent_config.context
     if agent_config.goal:
       context += '\n' + f"{agent_config.name}'s goal is: {agent_config.goal}"
 
-    self.add_memories(
-        memory=mem,
+    memories.extend(self._make_formative_episodes(
         agent_config=agent_config,
         sentences_per_episode=sentences_per_episode,
-    )
+    ))
 
     if context:
       context_items = context.split('\n')
-      for item in context_items:
-        if item:
-          mem.add(item)
+      memories.extend(item for item in context_items if item)
 
     if agent_config.specific_memories:
       specific_memories = agent_config.specific_memories.split('\n')
-      for item in specific_memories:
-        if item:
-          mem.add(item)
-
+      memories.extend(item for item in specific_memories if item)
+
+    if self._shared_segment is None:
+      mem = self._blank_memory_factory_call()
+    else:
+      # The shared memories are already in the segment and are not embedded.
+      mem = self._memory_factory.make_shared_base_memory(self._shared_segment)
+    mem.extend(memories)
     return mem
@@ -0,0 +1,195 @@
+"""Incremental BM25 inverted index for lexical retrieval from memory banks."""
+
+from collections.abc import Iterable
+import dataclasses
+import math
+import re
+
+from concordia.associative_memory import ann_index
+import numpy as np
+
+
+_TOKEN_PATTERN = re.compile(r'\w+')
+_INITIAL_CAPACITY = 4
+
+
+def tokenize(text: str) -> list[str]:
+  """Returns the lowercase word tokens of a text."""
+  return _TOKEN_PATTERN.findall(text.lower())
+
+
+@dataclasses.dataclass
+class _Postings:
+  """The rows a token occurs in and how often, oldest first.
+
+  Only the first `size` entries are valid, the rest is spare capacity.
+  """
+
+  rows: np.ndarray
+  counts: np.ndarray
+  size: int = 0
+
+
+class BM25Index:
+  """An inverted index scoring memories against a query with Okapi BM25.
+
+  Each token of a memory maps to the rows it occurs in, so a query only
+  touches the rows sharing a token with it. This makes the index a cheap
+  prefilter for associative retrieval: names, places and other rare words of
+  the query select a few candidates, which the bank then rescores with their
+  embeddings. Tokens found in more than `max_document_frequency` of the
+  memories, like stop words or the name of the agent itself, are too common to
+  select anything and are ignored by queries.
+
+  Like `ann_index.IVFIndex`, the index only stores row numbers. Searches may
+  run concurrently with a single thread calling `update`, and may ask for
+  fewer rows than were indexed, e.g. for an older snapshot of the bank.
+  """
+
+  def __init__(
+      self,
+      *,
+      num_candidates: int = 256,
+      k1: float = 1.2,
+      b: float = 0.75,
+      max_document_frequency: float = 0.5,
+  ):
+    """Initializes the index.
+
+    Args:
+      num_candidates: number of rows selected by a hybrid retrieval for
+        rescoring with their embeddings, if more than the number retrieved.
+      k1: BM25 term frequency saturation.
+      b: BM25 document length normalization.
+      max_document_frequency: fraction of the rows above which a token is
+        ignored by queries.
+    """
+    if num_candidates <= 0:
+      raise ValueError('num_candidates must be positive.')
+    if not 0.0 < max_document_frequency <= 1.0:
+      raise ValueError('max_document_frequency must be in (0, 1].')
+    self._num_candidates = num_candidates
+    self._k1 = k1
+    self._b = b
+    self._max_document_frequency = max_document_frequency
+    self.reset()
+
+  @property
+  def num_candidates(self) -> int:
+    return self._num_candidates
+
+  @property
+  def num_indexed(self) -> int:
+    return self._num_indexed
+
+  def reset(self) -> None:
+    """Forgets all indexed rows."""
+    self._postings: dict[str, _Postings] = {}
+    self._lengths = np.zeros(_INITIAL_CAPACITY, dtype=np.int32)
+    self._total_length = 0
+    # Rows [0, _num_indexed) are indexed. It is updated after the postings,
+    # so a concurrent search finds every row below the value it read.
+    self._num_indexed = 0
+
+  def update(self, texts: Iterable[str]) -> None:
+    """Indexes texts as the rows following the ones indexed so far.
+
+    Args:
+      texts: the texts of the new rows, oldest first.
+    """
+    row = self._num_indexed
+    for text in texts:
+      tokens = tokenize(text)
+      if row == self._lengths.shape[0]:
+        grown = np.zeros(2 * row, dtype=np.int32)
+        grown[:row] = self._lengths
+        self._lengths = grown
+      self._lengths[row] = len(tokens)
+      self._total_length += len(tokens)
+      counts = {}
+      for token in tokens:
+        counts[token] = counts.get(token, 0) + 1
+      for token, count in counts.items():
+        _append_posting(self._postings, token, row, count)
+      row += 1
+    self._num_indexed = row
+
+  def search(
+      self, query: str, k: int, num_rows: int | None = None
+  ) -> tuple[np.ndarray, np.ndarray]:
+    """Returns the rows with the highest BM25 scores for a query.
+
+    Args:
+      query: the query text.
+      k: the maximum number of rows to return.
+      num_rows: if given, only rows below it are searched.
+
+    Returns:
+      Up to k rows sharing a selective token with the query, sorted by
+      decreasing score, and their scores.
+    """
+    # Read the number of indexed rows before the postings, see `update`.
+    num_indexed = self._num_indexed
+    if num_rows is not None:
+      num_indexed = min(num_indexed, num_rows)
+    if not num_indexed:
+      return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float32)
+    lengths = self._lengths
+    average_length = max(self._total_length / self._num_indexed, 1.0)
+    max_frequency = max(self._max_document_frequency * num_indexed, 1.0)
+
+    matched_rows = []
+    matched_scores = []
+    for token in set(tokenize(query)):
+      postings = self._postings.get(token)
+      if postings is None:
+        continue
+      size = postings.size
+      rows = postings.rows[:size]
+      counts = postings.counts[:size]
+      keep = rows < num_indexed
+      rows, counts = rows[keep], counts[keep]
+      frequency = rows.shape[0]
+      if not frequency or frequency > max_frequency:
+        continue
+      idf = math.log(1.0 + (num_indexed - frequency + 0.5) / (frequency + 0.5))
+      norm = self._k1 * (
+          1.0 - self._b + self._b * lengths[rows] / average_length
+      )
+      matched_rows.append(rows)
+      matched_scores.append(idf * counts * (self._k1 + 1.0) / (counts + norm))
+    if not matched_rows:
+      return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float32)
+
+    rows, inverse = np.unique(np.concatenate(matched_rows), return_inverse=True)
+    scores = np.zeros(rows.shape[0], dtype=np.float32)
+    np.add.at(scores, inverse, np.concatenate(matched_scores))
+    # Ties go to the most recent rows.
+    rows, scores = rows[::-1], scores[::-1]
+    positions = ann_index.top_k(scores, k)
+    return rows[positions], scores[positions]
+
+
+def _append_posting(
+    postings: dict[str, _Postings], token: str, row: int, count: int
+) -> None:
+  """Appends a row to the postings of a token, growing them geometrically."""
+  entry = postings.get(token)
+  if entry is None:
+    entry = _Postings(
+        rows=np.empty(_INITIAL_CAPACITY, dtype=np.int64),
+        counts=np.empty(_INITIAL_CAPACITY, dtype=np.float32),
+    )
+  size = entry.size
+  if size == entry.rows.shape[0]:
+    rows = np.empty(2 * size, dtype=np.int64)
+    rows[:size] = entry.rows
+    counts = np.empty(2 * size, dtype=np.float32)
+    counts[:size] = entry.counts
+    entry.rows, entry.counts = rows, counts
+  # The posting is written before the size that makes it visible.
+  entry.rows[size] = row
+  entry.counts[size] = count
+  entry.size = size + 1
+  postings[token] = entry
+
@@ -0,0 +1,92 @@
+r"""Benchmark of reduced precision embedding storage for memory banks.
+
+Fills memory banks storing synthetic clustered embeddings at each of
+`basic_associative_memory.EMBEDDING_DTYPES` and reports the memory used by
+the embeddings, the agreement of their top-k retrieval with float32 storage
+and the retrieval latency.
+
+Usage:
+  python -m concordia.associative_memory.quantization_benchmark \
+      --num_memories=100000 --dim=768 --k=25
+"""
+
+from collections.abc import Sequence
+import time
+
+from absl import app
+from absl import flags
+from concordia.associative_memory import basic_associative_memory
+import numpy as np
+
+
+_NUM_MEMORIES = flags.DEFINE_integer(
+    'num_memories', 100_000, 'Number of memories in the bank.'
+)
+_DIM = flags.DEFINE_integer('dim', 768, 'Embedding dimension.')
+_NUM_TOPICS = flags.DEFINE_integer(
+    'num_topics', 1000, 'Number of clusters the synthetic memories are from.'
+)
+_NUM_QUERIES = flags.DEFINE_integer('num_queries', 200, 'Number of queries.')
+_K = flags.DEFINE_integer('k', 25, 'Number of memories retrieved per query.')
+_SEED = flags.DEFINE_integer('seed', 0, 'Random seed.')
+
+
+def _make_embeddings(
+    rng: np.random.Generator, num: int, topics: np.ndarray, noise: float
+) -> np.ndarray:
+  """Returns unit-norm embeddings drawn around random topics."""
+  embeddings = topics[rng.integers(topics.shape[0], size=num)]
+  embeddings = embeddings + noise * rng.standard_normal(
+      embeddings.shape, dtype=np.float32
+  )
+  return embeddings / np.linalg.norm(embeddings, axis=1, keepdims=True)
+
+
+def main(argv: Sequence[str]) -> None:
+  if len(argv) > 1:
+    raise app.UsageError('Too many command-line arguments.')
+
+  rng = np.random.default_rng(_SEED.value)
+  topics = rng.standard_normal((_NUM_TOPICS.value, _DIM.value), np.float32)
+  topics /= np.linalg.norm(topics, axis=1, keepdims=True)
+  noise = 1.0 / np.sqrt(_DIM.value)
+  embeddings = _make_embeddings(rng, _NUM_MEMORIES.value, topics, noise)
+  queries = _make_embeddings(rng, _NUM_QUERIES.value, topics, noise)
+  texts = [f'memory {i}' for i in range(_NUM_MEMORIES.value)]
+  query_texts = [f'query {i}' for i in range(_NUM_QUERIES.value)]
+  lookup = dict(zip(texts, embeddings))
+  lookup.update(zip(query_texts, queries))
+  k = _K.value
+  print(f'memories: {_NUM_MEMORIES.value}, dim: {_DIM.value}, k: {k}')
+
+  print(
+      f'{"dtype":>8} {"MB":>8} {"B/memory":>9} {"agreement":>10}'
+      f' {"ms/query":>9}'
+  )
+  reference = None
+  for dtype in basic_associative_memory.EMBEDDING_DTYPES:
+    bank = basic_associative_memory.AssociativeMemoryBank(
+        sentence_embedder=lookup.get,
+        batch_embedder=lambda batch: np.stack([lookup[t] for t in batch]),
+        embedding_dtype=dtype,
+    )
+    bank.extend(texts)
+    start = time.perf_counter()
+    results = [set(bank.retrieve_associative(q, k=k)) for q in query_texts]
+    latency = (time.perf_counter() - start) / len(query_texts)
+    if reference is None:
+      reference = results
+    agreement = np.mean([
+        len(result & expected) / len(expected)
+        for result, expected in zip(results, reference)
+    ])
+    embedding_bytes = bank.get_stats()['embedding_bytes']
+    print(
+        f'{dtype:>8} {embedding_bytes / 2**20:>8.1f}'
+        f' {embedding_bytes / len(bank):>9.1f} {agreement:>10.3f}'
+        f' {latency * 1e3:>9.3f}'
+    )
+
+
+if __name__ == '__main__':
+  app.run(main)
@@ -0,0 +1,84 @@
+r"""Re-embeds saved simulation checkpoints with another sentence embedder.
+
+Reads the checkpoints in `--checkpoint_path`, embeds every memory they hold
+with the SentenceTransformer model `--model_name` and writes the migrated
+checkpoints to `--output_path`. Embeddings are cached under the output path,
+so an interrupted run can be restarted with the same flags and continues
+where it stopped.
+
+Usage:
+  python -m concordia.associative_memory.reembed_checkpoints \
+      --checkpoint_path=/tmp/checkpoints --output_path=/tmp/migrated \
+      --model_name=sentence-transformers/all-MiniLM-L6-v2
+"""
+
+from collections.abc import Sequence
+import os
+
+from absl import app
+from absl import flags
+from concordia.associative_memory import embedder_migration
+from concordia.associative_memory import embedding_cache
+import sentence_transformers
+
+
+_CHECKPOINT_PATH = flags.DEFINE_string(
+    'checkpoint_path', None, 'Directory of the checkpoints.', required=True
+)
+_OUTPUT_PATH = flags.DEFINE_string(
+    'output_path', None, 'Directory to write the migrated checkpoints to.',
+    required=True,
+)
+_MODEL_NAME = flags.DEFINE_string(
+    'model_name',
+    'sentence-transformers/all-mpnet-base-v2',
+    'SentenceTransformer model to embed the memories with.',
+)
+_EMBEDDER_ID = flags.DEFINE_string(
+    'embedder_id',
+    None,
+    'Identity of the model recorded in the checkpoints. Defaults to the '
+    'model name.',
+)
+_BATCH_SIZE = flags.DEFINE_integer(
+    'batch_size', 256, 'Number of memories per call of the model.'
+)
+_NUM_THREADS = flags.DEFINE_integer(
+    'num_threads', 4, 'Number of batches embedded concurrently.'
+)
+
+
+def _print_progress(name: str, num_embedded: int, num_memories: int) -> None:
+  print(f'{name}: {num_embedded}/{num_memories} memories embedded', flush=True)
+
+
+def main(argv: Sequence[str]) -> None:
+  if len(argv) > 1:
+    raise app.UsageError('Too many command-line arguments.')
+
+  model_name = _MODEL_NAME.value
+  model = sentence_transformers.SentenceTransformer(model_name)
+  cache = embedding_cache.CachingEmbedder(
+      embedder=lambda text: model.encode(text, show_progress_bar=False),
+      batch_embedder=lambda texts: model.encode(
+          list(texts), show_progress_bar=False
+      ),
+      model_name=model_name,
+      cache_dir=os.path.join(_OUTPUT_PATH.value, 'embedding_cache'),
+  )
+  embedder = embedder_migration.Embedder(
+      cache,
+      cache.embed_batch,
+      _EMBEDDER_ID.value,
+      batch_size=_BATCH_SIZE.value,
+      num_threads=_NUM_THREADS.value,
+      progress_callback=_print_progress,
+  )
+  embedder_migration.migrate_checkpoints(
+      _CHECKPOINT_PATH.value, _OUTPUT_PATH.value, embedder
+  )
+  print(f'Migrated checkpoints written to {_OUTPUT_PATH.value}')
+
+
+if __name__ == '__main__':
+  app.run(main)
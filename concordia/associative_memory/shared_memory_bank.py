@@ -0,0 +1,343 @@
+"""A memory bank layered on a base segment of memories shared by many banks."""
+
+from collections.abc import Callable, Iterable, Mapping, Sequence
+
+from concordia.associative_memory import ann_index as ann_index_lib
+from concordia.associative_memory import basic_associative_memory
+from concordia.associative_memory import lexical_index as lexical_index_lib
+from concordia.type_checks import entity_component
+import numpy as np
+import pandas as pd
+
+
+class SharedMemorySegment:
+  """An immutable set of memories, embedded once and read by many banks.
+
+  The texts and embeddings are never copied by the banks that use the
+  segment, so memories common to all agents, such as a description of the
+  world, cost one embedding each however many agents there are.
+  """
+
+  def __init__(self, texts: Sequence[str], embeddings: np.ndarray):
+    """Initializes the segment from embedded texts.
+
+    Args:
+      texts: the texts of the memories, oldest first, without duplicates.
+      embeddings: the embeddings of the texts, one per row.
+
+    Raises:
+      ValueError: if there is not one embedding per text, or duplicate texts.
+    """
+    embeddings = np.array(embeddings, dtype=np.float32)
+    if embeddings.ndim != 2 or embeddings.shape[0] != len(texts):
+      raise ValueError(
+          f'Expected one embedding per text, got an array of shape '
+          f'{embeddings.shape} for {len(texts)} texts.'
+      )
+    embeddings.setflags(write=False)
+    self._texts = tuple(text.replace('\n', ' ') for text in texts)
+    self._embeddings = embeddings
+    self._digests = frozenset(
+        basic_associative_memory.content_digest(text) for text in self._texts
+    )
+    if len(self._digests) != len(self._texts):
+      raise ValueError('The texts of a shared segment must be distinct.')
+    self._texts_by_tag: dict[str, list[str]] = {}
+    for text in self._texts:
+      for tag in basic_associative_memory.leading_tags(text):
+        self._texts_by_tag.setdefault(tag, []).append(text)
+    self._lexical_index = lexical_index_lib.BM25Index()
+    self._lexical_index.update(self._texts)
+
+  @classmethod
+  def embed(
+      cls,
+      texts: Iterable[str],
+      sentence_embedder: Callable[[str], np.ndarray],
+      batch_embedder: basic_associative_memory.BatchEmbedder | None = None,
+  ) -> 'SharedMemorySegment':
+    """Embeds texts into a new segment, dropping duplicates.
+
+    Args:
+      texts: the texts of the memories, oldest first.
+      sentence_embedder: text embedding model.
+      batch_embedder: optional embedder of many texts at once.
+
+    Returns:
+      The segment holding the distinct texts.
+    """
+    texts = list(dict.fromkeys(text.replace('\n', ' ') for text in texts))
+    if not texts:
+      return cls([], np.empty((0, 0), dtype=np.float32))
+    if batch_embedder is not None:
+      embeddings = batch_embedder(texts)
+    else:
+      embeddings = np.stack([sentence_embedder(text) for text in texts])
+    return cls(texts, embeddings)
+
+  @property
+  def texts(self) -> tuple[str, ...]:
+    return self._texts
+
+  @property
+  def embeddings(self) -> np.ndarray:
+    """The read-only embeddings of the memories, one per row."""
+    return self._embeddings
+
+  @property
+  def digests(self) -> frozenset[str]:
+    """The `content_digest` of each memory."""
+    return self._digests
+
+  def __len__(self) -> int:
+    return len(self._texts)
+
+  def texts_with_tag(self, tag: str) -> Sequence[str]:
+    """Returns the memories with a leading tag, oldest first."""
+    return self._texts_by_tag.get(tag, ())
+
+  def lexical_top_k(
+      self, query: str, k: int
+  ) -> tuple[np.ndarray, np.ndarray]:
+    """Returns the top k rows by BM25 score for a query, and their scores."""
+    return self._lexical_index.search(query, k)
+
+  def scored_top_k_batch(
+      self, queries: np.ndarray, k: int
+  ) -> tuple[np.ndarray, np.ndarray]:
+    """Returns the top k rows of each query and their inner products."""
+    scores = queries @ self._embeddings.T
+    rows = ann_index_lib.top_k_per_row(scores, k)
+    return rows, np.take_along_axis(scores, rows, axis=1)
+
+
+class SharedBaseMemoryBank(basic_associative_memory.AssociativeMemoryBank):
+  """A memory bank whose oldest memories are those of a shared segment.
+
+  The bank reads the memories of a `SharedMemorySegment` without copying
+  them, and appends its own memories to a private segment stored like those
+  of `AssociativeMemoryBank`. All retrieval methods behave as if the shared
+  memories had been added to the bank first: associative retrieval merges the
+  top k of both segments by similarity, and retrieval by recency, tag or
+  prefix continues into the shared memories when the private ones run out.
+  Memories already in the shared segment are not added again.
+
+  The state of the bank only holds its private memories, so it must be
+  restored into a bank built on the same shared segment.
+  """
+
+  def __init__(
+      self,
+      shared_segment: SharedMemorySegment,
+      sentence_embedder: Callable[[str], np.ndarray] | None = None,
+      batch_embedder: basic_associative_memory.BatchEmbedder | None = None,
+      ann_index: ann_index_lib.IVFIndex | None = None,
+      index_tags: bool = True,
+      embedding_dtype: str = 'float32',
+      max_pending_batches: int = 16,
+      lexical_index: lexical_index_lib.BM25Index | None = None,
+  ):
+    """Constructor.
+
+    Args:
+      shared_segment: the memories shared with other banks.
+      sentence_embedder: text embedding model, see `AssociativeMemoryBank`.
+      batch_embedder: optional embedder of many texts at once.
+      ann_index: optional approximate nearest neighbour index over the private
+        memories.
+      index_tags: whether to index the leading tags of private memories.
+      embedding_dtype: precision the private embeddings are stored at.
+      max_pending_batches: number of `extend_async` batches that can wait for
+        the background embedder.
+      lexical_index: optional inverted index of the words of the private
+        memories, needed by the `lexical` and `hybrid` retrieval modes.
+    """
+    self._shared = shared_segment
+    super().__init__(
+        sentence_embedder=sentence_embedder,
+        batch_embedder=batch_embedder,
+        ann_index=ann_index,
+        index_tags=index_tags,
+        embedding_dtype=embedding_dtype,
+        max_pending_batches=max_pending_batches,
+        lexical_index=lexical_index,
+    )
+    self._stored_hashes.update(self._shared.digests)
+
+  @property
+  def shared_segment(self) -> SharedMemorySegment:
+    return self._shared
+
+  def set_state(self, state: entity_component.ComponentState) -> None:
+    """Restores the private memories from a state returned by `get_state`."""
+    super().set_state(state)
+    with self._memory_bank_lock:
+      self._stored_hashes.update(self._shared.digests)
+
+  def reembed(self, *args, **kwargs) -> None:
+    """Embeds the private memories again, see `AssociativeMemoryBank`.
+
+    Raises:
+      ValueError: if the shared segment is not empty, since its embeddings
+        would no longer be comparable with the private ones. Build a new
+        segment with the new embedder and banks on top of it instead.
+    """
+    if len(self._shared):
+      raise ValueError(
+          'The memories of a shared segment cannot be re-embedded by one of '
+          'its banks.'
+      )
+    super().reembed(*args, **kwargs)
+
+  def _get_top_k_cosine(self, x: np.ndarray, k: int) -> Sequence[str]:
+    x = np.asarray(x, dtype=np.float32).reshape(1, -1)
+    return self._get_top_k_cosine_batch(x, k)[0]
+
+  def _get_top_k_cosine_batch(
+      self, queries: np.ndarray, k: int
+  ) -> list[Sequence[str]]:
+    """Merges the top k of the shared and private memories of each query."""
+    queries = np.asarray(queries, dtype=np.float32)
+    self.wait_for_pending()
+    view = self._snapshot.view
+    if not len(self._shared):
+      return super()._get_top_k_cosine_batch(queries, k)
+    shared_rows, shared_scores = self._shared.scored_top_k_batch(queries, k)
+    if not view.size:
+      return [
+          [self._shared.texts[row] for row in rows] for rows in shared_rows
+      ]
+
+    private_top_k = self._top_k_rows_batch(view, queries, k)
+    embeddings = view.embedding_matrix()
+    results = []
+    for query, rows, top_shared_rows, top_shared_scores in zip(
+        queries, private_top_k, shared_rows, shared_scores
+    ):
+      rows = np.asarray(rows)
+      results.append(self._merge(
+          view, top_shared_rows, top_shared_scores,
+          rows, embeddings[rows] @ query, k,
+      ))
+    return results
+
+  def _get_top_k_lexical(self, query: str, k: int) -> Sequence[str]:
+    """Merges the top k of the shared and private memories by BM25 score.
+
+    The memories of each segment are scored with the word statistics of their
+    own segment.
+
+    Args:
+      query: the query text.
+      k: the number of memories to return.
+    """
+    self.wait_for_pending()
+    view = self._snapshot.view
+    shared_rows, shared_scores = self._shared.lexical_top_k(query, k)
+    rows, scores = self._lexical_index.search(query, k, view.size)
+    return self._merge(view, shared_rows, shared_scores, rows, scores, k)
+
+  def _get_top_k_hybrid(
+      self, query: str, x: np.ndarray, k: int
+  ) -> Sequence[str]:
+    """Merges the top k shared memories with a hybrid retrieval of the rest."""
+    x = np.asarray(x, dtype=np.float32).reshape(-1)
+    self.wait_for_pending()
+    view = self._snapshot.view
+    # The shared memories are few, so they are all scored densely.
+    shared_rows, shared_scores = self._shared.scored_top_k_batch(x[None], k)
+    rows = scores = np.empty(0)
+    if view.size:
+      rows, scores = self._hybrid_rows(view, query, x, k)
+    return self._merge(
+        view, shared_rows[0], shared_scores[0], rows, scores, k
+    )
+
+  def _merge(
+      self,
+      view: basic_associative_memory.StorageView,
+      shared_rows: np.ndarray,
+      shared_scores: np.ndarray,
+      rows: np.ndarray,
+      scores: np.ndarray,
+      k: int,
+  ) -> list[str]:
+    """Returns the texts of the k best shared and private rows by score."""
+    texts = [self._shared.texts[row] for row in shared_rows]
+    texts.extend(view.texts_at(rows))
+    scores = np.concatenate([shared_scores, scores])
+    return [texts[i] for i in ann_index_lib.top_k(scores, k)]
+
+  def scan(self, selector_fn: Callable[[str], bool]):
+    shared = [text for text in self._shared.texts if selector_fn(text)]
+    return shared + super().scan(selector_fn)
+
+  def retrieve_by_tag(
+      self,
+      tag: str,
+      k: int | None = None,
+  ) -> Sequence[str]:
+    private = super().retrieve_by_tag(tag, k)
+    return self._with_shared(self._shared.texts_with_tag(tag), private, k)
+
+  def retrieve_by_prefix(
+      self,
+      prefix: str,
+      k: int | None = None,
+  ) -> Sequence[str]:
+    private = super().retrieve_by_prefix(prefix, k)
+    if k is not None and len(private) >= k:
+      return private
+    shared = [text for text in self._shared.texts if text.startswith(prefix)]
+    return self._with_shared(shared, private, k)
+
+  def retrieve_recent(
+      self,
+      k: int = 1,
+  ) -> Sequence[str]:
+    private = super().retrieve_recent(k)
+    return self._with_shared(self._shared.texts, private, k)
+
+  def _with_shared(
+      self,
+      shared: Sequence[str],
+      private: Sequence[str],
+      k: int | None,
+  ) -> list[str]:
+    """Returns the most recent k of shared memories followed by private ones."""
+    if k is None:
+      return list(shared) + list(private)
+    num_shared = min(len(shared), k - len(private))
+    if num_shared <= 0:
+      return list(private)
+    return list(shared[len(shared) - num_shared:]) + list(private)
+
+  def __len__(self):
+    return len(self._shared) + super().__len__()
+
+  def get_all_memories_as_text(
+      self,
+  ) -> Sequence[str]:
+    return list(self._shared.texts) + list(super().get_all_memories_as_text())
+
+  def get_data_frame(self) -> pd.DataFrame:
+    """Returns the shared and private memories as a dataframe."""
+    shared = pd.DataFrame({
+        'text': list(self._shared.texts),
+        'embedding': list(self._shared.embeddings),
+    })
+    private = super().get_data_frame()
+    if not len(self._shared):
+      return private
+    if private.empty:
+      return shared
+    return pd.concat([shared, private], ignore_index=True)
+
+  def get_stats(self) -> Mapping[str, int]:
+    """Returns statistics about the memory bank.
+
+    Returns:
+      The statistics of `AssociativeMemoryBank.get_stats`, which only count
+      the private memories, and the number of shared memories.
+    """
+    return dict(super().get_stats(), num_shared_memories=len(self._shared))
@@ -0,0 +1,133 @@
+"""Tests for memory banks built on a shared segment."""
+
+from absl.testing import absltest
+from concordia.associative_memory import basic_associative_memory
+from concordia.associative_memory import lexical_index
+from concordia.associative_memory import shared_memory_bank
+import numpy as np
+
+
+def _one_hot_embedder(text: str) -> np.ndarray:
+  """Embeds a text as a one-hot vector of its first character."""
+  embedding = np.zeros(26)
+  embedding[ord(text[0].lower()) - ord('a')] = 1.0
+  return embedding
+
+
+_SHARED = ('[world] a town by the sea', 'bakery on the square', 'docks')
+
+
+class SharedBaseMemoryBankTest(absltest.TestCase):
+
+  def setUp(self):
+    super().setUp()
+    self._calls = []
+
+    def embedder(text):
+      self._calls.append(text)
+      return _one_hot_embedder(text)
+
+    self._embedder = embedder
+    self._segment = shared_memory_bank.SharedMemorySegment.embed(
+        _SHARED, sentence_embedder=embedder
+    )
+
+  def _make_bank(self):
+    return shared_memory_bank.SharedBaseMemoryBank(
+        self._segment, sentence_embedder=self._embedder
+    )
+
+  def test_shared_memories_are_embedded_once(self):
+    banks = [self._make_bank() for _ in range(3)]
+    for bank in banks:
+      bank.extend(list(_SHARED) + ['[world] private memory'])
+
+    # Each bank embeds its private memory, but none embeds the shared ones.
+    self.assertLen(self._calls, len(_SHARED) + 3)
+    self.assertEqual(
+        banks[0].get_all_memories_as_text(),
+        list(_SHARED) + ['[world] private memory'],
+    )
+    self.assertEqual(banks[0].get_stats()['num_shared_memories'], 3)
+    self.assertEqual(banks[0].get_stats()['num_memories'], 1)
+
+  def test_matches_bank_with_copies(self):
+    private = [f'{chr(ord("a") + i % 26)} memory {i}' for i in range(60)]
+    bank = self._make_bank()
+    bank.extend(private)
+    reference = basic_associative_memory.AssociativeMemoryBank(
+        sentence_embedder=_one_hot_embedder
+    )
+    reference.extend(list(_SHARED) + private)
+
+    self.assertLen(bank, len(reference))
+    # Each query matches exactly k memories.
+    for query, k in (('bread', 4), ('apple', 3), ('dock', 4)):
+      self.assertCountEqual(
+          bank.retrieve_associative(query, k=k),
+          reference.retrieve_associative(query, k=k),
+      )
+    for result, expected in zip(
+        bank.retrieve_associative_batch(['bread', 'dock'], k=4),
+        reference.retrieve_associative_batch(['bread', 'dock'], k=4),
+    ):
+      self.assertCountEqual(result, expected)
+    self.assertEqual(bank.retrieve_recent(62), reference.retrieve_recent(62))
+    self.assertEqual(
+        bank.retrieve_by_prefix('b', k=4), reference.retrieve_by_prefix('b', k=4)
+    )
+    self.assertEqual(
+        bank.scan(lambda text: text.startswith('d')),
+        reference.scan(lambda text: text.startswith('d')),
+    )
+
+  def test_tag_retrieval_continues_into_shared_memories(self):
+    bank = self._make_bank()
+    bank.add('[world] the tide is high')
+
+    self.assertEqual(
+        bank.retrieve_by_tag('[world]'),
+        ['[world] a town by the sea', '[world] the tide is high'],
+    )
+    self.assertEqual(
+        bank.retrieve_by_tag('[world]', k=1), ['[world] the tide is high']
+    )
+
+  def test_state_holds_private_memories(self):
+    bank = self._make_bank()
+    bank.add('private')
+    state = bank.get_state()
+
+    restored = self._make_bank()
+    restored.set_state(state)
+    restored.add('docks')
+
+    self.assertEqual(
+        restored.get_all_memories_as_text(), list(_SHARED) + ['private']
+    )
+    self.assertLen(restored.get_data_frame(), 4)
+
+  def test_lexical_and_hybrid_retrieval_include_shared_memories(self):
+    bank = shared_memory_bank.SharedBaseMemoryBank(
+        self._segment,
+        sentence_embedder=_one_hot_embedder,
+        lexical_index=lexical_index.BM25Index(),
+    )
+    bank.extend(['bakery closed early', 'apples at the market'])
+
+    self.assertCountEqual(
+        bank.retrieve_associative('the bakery', k=2, mode='lexical'),
+        ['bakery on the square', 'bakery closed early'],
+    )
+    self.assertCountEqual(
+        bank.retrieve_associative('bakery', k=2, mode='hybrid'),
+        ['bakery on the square', 'bakery closed early'],
+    )
+
+  def test_segment_rejects_mismatched_embeddings(self):
+    with self.assertRaises(ValueError):
+      shared_memory_bank.SharedMemorySegment(['a', 'b'], np.ones((1, 3)))
+
+
+if __name__ == '__main__':
+  absltest.main()
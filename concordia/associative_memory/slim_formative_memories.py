@@ -27,25 +27,36 @@ class SlimFormativeMemoryFactory:
       *,
       model: language_model.LanguageModel,
       embedder: Callable[[str], np.ndarray],
+      batch_embedder: associative_memory.BatchEmbedder | None = None,
       shared_memories: Sequence[str] = (),
       delimiter_symbol: str = '***',
       current_date: datetime.datetime | None = None,
+      share_memory_embeddings: bool = False,
   ):
     """Initializes the memory factory, loading parameters from environment variables.
 
     Args:
       model: The language model to use for generating memories.
       embedder: The text embedder to use.
+      batch_embedder: Optional embedder of many texts at once.
       shared_memories: Memories to be added to all agents.
       delimiter_symbol: The delimiter to split generated episodes.
       current_date: The date of the simulation.
+      share_memory_embeddings: Whether to embed the shared memories once and
+        build every agent's memory bank on top of them, see
+        `shared_memory_bank.SharedBaseMemoryBank`.
     """
     self._model = model
     self._delimiter_symbol = delimiter_symbol
-    self._blank_memory_factory_call = MemoryFactory(
-        embedder=embedder).make_blank_memory
+    self._memory_factory = MemoryFactory(
+        embedder=embedder, batch_embedder=batch_embedder)
+    self._blank_memory_factory_call = self._memory_factory.make_blank_memory
     self._shared_memories = shared_memories
     self._current_date = current_date
+    self._shared_segment = None
+    if share_memory_embeddings:
+      self._shared_segment = self._memory_factory.make_shared_segment(
+          shared_memories)
 
     # Load configurable parameters from environment variables with defaults
     self._sentences_per_episode = int(os.environ.get(
@@ -116,6 +127,10 @@ class SlimFormativeMemoryFactory:
       agent_config: AgentConfig,
   ) -> None:
     """Creates and adds formative memories to an agent's memory bank."""
+    memory.extend(self._make_formative_memories(agent_config))
+
+  def _make_formative_memories(self, agent_config: AgentConfig) -> list[str]:
+    """Returns the formative memories of the agent, in chronological order."""
     description = self.make_backstory(agent_config)
     episodes = self._generate_episodes(agent_config, description)
 
@@ -125,41 +140,45 @@ class SlimFormativeMemoryFactory:
           f'required ages ({len(agent_config.formative_ages)}).'
       )
 
+    memories = []
     for episode_age, episode in zip(agent_config.formative_ages, episodes):
       timestamp = None
       if agent_config.date_of_birth:
         timestamp = agent_config.date_of_birth + relativedelta(years=episode_age)
 
       memory_text = f'[{timestamp}] {episode.strip()}' if timestamp else episode.strip()
-      memory.add(memory_text)
+      memories.append(memory_text)
 
     if self._current_date and agent_config.date_of_birth:
       age = relativedelta(self._current_date, agent_config.date_of_birth).years
-      memory.add(f'[{self._current_date}] {agent_config.name} is {age} years old.')
+      memories.append(f'[{self._current_date}] {agent_config.name} is {age} years old.')
+    return memories
 
   def make_memories(
       self,
       agent_config: AgentConfig,
   ) -> associative_memory.AssociativeMemoryBank:
     """Creates a complete agent memory bank from the agent config."""
-    mem = self._blank_memory_factory_call()
-    for item in self._shared_memories:
-      mem.add(item)
+    memories = list(self._shared_memories)
 
     context = agent_config.context
     if agent_config.goal:
       context += f"\n{agent_config.name}'s goal is: {agent_config.goal}"
 
-    self.add_memories(memory=mem, agent_config=agent_config)
+    memories.extend(self._make_formative_memories(agent_config))
 
     if context:
-      for item in context.split('\n'):
-        if item:
-          mem.add(item)
+      memories.extend(item for item in context.split('\n') if item)
 
     if agent_config.specific_memories:
-      for item in agent_config.specific_memories.split('\n'):
-        if item:
-          mem.add(item)
+      memories.extend(
+          item for item in agent_config.specific_memories.split('\n') if item
+      )
 
+    if self._shared_segment is None:
+      mem = self._blank_memory_factory_call()
+    else:
+      # The shared memories are already in the segment and are not embedded.
+      mem = self._memory_factory.make_shared_base_memory(self._shared_segment)
+    mem.extend(memories)
     return mem
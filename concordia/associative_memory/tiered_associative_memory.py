@@ -0,0 +1,299 @@
+"""A disk-backed associative memory bank with a bounded in-memory hot tier."""
+
+from collections.abc import Callable, Iterable, Mapping
+from typing import Any
+
+from concordia.associative_memory import ann_index as ann_index_lib
+from concordia.associative_memory import basic_associative_memory
+from concordia.associative_memory import disk_associative_memory
+from concordia.associative_memory import lexical_index as lexical_index_lib
+import numpy as np
+
+
+_FLOAT32_BYTES = 4
+# Evicted rows are only released once they are this many, or a quarter of the
+# hot rows, so that compacting the hot tier is amortized over many evictions.
+_MIN_COMPACTION_ROWS = 64
+
+
+class _TierCounters:
+  """Counts the memories read from each tier.
+
+  Shared by the views of a bank. Readers update it without holding the lock,
+  so the counts are approximate under concurrent reads.
+  """
+
+  def __init__(self):
+    self.hot_reads = 0
+    self.cold_reads = 0
+
+
+class TieredStorageView(basic_associative_memory.StorageView):
+  """A read-only view of a tiered bank.
+
+  Rows [0, hot_start) are only on disk, rows [hot_start, size) are also held
+  in memory. The embedding matrix covers all rows through the memory-mapped
+  files, so that an approximate nearest neighbour index can train on it.
+  """
+
+  def __init__(
+      self,
+      cold: disk_associative_memory.DiskStorageView,
+      embeddings: np.ndarray | None,
+      hot_texts: list[str],
+      hot_embeddings: np.ndarray,
+      hot_base: int,
+      hot_start: int,
+      size: int,
+      counters: _TierCounters,
+  ):
+    """Initializes the view.
+
+    Args:
+      cold: a view of the rows in the files, of size `hot_start`.
+      embeddings: the memory-mapped embeddings of all the rows, or None if the
+        bank is empty.
+      hot_texts: texts of the rows from `hot_base` on, at least up to `size`.
+      hot_embeddings: embeddings of the rows from `hot_base` on.
+      hot_base: the row of the first element of `hot_texts`.
+      hot_start: the first row held in memory, at least `hot_base`.
+      size: the number of memories in the view.
+      counters: counters of the reads from each tier.
+    """
+    super().__init__(texts=(), embeddings=embeddings, size=size)
+    self._cold = cold
+    self._hot_texts = hot_texts
+    self._hot_embeddings = hot_embeddings
+    self._hot_base = hot_base
+    self.hot_start = hot_start
+    self._counters = counters
+
+  def read_texts(self, start: int, stop: int) -> list[str]:
+    stop = min(stop, self.size)
+    texts = []
+    if start < self.hot_start:
+      texts = self._cold.read_texts(start, min(stop, self.hot_start))
+      self._counters.cold_reads += len(texts)
+    hot_texts = self._hot_texts[
+        max(start, self.hot_start) - self._hot_base : stop - self._hot_base
+    ]
+    self._counters.hot_reads += len(hot_texts)
+    return texts + hot_texts
+
+  def texts_at(self, rows: Iterable[int]) -> list[str]:
+    rows = list(rows)
+    cold_positions = [i for i, row in enumerate(rows) if row < self.hot_start]
+    cold_texts = self._cold.texts_at(rows[i] for i in cold_positions)
+    texts = [
+        self._hot_texts[row - self._hot_base] if row >= self.hot_start else ''
+        for row in rows
+    ]
+    for i, text in zip(cold_positions, cold_texts):
+      texts[i] = text
+    self._counters.cold_reads += len(cold_positions)
+    self._counters.hot_reads += len(rows) - len(cold_positions)
+    return texts
+
+  def embedding_matrix(self) -> np.ndarray:
+    if self._embeddings is None:
+      return self._cold.embedding_matrix()
+    return self._embeddings[:self.size]
+
+  def exact_top_k(self, x: np.ndarray, k: int) -> np.ndarray:
+    return self.exact_top_k_batch(x.reshape(1, -1), k)[0]
+
+  def exact_top_k_batch(self, queries: np.ndarray, k: int) -> np.ndarray:
+    """Merges the top k of the hot rows with a scan of the cold rows."""
+    cold_rows, cold_scores = self._cold.scored_top_k_batch(queries, k)
+    hot = self._hot_embeddings[
+        self.hot_start - self._hot_base : self.size - self._hot_base
+    ]
+    hot_scores = queries @ hot.T
+    hot_top_k = ann_index_lib.top_k_per_row(hot_scores, k)
+    rows = np.concatenate([cold_rows, hot_top_k + self.hot_start], axis=1)
+    scores = np.concatenate(
+        [cold_scores, np.take_along_axis(hot_scores, hot_top_k, axis=1)],
+        axis=1,
+    )
+    keep = ann_index_lib.top_k_per_row(scores, k)
+    return np.take_along_axis(rows, keep, axis=1)
+
+
+class TieredAssociativeMemoryBank(
+    disk_associative_memory.DiskAssociativeMemoryBank
+):
+  """A disk bank that keeps its most recent memories in memory.
+
+  Every memory is written through to the files of a `DiskAssociativeMemoryBank`
+  in `directory`, which form the cold tier. The texts and embeddings of the
+  most recent memories also stay in memory, up to `max_hot_memories` of them
+  and, if given, `max_hot_bytes` of texts and embeddings. Older memories are
+  evicted from memory as new ones arrive.
+
+  `retrieve_recent` reads the hot tier only, as long as no more than the hot
+  memories are asked for. Associative retrieval scores the hot memories in
+  memory and scans the cold ones from disk, or, given an `ann_index`, searches
+  the whole bank through the index, whose centroids and inverted lists stay in
+  memory. Results are the same as those of an in-memory bank; retrieving cold
+  memories is only slower.
+  """
+
+  def __init__(
+      self,
+      directory: str,
+      sentence_embedder: Callable[[str], np.ndarray] | None = None,
+      batch_embedder: basic_associative_memory.BatchEmbedder | None = None,
+      ann_index: ann_index_lib.IVFIndex | None = None,
+      index_tags: bool = True,
+      *,
+      max_hot_memories: int = 10_000,
+      max_hot_bytes: int | None = None,
+      chunk_size: int = 4096,
+      block_size: int = 65536,
+      lexical_index: lexical_index_lib.BM25Index | None = None,
+  ):
+    """Constructor.
+
+    Args:
+      directory: directory holding the files of the bank. Memories already
+        stored there are loaded, the most recent into the hot tier.
+      sentence_embedder: text embedding model, see `AssociativeMemoryBank`.
+      batch_embedder: optional embedder of many texts at once.
+      ann_index: optional approximate nearest neighbour index.
+      index_tags: whether to index the leading tags of memories.
+      max_hot_memories: the maximum number of memories kept in memory.
+      max_hot_bytes: optional maximum size in bytes of the UTF-8 texts and
+        float32 embeddings of the memories kept in memory.
+      chunk_size: number of rows by which the embeddings file grows.
+      block_size: number of rows scored at a time when scanning cold memories.
+      lexical_index: optional inverted index of the words of the memories.
+    """
+    if max_hot_memories < 0:
+      raise ValueError('max_hot_memories must not be negative.')
+    if max_hot_bytes is not None and max_hot_bytes < 0:
+      raise ValueError('max_hot_bytes must not be negative.')
+    self._max_hot_memories = max_hot_memories
+    self._max_hot_bytes = max_hot_bytes
+    self._counters = _TierCounters()
+    self._num_evicted = 0
+    super().__init__(
+        directory,
+        sentence_embedder=sentence_embedder,
+        batch_embedder=batch_embedder,
+        ann_index=ann_index,
+        index_tags=index_tags,
+        chunk_size=chunk_size,
+        block_size=block_size,
+        lexical_index=lexical_index,
+    )
+
+  def _init_storage(self) -> None:
+    super()._init_storage()
+    self._load_hot()
+
+  def _swap_storage(self, storage: Any) -> None:
+    super()._swap_storage(storage)
+    self._load_hot()
+
+  def _load_hot(self) -> None:
+    """Fills the hot tier with the most recent stored memories."""
+    start = max(0, self._size - self._max_hot_memories)
+    texts = self._disk_view().read_texts(start, self._size)
+    if self._embeddings is None:
+      embeddings = np.empty((0, 0), dtype=np.float32)
+    else:
+      embeddings = np.array(self._embeddings[start:self._size])
+    self._hot_texts = texts
+    self._hot_embeddings = embeddings
+    self._hot_row_bytes = [
+        len(text.encode('utf-8')) + embeddings.shape[1] * _FLOAT32_BYTES
+        for text in texts
+    ]
+    self._hot_bytes = sum(self._hot_row_bytes)
+    self._hot_base = start
+    self._hot_start = start
+    self._evict()
+
+  def _make_view(self) -> basic_associative_memory.StorageView:
+    self._texts_file.flush()
+    cold = self._disk_view()
+    cold.size = self._hot_start
+    return TieredStorageView(
+        cold=cold,
+        embeddings=self._embeddings,
+        hot_texts=self._hot_texts,
+        hot_embeddings=self._hot_embeddings,
+        hot_base=self._hot_base,
+        hot_start=self._hot_start,
+        size=self._size,
+        counters=self._counters,
+    )
+
+  def _append(self, text: str, embedding: np.ndarray) -> None:
+    super()._append(text, embedding)
+    row = self._size - 1 - self._hot_base
+    if row == self._hot_embeddings.shape[0]:
+      # Views share the hot arrays, so they are replaced rather than resized.
+      grown = np.zeros(
+          (max(2 * row, self._chunk_size), self._dim), dtype=np.float32
+      )
+      if row:
+        grown[:row] = self._hot_embeddings[:row]
+      self._hot_embeddings = grown
+    self._hot_embeddings[row] = self._embeddings[self._size - 1]
+    self._hot_texts.append(text)
+    row_bytes = len(text.encode('utf-8')) + self._dim * _FLOAT32_BYTES
+    self._hot_row_bytes.append(row_bytes)
+    self._hot_bytes += row_bytes
+    self._evict()
+
+  def _evict(self) -> None:
+    """Evicts the oldest hot memories until the budgets are met."""
+    while self._hot_start < self._size and (
+        self._size - self._hot_start > self._max_hot_memories
+        or (
+            self._max_hot_bytes is not None
+            and self._hot_bytes > self._max_hot_bytes
+        )
+    ):
+      self._hot_bytes -= self._hot_row_bytes[self._hot_start - self._hot_base]
+      self._hot_start += 1
+      self._num_evicted += 1
+
+    num_dead = self._hot_start - self._hot_base
+    num_live = self._size - self._hot_start
+    if num_dead >= max(num_live // 4, _MIN_COMPACTION_ROWS):
+      # Older views keep the previous arrays, so copies are made.
+      self._hot_texts = self._hot_texts[num_dead:]
+      self._hot_row_bytes = self._hot_row_bytes[num_dead:]
+      embeddings = np.zeros(
+          (max(2 * num_live, self._chunk_size), self._dim), dtype=np.float32
+      )
+      embeddings[:num_live] = self._hot_embeddings[num_dead : num_dead + num_live]
+      self._hot_embeddings = embeddings
+      self._hot_base = self._hot_start
+
+  def get_stats(self) -> Mapping[str, int]:
+    """Returns statistics about the memory bank.
+
+    Returns:
+      The statistics of `AssociativeMemoryBank.get_stats`, the number of
+      memories in the hot and cold tiers, the bytes of text and embeddings
+      used by the hot tier, the number of memories evicted from it so far, and
+      the number of memories read from each tier, both to retrieve them and to
+      index their tags.
+    """
+    stats = dict(super().get_stats())
+    view = self._snapshot.view
+    with self._memory_bank_lock:
+      hot_bytes = self._hot_bytes
+      num_evicted = self._num_evicted
+    stats.update(
+        num_hot=view.size - view.hot_start,
+        num_cold=view.hot_start,
+        hot_bytes=hot_bytes,
+        num_evicted=num_evicted,
+        hot_reads=self._counters.hot_reads,
+        cold_reads=self._counters.cold_reads,
+    )
+    return stats
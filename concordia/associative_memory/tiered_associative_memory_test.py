@@ -0,0 +1,115 @@
+"""Tests for the tiered associative memory bank."""
+
+import tempfile
+
+from absl.testing import absltest
+from concordia.associative_memory import basic_associative_memory
+from concordia.associative_memory import tiered_associative_memory
+import numpy as np
+
+
+def _one_hot_embedder(text: str) -> np.ndarray:
+  """Embeds a text as a one-hot vector of its first character."""
+  embedding = np.zeros(26)
+  embedding[ord(text[0].lower()) - ord('a')] = 1.0
+  return embedding
+
+
+def _texts(num: int) -> list[str]:
+  return [f'{chr(ord("a") + i % 26)} memory {i}' for i in range(num)]
+
+
+class TieredAssociativeMemoryBankTest(absltest.TestCase):
+
+  def setUp(self):
+    super().setUp()
+    self._directory = self.enter_context(tempfile.TemporaryDirectory())
+
+  def _make_bank(self, **kwargs):
+    return tiered_associative_memory.TieredAssociativeMemoryBank(
+        self._directory, sentence_embedder=_one_hot_embedder, **kwargs
+    )
+
+  def test_matches_in_memory_bank(self):
+    texts = _texts(300)
+    bank = self._make_bank(max_hot_memories=40, chunk_size=16, block_size=7)
+    reference = basic_associative_memory.AssociativeMemoryBank(
+        sentence_embedder=_one_hot_embedder
+    )
+    bank.extend(texts[:100])
+    for text in texts[100:]:
+      bank.add(text)
+    reference.extend(texts)
+
+    self.assertLen(bank, 300)
+    self.assertEqual(bank.retrieve_recent(60), reference.retrieve_recent(60))
+    self.assertEqual(
+        bank.get_all_memories_as_text(), reference.get_all_memories_as_text()
+    )
+    self.assertCountEqual(
+        bank.retrieve_associative('query', k=11),
+        reference.retrieve_associative('query', k=11),
+    )
+    for result, expected in zip(
+        bank.retrieve_associative_batch(['query', 'bread'], k=11),
+        reference.retrieve_associative_batch(['query', 'bread'], k=11),
+    ):
+      self.assertCountEqual(result, expected)
+
+  def test_recent_memories_are_read_from_memory(self):
+    bank = self._make_bank(max_hot_memories=10)
+    bank.extend(_texts(100))
+
+    cold_reads = bank.get_stats()['cold_reads']
+    self.assertEqual(bank.retrieve_recent(10), _texts(100)[-10:])
+    stats = bank.get_stats()
+
+    self.assertEqual(stats['cold_reads'], cold_reads)
+    self.assertEqual(stats['num_hot'], 10)
+    self.assertEqual(stats['num_cold'], 90)
+    self.assertEqual(stats['num_evicted'], 90)
+
+  def test_cold_memories_are_retrieved(self):
+    bank = self._make_bank(max_hot_memories=2)
+    bank.extend(['apple', 'banana', 'cherry', 'date'])
+    cold_reads = bank.get_stats()['cold_reads']
+
+    self.assertEqual(bank.retrieve_associative('avocado', k=1), ['apple'])
+    self.assertEqual(bank.get_stats()['cold_reads'], cold_reads + 1)
+
+  def test_byte_budget(self):
+    bank = self._make_bank(max_hot_bytes=3 * (26 * 4 + 10))
+    bank.extend([f'{letter}123456789' for letter in 'abcdefgh'])
+
+    stats = bank.get_stats()
+    self.assertEqual(stats['num_hot'], 3)
+    self.assertLessEqual(stats['hot_bytes'], 3 * (26 * 4 + 10))
+    self.assertEqual(bank.retrieve_associative('h', k=1), ['h123456789'])
+
+  def test_reopen_loads_recent_memories(self):
+    bank = self._make_bank(max_hot_memories=3)
+    bank.extend(_texts(10))
+    bank.close()
+
+    reopened = self._make_bank(max_hot_memories=3)
+
+    stats = reopened.get_stats()
+    self.assertEqual((stats['num_hot'], stats['num_cold']), (3, 7))
+    self.assertEqual(reopened.retrieve_recent(3), _texts(10)[-3:])
+    self.assertEqual(reopened.get_stats()['cold_reads'], stats['cold_reads'])
+
+  def test_set_state_truncates_hot_tier(self):
+    bank = self._make_bank(max_hot_memories=4)
+    bank.extend(_texts(6))
+    state = bank.get_state()
+    bank.extend(['x extra', 'y extra'])
+
+    bank.set_state(state)
+
+    self.assertEqual(bank.retrieve_recent(5), _texts(6)[-5:])
+    self.assertEqual(bank.get_all_memories_as_text(), _texts(6))
+    self.assertEqual(bank.get_stats()['num_hot'], 4)
+
+
+if __name__ == '__main__':
+  absltest.main()
@@ -3,11 +3,13 @@
 """A component that ignores the action spec in the `pre_act` method."""
 
 import abc
+import asyncio
 import threading
 from typing import Final, Any
 
 from concordia.type_checks import entity as entity_lib
 from concordia.type_checks import entity_component
+from concordia.utils import concurrency
 from typing_extensions import override
 
 
@@ -22,11 +24,16 @@ class ActionSpecIgnored(
   implement `_make_pre_act_value` and `pre_act_label` instead of
   `pre_act`. The pre_act context will be constructed as `f'{key}: {value}'`.
   This will be cached and cleaned up in `update`.
+
+  Derived classes calling the language model can also implement
+  `_async_make_pre_act_value` with its asynchronous methods, which
+  `async_pre_act` uses to make the value without a thread.
   """
 
   def __init__(self, pre_act_label: str):
     super().__init__()
     self._pre_act_value: str | None = None
+    self._pre_act_task: asyncio.Future[str] | None = None
     self._pre_act_label: Final[str] = pre_act_label
     self._lock: threading.Lock = threading.Lock()
 
@@ -35,6 +42,14 @@ class ActionSpecIgnored(
     """Creates the pre-act value."""
     raise NotImplementedError()
 
+  async def _async_make_pre_act_value(self) -> str:
+    """Creates the pre-act value without blocking the event loop.
+
+    The default implementation runs `_make_pre_act_value` in a worker thread
+    of the event loop.
+    """
+    return await concurrency.to_thread(self._make_pre_act_value)
+
   def get_pre_act_value(self) -> str:
     """Gets the pre-act value.
 
@@ -45,6 +60,49 @@ class ActionSpecIgnored(
     Raises:
       ValueError: If the entity is not in the `PRE_ACT` or `POST_ACT` phase.
     """
+    self._check_pre_act_phase()
+    with self._lock:
+      if self._pre_act_value is None:
+        self._pre_act_value = self._make_pre_act_value()
+      return self._pre_act_value
+
+  async def async_get_pre_act_value(self) -> str:
+    """Gets the pre-act value without blocking the event loop.
+
+    The value is made once by `_async_make_pre_act_value`, even when other
+    components ask for it while it is being made.
+
+    Returns:
+      The pre-act value, see `get_pre_act_value`.
+
+    Raises:
+      ValueError: If the entity is not in the `PRE_ACT` or `POST_ACT` phase.
+    """
+    if concurrency.overrides_sync_only(
+        self, "get_pre_act_value", "async_get_pre_act_value"
+    ):
+      return await concurrency.to_thread(self.get_pre_act_value)
+    self._check_pre_act_phase()
+    with self._lock:
+      if self._pre_act_value is not None:
+        return self._pre_act_value
+      if self._pre_act_task is None:
+        if concurrency.overrides_sync_only(
+            self, "_make_pre_act_value", "_async_make_pre_act_value"
+        ):
+          make_value = concurrency.to_thread(self._make_pre_act_value)
+        else:
+          make_value = self._async_make_pre_act_value()
+        self._pre_act_task = asyncio.ensure_future(make_value)
+      task = self._pre_act_task
+    value = await task
+    with self._lock:
+      if self._pre_act_value is None:
+        self._pre_act_value = value
+      return self._pre_act_value
+
+  def _check_pre_act_phase(self) -> None:
+    """Raises a ValueError outside of the `PRE_ACT` and `POST_ACT` phases."""
     if (
         self.get_entity().get_phase() != entity_component.Phase.PRE_ACT
         and self.get_entity().get_phase() != entity_component.Phase.POST_ACT
@@ -54,11 +112,6 @@ class ActionSpecIgnored(
           "`POST_ACT` phase. The entity is currently in the "
           f"{self.get_entity().get_phase()} phase.")
 
-    with self._lock:
-      if self._pre_act_value is None:
-        self._pre_act_value = self._make_pre_act_value()
-      return self._pre_act_value
-
   def get_pre_act_label(self) -> str:
     """Returns the key used as a prefix in the string returned by `pre_act`."""
     return self._pre_act_label
@@ -70,15 +123,33 @@ class ActionSpecIgnored(
     del action_spec
     return f"{self.get_pre_act_label()}:\n{self.get_pre_act_value()}\n"
 
+  @override
+  async def async_pre_act(
+      self,
+      action_spec: entity_lib.ActionSpec,
+  ) -> str:
+    if concurrency.overrides_sync_only(self, "pre_act", "async_pre_act"):
+      return await super().async_pre_act(action_spec)
+    value = await self.async_get_pre_act_value()
+    return f"{self.get_pre_act_label()}:\n{value}\n"
+
   def update(self) -> None:
     with self._lock:
       self._pre_act_value = None
+      self._pre_act_task = None
 
   def get_named_component_pre_act_value(self, component_name: str) -> str:
     """Returns the pre-act value of a named component of the parent entity."""
     return self.get_entity().get_component(
         component_name, type_=ActionSpecIgnored).get_pre_act_value()
 
+  async def async_get_named_component_pre_act_value(
+      self, component_name: str
+  ) -> str:
+    """Returns the pre-act value of a named component without blocking."""
+    return await self.get_entity().get_component(
+        component_name, type_=ActionSpecIgnored).async_get_pre_act_value()
+
   @override
   def set_state(self, state: entity_component.ComponentState) -> Any:
     return None
@@ -68,7 +68,9 @@ COMPONENT_FACTORIES = {
             "memory_bank": memory_bank.get_state(),
             "buffer": ["Fake memory"],
         },
-        "skip_keys": {"_model", "_lock", "_memory_bank_lock"},
+        "skip_keys": {
+            "_model", "_lock", "_memory_bank_lock", "_pending_slots"
+        },
     },
     "report_function": {
         "component_class": report_function.ReportFunction,
@@ -166,5 +168,54 @@ class AgentComponentTest(parameterized.TestCase):
     deep_compare_components(component_a, component_b, self, skip_keys)
 
 
+class _ScanOnlyMemory(memory.Memory):
+  """A memory implementing only `scan`, to test the default retrievals."""
+
+  def __init__(self, memories: list[str]):
+    self._memories = memories
+
+  def scan(self, selector_fn):
+    return [mem for mem in self._memories if selector_fn(mem)]
+
+
+class MemoryTest(absltest.TestCase):
+  """Tests for the default retrievals of the memory component."""
+
+  def setUp(self):
+    super().setUp()
+    self._memory = _ScanOnlyMemory([
+        "[event] Alice left.",
+        "[observation] [event] Bob arrived.",
+        "Alice said [event] loudly.",
+        "[observation] The sun rose.",
+        "[event] Carol sang.",
+    ])
+
+  def test_retrieve_by_tag(self):
+    self.assertEqual(
+        self._memory.retrieve_by_tag("[event]"),
+        [
+            "[event] Alice left.",
+            "[observation] [event] Bob arrived.",
+            "[event] Carol sang.",
+        ],
+    )
+    self.assertEqual(
+        self._memory.retrieve_by_tag("[event]", limit=2),
+        ["[observation] [event] Bob arrived.", "[event] Carol sang."],
+    )
+
+  def test_retrieve_by_prefix(self):
+    self.assertEqual(
+        self._memory.retrieve_by_prefix("[observation]"),
+        ["[observation] [event] Bob arrived.", "[observation] The sun rose."],
+    )
+    self.assertEqual(
+        self._memory.retrieve_by_prefix("Alice", limit=5),
+        ["Alice said [event] loudly."],
+    )
+    self.assertEqual(self._memory.retrieve_by_prefix("[event]", limit=0), [])
+
+
 if __name__ == "__main__":
   absltest.main()
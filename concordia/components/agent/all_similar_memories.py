@@ -26,6 +26,7 @@ class AllSimilarMemories(
       components: Sequence[str] = (),
       num_memories_to_retrieve: int = 25,
       pre_act_label: str = 'Relevant memories',
+      retrieval_mode: str = 'dense',
   ):
     """Initialize a component to report relevant memories (similar to a prompt).
 
@@ -37,12 +38,17 @@ class AllSimilarMemories(
       num_memories_to_retrieve: The number of memories to retrieve.
       pre_act_label: Prefix to add to the output of the component when called
         in `pre_act`.
+      retrieval_mode: The mode of the associative retrieval, see
+        `memory_component.AssociativeMemory.retrieve_associative`. On large
+        memory banks with a lexical index, `hybrid` only scores the memories
+        sharing words, such as names, with the query.
     """
     super().__init__(pre_act_label)
     self._model = model
     self._memory_component_key = memory_component_key
     self._components = components
     self._num_memories_to_retrieve = num_memories_to_retrieve
+    self._retrieval_mode = retrieval_mode
 
   def get_component_pre_act_label(self, component_name: str) -> str:
     """Returns the pre-act label of a named component of the parent entity."""
@@ -78,7 +84,9 @@ class AllSimilarMemories(
     result = '\n'.join([
         mem
         for mem in memory.retrieve_associative(
-            query=query, limit=self._num_memories_to_retrieve
+            query=query,
+            limit=self._num_memories_to_retrieve,
+            mode=self._retrieval_mode,
         )
     ])
 
@@ -8,6 +8,7 @@ from concordia.document import interactive_document
 from concordia.language_model import language_model
 from concordia.type_checks import entity as entity_lib
 from concordia.type_checks import entity_component
+from concordia.utils import concurrency
 from typing_extensions import override
 
 
@@ -90,21 +91,13 @@ class ConcatActComponent(
       contexts: entity_component.ComponentContextMapping,
       action_spec: entity_lib.ActionSpec,
   ) -> str:
-    prompt = interactive_document.InteractiveDocument(self._model)
-    context = self._context_for_action(contexts)
-    prompt.statement(context + '\n')
-
-    call_to_action = action_spec.call_to_action.format(
-        name=self.get_entity().name
-    )
+    prompt, call_to_action = self._make_prompt(contexts, action_spec)
     if action_spec.output_type in entity_lib.FREE_ACTION_TYPES:
-      output = ''
-      if self._prefix_entity_name:
-        output = self.get_entity().name + ' '
-      output += prompt.open_question(
+      prefix = self._answer_prefix()
+      output = prefix + prompt.open_question(
           call_to_action,
           max_tokens=2200,
-          answer_prefix=output,
+          answer_prefix=prefix,
           terminators=(),
           question_label='Exercise',
       )
@@ -119,26 +112,103 @@ class ConcatActComponent(
       output = action_spec.options[idx]
       self._log(output, prompt)
       return output
-    elif action_spec.output_type == entity_lib.OutputType.FLOAT:
-      if self._prefix_entity_name:
-        prefix = self.get_entity().name + ' '
-      else:
-        prefix = ''
+    else:
       sampled_text = prompt.open_question(
+          call_to_action,
+          max_tokens=2200,
+          answer_prefix=self._answer_prefix(),
+      )
+      return self._float_output(sampled_text, prompt)
+
+  @override
+  async def async_get_action_attempt(
+      self,
+      contexts: entity_component.ComponentContextMapping,
+      action_spec: entity_lib.ActionSpec,
+  ) -> str:
+    if concurrency.overrides_sync_only(
+        self, 'get_action_attempt', 'async_get_action_attempt'
+    ):
+      return await super().async_get_action_attempt(contexts, action_spec)
+    prompt, call_to_action = self._make_prompt(contexts, action_spec)
+    if action_spec.output_type in entity_lib.FREE_ACTION_TYPES:
+      prefix = self._answer_prefix()
+      output = prefix + await prompt.async_open_question(
           call_to_action,
           max_tokens=2200,
           answer_prefix=prefix,
+          terminators=(),
+          question_label='Exercise',
+      )
+      self._log(output, prompt)
+      return output
+    elif action_spec.output_type in entity_lib.CHOICE_ACTION_TYPES:
+      idx = await prompt.async_multiple_choice_question(
+          question=call_to_action,
+          answers=action_spec.options,
+          randomize_choices=self._randomize_choices,
       )
-      self._log(sampled_text, prompt)
-      try:
-        return str(float(sampled_text))
-      except ValueError:
-        return '0.0'
+      output = action_spec.options[idx]
+      self._log(output, prompt)
+      return output
     else:
+      sampled_text = await prompt.async_open_question(
+          call_to_action,
+          max_tokens=2200,
+          answer_prefix=self._answer_prefix(),
+      )
+      return self._float_output(sampled_text, prompt)
+
+  def _make_prompt(
+      self,
+      contexts: entity_component.ComponentContextMapping,
+      action_spec: entity_lib.ActionSpec,
+  ) -> tuple[interactive_document.InteractiveDocument, str]:
+    """Returns the prompt with the contexts, and the call to action.
+
+    Args:
+      contexts: the contexts of the components.
+      action_spec: the action spec of the action attempt.
+
+    Raises:
+      NotImplementedError: if the output type of the action spec is not
+        supported.
+    """
+    if (
+        action_spec.output_type not in entity_lib.FREE_ACTION_TYPES
+        and action_spec.output_type not in entity_lib.CHOICE_ACTION_TYPES
+        and action_spec.output_type != entity_lib.OutputType.FLOAT
+    ):
       raise NotImplementedError(
           f'Unsupported output type: {action_spec.output_type}. '
           'Supported output types are: FREE, CHOICE, and FLOAT.'
       )
+    prompt = interactive_document.InteractiveDocument(self._model)
+    context = self._context_for_action(contexts)
+    prompt.statement(context + '\n')
+
+    call_to_action = action_spec.call_to_action.format(
+        name=self.get_entity().name
+    )
+    return prompt, call_to_action
+
+  def _answer_prefix(self) -> str:
+    """Returns the prefix of free and float actions."""
+    if self._prefix_entity_name:
+      return self.get_entity().name + ' '
+    return ''
+
+  def _float_output(
+      self,
+      sampled_text: str,
+      prompt: interactive_document.InteractiveDocument,
+  ) -> str:
+    """Logs the answer to a float action and returns it as a float."""
+    self._log(sampled_text, prompt)
+    try:
+      return str(float(sampled_text))
+    except ValueError:
+      return '0.0'
 
   def _log(self,
            result: str,
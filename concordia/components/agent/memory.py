@@ -15,6 +15,13 @@ import pandas as pd
 DEFAULT_MEMORY_COMPONENT_KEY = '__memory__'
 
 
+def _most_recent(memories: Sequence[str], limit: int | None) -> Sequence[str]:
+  """Returns up to `limit` of the last memories, or all if `limit` is None."""
+  if limit is None:
+    return memories
+  return memories[max(len(memories) - limit, 0):]
+
+
 class Memory(entity_component.ContextComponent):
   """A component backed by a memory bank."""
 
@@ -68,6 +75,43 @@ class Memory(entity_component.ContextComponent):
     """
     raise NotImplementedError()
 
+  def retrieve_by_tag(
+      self,
+      tag: str,
+      limit: int | None = None,
+  ) -> Sequence[str]:
+    """Retrieves memories that start with a bracketed tag.
+
+    Args:
+      tag: The tag, e.g. `'[event]'`, among the leading tags of the memories.
+      limit: If given, the number of most recent memories to retrieve.
+
+    Returns:
+      A list of memory results, sorted by their recency.
+    """
+    return _most_recent(
+        self.scan(
+            lambda mem: tag in basic_associative_memory.leading_tags(mem)
+        ),
+        limit,
+    )
+
+  def retrieve_by_prefix(
+      self,
+      prefix: str,
+      limit: int | None = None,
+  ) -> Sequence[str]:
+    """Retrieves memories that start with a prefix.
+
+    Args:
+      prefix: The prefix of the memories to retrieve.
+      limit: If given, the number of most recent memories to retrieve.
+
+    Returns:
+      A list of memory results, sorted by their recency.
+    """
+    return _most_recent(self.scan(lambda mem: mem.startswith(prefix)), limit)
+
   def add(
       self,
       text: str,
@@ -104,18 +148,28 @@ class AssociativeMemory(Memory):
   This component caches additions to the memory bank issued within an `act` or
   `observe` call. The new memories are committed to the memory bank during the
   `UPDATE` phase.
+
+  The lock of the component only guards its buffer. Retrievals go straight to
+  the memory bank, which serves concurrent readers without blocking.
   """
 
   def __init__(
       self,
       memory_bank: basic_associative_memory.AssociativeMemoryBank,
+      background_embedding: bool = False,
   ):
     """Initializes the associative memory.
 
     Args:
       memory_bank: The memory bank to use.
+      background_embedding: If True, `update` hands the new memories to the
+        memory bank's background embedder instead of embedding them before it
+        returns, so embedding overlaps with what the simulation does next. The
+        texts of the new memories are visible to retrieval right away, while
+        `retrieve_associative` waits until they are embedded.
     """
     self._memory_bank = memory_bank
+    self._background_embedding = background_embedding
     self._lock = threading.Lock()
     self._buffer = []
 
@@ -135,20 +189,46 @@ class AssociativeMemory(Memory):
       self,
       query: str,
       limit: int = 1,
+      mode: str = 'dense',
   ) -> Sequence[str]:
     """Retrieves memories most closely matching a query.
 
     Args:
       query: The query to use for retrieval.
       limit: The number of memories to retrieve.
+      mode: The retrieval mode, one of
+        `basic_associative_memory.RETRIEVAL_MODES`. The `lexical` and `hybrid`
+        modes need a memory bank with a lexical index.
 
     Returns:
-      A list of memory results, sorted by their cosine similarity to the query.
+      A list of memory results, sorted by their cosine similarity to the query,
+      or by their lexical score in `lexical` mode.
     """
     self._check_phase()
 
-    with self._lock:
-      return self._memory_bank.retrieve_associative(query, limit)
+    return self._memory_bank.retrieve_associative(query, limit, mode=mode)
+
+  def retrieve_associative_batch(
+      self,
+      queries: Sequence[str],
+      limit: int = 1,
+  ) -> list[Sequence[str]]:
+    """Retrieves memories most closely matching each of several queries.
+
+    All queries are embedded and scored together, which is cheaper than
+    calling `retrieve_associative` once per query.
+
+    Args:
+      queries: The queries to use for retrieval.
+      limit: The number of memories to retrieve per query.
+
+    Returns:
+      For each query, a list of memory results, sorted by their cosine
+      similarity to the query.
+    """
+    self._check_phase()
+
+    return self._memory_bank.retrieve_associative_batch(queries, limit)
 
   def retrieve_recent(
       self,
@@ -165,8 +245,7 @@ class AssociativeMemory(Memory):
 
     self._check_phase()
 
-    with self._lock:
-      return self._memory_bank.retrieve_recent(limit)
+    return self._memory_bank.retrieve_recent(limit)
 
   def scan(
       self,
@@ -182,8 +261,41 @@ class AssociativeMemory(Memory):
       A list of memory results, sorted by their recency.
     """
     self._check_phase()
-    with self._lock:
-      return self._memory_bank.scan(selector_fn)
+    return self._memory_bank.scan(selector_fn)
+
+  def retrieve_by_tag(
+      self,
+      tag: str,
+      limit: int | None = None,
+  ) -> Sequence[str]:
+    """Retrieves memories that start with a bracketed tag.
+
+    Args:
+      tag: The tag, e.g. `'[event]'`, among the leading tags of the memories.
+      limit: If given, the number of most recent memories to retrieve.
+
+    Returns:
+      A list of memory results, sorted by their recency.
+    """
+    self._check_phase()
+    return self._memory_bank.retrieve_by_tag(tag, limit)
+
+  def retrieve_by_prefix(
+      self,
+      prefix: str,
+      limit: int | None = None,
+  ) -> Sequence[str]:
+    """Retrieves memories that start with a prefix.
+
+    Args:
+      prefix: The prefix of the memories to retrieve.
+      limit: If given, the number of most recent memories to retrieve.
+
+    Returns:
+      A list of memory results, sorted by their recency.
+    """
+    self._check_phase()
+    return self._memory_bank.retrieve_by_prefix(prefix, limit)
 
   def add(
       self,
@@ -205,22 +317,22 @@ class AssociativeMemory(Memory):
       self,
   ) -> None:
     with self._lock:
-      for mem in self._buffer:
-        self._memory_bank.add(mem)
+      # Commit the whole buffer at once so it is embedded in a single batch.
+      if self._background_embedding:
+        self._memory_bank.extend_async(self._buffer)
+      else:
+        self._memory_bank.extend(self._buffer)
       self._buffer = []
 
   def get_raw_memory(self) -> pd.DataFrame:
     """Returns the raw memory as a pandas dataframe."""
     self._check_phase()
-    with self._lock:
-      return self._memory_bank.get_data_frame()
+    return self._memory_bank.get_data_frame()
 
   def get_all_memories_as_text(self) -> Sequence[str]:
     """Returns all memories in the memory bank as a sequence of strings."""
     self._check_phase()
-    with self._lock:
-      texts = self._memory_bank.get_all_memories_as_text()
-      return texts
+    return self._memory_bank.get_all_memories_as_text()
 
 
 class ListMemory(Memory):
@@ -288,6 +400,56 @@ class ListMemory(Memory):
     with self._lock:
       return [mem for mem in self._memory_bank if selector_fn(mem)]
 
+  def retrieve_by_tag(
+      self,
+      tag: str,
+      limit: int | None = None,
+  ) -> Sequence[str]:
+    """Retrieves memories that start with a bracketed tag.
+
+    Args:
+      tag: The tag, e.g. `'[event]'`, among the leading tags of the memories.
+      limit: If given, the number of most recent memories to retrieve.
+
+    Returns:
+      A list of memory results, sorted by their recency.
+    """
+    return self._retrieve_latest(
+        lambda mem: tag in basic_associative_memory.leading_tags(mem), limit
+    )
+
+  def retrieve_by_prefix(
+      self,
+      prefix: str,
+      limit: int | None = None,
+  ) -> Sequence[str]:
+    """Retrieves memories that start with a prefix.
+
+    Args:
+      prefix: The prefix of the memories to retrieve.
+      limit: If given, the number of most recent memories to retrieve.
+
+    Returns:
+      A list of memory results, sorted by their recency.
+    """
+    return self._retrieve_latest(lambda mem: mem.startswith(prefix), limit)
+
+  def _retrieve_latest(
+      self,
+      selector_fn: Callable[[str], bool],
+      limit: int | None,
+  ) -> Sequence[str]:
+    """Retrieves up to `limit` of the most recent selected memories."""
+    self._check_phase()
+    with self._lock:
+      selected = []
+      for mem in reversed(self._memory_bank):
+        if limit is not None and len(selected) == limit:
+          break
+        if selector_fn(mem):
+          selected.append(mem)
+      return selected[::-1]
+
   def add(
       self,
       text: str,
@@ -106,6 +106,40 @@ class QuestionOfRecentMemories(
         f'{self.get_named_component_pre_act_value(key)}')
 
   def _make_pre_act_value(self) -> str:
+    component_states = '\n'.join(
+        [self._component_pre_act_display(key) for key in self._components]
+    )
+    prompt, question = self._make_prompt(component_states)
+    result = prompt.open_question(
+        question,
+        answer_prefix=self._answer_prefix.format(
+            agent_name=self.get_entity().name
+        ),
+        max_tokens=1000,
+        terminators=self._terminators,
+    )
+    return self._record_answer(prompt, question, result)
+
+  async def _async_make_pre_act_value(self) -> str:
+    displays = []
+    for key in self._components:
+      value = await self.async_get_named_component_pre_act_value(key)
+      displays.append(f'  {self.get_component_pre_act_label(key)}: {value}')
+    prompt, question = self._make_prompt('\n'.join(displays))
+    result = await prompt.async_open_question(
+        question,
+        answer_prefix=self._answer_prefix.format(
+            agent_name=self.get_entity().name
+        ),
+        max_tokens=1000,
+        terminators=self._terminators,
+    )
+    return self._record_answer(prompt, question, result)
+
+  def _make_prompt(
+      self, component_states: str
+  ) -> tuple[interactive_document.InteractiveDocument, str]:
+    """Returns the prompt with the recent memories, and the question."""
     agent_name = self.get_entity().name
 
     memory = self.get_entity().get_component(
@@ -122,21 +156,25 @@ class QuestionOfRecentMemories(
     if self._clock_now is not None:
       prompt.statement(f'Current time: {self._clock_now()}.\n')
 
-    component_states = '\n'.join(
-        [self._component_pre_act_display(key) for key in self._components]
-    )
     prompt.statement(component_states)
 
-    question = self._question.format(agent_name=agent_name)
-    result = prompt.open_question(
-        question,
-        answer_prefix=self._answer_prefix.format(agent_name=agent_name),
-        max_tokens=1000,
-        terminators=self._terminators,
+    return prompt, self._question.format(agent_name=agent_name)
+
+  def _record_answer(
+      self,
+      prompt: interactive_document.InteractiveDocument,
+      question: str,
+      result: str,
+  ) -> str:
+    """Adds the answer to memory if asked to, logs it and returns it."""
+    result = (
+        self._answer_prefix.format(agent_name=self.get_entity().name) + result
     )
-    result = self._answer_prefix.format(agent_name=agent_name) + result
 
     if self._add_to_memory:
+      memory = self.get_entity().get_component(
+          self._memory_component_key, type_=memory_component.Memory
+      )
       memory.add(f'{self._memory_tag} {result}')
 
     log = {
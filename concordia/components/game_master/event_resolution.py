@@ -141,7 +141,7 @@ class EventResolution(
       memory = self.get_entity().get_component(
           self._memory_component_key, type_=memory_component.Memory
       )
-      suggestions = memory.scan(selector_fn=lambda x: PUTATIVE_EVENT_TAG in x)
+      suggestions = memory.retrieve_by_tag(PUTATIVE_EVENT_TAG, limit=1)
       if not suggestions:
         raise RuntimeError('No suggested events to resolve.')
       if self._active_entity_name is None:
@@ -242,7 +242,7 @@ class DisplayEvents(
       memory_component_key: str = (
           memory_component.DEFAULT_MEMORY_COMPONENT_KEY
       ),
-      num_events_to_retrieve: int = 100,
+      num_events_to_retrieve: int | None = 100,
       pre_act_label: str = 'Recent events',
   ):
     """Initializes the component.
@@ -251,7 +251,8 @@ class DisplayEvents(
       model: The language model to use for the component.
       memory_component_key: The name of the memory component in which to write
         records of events.
-      num_events_to_retrieve: The number of events to retrieve.
+      num_events_to_retrieve: The number of events to retrieve, 0 or None to
+        retrieve all of them.
       pre_act_label: Prefix to add to the output of the component when called in
         `pre_act`.
 
@@ -268,12 +269,9 @@ class DisplayEvents(
     memory = self.get_entity().get_component(
         self._memory_component_key, type_=memory_component.Memory
     )
-    events = memory.scan(selector_fn=lambda x: EVENT_TAG in x)
-
-    limit = self._num_events_to_retrieve
-    if limit > len(events):
-      limit = len(events)
-    events = events[-limit:]
+    events = memory.retrieve_by_tag(
+        EVENT_TAG, limit=self._num_events_to_retrieve or None
+    )
     events = [
         f'{i}). {event.split(EVENT_TAG)[-1]}' for i, event in enumerate(events)
     ]
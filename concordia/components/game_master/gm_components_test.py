@@ -6,6 +6,10 @@ import datetime
 
 from absl.testing import absltest
 from absl.testing import parameterized
+from concordia.agents import entity_agent
+from concordia.associative_memory import basic_associative_memory
+from concordia.components.agent import concat_act_component
+from concordia.components.agent import memory as memory_component
 from concordia.components.game_master import event_resolution
 from concordia.components.game_master import inventory
 from concordia.components.game_master import make_observation
@@ -19,6 +23,7 @@ from concordia.components.game_master import terminate
 from concordia.components.game_master import world_state
 from concordia.contrib.data.questionnaires import depression_stress_anxiety_scale
 from concordia.language_model import no_language_model
+from concordia.type_checks import entity_component
 from concordia.utils import helper_functions
 import numpy as np
 
@@ -443,6 +448,50 @@ class GMComponentTest(parameterized.TestCase):
     # Deeper check for the entire component
     deep_compare_components(component_a, component_b, self, skip_keys)
 
+  @parameterized.named_parameters(
+      dict(testcase_name="limited", num_events=2, expected=("two", "three")),
+      dict(
+          testcase_name="zero",
+          num_events=0,
+          expected=("one", "two", "three"),
+      ),
+      dict(
+          testcase_name="none",
+          num_events=None,
+          expected=("one", "two", "three"),
+      ),
+  )
+  def test_display_events(self, num_events, expected):
+    memory_bank = basic_associative_memory.AssociativeMemoryBank(
+        sentence_embedder=embedder
+    )
+    memory_bank.extend([
+        f"{event_resolution.EVENT_TAG} {event}"
+        for event in ("one", "two", "three")
+    ])
+    memory_bank.add("[observation] four")
+    display_events = event_resolution.DisplayEvents(
+        model=no_language_model.NoLanguageModel(),
+        num_events_to_retrieve=num_events,
+    )
+    model = no_language_model.NoLanguageModel()
+    agent = entity_agent.EntityAgent(
+        agent_name="Game Master",
+        act_component=concat_act_component.ConcatActComponent(model=model),
+        context_components={
+            memory_component.DEFAULT_MEMORY_COMPONENT_KEY: (
+                memory_component.AssociativeMemory(memory_bank)
+            ),
+            "display_events": display_events,
+        },
+    )
+    agent.set_phase(entity_component.Phase.PRE_ACT)
+
+    self.assertEqual(
+        display_events.get_pre_act_value(),
+        "\n".join(f"{i}).  {event}" for i, event in enumerate(expected)),
+    )
+
 
 if __name__ == "__main__":
   absltest.main()
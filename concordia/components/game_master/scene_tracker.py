@@ -90,8 +90,7 @@ class SceneTracker(
     memory_component = self.get_entity().get_component(
         self._memory_component_key, type_=memory_component_module.Memory
     )
-    counter_states = memory_component.scan(
-        lambda x: x.startswith(_SCENE_COUNTER_TAG))
+    counter_states = memory_component.retrieve_by_tag(_SCENE_COUNTER_TAG)
     counter_state = len(counter_states)
     if counter_state == self._max_rounds:
       return -1, self._scenes[0], counter_state
@@ -7,6 +7,7 @@ from collections.abc import Collection, Iterable, Iterator, Sequence
 import contextlib
 import random
 import re
+from typing import Any
 
 from concordia.document import document
 from concordia.language_model import language_model
@@ -168,6 +169,51 @@ class InteractiveDocument(document.Document):
       )
     else:
       response = forced_response
+    return self._open_answer(response, answer_prefix, answer_suffix)
+
+  async def async_open_question(
+      self,
+      question: str,
+      *,
+      forced_response: str | None = None,
+      answer_prefix: str = '',
+      answer_suffix: str = '',
+      max_tokens: int = DEFAULT_MAX_TOKENS,
+      terminators: Collection[str] = ('\n',),
+      question_label: str = 'Question',
+      answer_label: str = 'Answer',
+  ) -> str:
+    """Asks an open question with `LanguageModel.async_sample_text`.
+
+    Args:
+      question: the question to ask.
+      forced_response: see `open_question`.
+      answer_prefix: a prefix to append to the model's prompt.
+      answer_suffix: a suffix to append to the model's response.
+      max_tokens: the maximum number of tokens to sample from the model.
+      terminators: see `open_question`.
+      question_label: the label to use for the question, typically "Question".
+      answer_label: the label to use for the answer, typically "Answer".
+
+    Returns:
+      The agents truncated response (or `forced_response` is provided).
+    """
+    self._question(f'{question_label}: {question}\n')
+    self._response(f'{answer_label}: {answer_prefix}')
+    if forced_response is None:
+      response = await self._model.async_sample_text(
+          prompt=self._model_view.text(),
+          max_tokens=max_tokens,
+          terminators=terminators,
+      )
+    else:
+      response = forced_response
+    return self._open_answer(response, answer_prefix, answer_suffix)
+
+  def _open_answer(
+      self, response: str, answer_prefix: str, answer_suffix: str
+  ) -> str:
+    """Appends the answer to an open question and returns it."""
     response = response.removeprefix(answer_prefix)
     self._model_response(response)
     self._response(f'{answer_suffix}\n')
@@ -285,6 +331,47 @@ class InteractiveDocument(document.Document):
     Returns:
       The index of the sampled answer.
     """
+    options, original_indices = self._multiple_choice_prompt(
+        question, answers, randomize_choices
+    )
+    idx, response, debug = self._model.sample_choice(
+        prompt=self._model_view.text(),
+        responses=list(options.keys()),
+    )
+    return self._multiple_choice_answer(idx, response, debug, original_indices)
+
+  async def async_multiple_choice_question(
+      self,
+      question: str,
+      answers: Sequence[str],
+      randomize_choices: bool = True,
+  ) -> int:
+    """Presents a multiple choice with `LanguageModel.async_sample_choice`.
+
+    Args:
+      question: the question to ask the agent.
+      answers: the choice of answers
+      randomize_choices: whether to randomize the order of the choices.
+
+    Returns:
+      The index of the sampled answer.
+    """
+    options, original_indices = self._multiple_choice_prompt(
+        question, answers, randomize_choices
+    )
+    idx, response, debug = await self._model.async_sample_choice(
+        prompt=self._model_view.text(),
+        responses=list(options.keys()),
+    )
+    return self._multiple_choice_answer(idx, response, debug, original_indices)
+
+  def _multiple_choice_prompt(
+      self,
+      question: str,
+      answers: Sequence[str],
+      randomize_choices: bool,
+  ) -> tuple[dict[str, str], Sequence[int]]:
+    """Appends a multiple choice question, returns its options and order."""
     if randomize_choices:
       original_indices = self._rng.permutation(len(answers))
     else:
@@ -295,10 +382,16 @@ class InteractiveDocument(document.Document):
       self._question(f'  ({key}) {option}\n')
 
     self._response('Answer: (')
-    idx, response, debug = self._model.sample_choice(
-        prompt=self._model_view.text(),
-        responses=list(options.keys()),
-    )
+    return options, original_indices
+
+  def _multiple_choice_answer(
+      self,
+      idx: int,
+      response: str,
+      debug: Any,
+      original_indices: Sequence[int],
+  ) -> int:
+    """Appends the answer to a multiple choice, returns the answer index."""
     self._model_response(response)
     self._response(')\n')
     self.debug(f'[{debug}]')
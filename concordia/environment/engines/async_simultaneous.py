@@ -0,0 +1,220 @@
+"""Simultaneous engine running the entities of each step on an event loop.
+"""
+
+import asyncio
+from collections.abc import Mapping, Sequence
+from concurrent import futures
+from typing import Any
+
+from concordia.environment.engines import simultaneous
+from concordia.type_checks import entity as entity_lib
+from concordia.utils import concurrency
+from concordia.utils import telemetry
+from typing_extensions import override
+
+
+class AsyncSimultaneous(simultaneous.Simultaneous):
+  """Simultaneous engine whose entities observe and act as coroutines.
+
+  Each step, the game master makes the observations with `async_act`, and
+  the entities observe and act through `Entity.async_observe` and
+  `Entity.async_act`, run together on the shared event loop of
+  `concurrency.run_coroutine`.
+
+  Only entities implementing `async_act` natively act without a thread.
+  `EntityAgent` does, as long as its components do: its act component and
+  context components implementing `async_get_action_attempt` and
+  `async_pre_act` with `LanguageModel.async_sample_text`, like
+  `ConcatActComponent` and `QuestionOfRecentMemories`, let a large population
+  have thousands of requests in flight. Everything else, including the
+  default `Entity.async_act` and the components only implementing the
+  synchronous methods, runs in the worker threads of the event loop, which
+  bound the number of requests in flight. Pass `executor` to size them.
+  """
+
+  def __init__(
+      self,
+      call_to_make_observation: str = (
+          simultaneous.DEFAULT_CALL_TO_MAKE_OBSERVATION
+      ),
+      call_to_next_acting: str = simultaneous.DEFAULT_CALL_TO_NEXT_ACTING,
+      call_to_next_action_spec: str = (
+          simultaneous.DEFAULT_CALL_TO_NEXT_ACTION_SPEC
+      ),
+      call_to_resolve: str = simultaneous.DEFAULT_CALL_TO_RESOLVE,
+      call_to_check_termination: str = (
+          simultaneous.DEFAULT_CALL_TO_CHECK_TERMINATION
+      ),
+      call_to_next_game_master: str = (
+          simultaneous.DEFAULT_CALL_TO_NEXT_GAME_MASTER
+      ),
+      max_concurrent_entities: int | None = None,
+      executor: futures.ThreadPoolExecutor | None = None,
+  ):
+    """Asynchronous simultaneous engine constructor.
+
+    Args:
+      call_to_make_observation: see `Simultaneous`.
+      call_to_next_acting: see `Simultaneous`.
+      call_to_next_action_spec: see `Simultaneous`.
+      call_to_resolve: see `Simultaneous`.
+      call_to_check_termination: see `Simultaneous`.
+      call_to_next_game_master: see `Simultaneous`.
+      max_concurrent_entities: the maximum number of entities observing or
+        acting at once. If None, all entities of a step run at once.
+      executor: the executor running the calls of the entities and game master
+        without native async support, see `concurrency.to_thread`. If None,
+        they run in the default executor of the event loop, which has
+        min(32, os.cpu_count() + 4) workers.
+    """
+    super().__init__(
+        call_to_make_observation=call_to_make_observation,
+        call_to_next_acting=call_to_next_acting,
+        call_to_next_action_spec=call_to_next_action_spec,
+        call_to_resolve=call_to_resolve,
+        call_to_check_termination=call_to_check_termination,
+        call_to_next_game_master=call_to_next_game_master,
+    )
+    if max_concurrent_entities is not None and max_concurrent_entities <= 0:
+      raise ValueError('max_concurrent_entities must be positive.')
+    self._max_concurrent_entities = max_concurrent_entities
+    self._executor = executor
+
+  @override
+  def _entities_act(
+      self,
+      game_master: entity_lib.Entity,
+      entities: Sequence[entity_lib.Entity],
+      action_specs: Sequence[entity_lib.ActionSpec],
+      *,
+      skip_actions: bool,
+      log_entry: Mapping[str, Any],
+      log: list[Mapping[str, Any]] | None,
+      verbose: bool,
+  ) -> Mapping[str, str]:
+    return concurrency.run_coroutine(
+        self._async_entities_act(
+            game_master,
+            entities,
+            action_specs,
+            skip_actions=skip_actions,
+            log_entry=log_entry,
+            log=log,
+            verbose=verbose,
+        )
+    )
+
+  async def _async_entities_act(
+      self,
+      game_master: entity_lib.Entity,
+      entities: Sequence[entity_lib.Entity],
+      action_specs: Sequence[entity_lib.ActionSpec],
+      *,
+      skip_actions: bool,
+      log_entry: Mapping[str, Any],
+      log: list[Mapping[str, Any]] | None,
+      verbose: bool,
+  ) -> Mapping[str, str]:
+    """Lets the entities observe and act concurrently on the event loop.
+
+    Args:
+      game_master: the game master of the step.
+      entities: the entities to observe and act.
+      action_specs: the action spec of each entity.
+      skip_actions: whether the entities only observe.
+      log_entry: the log entry of the step.
+      log: the log, or None if not logging.
+      verbose: whether to print what happens.
+
+    Returns:
+      The action of each entity by name, in the order of the entities, which
+      is empty if actions are skipped.
+
+    Raises:
+      Exception: the first error raised by an entity. The other entities are
+        cancelled.
+    """
+    semaphore = None
+    if self._max_concurrent_entities is not None:
+      semaphore = asyncio.Semaphore(self._max_concurrent_entities)
+
+    async def entity_act(
+        entity: entity_lib.Entity, action_spec: entity_lib.ActionSpec
+    ) -> str:
+      if semaphore is None:
+        return await self._async_entity_act(
+            game_master, entity, action_spec, skip_actions, log_entry, log,
+            verbose,
+        )
+      async with semaphore:
+        return await self._async_entity_act(
+            game_master, entity, action_spec, skip_actions, log_entry, log,
+            verbose,
+        )
+
+    with concurrency.using_executor(self._executor):
+      tasks = [
+          asyncio.ensure_future(entity_act(entity, action_spec))
+          for entity, action_spec in zip(entities, action_specs)
+      ]
+    try:
+      actions = await asyncio.gather(*tasks)
+    except BaseException:
+      for task in tasks:
+        task.cancel()
+      raise
+    return {entity.name: action for entity, action in zip(entities, actions)}
+
+  async def async_make_observation(
+      self,
+      game_master: entity_lib.Entity,
+      entity: entity_lib.Entity,
+  ) -> str:
+    """Makes an observation for an entity without blocking the event loop.
+
+    Args:
+      game_master: the game master making the observation.
+      entity: the entity to make the observation for.
+
+    Returns:
+      The observation, see `make_observation`.
+    """
+    if concurrency.overrides_sync_only(
+        self, 'make_observation', 'async_make_observation'
+    ):
+      return await concurrency.to_thread(
+          self.make_observation, game_master, entity
+      )
+    with telemetry.scope(phase=telemetry.MAKE_OBSERVATION):
+      return await game_master.async_act(
+          action_spec=entity_lib.ActionSpec(
+              call_to_action=self._call_to_make_observation.format(
+                  name=entity.name
+              ),
+              output_type=entity_lib.OutputType.MAKE_OBSERVATION,
+          )
+      )
+
+  async def _async_entity_act(
+      self,
+      game_master: entity_lib.Entity,
+      entity: entity_lib.Entity,
+      action_spec: entity_lib.ActionSpec,
+      skip_actions: bool,
+      log_entry: Mapping[str, Any],
+      log: list[Mapping[str, Any]] | None,
+      verbose: bool,
+  ) -> str:
+    """Make observation, get action and resolution for one entity."""
+    observation = await self.async_make_observation(game_master, entity)
+    with telemetry.scope(phase=telemetry.OBSERVE):
+      await entity.async_observe(observation)
+    self._log_observation(game_master, entity, observation, log_entry, log,
+                          verbose)
+    if skip_actions:
+      return ''
+
+    self._print_action_spec(entity, action_spec, verbose)
+    with telemetry.scope(phase=telemetry.ACT):
+      raw_action = await entity.async_act(action_spec)
+    return self._format_action(entity, raw_action, verbose)
@@ -0,0 +1,211 @@
+"""Tests for the asynchronous simultaneous engine.
+"""
+
+import asyncio
+from collections.abc import Sequence
+from concurrent import futures
+import functools
+import threading
+
+from absl.testing import absltest
+from concordia.agents import entity_agent
+from concordia.components.agent import concat_act_component
+from concordia.components.agent import constant
+from concordia.components.agent import memory as memory_component
+from concordia.components.agent import question_of_recent_memories
+from concordia.environment.engines import async_simultaneous
+from concordia.environment.engines import simultaneous
+from concordia.environment.engines import simultaneous_test
+from concordia.language_model import language_model
+from concordia.type_checks import entity as entity_lib
+from typing_extensions import override
+
+
+class AsyncEntity(entity_lib.Entity):
+  """Mock entity acting with a coroutine, recording how many are in flight."""
+
+  def __init__(self, name: str, counter: dict[str, int]) -> None:
+    self._name = name
+    self._counter = counter
+
+  @functools.cached_property
+  @override
+  def name(self) -> str:
+    return self._name
+
+  @override
+  def observe(self, observation: str) -> None:
+    pass
+
+  @override
+  def act(
+      self,
+      action_spec: entity_lib.ActionSpec = entity_lib.DEFAULT_ACTION_SPEC,
+  ) -> str:
+    raise AssertionError('The engine must call async_act.')
+
+  @override
+  async def async_act(
+      self,
+      action_spec: entity_lib.ActionSpec = entity_lib.DEFAULT_ACTION_SPEC,
+  ) -> str:
+    self._counter['in_flight'] += 1
+    self._counter['max_in_flight'] = max(
+        self._counter['max_in_flight'], self._counter['in_flight']
+    )
+    await asyncio.sleep(0.01)
+    self._counter['in_flight'] -= 1
+    return 'waits'
+
+
+class AsyncOnlyModel(language_model.LanguageModel):
+  """Mock model only answering asynchronously, recording the calls in flight."""
+
+  def __init__(self, counter: dict[str, int]) -> None:
+    self._counter = counter
+
+  @override
+  def sample_text(self, prompt: str, **kwargs) -> str:
+    raise AssertionError('The entities must call async_sample_text.')
+
+  @override
+  def sample_choice(
+      self, prompt: str, responses: Sequence[str], **kwargs
+  ) -> tuple[int, str, dict[str, float]]:
+    raise AssertionError('The entities must call async_sample_choice.')
+
+  @override
+  async def async_sample_text(self, prompt: str, **kwargs) -> str:
+    self._counter['num_calls'] += 1
+    self._counter['num_with_goal'] += 'Alice wants tea.' in prompt
+    self._counter['in_flight'] += 1
+    self._counter['max_in_flight'] = max(
+        self._counter['max_in_flight'], self._counter['in_flight']
+    )
+    await asyncio.sleep(0.05)
+    self._counter['in_flight'] -= 1
+    return 'waits'
+
+
+class GameMaster(entity_lib.Entity):
+  """Mock game master sending every entity to act, recording the events."""
+
+  def __init__(self, entity_names: list[str]) -> None:
+    self._entity_names = entity_names
+    self._lock = threading.Lock()
+    self.events = []
+    self.observation_threads = set()
+
+  @functools.cached_property
+  @override
+  def name(self) -> str:
+    return 'game_master'
+
+  @override
+  def observe(self, observation: str) -> None:
+    with self._lock:
+      self.events.append(observation)
+
+  @override
+  def act(
+      self,
+      action_spec: entity_lib.ActionSpec = entity_lib.DEFAULT_ACTION_SPEC,
+  ) -> str:
+    if action_spec.output_type == entity_lib.OutputType.NEXT_ACTING:
+      return ','.join(self._entity_names)
+    if action_spec.output_type == entity_lib.OutputType.NEXT_ACTION_SPEC:
+      return 'type: free'
+    if action_spec.output_type == entity_lib.OutputType.TERMINATE:
+      return entity_lib.BINARY_OPTIONS['negative']
+    if action_spec.output_type == entity_lib.OutputType.MAKE_OBSERVATION:
+      with self._lock:
+        self.observation_threads.add(threading.current_thread().name)
+    return 'something happens'
+
+
+
+class AsyncSimultaneousTest(absltest.TestCase):
+
+  def test_run_loop(self):
+    env = async_simultaneous.AsyncSimultaneous()
+    game_master = simultaneous_test.MockEntity(name='game_master')
+    entities = [
+        simultaneous_test.MockEntity(name=name)
+        for name in simultaneous_test._ENTITY_NAMES
+    ]
+    env.run_loop(
+        game_masters=[game_master],
+        entities=entities,
+        max_steps=2,
+    )
+
+  def test_async_entities_act_concurrently(self):
+    counter = {'in_flight': 0, 'max_in_flight': 0}
+    names = [f'entity_{i}' for i in range(300)]
+    game_master = GameMaster(names)
+    entities = [AsyncEntity(name, counter) for name in names]
+
+    async_simultaneous.AsyncSimultaneous(
+        max_concurrent_entities=200
+    ).run_loop(game_masters=[game_master], entities=entities, max_steps=1)
+
+    self.assertEqual(counter['max_in_flight'], 200)
+    resolved = [event for event in game_master.events if 'waits' in event]
+    self.assertEqual(
+        resolved[0].splitlines()[:2],
+        [
+            f'{simultaneous.PUTATIVE_EVENT_TAG} '
+            'entity_0: waits',
+            'entity_1: waits',
+        ],
+    )
+
+  def test_entity_agents_act_without_a_thread_each(self):
+    counter = {
+        'in_flight': 0, 'max_in_flight': 0, 'num_calls': 0, 'num_with_goal': 0
+    }
+    model = AsyncOnlyModel(counter)
+    names = [f'entity_{i}' for i in range(300)]
+    game_master = GameMaster(names)
+    entities = [
+        entity_agent.EntityAgent(
+            name,
+            act_component=concat_act_component.ConcatActComponent(model),
+            context_components={
+                memory_component.DEFAULT_MEMORY_COMPONENT_KEY: (
+                    memory_component.ListMemory([])
+                ),
+                'goal': constant.Constant('Alice wants tea.'),
+                'situation': question_of_recent_memories.SituationPerception(
+                    model=model, components=('goal',)
+                ),
+            },
+        )
+        for name in names
+    ]
+    executor = futures.ThreadPoolExecutor(
+        max_workers=4, thread_name_prefix='engine'
+    )
+    self.addCleanup(executor.shutdown)
+
+    async_simultaneous.AsyncSimultaneous(executor=executor).run_loop(
+        game_masters=[game_master], entities=entities, max_steps=1
+    )
+
+    self.assertGreater(counter['max_in_flight'], 100)
+    # The situation and the action of each entity, both knowing the goal.
+    self.assertEqual(counter['num_calls'], 600)
+    self.assertEqual(counter['num_with_goal'], 600)
+    resolved = [event for event in game_master.events if 'waits' in event]
+    self.assertIn('entity_0 waits', resolved[0])
+    self.assertTrue(game_master.observation_threads)
+    for thread_name in game_master.observation_threads:
+      self.assertStartsWith(thread_name, 'engine')
+
+  def test_rejects_non_positive_concurrency(self):
+    with self.assertRaises(ValueError):
+      async_simultaneous.AsyncSimultaneous(max_concurrent_entities=0)
+
+
+if __name__ == '__main__':
+  absltest.main()
@@ -16,6 +16,7 @@ from concordia.environment import engine as engine_lib
 from concordia.type_checks import entity as entity_lib
 from concordia.type_checks import entity_component
 from concordia.utils import concurrency
+from concordia.utils import telemetry
 import termcolor
 from typing_extensions import override
 
@@ -60,6 +61,7 @@ class ParallelQuestionnaireEngine(engine_lib.Engine):
     return self._executor
 
   @override
+  @telemetry.scope(phase=telemetry.NEXT_ACTING)
   def next_acting(
       self,
       game_master: entity_lib.Entity,
@@ -84,6 +86,7 @@ class ParallelQuestionnaireEngine(engine_lib.Engine):
     ]
     return next_entities
 
+  @telemetry.scope(phase=telemetry.NEXT_ACTING)
   def next_action_spec(
       self,
       game_master: entity_lib.Entity,
@@ -112,6 +115,7 @@ class ParallelQuestionnaireEngine(engine_lib.Engine):
 
     return all_action_specs
 
+  @telemetry.scope(phase=telemetry.TERMINATE)
   def terminate(
       self, game_master: entity_lib.Entity, verbose: bool = False
   ) -> bool:
@@ -191,7 +195,8 @@ class ParallelQuestionnaireEngine(engine_lib.Engine):
             q_id: str,
         ):
           # Executor is passed down to _process_single_stateless_act
-          answer = agent.stateless_act(action_spec)
+          with telemetry.scope(phase=telemetry.ACT):
+            answer = agent.stateless_act(action_spec)
           with mutex:
             entity_answers[player_name][q_id] = answer
 
@@ -236,6 +241,7 @@ class ParallelQuestionnaireEngine(engine_lib.Engine):
       self._executor = None
 
   @override
+  @telemetry.scope(phase=telemetry.NEXT_GAME_MASTER)
   def next_game_master(
       self,
       game_master: entity_lib.Entity,
@@ -12,6 +12,7 @@ from concordia.components.game_master import switch_act as switch_act_component
 from concordia.environment import engine as engine_lib
 from concordia.type_checks import entity as entity_lib
 from concordia.utils import concurrency
+from concordia.utils import telemetry
 import termcolor
 
 
@@ -71,6 +72,7 @@ class Sequential(engine_lib.Engine):
     self._call_to_check_termination = call_to_check_termination
     self._call_to_next_game_master = call_to_next_game_master
 
+  @telemetry.scope(phase=telemetry.MAKE_OBSERVATION)
   def make_observation(self,
                        game_master: entity_lib.Entity,
                        entity: entity_lib.Entity) -> str:
@@ -84,6 +86,7 @@ class Sequential(engine_lib.Engine):
     )
     return observation
 
+  @telemetry.scope(phase=telemetry.NEXT_ACTING)
   def next_acting(
       self,
       game_master: entity_lib.Entity,
@@ -118,6 +121,7 @@ class Sequential(engine_lib.Engine):
     next_action_spec = engine_lib.action_spec_parser(next_action_spec_string)
     return (entities_by_name[next_object_name], next_action_spec)
 
+  @telemetry.scope(phase=telemetry.RESOLVE)
   def resolve(self,
               game_master: entity_lib.Entity,
               putative_event: str,
@@ -139,6 +143,7 @@ class Sequential(engine_lib.Engine):
       print(termcolor.colored(
           f'The resolved event was: {result}', _PRINT_COLOR))
 
+  @telemetry.scope(phase=telemetry.TERMINATE)
   def terminate(self,
                 game_master: entity_lib.Entity,
                 verbose: bool = False) -> bool:
@@ -155,6 +160,7 @@ class Sequential(engine_lib.Engine):
           f'Terminate? {should_terminate_string}', _PRINT_COLOR))
     return should_terminate_string == entity_lib.BINARY_OPTIONS['affirmative']
 
+  @telemetry.scope(phase=telemetry.NEXT_GAME_MASTER)
   def next_game_master(self,
                        game_master: entity_lib.Entity,
                        game_masters: Sequence[entity_lib.Entity],
@@ -227,7 +233,8 @@ class Sequential(engine_lib.Engine):
         if verbose:
           print(termcolor.colored(
               f'Entity {entity.name} observed: {observation}', _PRINT_COLOR))
-        entity.observe(observation)
+        with telemetry.scope(phase=telemetry.OBSERVE):
+          entity.observe(observation)
 
       tasks = {
           entity.name: functools.partial(_entity_observation, entity)
@@ -255,7 +262,8 @@ class Sequential(engine_lib.Engine):
         print(termcolor.colored(
             f'Entity {next_entity.name} is next to act. They must respond '
             f' in the format: "{entity_spec_to_use}".', _PRINT_COLOR))
-      raw_action = next_entity.act(entity_spec_to_use)
+      with telemetry.scope(phase=telemetry.ACT):
+        raw_action = next_entity.act(entity_spec_to_use)
       if next_entity.name in raw_action:
         action = raw_action
       else:
@@ -14,6 +14,7 @@ from concordia.components.game_master import switch_act as switch_act_component
 from concordia.environment import engine as engine_lib
 from concordia.type_checks import entity as entity_lib
 from concordia.utils import concurrency
+from concordia.utils import telemetry
 import termcolor
 from typing_extensions import override
 
@@ -68,6 +69,7 @@ class Simultaneous(engine_lib.Engine):
     self._call_to_check_termination = call_to_check_termination
     self._call_to_next_game_master = call_to_next_game_master
 
+  @telemetry.scope(phase=telemetry.MAKE_OBSERVATION)
   def make_observation(self,
                        game_master: entity_lib.Entity,
                        entity: entity_lib.Entity) -> str:
@@ -82,6 +84,7 @@ class Simultaneous(engine_lib.Engine):
     return observation
 
   @override
+  @telemetry.scope(phase=telemetry.NEXT_ACTING)
   def next_acting(
       self,
       game_master: entity_lib.Entity,
@@ -127,6 +130,7 @@ class Simultaneous(engine_lib.Engine):
         [action_spec_by_name[entity_name] for entity_name in next_entity_names]
     )
 
+  @telemetry.scope(phase=telemetry.RESOLVE)
   def resolve(self,
               game_master: entity_lib.Entity,
               putative_event: str,
@@ -148,6 +152,7 @@ class Simultaneous(engine_lib.Engine):
       print(termcolor.colored(
           f'The resolved event was: {result}', _PRINT_COLOR))
 
+  @telemetry.scope(phase=telemetry.TERMINATE)
   def terminate(self,
                 game_master: entity_lib.Entity,
                 verbose: bool = False) -> bool:
@@ -164,6 +169,7 @@ class Simultaneous(engine_lib.Engine):
           f'Terminate? {should_terminate_string}', _PRINT_COLOR))
     return should_terminate_string == entity_lib.BINARY_OPTIONS['affirmative']
 
+  @telemetry.scope(phase=telemetry.NEXT_GAME_MASTER)
   def next_game_master(self,
                        game_master: entity_lib.Entity,
                        game_masters: Sequence[entity_lib.Entity],
@@ -246,66 +252,27 @@ class Simultaneous(engine_lib.Engine):
       else:
         skip_actions = False
 
-      def _entity_act(
-          entity: entity_lib.Entity, action_spec: entity_lib.ActionSpec,
-          skip_actions: bool = False,
-      ) -> str:
-        """Make observation, get action and resolution for one entity."""
-        observation = self.make_observation(game_master, entity)
-        entity.observe(observation)
-        if log is not None and hasattr(game_master, 'get_last_log'):
-          assert hasattr(game_master, 'get_last_log')  # Assertion for pytype
-          log_entry['make_observation'][
-              entity.name
-          ] = game_master.get_last_log()
-        if verbose:
-          print(
-              termcolor.colored(
-                  f'Entity {entity.name} observed: {observation}', _PRINT_COLOR
-              )
-          )
-
-        if skip_actions:
-          return ''
-
-        if verbose:
-          print(
-              termcolor.colored(
-                  f'Entity {entity.name} is next to act. They must respond '
-                  f' in the format: "{action_spec}".',
-                  _PRINT_COLOR,
-              )
-          )
-        raw_action = entity.act(action_spec)
-        if entity.name in raw_action:
-          action = raw_action
-        else:
-          action = f'{entity.name}: {raw_action}'
-        if verbose:
-          print(
-              termcolor.colored(
-                  f'Entity {entity.name} chose action: {action}', _PRINT_COLOR
-              )
-          )
-
-        return action
-
-      tasks = {}
       entities_to_process = entities if skip_actions else next_entities
-      for i, entity in enumerate(entities_to_process):
-        if skip_actions:
-          action_spec = entity_lib.ActionSpec(
-              call_to_action='',
-              output_type=entity_lib.OutputType.SKIP_THIS_STEP,
-          )
-        else:
-          action_spec = next_action_specs[i]
-        tasks[entity.name] = functools.partial(
-            _entity_act, entity, action_spec, skip_actions
-        )
+      if skip_actions:
+        action_specs = [
+            entity_lib.ActionSpec(
+                call_to_action='',
+                output_type=entity_lib.OutputType.SKIP_THIS_STEP,
+            )
+        ] * len(entities_to_process)
+      else:
+        action_specs = next_action_specs
 
       # Run entity actions concurrently
-      actions = concurrency.run_tasks(tasks)
+      actions = self._entities_act(
+          game_master,
+          entities_to_process,
+          action_specs,
+          skip_actions=skip_actions,
+          log_entry=log_entry,
+          log=log,
+          verbose=verbose,
+      )
 
       if skip_actions:
         continue
@@ -337,6 +304,128 @@ class Simultaneous(engine_lib.Engine):
       if checkpoint_callback is not None:
         checkpoint_callback(steps)
 
+  def _entities_act(
+      self,
+      game_master: entity_lib.Entity,
+      entities: Sequence[entity_lib.Entity],
+      action_specs: Sequence[entity_lib.ActionSpec],
+      *,
+      skip_actions: bool,
+      log_entry: Mapping[str, Any],
+      log: list[Mapping[str, Any]] | None,
+      verbose: bool,
+  ) -> Mapping[str, str]:
+    """Lets the entities observe and act concurrently.
+
+    Args:
+      game_master: the game master of the step.
+      entities: the entities to observe and act.
+      action_specs: the action spec of each entity.
+      skip_actions: whether the entities only observe.
+      log_entry: the log entry of the step.
+      log: the log, or None if not logging.
+      verbose: whether to print what happens.
+
+    Returns:
+      The action of each entity by name, which is empty if actions are
+      skipped.
+    """
+    tasks = {
+        entity.name: functools.partial(
+            self._entity_act,
+            game_master,
+            entity,
+            action_spec,
+            skip_actions=skip_actions,
+            log_entry=log_entry,
+            log=log,
+            verbose=verbose,
+        )
+        for entity, action_spec in zip(entities, action_specs)
+    }
+    return concurrency.run_tasks(tasks)
+
+  def _entity_act(
+      self,
+      game_master: entity_lib.Entity,
+      entity: entity_lib.Entity,
+      action_spec: entity_lib.ActionSpec,
+      *,
+      skip_actions: bool,
+      log_entry: Mapping[str, Any],
+      log: list[Mapping[str, Any]] | None,
+      verbose: bool,
+  ) -> str:
+    """Make observation, get action and resolution for one entity."""
+    observation = self.make_observation(game_master, entity)
+    with telemetry.scope(phase=telemetry.OBSERVE):
+      entity.observe(observation)
+    self._log_observation(game_master, entity, observation, log_entry, log,
+                          verbose)
+    if skip_actions:
+      return ''
+
+    self._print_action_spec(entity, action_spec, verbose)
+    with telemetry.scope(phase=telemetry.ACT):
+      raw_action = entity.act(action_spec)
+    return self._format_action(entity, raw_action, verbose)
+
+  def _log_observation(
+      self,
+      game_master: entity_lib.Entity,
+      entity: entity_lib.Entity,
+      observation: str,
+      log_entry: Mapping[str, Any],
+      log: list[Mapping[str, Any]] | None,
+      verbose: bool,
+  ) -> None:
+    """Logs the observation an entity was sent."""
+    if log is not None and hasattr(game_master, 'get_last_log'):
+      assert hasattr(game_master, 'get_last_log')  # Assertion for pytype
+      log_entry['make_observation'][
+          entity.name
+      ] = game_master.get_last_log()
+    if verbose:
+      print(
+          termcolor.colored(
+              f'Entity {entity.name} observed: {observation}', _PRINT_COLOR
+          )
+      )
+
+  def _print_action_spec(
+      self,
+      entity: entity_lib.Entity,
+      action_spec: entity_lib.ActionSpec,
+      verbose: bool,
+  ) -> None:
+    if verbose:
+      print(
+          termcolor.colored(
+              f'Entity {entity.name} is next to act. They must respond '
+              f' in the format: "{action_spec}".',
+              _PRINT_COLOR,
+          )
+      )
+
+  def _format_action(
+      self,
+      entity: entity_lib.Entity,
+      raw_action: str,
+      verbose: bool,
+  ) -> str:
+    """Returns the action of an entity, prefixed by its name if missing."""
+    if entity.name in raw_action:
+      action = raw_action
+    else:
+      action = f'{entity.name}: {raw_action}'
+    if verbose:
+      print(
+          termcolor.colored(
+              f'Entity {entity.name} chose action: {action}', _PRINT_COLOR
+          )
+      )
+    return action
+
   def _log(
       self,
       log: list[Mapping[str, Any]],
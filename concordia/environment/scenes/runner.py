@@ -156,9 +156,7 @@ def _get_latest_memory_item(
     tag: str,
 ) -> str:
   """Return the latest item prefixed by a tag in the memory."""
-  retrieved = memory.scan(
-      selector_fn=lambda x: x.startswith(tag),
-  )
+  retrieved = memory.retrieve_by_prefix(tag, limit=1)
   if retrieved:
     result = retrieved[-1]
     return result[result.find(tag) + len(tag) + 1:]
@@ -1,16 +1,230 @@
 """Base class for OpenAI-compatible models."""
 
 from collections.abc import Collection, Sequence
+import json
+import math
+import threading
+import time
+from typing import Any
 
 from concordia.language_model import language_model
 from concordia.utils import sampling
 from concordia.utils import measurements as measurements_lib
+import openai
+from openai import AsyncOpenAI
 from openai import OpenAI
 from typing_extensions import override
 
 
 _MAX_MULTIPLE_CHOICE_ATTEMPTS = 150
 
+# Ways of answering `sample_choice`. The single-request modes fall back to
+# sampling when the server does not support them or gives no valid answer.
+CHOICE_SCORING_SAMPLING = 'sampling'
+CHOICE_SCORING_LOGPROBS = 'logprobs'
+CHOICE_SCORING_JSON_SCHEMA = 'json_schema'
+CHOICE_SCORING_MODES = (
+    CHOICE_SCORING_SAMPLING,
+    CHOICE_SCORING_LOGPROBS,
+    CHOICE_SCORING_JSON_SCHEMA,
+)
+
+# The most alternatives to the chosen token the OpenAI API returns.
+_TOP_LOGPROBS = 20
+# The default least probability of the top tokens naming a response for the
+# 'logprobs' mode to choose without sampling.
+_MIN_CHOICE_PROBABILITY = 0.5
+_JSON_SCHEMA_MAX_TOKENS = 32
+
+# Errors of servers rejecting the logprobs or response format parameters.
+_UNSUPPORTED_PARAMETER_ERRORS = (
+    openai.BadRequestError,
+    openai.UnprocessableEntityError,
+)
+
+
+def _make_messages(prompt: str) -> list[dict[str, str]]:
+  """Returns the chat messages asking the model to continue the prompt."""
+  # The system prompt and few-shot examples from the original file are kept.
+  return [
+      {
+          'role': 'system',
+          'content': (
+              'You always continue sentences provided '
+              + 'by the user and you never repeat what '
+              + 'the user already said.'
+          ),
+      },
+      {
+          'role': 'user',
+          'content': 'Question: Is Jake a turtle?\nAnswer: Jake is ',
+      },
+      {'role': 'assistant', 'content': 'not a turtle.'},
+      {
+          'role': 'user',
+          'content': (
+              'Question: What is Priya doing right now?\nAnswer: '
+              + 'Priya is currently '
+          ),
+      },
+      {'role': 'assistant', 'content': 'sleeping.'},
+      {'role': 'user', 'content': prompt},
+  ]
+
+
+# The turns of the chat messages when written out as a single text prompt.
+_COMPLETION_TURN_SEPARATOR = '\n\n'
+_COMPLETION_ROLE_NAMES = {
+    'system': 'System',
+    'user': 'User',
+    'assistant': 'Assistant',
+}
+
+
+def _make_completion_prompt(prompt: str) -> str:
+  """Returns the chat messages of `prompt` written out as a text prompt."""
+  turns = [
+      f'{_COMPLETION_ROLE_NAMES[message["role"]]}: {message["content"]}'
+      for message in _make_messages(prompt)
+  ]
+  turns.append(f'{_COMPLETION_ROLE_NAMES["assistant"]}:')
+  return _COMPLETION_TURN_SEPARATOR.join(turns)
+
+
+def _make_choice_prompt(prompt: str, responses: Sequence[str]) -> str:
+  """Returns the prompt asking the model for one of the responses."""
+  return (
+      prompt
+      + '\nRespond EXACTLY with one of the following strings:\n'
+      + '\n'.join(responses)
+      + '.'
+  )
+
+
+def _find_terminator(
+    text: str, terminators: Collection[str], start: int = 0
+) -> int | None:
+  """Returns where the first terminator in `text[start:]` begins, if any."""
+  positions = [
+      text.find(terminator, start) for terminator in terminators if terminator
+  ]
+  positions = [position for position in positions if position >= 0]
+  return min(positions) if positions else None
+
+
+class _StreamedText:
+  """Collects streamed text until a terminator or the token budget is hit.
+
+  Terminators are matched in the text received so far, including across
+  chunk boundaries, so streams are cut short even when the server ignores or
+  truncates the stop sequences. Servers send about one token per content
+  chunk, so the token budget is checked against the number of chunks.
+  """
+
+  def __init__(self, terminators: Collection[str], max_tokens: int):
+    self._terminators = terminators
+    self._max_length = max(map(len, self._terminators), default=0)
+    self._max_tokens = max_tokens
+    self._start = time.monotonic()
+    self.text = ''
+    self.num_chunks = 0
+    self.time_to_first_token = None
+    self.cancelled = False
+
+  def add(self, chunk: Any) -> bool:
+    """Adds a chunk of the stream, returns whether the stream can be closed."""
+    if not chunk.choices or not chunk.choices[0].delta.content:
+      return False
+    if self.time_to_first_token is None:
+      self.time_to_first_token = time.monotonic() - self._start
+    search_from = max(0, len(self.text) - self._max_length + 1)
+    self.text += chunk.choices[0].delta.content
+    self.num_chunks += 1
+    end = _find_terminator(self.text, self._terminators, search_from)
+    if end is not None:
+      self.text = self.text[:end]
+      self.cancelled = True
+    elif self.num_chunks >= self._max_tokens:
+      self.cancelled = True
+    return self.cancelled
+
+  def stats(self) -> dict[str, float]:
+    """Returns the statistics of the stream.
+
+    `max_tokens_saved` is an upper bound on the tokens not generated because
+    the stream was closed early: the budget left when it was closed, which
+    the model would often not have used up anyway.
+    """
+    return {
+        'time_to_first_token_seconds': self.time_to_first_token,
+        'stream_chunks': self.num_chunks,
+        'max_tokens_saved': (
+            max(0, self._max_tokens - self.num_chunks) if self.cancelled else 0
+        ),
+    }
+
+
+def _normalize_choice(text: str) -> str:
+  return text.strip().strip('()').strip().lower()
+
+
+def _choice_from_logprobs(
+    completion,
+    responses: Sequence[str],
+    min_probability: float,
+) -> tuple[int, dict[str, float]] | None:
+  """Returns the response with the most likely first token, and the scores.
+
+  The probability of a response is the sum over the top tokens naming it, so
+  'a' and ' a' both count towards response 'a'.
+
+  Args:
+    completion: a chat completion of one token, with its top logprobs.
+    responses: the responses to choose from.
+    min_probability: the least total probability of the top tokens naming a
+      response. Below it the model mostly answers with other tokens, and the
+      most likely response among the top tokens is not a reliable choice.
+
+  Returns:
+    The index of the most likely response and the logprob of each response
+    among the top tokens, or None if the completion has no logprobs or its top
+    tokens naming a response have less than `min_probability` in total.
+  """
+  logprobs = completion.choices[0].logprobs
+  if logprobs is None or not logprobs.content:
+    return None
+  indices = {}
+  for idx, response in enumerate(responses):
+    indices.setdefault(_normalize_choice(response), idx)
+  scores = {}
+  for candidate in logprobs.content[0].top_logprobs or logprobs.content[:1]:
+    idx = indices.get(_normalize_choice(candidate.token))
+    if idx is None:
+      continue
+    response = responses[idx]
+    if response in scores:
+      high, low = sorted((scores[response], candidate.logprob), reverse=True)
+      scores[response] = high + math.log1p(math.exp(low - high))
+    else:
+      scores[response] = candidate.logprob
+  if not scores or (
+      sum(math.exp(score) for score in scores.values()) < min_probability
+  ):
+    return None
+  best = max(scores, key=scores.get)
+  return responses.index(best), scores
+
+
+def _choice_from_json(
+    completion, responses: Sequence[str]
+) -> tuple[int, dict[str, float]] | None:
+  """Returns the response a schema-constrained completion chose, if valid."""
+  try:
+    answer = json.loads(completion.choices[0].message.content)['choice']
+    return responses.index(answer), {}
+  except (TypeError, KeyError, ValueError):
+    return None
+
 
 class BaseOAICompatibleModel(language_model.LanguageModel):
   """Base class for models using an OpenAI-compatible API."""
@@ -21,6 +235,10 @@ class BaseOAICompatibleModel(language_model.LanguageModel):
       client: OpenAI,
       measurements: measurements_lib.Measurements | None = None,
       channel: str = language_model.DEFAULT_STATS_CHANNEL,
+      async_client: AsyncOpenAI | None = None,
+      choice_scoring: str = CHOICE_SCORING_LOGPROBS,
+      stream: bool = True,
+      min_choice_probability: float = _MIN_CHOICE_PROBABILITY,
   ):
     """Initializes the base instance.
 
@@ -29,11 +247,160 @@ class BaseOAICompatibleModel(language_model.LanguageModel):
       client: An initialized OpenAI client.
       measurements: The measurements object to log usage statistics to.
       channel: The channel to write the statistics to.
+      async_client: An optional asynchronous client for the same API, used by
+        `async_sample_text` and `async_sample_choice`. If None, one is created
+        with the settings of `client` on first use.
+      choice_scoring: How `sample_choice` answers. With 'logprobs', a single
+        one-token request scores the responses by the logprob of their first
+        token. With 'json_schema', a single request is constrained to a JSON
+        object naming one of the responses. With 'sampling', text is sampled
+        until it names a response, raising the temperature on each attempt.
+        The single-request modes fall back to sampling for the rest of the
+        run when the server rejects them, and for a single call when the
+        server gives no valid answer.
+      stream: Whether `sample_text` streams the response. Streams are closed
+        as soon as a terminator or `max_tokens` is reached, which the server
+        may not detect itself, and report the time to the first token and an
+        upper bound on the tokens saved by closing early. Pass False for
+        servers that do not support streamed chat completions.
+      min_choice_probability: With 'logprobs', the least total probability of
+        the top tokens naming a response. When the first token is less likely
+        to name a response, the call falls back to sampling.
+
+    Raises:
+      ValueError: if `choice_scoring` is not one of CHOICE_SCORING_MODES.
     """
+    if choice_scoring not in CHOICE_SCORING_MODES:
+      raise ValueError(
+          f'Unknown choice_scoring {choice_scoring!r}, expected one of '
+          f'{CHOICE_SCORING_MODES}.'
+      )
     self._model_name = model_name
     self._measurements = measurements
     self._channel = channel
     self._client = client
+    self._async_client = async_client
+    self._async_client_lock = threading.Lock()
+    self._choice_scoring = choice_scoring
+    self._stream = stream
+    self._min_choice_probability = min_choice_probability
+
+  @property
+  def model_name(self) -> str:
+    return self._model_name
+
+  def _get_async_client(self) -> AsyncOpenAI:
+    """Returns the asynchronous client, creating it on first use."""
+    with self._async_client_lock:
+      if self._async_client is None:
+        self._async_client = AsyncOpenAI(
+            api_key=self._client.api_key,
+            organization=self._client.organization,
+            base_url=self._client.base_url,
+            timeout=self._client.timeout,
+            max_retries=self._client.max_retries,
+        )
+      return self._async_client
+
+  def _publish_text_length(self, text: str) -> None:
+    if self._measurements is not None:
+      self._measurements.publish_datum(
+          self._channel,
+          {'raw_text_length': len(text)},
+      )
+
+  def _publish_stream_stats(self, streamed: _StreamedText) -> None:
+    if self._measurements is not None:
+      self._measurements.publish_datum(self._channel, streamed.stats())
+
+  def _text_request(
+      self,
+      prompt: str,
+      max_tokens: int,
+      terminators: Collection[str],
+      temperature: float,
+      timeout: float,
+      seed: int | None,
+  ) -> dict[str, Any]:
+    """Returns the arguments of the request for `sample_text`."""
+    return dict(
+        model=self._model_name,
+        messages=_make_messages(prompt),
+        temperature=temperature,
+        max_tokens=max_tokens,
+        timeout=timeout,
+        stop=terminators,
+        seed=seed,
+    )
+
+  def _publish_choice_requests(
+      self, mode: str, num_requests: int, choices_calls: int = 0
+  ) -> None:
+    """Publishes how a choice was made.
+
+    Args:
+      mode: the scoring mode that gave the choice.
+      num_requests: the requests the choice took, in all modes.
+      choices_calls: the failed sampling attempts before the choice.
+    """
+    if self._measurements is not None:
+      self._measurements.publish_datum(
+          self._channel,
+          {
+              'choices_calls': choices_calls,
+              'choice_scoring': mode,
+              'choice_requests': num_requests,
+          },
+      )
+
+  def _choice_request(
+      self, prompt: str, responses: Sequence[str], seed: int | None
+  ) -> dict[str, object] | None:
+    """Returns the arguments of a single-request choice, if it is enabled."""
+    request = dict(
+        model=self._model_name,
+        messages=_make_messages(_make_choice_prompt(prompt, responses)),
+        temperature=0.0,
+        seed=seed,
+    )
+    if self._choice_scoring == CHOICE_SCORING_LOGPROBS:
+      request.update(max_tokens=1, logprobs=True, top_logprobs=_TOP_LOGPROBS)
+    elif self._choice_scoring == CHOICE_SCORING_JSON_SCHEMA:
+      request.update(
+          max_tokens=_JSON_SCHEMA_MAX_TOKENS,
+          response_format={
+              'type': 'json_schema',
+              'json_schema': {
+                  'name': 'choice',
+                  'strict': True,
+                  'schema': {
+                      'type': 'object',
+                      'properties': {
+                          'choice': {'type': 'string', 'enum': list(responses)}
+                      },
+                      'required': ['choice'],
+                      'additionalProperties': False,
+                  },
+              },
+          },
+      )
+    else:
+      return None
+    return request
+
+  def _parse_choice(
+      self, completion, responses: Sequence[str]
+  ) -> tuple[int, dict[str, float]] | None:
+    """Returns the choice in the answer to `_choice_request`, if valid."""
+    if self._choice_scoring == CHOICE_SCORING_LOGPROBS:
+      if completion.choices[0].logprobs is None:
+        # The server ignored the parameter, so it will not return logprobs.
+        self._choice_scoring = CHOICE_SCORING_SAMPLING
+        return None
+      return _choice_from_logprobs(
+          completion, responses, self._min_choice_probability
+      )
+    return _choice_from_json(completion, responses)
 
   @override
   def sample_text(
@@ -47,48 +414,121 @@ class BaseOAICompatibleModel(language_model.LanguageModel):
       seed: int | None = None,
   ) -> str:
     """Samples text from the model."""
-    # The system prompt and few-shot examples from the original file are kept.
-    messages = [
-        {
-            'role': 'system',
-            'content': (
-                'You always continue sentences provided '
-                + 'by the user and you never repeat what '
-                + 'the user already said.'
-            ),
-        },
-        {
-            'role': 'user',
-            'content': 'Question: Is Jake a turtle?\nAnswer: Jake is ',
-        },
-        {'role': 'assistant', 'content': 'not a turtle.'},
-        {
-            'role': 'user',
-            'content': (
-                'Question: What is Priya doing right now?\nAnswer: '
-                + 'Priya is currently '
-            ),
-        },
-        {'role': 'assistant', 'content': 'sleeping.'},
-        {'role': 'user', 'content': prompt},
-    ]
+    request = self._text_request(
+        prompt, max_tokens, terminators, temperature, timeout, seed
+    )
+    if not self._stream:
+      response = self._client.chat.completions.create(**request)
+      text = response.choices[0].message.content
+      end = _find_terminator(text, terminators)
+      if end is not None:
+        text = text[:end]
+    else:
+      streamed = _StreamedText(terminators, max_tokens)
+      stream = self._client.chat.completions.create(**request, stream=True)
+      try:
+        for chunk in stream:
+          if streamed.add(chunk):
+            break
+      finally:
+        stream.close()
+      self._publish_stream_stats(streamed)
+      text = streamed.text
+    self._publish_text_length(text)
+    return text
 
-    response = self._client.chat.completions.create(
+  @override
+  async def async_sample_text(
+      self,
+      prompt: str,
+      *,
+      max_tokens: int = language_model.DEFAULT_MAX_TOKENS,
+      terminators: Collection[str] = language_model.DEFAULT_TERMINATORS,
+      temperature: float = language_model.DEFAULT_TEMPERATURE,
+      timeout: float = language_model.DEFAULT_TIMEOUT_SECONDS,
+      seed: int | None = None,
+  ) -> str:
+    """Samples text from the model with the asynchronous client."""
+    request = self._text_request(
+        prompt, max_tokens, terminators, temperature, timeout, seed
+    )
+    client = self._get_async_client()
+    if not self._stream:
+      response = await client.chat.completions.create(**request)
+      text = response.choices[0].message.content
+      end = _find_terminator(text, terminators)
+      if end is not None:
+        text = text[:end]
+    else:
+      streamed = _StreamedText(terminators, max_tokens)
+      stream = await client.chat.completions.create(**request, stream=True)
+      try:
+        async for chunk in stream:
+          if streamed.add(chunk):
+            break
+      finally:
+        await stream.close()
+      self._publish_stream_stats(streamed)
+      text = streamed.text
+    self._publish_text_length(text)
+    return text
+
+  def sample_text_batch(
+      self,
+      prompts: Sequence[str],
+      *,
+      max_tokens: int = language_model.DEFAULT_MAX_TOKENS,
+      terminators: Collection[str] = language_model.DEFAULT_TERMINATORS,
+      temperature: float = language_model.DEFAULT_TEMPERATURE,
+      timeout: float = language_model.DEFAULT_TIMEOUT_SECONDS,
+      seed: int | None = None,
+  ) -> list[str]:
+    """Samples continuations of many prompts in a single request.
+
+    Uses the completions endpoint, which takes a list of prompts on local
+    servers like vLLM, llama.cpp or LM Studio. The endpoint takes no chat
+    messages, so each prompt is sent with the system message and few-shot
+    examples of `sample_text` written out as a transcript, and the response
+    is cut where the model starts a new turn of it. Models served for chat
+    only have no completions endpoint and fail here; use `sample_text`.
+
+    Args:
+      prompts: the texts to condition on.
+      max_tokens: the maximum number of tokens in each response.
+      terminators: each response will be terminated before any of these
+        characters.
+      temperature: temperature for the model.
+      timeout: timeout for the request.
+      seed: optional seed for the sampling. If None a random seed will be used.
+
+    Returns:
+      The sampled response of each prompt, in order.
+    """
+    response = self._client.completions.create(
         model=self._model_name,
-        messages=messages,
+        prompt=[_make_completion_prompt(prompt) for prompt in prompts],
         temperature=temperature,
         max_tokens=max_tokens,
         timeout=timeout,
         stop=terminators,
         seed=seed,
     )
-
-    if self._measurements is not None:
-      self._measurements.publish_datum(
-          self._channel,
-          {'raw_text_length': len(response.choices[0].message.content)},
-      )
-    return response.choices[0].message.content
+    turn_starts = [
+        f'{_COMPLETION_TURN_SEPARATOR}{role}:'
+        for role in _COMPLETION_ROLE_NAMES.values()
+    ]
+    texts = [''] * len(prompts)
+    for choice in response.choices:
+      # The transcript ends with 'Assistant:', so the answer starts with the
+      # space that follows it in the earlier turns.
+      text = choice.text.removeprefix(' ')
+      end = _find_terminator(text, [*terminators, *turn_starts])
+      if end is not None:
+        text = text[:end]
+      texts[choice.index] = text
+    for text in texts:
+      self._publish_text_length(text)
+    return texts
 
   @override
   def sample_choice(
@@ -99,13 +539,21 @@ class BaseOAICompatibleModel(language_model.LanguageModel):
       seed: int | None = None,
   ) -> tuple[int, str, dict[str, float]]:
     """Samples a choice from a list of responses."""
-    prompt = (
-        prompt
-        + '\nRespond EXACTLY with one of the following strings:\n'
-        + '\n'.join(responses)
-        + '.'
-    )
+    mode = self._choice_scoring
+    request = self._choice_request(prompt, responses, seed)
+    if request is not None:
+      try:
+        completion = self._client.chat.completions.create(**request)
+      except _UNSUPPORTED_PARAMETER_ERRORS:
+        self._choice_scoring = CHOICE_SCORING_SAMPLING
+      else:
+        choice = self._parse_choice(completion, responses)
+        if choice is not None:
+          self._publish_choice_requests(mode, 1)
+          idx, debug = choice
+          return idx, responses[idx], debug
 
+    prompt = _make_choice_prompt(prompt, responses)
     sample = ''
     answer = ''
     for attempts in range(_MAX_MULTIPLE_CHOICE_ATTEMPTS):
@@ -124,10 +572,68 @@ class BaseOAICompatibleModel(language_model.LanguageModel):
       except ValueError:
         continue
       else:
-        if self._measurements is not None:
-          self._measurements.publish_datum(
-              self._channel, {'choices_calls': attempts}
-          )
+        self._publish_choice_requests(
+            CHOICE_SCORING_SAMPLING,
+            attempts + 1 + (request is not None),
+            attempts,
+        )
+        debug = {}
+        return idx, responses[idx], debug
+
+    raise language_model.InvalidResponseError((
+        f'Too many multiple choice attempts.\nLast attempt: {sample}, '
+        + f'extracted: {answer}'
+    ))
+
+  @override
+  async def async_sample_choice(
+      self,
+      prompt: str,
+      responses: Sequence[str],
+      *,
+      seed: int | None = None,
+  ) -> tuple[int, str, dict[str, float]]:
+    """Samples a choice from a list of responses with the async client."""
+    mode = self._choice_scoring
+    request = self._choice_request(prompt, responses, seed)
+    if request is not None:
+      try:
+        completion = await self._get_async_client().chat.completions.create(
+            **request
+        )
+      except _UNSUPPORTED_PARAMETER_ERRORS:
+        self._choice_scoring = CHOICE_SCORING_SAMPLING
+      else:
+        choice = self._parse_choice(completion, responses)
+        if choice is not None:
+          self._publish_choice_requests(mode, 1)
+          idx, debug = choice
+          return idx, responses[idx], debug
+
+    prompt = _make_choice_prompt(prompt, responses)
+    sample = ''
+    answer = ''
+    for attempts in range(_MAX_MULTIPLE_CHOICE_ATTEMPTS):
+      temperature = sampling.dynamically_adjust_temperature(
+          attempts, _MAX_MULTIPLE_CHOICE_ATTEMPTS
+      )
+
+      sample = await self.async_sample_text(
+          prompt,
+          temperature=temperature,
+          seed=seed,
+      )
+      answer = sampling.extract_choice_response(sample)
+      try:
+        idx = responses.index(answer)
+      except ValueError:
+        continue
+      else:
+        self._publish_choice_requests(
+            CHOICE_SCORING_SAMPLING,
+            attempts + 1 + (request is not None),
+            attempts,
+        )
         debug = {}
         return idx, responses[idx], debug
 
@@ -0,0 +1,310 @@
+"""Tests for OpenAI-compatible models, against a stub server."""
+
+import asyncio
+import http.server
+import json
+import math
+import threading
+import time
+
+from absl.testing import absltest
+from concordia.language_model import base_oai_compatible
+from concordia.language_model import language_model
+from concordia.utils import measurements as measurements_lib
+import openai
+
+
+class _StubHandler(http.server.BaseHTTPRequestHandler):
+  """Answers chat requests with the canned responses of its server."""
+
+  def do_POST(self):  # pylint: disable=invalid-name
+    request = json.loads(self.rfile.read(int(self.headers['Content-Length'])))
+    self.server.requests.append(request)
+    logprobs = None
+    if 'response_format' in request:
+      content = json.dumps({'choice': self.server.schema_choice})
+    elif request.get('logprobs'):
+      if self.server.top_logprobs is None:
+        self._send(400, {'error': {'message': 'logprobs are not supported'}})
+        return
+      content = self.server.top_logprobs[0][0]
+      top_logprobs = [
+          {'token': token, 'logprob': logprob, 'bytes': None}
+          for token, logprob in self.server.top_logprobs
+      ]
+      logprobs = {'content': [dict(top_logprobs[0], top_logprobs=top_logprobs)]}
+    else:
+      reply = self.server.replies.pop(0)
+      if request.get('stream'):
+        self._stream(request, [reply] if isinstance(reply, str) else reply)
+        return
+      content = reply if isinstance(reply, str) else ''.join(reply)
+    self._send(200, {
+        'id': 'chat',
+        'object': 'chat.completion',
+        'created': 0,
+        'model': request['model'],
+        'choices': [{
+            'index': 0,
+            'message': {'role': 'assistant', 'content': content},
+            'logprobs': logprobs,
+            'finish_reason': 'stop',
+        }],
+    })
+
+  def _send(self, status, body):
+    data = json.dumps(body).encode('utf-8')
+    self.send_response(status)
+    self.send_header('Content-Type', 'application/json')
+    self.send_header('Content-Length', str(len(data)))
+    self.end_headers()
+    self.wfile.write(data)
+
+  def _stream(self, request, tokens):
+    self.send_response(200)
+    self.send_header('Content-Type', 'text/event-stream')
+    self.end_headers()
+    chunks = [
+        {'index': 0, 'delta': {'content': token}, 'finish_reason': None}
+        for token in tokens
+    ]
+    try:
+      for chunk in chunks:
+        self.wfile.write(b'data: ' + json.dumps({
+            'id': 'chat',
+            'object': 'chat.completion.chunk',
+            'created': 0,
+            'model': request['model'],
+            'choices': [chunk],
+        }).encode('utf-8') + b'\n\n')
+        self.wfile.flush()
+        self.server.chunks_sent += 1
+        time.sleep(self.server.chunk_delay)
+      self.wfile.write(b'data: [DONE]\n\n')
+    except ConnectionError:
+      pass
+
+  def log_message(self, *args):
+    pass
+
+
+class _StubServerTest(absltest.TestCase):
+
+  def setUp(self):
+    super().setUp()
+    self._server = http.server.ThreadingHTTPServer(
+        ('127.0.0.1', 0), _StubHandler
+    )
+    self._server.requests = []
+    self._server.replies = []
+    self._server.top_logprobs = None
+    self._server.schema_choice = None
+    self._server.chunks_sent = 0
+    self._server.chunk_delay = 0.0
+    threading.Thread(target=self._server.serve_forever, daemon=True).start()
+    self.addCleanup(self._server.server_close)
+    self.addCleanup(self._server.shutdown)
+    self._measurements = measurements_lib.Measurements()
+
+  def _make_model(self, **kwargs):
+    client = openai.OpenAI(
+        api_key='stub',
+        base_url=f'http://127.0.0.1:{self._server.server_port}/v1',
+        max_retries=0,
+    )
+    return base_oai_compatible.BaseOAICompatibleModel(
+        model_name='stub',
+        client=client,
+        measurements=self._measurements,
+        **kwargs,
+    )
+
+  def _published(self, key):
+    return [
+        datum
+        for datum in self._measurements.get_channel(
+            language_model.DEFAULT_STATS_CHANNEL
+        )
+        if key in datum
+    ]
+
+
+class StreamingTest(_StubServerTest):
+
+  def test_closes_stream_at_terminator(self):
+    self._server.chunk_delay = 0.01
+    self._server.replies = [['Yes', ',', ' she', ' did', '.\nAnd', ' then']
+                            + [' more'] * 100]
+    model = self._make_model()
+
+    text = model.sample_text('Question?', terminators=('\n',), max_tokens=200)
+
+    self.assertEqual(text, 'Yes, she did.')
+    time.sleep(0.05)
+    self.assertLess(self._server.chunks_sent, 20)
+    (stats,) = self._published('max_tokens_saved')
+    self.assertEqual(stats['stream_chunks'], 5)
+    self.assertEqual(stats['max_tokens_saved'], 195)
+    self.assertIsNotNone(stats['time_to_first_token_seconds'])
+
+  def test_matches_terminators_across_chunks(self):
+    self._server.replies = [['one', ' END', 'ING', ' two']]
+    model = self._make_model()
+
+    text = model.sample_text('Question?', terminators=('ENDING',))
+
+    self.assertEqual(text, 'one ')
+
+  def test_closes_stream_at_token_budget(self):
+    self._server.replies = [['a'] * 10]
+    model = self._make_model()
+
+    self.assertEqual(model.sample_text('Question?', max_tokens=3), 'aaa')
+
+  def test_async_closes_stream_at_terminator(self):
+    self._server.replies = [['Hello', ' world', '\n', 'more']]
+    model = self._make_model()
+
+    text = asyncio.run(
+        model.async_sample_text('Question?', terminators=('\n',))
+    )
+
+    self.assertEqual(text, 'Hello world')
+
+  def test_truncates_unstreamed_text_at_terminator(self):
+    self._server.replies = ['Hello world\nmore']
+    model = self._make_model(stream=False)
+
+    text = model.sample_text('Question?', terminators=('\n',))
+
+    self.assertEqual(text, 'Hello world')
+    (request,) = self._server.requests
+    self.assertNotIn('stream', request)
+
+
+class ChoiceScoringTest(_StubServerTest):
+
+  def test_scores_choice_in_a_single_request(self):
+    self._server.top_logprobs = [('b', -0.1), (' a', -2.5), ('x', -3.0)]
+    model = self._make_model()
+
+    idx, response, debug = model.sample_choice('Question?', ['a', 'b', 'c'])
+
+    self.assertEqual((idx, response), (1, 'b'))
+    self.assertEqual(debug, {'b': -0.1, 'a': -2.5})
+    (request,) = self._server.requests
+    self.assertEqual(request['max_tokens'], 1)
+    self.assertTrue(request['logprobs'])
+    self.assertEqual(
+        self._published('choice_scoring'),
+        [{
+            'choices_calls': 0,
+            'choice_scoring': 'logprobs',
+            'choice_requests': 1,
+        }],
+    )
+
+  def test_async_scores_choice_in_a_single_request(self):
+    self._server.top_logprobs = [('(c', -0.2), ('a', -1.0)]
+    model = self._make_model()
+
+    idx, response, _ = asyncio.run(
+        model.async_sample_choice('Question?', ['a', 'b', 'c'])
+    )
+
+    self.assertEqual((idx, response), (2, 'c'))
+    self.assertLen(self._server.requests, 1)
+
+  def test_falls_back_to_sampling_when_logprobs_are_rejected(self):
+    self._server.replies = ['(z', 'a', 'b']
+    model = self._make_model()
+
+    self.assertEqual(model.sample_choice('Question?', ['a', 'b'])[1], 'a')
+    self.assertEqual(model.sample_choice('Question?', ['a', 'b'])[1], 'b')
+
+    self.assertEqual(
+        [request.get('logprobs') for request in self._server.requests],
+        [True, None, None, None],
+    )
+    self.assertEqual(
+        self._published('choice_scoring'),
+        [
+            {
+                'choices_calls': 1,
+                'choice_scoring': 'sampling',
+                'choice_requests': 3,
+            },
+            {
+                'choices_calls': 0,
+                'choice_scoring': 'sampling',
+                'choice_requests': 1,
+            },
+        ],
+    )
+
+  def test_falls_back_when_no_top_token_is_a_response(self):
+    self._server.top_logprobs = [('The', -0.1), ('I', -1.0)]
+    self._server.replies = ['b']
+    model = self._make_model()
+
+    self.assertEqual(model.sample_choice('Question?', ['a', 'b'])[1], 'b')
+    self.assertLen(self._server.requests, 2)
+
+  def test_falls_back_when_responses_have_little_probability(self):
+    self._server.top_logprobs = [('The', -0.05), ('a', -3.5), ('b', -4.0)]
+    self._server.replies = ['b']
+    model = self._make_model()
+
+    self.assertEqual(model.sample_choice('Question?', ['a', 'b'])[1], 'b')
+    self.assertLen(self._server.requests, 2)
+    self.assertEqual(
+        self._published('choice_scoring'),
+        [{
+            'choices_calls': 0,
+            'choice_scoring': 'sampling',
+            'choice_requests': 2,
+        }],
+    )
+
+  def test_async_falls_back_when_responses_have_little_probability(self):
+    self._server.top_logprobs = [('I', -0.1), ('(a', -2.5)]
+    self._server.replies = ['b']
+    model = self._make_model()
+
+    _, response, _ = asyncio.run(
+        model.async_sample_choice('Question?', ['a', 'b'])
+    )
+
+    self.assertEqual(response, 'b')
+    self.assertLen(self._server.requests, 2)
+
+  def test_sums_probability_of_tokens_naming_a_response(self):
+    self._server.top_logprobs = [
+        ('The', -1.0), ('a', -1.6), (' a', -1.6), ('b', -1.2)
+    ]
+    model = self._make_model(min_choice_probability=0.6)
+
+    idx, response, debug = model.sample_choice('Question?', ['a', 'b'])
+
+    self.assertEqual((idx, response), (0, 'a'))
+    self.assertAlmostEqual(debug['a'], -1.6 + math.log(2))
+    self.assertLen(self._server.requests, 1)
+
+  def test_json_schema_choice(self):
+    self._server.schema_choice = 'b'
+    model = self._make_model(choice_scoring='json_schema')
+
+    self.assertEqual(model.sample_choice('Question?', ['a', 'b'])[:2], (1, 'b'))
+    (request,) = self._server.requests
+    self.assertEqual(
+        request['response_format']['json_schema']['schema']['properties'],
+        {'choice': {'type': 'string', 'enum': ['a', 'b']}},
+    )
+
+  def test_rejects_unknown_mode(self):
+    with self.assertRaises(ValueError):
+      self._make_model(choice_scoring='grammar')
+
+
+if __name__ == '__main__':
+  absltest.main()
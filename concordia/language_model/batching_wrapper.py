@@ -0,0 +1,252 @@
+"""Wrapper to send concurrent calls to a language model in batches."""
+
+import asyncio
+from collections.abc import Collection, Mapping, Sequence
+from concurrent import futures
+import dataclasses
+import queue
+import threading
+import time
+from typing import Any, Protocol
+
+from concordia.language_model import language_model
+from concordia.utils import concurrency
+from typing_extensions import override
+
+
+class BatchSampler(Protocol):
+  """Samples continuations of many prompts with the same parameters."""
+
+  def __call__(
+      self,
+      prompts: Sequence[str],
+      *,
+      max_tokens: int,
+      terminators: Collection[str],
+      temperature: float,
+      timeout: float,
+      seed: int | None,
+  ) -> Sequence[str]:
+    ...
+
+
+@dataclasses.dataclass(frozen=True)
+class _Parameters:
+  """The sampling parameters shared by the calls of a batch."""
+
+  max_tokens: int
+  terminators: tuple[str, ...]
+  temperature: float
+  timeout: float
+  seed: int | None
+
+  def as_kwargs(self) -> dict[str, Any]:
+    return dataclasses.asdict(self)
+
+
+@dataclasses.dataclass(frozen=True)
+class _Call:
+  prompt: str
+  parameters: _Parameters
+  future: futures.Future[str]
+
+
+class BatchingLanguageModel(language_model.LanguageModel):
+  """Wraps an underlying language model and sends its text calls in batches.
+
+  Calls to `sample_text` made concurrently, e.g. by the entities of a step or
+  the components of an entity, are collected for up to `max_wait_seconds`
+  and sent together, which cuts the per-request overhead of a local
+  inference server and lets it batch the prompts on its accelerator. Calls
+  are batched with the calls sharing their sampling parameters.
+
+  A batch is sent with `batch_sampler` if given, e.g. the
+  `sample_text_batch` method of an OpenAI-compatible model using the
+  multi-prompt completions endpoint. Otherwise its calls are sent at once
+  with `async_sample_text`, which for OpenAI-compatible models pipelines
+  them over the keep-alive connections of a single asynchronous client.
+  `sample_choice` is forwarded to the underlying model.
+  """
+
+  def __init__(
+      self,
+      model: language_model.LanguageModel,
+      *,
+      batch_sampler: BatchSampler | None = None,
+      max_batch_size: int = 32,
+      max_wait_seconds: float = 0.005,
+      max_concurrent_batches: int = 4,
+  ) -> None:
+    """Wrap the underlying language model with batching.
+
+    Args:
+      model: A language model to wrap with batching.
+      batch_sampler: optional function sampling many prompts in one request.
+      max_batch_size: the maximum number of calls in a batch.
+      max_wait_seconds: how long the first call of a batch waits for others.
+      max_concurrent_batches: the maximum number of batches in flight.
+
+    Raises:
+      ValueError: if a size or count is not positive or the wait is negative.
+    """
+    if max_batch_size <= 0 or max_concurrent_batches <= 0:
+      raise ValueError(
+          'max_batch_size and max_concurrent_batches must be positive.'
+      )
+    if max_wait_seconds < 0:
+      raise ValueError('max_wait_seconds must not be negative.')
+    self._model = model
+    self._batch_sampler = batch_sampler
+    self._max_batch_size = max_batch_size
+    self._max_wait_seconds = max_wait_seconds
+    self._max_concurrent_batches = max_concurrent_batches
+    self._calls: queue.SimpleQueue[_Call | None] = queue.SimpleQueue()
+    self._lock = threading.Lock()
+    self._dispatcher = None
+    self._executor = None
+    self._num_calls = 0
+    self._num_batches = 0
+
+  def _submit(self, call: _Call) -> None:
+    """Queues a call, starting the dispatcher thread if needed."""
+    with self._lock:
+      if self._dispatcher is None:
+        self._executor = futures.ThreadPoolExecutor(
+            max_workers=self._max_concurrent_batches,
+            thread_name_prefix='language_model_batch',
+        )
+        self._dispatcher = threading.Thread(
+            target=self._dispatch,
+            args=(self._executor,),
+            name='language_model_batching',
+            daemon=True,
+        )
+        self._dispatcher.start()
+      self._calls.put(call)
+
+  def close(self) -> None:
+    """Sends the pending calls and stops the dispatcher thread.
+
+    The model can still be used afterwards, which starts a new dispatcher.
+    """
+    with self._lock:
+      dispatcher, self._dispatcher = self._dispatcher, None
+      executor, self._executor = self._executor, None
+      if dispatcher is not None:
+        # Calls queued before it are still sent by this dispatcher.
+        self._calls.put(None)
+    if dispatcher is not None:
+      dispatcher.join()
+      executor.shutdown()
+
+  def _dispatch(self, executor: futures.ThreadPoolExecutor) -> None:
+    """Collects the calls into batches until closed."""
+    while True:
+      call = self._calls.get()
+      if call is None:
+        return
+      batches = {call.parameters: [call]}
+      num_calls = 1
+      deadline = time.monotonic() + self._max_wait_seconds
+      closed = False
+      while num_calls < self._max_batch_size:
+        try:
+          call = self._calls.get(timeout=max(deadline - time.monotonic(), 0))
+        except queue.Empty:
+          break
+        if call is None:
+          closed = True
+          break
+        batches.setdefault(call.parameters, []).append(call)
+        num_calls += 1
+      for parameters, calls in batches.items():
+        with self._lock:
+          self._num_calls += len(calls)
+          self._num_batches += 1
+        executor.submit(self._send, parameters, calls)
+      if closed:
+        return
+
+  def _send(self, parameters: _Parameters, calls: Sequence[_Call]) -> None:
+    """Sends a batch and hands each result to its call."""
+    prompts = [call.prompt for call in calls]
+    try:
+      if self._batch_sampler is not None:
+        results = list(
+            self._batch_sampler(prompts, **parameters.as_kwargs())
+        )
+        if len(results) != len(prompts):
+          raise ValueError(
+              f'Batch sampler returned {len(results)} results for '
+              f'{len(prompts)} prompts.'
+          )
+      else:
+        results = concurrency.run_coroutine(self._send_async(
+            prompts, parameters
+        ))
+    except Exception as error:  # pylint: disable=broad-exception-caught
+      for call in calls:
+        call.future.set_exception(error)
+      return
+    for call, result in zip(calls, results):
+      if isinstance(result, BaseException):
+        call.future.set_exception(result)
+      else:
+        call.future.set_result(result)
+
+  async def _send_async(
+      self, prompts: Sequence[str], parameters: _Parameters
+  ) -> list[str | BaseException]:
+    return await asyncio.gather(
+        *(
+            self._model.async_sample_text(prompt, **parameters.as_kwargs())
+            for prompt in prompts
+        ),
+        return_exceptions=True,
+    )
+
+  @override
+  def sample_text(
+      self,
+      prompt: str,
+      *,
+      max_tokens: int = language_model.DEFAULT_MAX_TOKENS,
+      terminators: Collection[str] = language_model.DEFAULT_TERMINATORS,
+      temperature: float = language_model.DEFAULT_TEMPERATURE,
+      timeout: float = language_model.DEFAULT_TIMEOUT_SECONDS,
+      seed: int | None = None,
+  ) -> str:
+    future = futures.Future()
+    self._submit(_Call(
+        prompt=prompt,
+        parameters=_Parameters(
+            max_tokens=max_tokens,
+            terminators=tuple(terminators),
+            temperature=temperature,
+            timeout=timeout,
+            seed=seed,
+        ),
+        future=future,
+    ))
+    return future.result()
+
+  @override
+  def sample_choice(
+      self,
+      prompt: str,
+      responses: Sequence[str],
+      *,
+      seed: int | None = None,
+  ) -> tuple[int, str, Mapping[str, Any]]:
+    return self._model.sample_choice(prompt, responses, seed=seed)
+
+  def get_stats(self) -> Mapping[str, float]:
+    """Returns the number of calls and batches sent and the mean batch size."""
+    with self._lock:
+      return {
+          'num_calls': self._num_calls,
+          'num_batches': self._num_batches,
+          'mean_batch_size': (
+              self._num_calls / self._num_batches if self._num_batches else 0.0
+          ),
+      }
@@ -0,0 +1,168 @@
+"""Tests for the batching language model wrapper, against a stub server."""
+
+from concurrent import futures
+import http.server
+import json
+import threading
+
+from absl.testing import absltest
+from concordia.language_model import base_oai_compatible
+from concordia.language_model import batching_wrapper
+import openai
+
+
+def _last_user_turn(prompt):
+  return prompt.rsplit('User: ', 1)[1].removesuffix('\n\nAssistant:')
+
+
+class _StubHandler(http.server.BaseHTTPRequestHandler):
+  """Answers OpenAI-compatible requests by echoing the prompts."""
+
+  def do_POST(self):  # pylint: disable=invalid-name
+    request = json.loads(self.rfile.read(int(self.headers['Content-Length'])))
+    self.server.requests.append((self.path, request))
+    if self.path.endswith('/completions') and 'prompt' in request:
+      body = {
+          'id': 'completion',
+          'object': 'text_completion',
+          'created': 0,
+          'model': request['model'],
+          'choices': [
+              {
+                  'index': i,
+                  'text': f' {_last_user_turn(prompt)}!\n\nUser: more',
+                  'finish_reason': 'stop',
+              }
+              for i, prompt in enumerate(request['prompt'])
+          ],
+      }
+    else:
+      body = {
+          'id': 'chat',
+          'object': 'chat.completion',
+          'created': 0,
+          'model': request['model'],
+          'choices': [{
+              'index': 0,
+              'message': {
+                  'role': 'assistant',
+                  'content': f'{request["messages"][-1]["content"]}!',
+              },
+              'finish_reason': 'stop',
+          }],
+      }
+    data = json.dumps(body).encode('utf-8')
+    self.send_response(200)
+    self.send_header('Content-Type', 'application/json')
+    self.send_header('Content-Length', str(len(data)))
+    self.end_headers()
+    self.wfile.write(data)
+
+  def log_message(self, *args):
+    pass
+
+
+class BatchingLanguageModelTest(absltest.TestCase):
+
+  def setUp(self):
+    super().setUp()
+    self._server = http.server.ThreadingHTTPServer(
+        ('127.0.0.1', 0), _StubHandler
+    )
+    self._server.requests = []
+    threading.Thread(target=self._server.serve_forever, daemon=True).start()
+    self.addCleanup(self._server.server_close)
+    self.addCleanup(self._server.shutdown)
+    client = openai.OpenAI(
+        api_key='stub',
+        base_url=f'http://127.0.0.1:{self._server.server_port}/v1',
+    )
+    self._model = base_oai_compatible.BaseOAICompatibleModel(
+        model_name='stub', client=client, stream=False
+    )
+
+  def _sample_concurrently(self, model, prompts, **kwargs):
+    with futures.ThreadPoolExecutor(max_workers=len(prompts)) as executor:
+      return list(executor.map(
+          lambda prompt: model.sample_text(prompt, **kwargs), prompts
+      ))
+
+  def test_concurrent_calls_share_a_request(self):
+    model = batching_wrapper.BatchingLanguageModel(
+        self._model,
+        batch_sampler=self._model.sample_text_batch,
+        max_wait_seconds=0.2,
+    )
+    self.addCleanup(model.close)
+    prompts = [f'prompt {i}' for i in range(8)]
+
+    results = self._sample_concurrently(model, prompts, seed=1)
+
+    self.assertEqual(results, [f'{prompt}!' for prompt in prompts])
+    self.assertLess(len(self._server.requests), len(prompts))
+    for path, request in self._server.requests:
+      self.assertEqual(path, '/v1/completions')
+      self.assertEqual(request['seed'], 1)
+    self.assertEqual(model.get_stats()['num_calls'], 8)
+
+  def test_batches_have_uniform_parameters(self):
+    model = batching_wrapper.BatchingLanguageModel(
+        self._model,
+        batch_sampler=self._model.sample_text_batch,
+        max_wait_seconds=0.2,
+    )
+    self.addCleanup(model.close)
+
+    with futures.ThreadPoolExecutor(max_workers=2) as executor:
+      hot = executor.submit(model.sample_text, 'hot', temperature=1.0)
+      cold = executor.submit(model.sample_text, 'cold', temperature=0.0)
+      self.assertEqual((hot.result(), cold.result()), ('hot!', 'cold!'))
+    self.assertCountEqual(
+        [
+            [_last_user_turn(prompt) for prompt in request['prompt']]
+            for _, request in self._server.requests
+        ],
+        [['hot'], ['cold']],
+    )
+
+  def test_batch_sampler_frames_and_truncates_responses(self):
+    texts = self._model.sample_text_batch(
+        ['one', 'two, three'], terminators=(',',)
+    )
+
+    self.assertEqual(texts, ['one!', 'two'])
+    ((_, request),) = self._server.requests
+    for prompt in request['prompt']:
+      self.assertStartsWith(prompt, 'System: You always continue sentences')
+      self.assertIn('Assistant: not a turtle.', prompt)
+      self.assertEndsWith(prompt, 'Assistant:')
+
+  def test_pipelines_chat_requests_without_batch_sampler(self):
+    model = batching_wrapper.BatchingLanguageModel(self._model)
+    self.addCleanup(model.close)
+    prompts = [f'prompt {i}' for i in range(4)]
+
+    results = self._sample_concurrently(model, prompts)
+
+    self.assertEqual(results, [f'{prompt}!' for prompt in prompts])
+    self.assertEqual(
+        {path for path, _ in self._server.requests}, {'/v1/chat/completions'}
+    )
+
+  def test_errors_reach_each_call(self):
+
+    def failing_sampler(prompts, **kwargs):
+      del prompts, kwargs
+      raise ConnectionError()
+
+    model = batching_wrapper.BatchingLanguageModel(
+        self._model, batch_sampler=failing_sampler
+    )
+    self.addCleanup(model.close)
+
+    with self.assertRaises(ConnectionError):
+      model.sample_text('prompt')
+
+
+if __name__ == '__main__':
+  absltest.main()
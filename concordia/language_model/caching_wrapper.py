@@ -0,0 +1,374 @@
+"""Wrapper to cache the responses of an underlying language model."""
+
+import asyncio
+import collections
+from collections.abc import Collection, Mapping, Sequence
+from concurrent import futures
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+from typing import Any
+
+from concordia.language_model import language_model
+from typing_extensions import override
+
+
+# Only calls whose response is reproducible are cached: those with a seed, and
+# text sampled at temperature 0.
+CACHE_DETERMINISTIC = 'deterministic'
+# All calls are cached. The n-th identical call of a run replays the n-th
+# response recorded for it, so a re-run replays the same sequence of responses.
+CACHE_ALWAYS = 'always'
+CACHE_POLICIES = (CACHE_DETERMINISTIC, CACHE_ALWAYS)
+
+_SQLITE_FILE = 'responses.sqlite'
+
+
+def _cache_key(*fields: Any) -> str:
+  """Returns the cache key of a call with the given fields."""
+  return hashlib.blake2b(
+      json.dumps(fields).encode('utf-8'), digest_size=16
+  ).hexdigest()
+
+
+def _serialize_choice(idx: int, response: str, info: Mapping[str, Any]) -> str:
+  """Serializes a choice, dropping its info if it is not serializable."""
+  try:
+    return json.dumps([idx, response, info])
+  except TypeError:
+    return json.dumps([idx, response, {}])
+
+
+class _SQLiteStore:
+  """Durable key-value store of serialized responses.
+
+  Each response is committed as soon as it is written, so the responses of an
+  interrupted run are kept.
+  """
+
+  def __init__(self, directory: str):
+    os.makedirs(directory, exist_ok=True)
+    self._connection = sqlite3.connect(
+        os.path.join(directory, _SQLITE_FILE), check_same_thread=False
+    )
+    self._connection.execute('PRAGMA journal_mode=WAL')
+    self._connection.execute(
+        'CREATE TABLE IF NOT EXISTS responses '
+        '(key TEXT PRIMARY KEY, value TEXT NOT NULL)'
+    )
+    self._connection.commit()
+
+  def __len__(self) -> int:
+    return self._connection.execute(
+        'SELECT COUNT(*) FROM responses'
+    ).fetchone()[0]
+
+  def get(self, key: str) -> str | None:
+    """Returns the stored value for the key, or None if missing."""
+    row = self._connection.execute(
+        'SELECT value FROM responses WHERE key = ?', (key,)
+    ).fetchone()
+    return None if row is None else row[0]
+
+  def put(self, key: str, value: str) -> None:
+    """Stores a value, keeping the existing one if the key is present."""
+    with self._connection:
+      self._connection.execute(
+          'INSERT OR IGNORE INTO responses (key, value) VALUES (?, ?)',
+          (key, value),
+      )
+
+  def close(self) -> None:
+    self._connection.close()
+
+
+class CachingLanguageModel(language_model.LanguageModel):
+  """Wraps an underlying language model and caches its responses.
+
+  Calls are keyed by a digest of the model id and every argument that affects
+  the response: the prompt, max_tokens, terminators, temperature and seed of
+  `sample_text`, and the prompt, responses and seed of `sample_choice`.
+  Responses are kept in a bounded in-memory LRU cache and, if a cache
+  directory is given, in a SQLite database that survives restarts, so
+  re-running a failed simulation replays the calls it completed instead of
+  sending them to the model again.
+
+  The info returned by `sample_choice` is only stored on disk if it can be
+  serialized to JSON; otherwise an empty info is replayed from disk.
+
+  The async methods call the async methods of the underlying model, and read
+  and write the on-disk store on a thread of the cache, so that the event
+  loop is never blocked on SQLite.
+  """
+
+  def __init__(
+      self,
+      model: language_model.LanguageModel,
+      *,
+      model_id: str,
+      policy: str = CACHE_DETERMINISTIC,
+      max_entries: int = 10_000,
+      cache_dir: str | None = None,
+  ) -> None:
+    """Wrap the underlying language model with a response cache.
+
+    Args:
+      model: A language model to wrap with a cache.
+      model_id: identity of the underlying model, part of the cache key so
+        that responses of different models are never mixed.
+      policy: which calls to cache, one of `CACHE_POLICIES`.
+      max_entries: maximum number of responses kept in memory. The least
+        recently used ones are evicted first.
+      cache_dir: optional directory of the on-disk store. If None, responses
+        are only cached in memory.
+
+    Raises:
+      ValueError: if the policy is unknown or max_entries is not positive.
+    """
+    if policy not in CACHE_POLICIES:
+      raise ValueError(
+          f'Unknown cache policy {policy!r}, expected one of {CACHE_POLICIES}.'
+      )
+    if max_entries <= 0:
+      raise ValueError('max_entries must be positive.')
+    self._model = model
+    self._model_id = model_id
+    self._policy = policy
+    self._max_entries = max_entries
+    self._lock = threading.Lock()
+    self._entries: collections.OrderedDict[str, str] = (
+        collections.OrderedDict()
+    )
+    self._store = None
+    self._store_executor = None
+    if cache_dir is not None:
+      self._store = _SQLiteStore(cache_dir)
+      self._store_executor = futures.ThreadPoolExecutor(
+          max_workers=1, thread_name_prefix='llm_cache'
+      )
+    # Number of calls made so far with each key, see `CACHE_ALWAYS`.
+    self._occurrences: collections.Counter[str] = collections.Counter()
+    self._hits = 0
+    self._disk_hits = 0
+    self._misses = 0
+
+  def _key(self, *fields: Any) -> str:
+    """Returns the key of a call, counting it if all calls are cached."""
+    key = _cache_key(self._model_id, *fields)
+    if self._policy != CACHE_ALWAYS:
+      return key
+    with self._lock:
+      occurrence = self._occurrences[key]
+      self._occurrences[key] += 1
+    return _cache_key(key, occurrence)
+
+  def _lookup(self, key: str) -> str | None:
+    """Returns the cached value for the key, or None if missing."""
+    with self._lock:
+      value = self._entries.get(key)
+      if value is not None:
+        self._entries.move_to_end(key)
+        self._hits += 1
+        return value
+      if self._store is not None:
+        value = self._store.get(key)
+        if value is not None:
+          self._insert(key, value)
+          self._hits += 1
+          self._disk_hits += 1
+          return value
+      self._misses += 1
+      return None
+
+  async def _async_lookup(self, key: str) -> str | None:
+    """Returns the cached value for the key, reading the disk off the loop."""
+    with self._lock:
+      value = self._entries.get(key)
+      if value is not None:
+        self._entries.move_to_end(key)
+        self._hits += 1
+        return value
+    if self._store_executor is None:
+      return self._lookup(key)
+    return await asyncio.wrap_future(
+        self._store_executor.submit(self._lookup, key)
+    )
+
+  def _insert(self, key: str, value: str) -> None:
+    """Adds a value to the in-memory cache. Assumes the lock is held."""
+    self._entries[key] = value
+    self._entries.move_to_end(key)
+    while len(self._entries) > self._max_entries:
+      self._entries.popitem(last=False)
+
+  def _put(self, key: str, value: str) -> None:
+    with self._lock:
+      self._insert(key, value)
+      if self._store is not None:
+        self._store.put(key, value)
+
+  async def _async_put(self, key: str, value: str) -> None:
+    if self._store_executor is None:
+      self._put(key, value)
+      return
+    await asyncio.wrap_future(
+        self._store_executor.submit(self._put, key, value)
+    )
+
+  def _text_key(
+      self,
+      prompt: str,
+      max_tokens: int,
+      terminators: Collection[str],
+      temperature: float,
+      seed: int | None,
+  ) -> str | None:
+    """Returns the key of a text call, or None if it is not cached."""
+    if (
+        self._policy == CACHE_DETERMINISTIC
+        and seed is None
+        and temperature != 0
+    ):
+      return None
+    return self._key(
+        'sample_text',
+        prompt,
+        max_tokens,
+        sorted(terminators),
+        temperature,
+        seed,
+    )
+
+  def _choice_key(
+      self, prompt: str, responses: Sequence[str], seed: int | None
+  ) -> str | None:
+    """Returns the key of a choice call, or None if it is not cached."""
+    if self._policy == CACHE_DETERMINISTIC and seed is None:
+      return None
+    return self._key('sample_choice', prompt, list(responses), seed)
+
+  @override
+  def sample_text(
+      self,
+      prompt: str,
+      *,
+      max_tokens: int = language_model.DEFAULT_MAX_TOKENS,
+      terminators: Collection[str] = language_model.DEFAULT_TERMINATORS,
+      temperature: float = language_model.DEFAULT_TEMPERATURE,
+      timeout: float = language_model.DEFAULT_TIMEOUT_SECONDS,
+      seed: int | None = None,
+  ) -> str:
+    sample = lambda: self._model.sample_text(
+        prompt,
+        max_tokens=max_tokens,
+        terminators=terminators,
+        temperature=temperature,
+        timeout=timeout,
+        seed=seed,
+    )
+    key = self._text_key(prompt, max_tokens, terminators, temperature, seed)
+    if key is None:
+      return sample()
+    cached = self._lookup(key)
+    if cached is not None:
+      return json.loads(cached)
+    result = sample()
+    self._put(key, json.dumps(result))
+    return result
+
+  @override
+  def sample_choice(
+      self,
+      prompt: str,
+      responses: Sequence[str],
+      *,
+      seed: int | None = None,
+  ) -> tuple[int, str, Mapping[str, Any]]:
+    key = self._choice_key(prompt, responses, seed)
+    if key is None:
+      return self._model.sample_choice(prompt, responses, seed=seed)
+    cached = self._lookup(key)
+    if cached is not None:
+      idx, response, info = json.loads(cached)
+      return idx, response, info
+    idx, response, info = self._model.sample_choice(
+        prompt, responses, seed=seed
+    )
+    self._put(key, _serialize_choice(idx, response, info))
+    return idx, response, info
+
+  @override
+  async def async_sample_text(
+      self,
+      prompt: str,
+      *,
+      max_tokens: int = language_model.DEFAULT_MAX_TOKENS,
+      terminators: Collection[str] = language_model.DEFAULT_TERMINATORS,
+      temperature: float = language_model.DEFAULT_TEMPERATURE,
+      timeout: float = language_model.DEFAULT_TIMEOUT_SECONDS,
+      seed: int | None = None,
+  ) -> str:
+    sample = lambda: self._model.async_sample_text(
+        prompt,
+        max_tokens=max_tokens,
+        terminators=terminators,
+        temperature=temperature,
+        timeout=timeout,
+        seed=seed,
+    )
+    key = self._text_key(prompt, max_tokens, terminators, temperature, seed)
+    if key is None:
+      return await sample()
+    cached = await self._async_lookup(key)
+    if cached is not None:
+      return json.loads(cached)
+    result = await sample()
+    await self._async_put(key, json.dumps(result))
+    return result
+
+  @override
+  async def async_sample_choice(
+      self,
+      prompt: str,
+      responses: Sequence[str],
+      *,
+      seed: int | None = None,
+  ) -> tuple[int, str, Mapping[str, Any]]:
+    key = self._choice_key(prompt, responses, seed)
+    if key is None:
+      return await self._model.async_sample_choice(
+          prompt, responses, seed=seed
+      )
+    cached = await self._async_lookup(key)
+    if cached is not None:
+      idx, response, info = json.loads(cached)
+      return idx, response, info
+    idx, response, info = await self._model.async_sample_choice(
+        prompt, responses, seed=seed
+    )
+    await self._async_put(key, _serialize_choice(idx, response, info))
+    return idx, response, info
+
+  def get_stats(self) -> Mapping[str, float]:
+    """Returns the hit and miss counts and the hit rate of the cache."""
+    with self._lock:
+      lookups = self._hits + self._misses
+      return {
+          'hits': self._hits,
+          'disk_hits': self._disk_hits,
+          'misses': self._misses,
+          'hit_rate': self._hits / lookups if lookups else 0.0,
+          'num_entries': len(self._entries),
+          'num_disk_entries': (
+              len(self._store) if self._store is not None else 0
+          ),
+      }
+
+  def close(self) -> None:
+    """Closes the on-disk store."""
+    if self._store is not None:
+      self._store_executor.shutdown()
+      with self._lock:
+        self._store.close()
@@ -0,0 +1,103 @@
+"""Tests for the caching language model wrapper."""
+
+import tempfile
+
+from absl.testing import absltest
+from concordia.language_model import caching_wrapper
+from concordia.testing import mock_model
+
+
+class _CountingModel(mock_model.MockModel):
+  """Mock model numbering its responses."""
+
+  def __init__(self):
+    super().__init__()
+    self.num_calls = 0
+
+  def sample_text(self, prompt, **kwargs):
+    self.num_calls += 1
+    return f'{prompt} {self.num_calls}'
+
+  def sample_choice(self, prompt, responses, *, seed=None):
+    self.num_calls += 1
+    idx = self.num_calls % len(responses)
+    return idx, responses[idx], {'calls': self.num_calls}
+
+
+class CachingLanguageModelTest(absltest.TestCase):
+
+  def setUp(self):
+    super().setUp()
+    self._directory = self.enter_context(tempfile.TemporaryDirectory())
+    self._model = _CountingModel()
+
+  def _make_model(self, **kwargs):
+    return caching_wrapper.CachingLanguageModel(
+        self._model, model_id='counting', **kwargs
+    )
+
+  def test_deterministic_policy_caches_reproducible_calls(self):
+    model = self._make_model()
+
+    self.assertEqual(model.sample_text('a', temperature=0.0), 'a 1')
+    self.assertEqual(model.sample_text('a', temperature=0.0), 'a 1')
+    self.assertEqual(model.sample_text('a', seed=3), 'a 2')
+    self.assertEqual(model.sample_text('a', seed=3), 'a 2')
+    self.assertEqual(model.sample_text('a', seed=4), 'a 3')
+    self.assertEqual(model.sample_text('a', max_tokens=5, seed=3), 'a 4')
+    self.assertEqual(model.sample_text('a', terminators=('.',), seed=3), 'a 5')
+    # Sampling without a seed above temperature 0 is never cached.
+    self.assertEqual(model.sample_text('a'), 'a 6')
+    self.assertEqual(model.sample_text('a'), 'a 7')
+    self.assertEqual(model.get_stats()['hits'], 2)
+
+  def test_choices_are_cached(self):
+    model = self._make_model()
+
+    first = model.sample_choice('q', ['x', 'y', 'z'], seed=1)
+    self.assertEqual(model.sample_choice('q', ['x', 'y', 'z'], seed=1), first)
+    self.assertNotEqual(model.sample_choice('q', ['x', 'y'], seed=1), first)
+    self.assertEqual(self._model.num_calls, 2)
+
+  def test_always_policy_replays_responses_in_order(self):
+    model = self._make_model(
+        policy=caching_wrapper.CACHE_ALWAYS, cache_dir=self._directory
+    )
+    first_run = [model.sample_text('a') for _ in range(3)]
+    model.close()
+
+    replay = self._make_model(
+        policy=caching_wrapper.CACHE_ALWAYS, cache_dir=self._directory
+    )
+    self.assertEqual([replay.sample_text('a') for _ in range(3)], first_run)
+    self.assertEqual(first_run, ['a 1', 'a 2', 'a 3'])
+    # Calls beyond those recorded reach the model.
+    self.assertEqual(replay.sample_text('a'), 'a 4')
+    stats = replay.get_stats()
+    self.assertEqual((stats['disk_hits'], stats['misses']), (3, 1))
+    self.assertEqual(stats['num_disk_entries'], 4)
+
+  def test_model_id_is_part_of_the_key(self):
+    model = self._make_model(cache_dir=self._directory)
+    model.sample_text('a', seed=1)
+    other = caching_wrapper.CachingLanguageModel(
+        self._model, model_id='other', cache_dir=self._directory
+    )
+
+    self.assertEqual(other.sample_text('a', seed=1), 'a 2')
+
+  def test_in_memory_entries_are_bounded(self):
+    model = self._make_model(max_entries=2)
+    for prompt in 'abc':
+      model.sample_text(prompt, seed=0)
+
+    self.assertEqual(model.get_stats()['num_entries'], 2)
+    self.assertEqual(model.sample_text('a', seed=0), 'a 4')
+
+  def test_rejects_unknown_policy(self):
+    with self.assertRaises(ValueError):
+      self._make_model(policy='sometimes')
+
+
+if __name__ == '__main__':
+  absltest.main()
@@ -31,6 +31,17 @@ class CallLimitLanguageModel(language_model.LanguageModel):
     self._max_calls = max_calls
     self._calls = 0
 
+  def _limit_reached(self) -> bool:
+    """Returns whether the call limit is reached, warning if it is."""
+    if self._calls >= self._max_calls:
+      print(
+          f'\n\n***** WARNING *****\nCall limit of {self._max_calls} reached.'
+          ' All further sample_text calls will be replaced with empty strings'
+          ' sample_choice calls with the first response\n\n'
+      )
+      return True
+    return False
+
   @override
   def sample_text(
       self,
@@ -42,13 +53,7 @@ class CallLimitLanguageModel(language_model.LanguageModel):
       timeout: float = language_model.DEFAULT_TIMEOUT_SECONDS,
       seed: int | None = None,
   ) -> str:
-    if self._calls >= self._max_calls:
-      print(
-          f'\n\n***** WARNING *****\nCall limit of {self._max_calls} reached.'
-          ' All further sample_text calls will be replaced with empty strings'
-          ' sample_choice calls with the first response\n\n'
-      )
-
+    if self._limit_reached():
       return ''
 
     self._calls += 1
@@ -69,13 +74,46 @@ class CallLimitLanguageModel(language_model.LanguageModel):
       *,
       seed: int | None = None,
   ) -> tuple[int, str, Mapping[str, Any]]:
-    if self._calls >= self._max_calls:
-      print(
-          f'\n\n***** WARNING *****\nCall limit of {self._max_calls} reached.'
-          ' All further sample_text calls will be replaced with empty strings'
-          ' sample_choice calls with the first response\n\n'
-      )
+    if self._limit_reached():
       return 0, responses[0], {}
 
     self._calls += 1
     return self._model.sample_choice(prompt, responses, seed=seed)
+
+  @override
+  async def async_sample_text(
+      self,
+      prompt: str,
+      *,
+      max_tokens: int = language_model.DEFAULT_MAX_TOKENS,
+      terminators: Collection[str] = language_model.DEFAULT_TERMINATORS,
+      temperature: float = language_model.DEFAULT_TEMPERATURE,
+      timeout: float = language_model.DEFAULT_TIMEOUT_SECONDS,
+      seed: int | None = None,
+  ) -> str:
+    if self._limit_reached():
+      return ''
+
+    self._calls += 1
+    return await self._model.async_sample_text(
+        prompt,
+        max_tokens=max_tokens,
+        terminators=terminators,
+        temperature=temperature,
+        timeout=timeout,
+        seed=seed,
+    )
+
+  @override
+  async def async_sample_choice(
+      self,
+      prompt: str,
+      responses: Sequence[str],
+      *,
+      seed: int | None = None,
+  ) -> tuple[int, str, Mapping[str, Any]]:
+    if self._limit_reached():
+      return 0, responses[0], {}
+
+    self._calls += 1
+    return await self._model.async_sample_choice(prompt, responses, seed=seed)
@@ -1,21 +1,124 @@
 """A language model that wraps a primary and a fallback model."""
 
-from collections.abc import Collection, Sequence, Mapping
-from typing import Any, Type
+import asyncio
+import bisect
+from collections.abc import Awaitable, Callable, Collection, Sequence, Mapping
+import math
+import threading
+import time
+from typing import Any, Type, TypeVar
 
 from concordia.language_model import language_model
+from concordia.utils import concurrency
 import retry
 from typing_extensions import override
 
+_T = TypeVar('_T')
+
+# Upper bounds of the latency histogram buckets, 10ms to 10 minutes.
+_BUCKET_BOUNDS = tuple(0.01 * 1.2**i for i in range(61))
+# Counts are halved when a histogram holds this many samples, so that the
+# percentiles follow changes in the latency of a backend.
+_DECAY_AT_SAMPLES = 2000
+
+
+def _has_native_async(model: language_model.LanguageModel, method: str) -> bool:
+  """Returns whether an asynchronous method of a model runs without a thread.
+
+  The default `async_sample_text` and `async_sample_choice` run the
+  synchronous call on a thread, which keeps running when the call is
+  cancelled. Wrappers are followed to the model they wrap, as their
+  asynchronous methods call those of that model.
+
+  Args:
+    model: the model to check.
+    method: the name of the asynchronous method, e.g. 'async_sample_text'.
+  """
+  while getattr(type(model), method) is not getattr(
+      language_model.LanguageModel, method
+  ):
+    inner = getattr(model, '_model', None)
+    if not isinstance(inner, language_model.LanguageModel):
+      return True
+    model = inner
+  return False
+
+
+class _LatencyHistogram:
+  """An online histogram of call latencies with exponential buckets."""
+
+  def __init__(self):
+    self._counts = [0] * (len(_BUCKET_BOUNDS) + 1)
+    self._total = 0
+    self._lock = threading.Lock()
+
+  def add(self, seconds: float) -> None:
+    with self._lock:
+      self._counts[bisect.bisect_left(_BUCKET_BOUNDS, seconds)] += 1
+      self._total += 1
+      if self._total >= _DECAY_AT_SAMPLES:
+        self._counts = [count // 2 for count in self._counts]
+        self._total = sum(self._counts)
+
+  def __len__(self) -> int:
+    with self._lock:
+      return self._total
+
+  def percentile(self, percentile: float) -> float:
+    """Returns the upper bound of the bucket holding the percentile.
+
+    Args:
+      percentile: the percentile, between 0 and 100.
+
+    Returns:
+      The latency in seconds, or NaN if there are no samples.
+    """
+    with self._lock:
+      if not self._total:
+        return math.nan
+      rank = percentile / 100 * self._total
+      cumulative = 0
+      for i, count in enumerate(self._counts):
+        cumulative += count
+        if count and cumulative >= rank:
+          break
+      return _BUCKET_BOUNDS[min(i, len(_BUCKET_BOUNDS) - 1)]
+
+  def get_stats(self) -> Mapping[str, float]:
+    return {
+        'count': len(self),
+        'p50': self.percentile(50),
+        'p90': self.percentile(90),
+        'p99': self.percentile(99),
+    }
+
 
 class FallbackLanguageModel(language_model.LanguageModel):
-  """Wraps a primary and a fallback model with specific retry logic."""
+  """Wraps a primary and a fallback model with specific retry logic.
+
+  By default, a call is retried on the primary model and then moved to the
+  fallback model once the primary fails. With `hedge_percentile` set, calls
+  are hedged instead: when the primary has not answered within that
+  percentile of its recent latencies, the same call is also sent to the
+  fallback, and whichever answers first is used. The other call is
+  cancelled, which stops the request of models with native asynchronous
+  sampling, like the OpenAI-compatible ones. Models without it sample on a
+  thread that cannot be stopped, so their losing calls are abandoned and
+  keep running to the end; they are counted as `num_abandoned` in
+  `get_stats`. A call failing on the primary is sent to the fallback at
+  once.
+  """
 
   def __init__(
       self,
       primary_model: language_model.LanguageModel,
       fallback_model: language_model.LanguageModel,
       primary_retry_exceptions: Collection[Type[Exception]] = (Exception,),
+      *,
+      hedge_percentile: float | None = None,
+      initial_hedge_delay_seconds: float = 10.0,
+      min_hedge_delay_seconds: float = 0.1,
+      min_latency_samples: int = 20,
   ):
     """Initializes the FallbackLanguageModel.
 
@@ -23,10 +126,119 @@ class FallbackLanguageModel(language_model.LanguageModel):
       primary_model: The main model to use.
       fallback_model: The model to use if the primary model fails.
       primary_retry_exceptions: Exceptions to trigger a retry on the primary.
+        Not used when hedging.
+      hedge_percentile: If set, the percentile of the primary's latency, e.g.
+        95, after which a call is hedged on the fallback.
+      initial_hedge_delay_seconds: the delay before hedging a call until the
+        primary has answered `min_latency_samples` calls.
+      min_hedge_delay_seconds: the shortest delay before hedging a call.
+      min_latency_samples: the number of primary latencies needed to use
+        their percentile.
+
+    Raises:
+      ValueError: if `hedge_percentile` is not between 0 and 100.
     """
+    if hedge_percentile is not None and not 0 < hedge_percentile <= 100:
+      raise ValueError('hedge_percentile must be in (0, 100].')
     self._primary_model = primary_model
     self._fallback_model = fallback_model
     self._primary_retry_exceptions = tuple(primary_retry_exceptions)
+    self._hedge_percentile = hedge_percentile
+    self._initial_hedge_delay_seconds = initial_hedge_delay_seconds
+    self._min_hedge_delay_seconds = min_hedge_delay_seconds
+    self._min_latency_samples = min_latency_samples
+
+    self._latencies = {
+        'primary': _LatencyHistogram(),
+        'fallback': _LatencyHistogram(),
+    }
+    self._lock = threading.Lock()
+    self._num_calls = 0
+    self._num_hedged = 0
+    self._num_failovers = 0
+    self._num_fallback_wins = 0
+    self._num_abandoned = 0
+
+  def _hedge_delay(self) -> float:
+    """Returns how long the primary has to answer before a call is hedged."""
+    latencies = self._latencies['primary']
+    if len(latencies) < self._min_latency_samples:
+      return self._initial_hedge_delay_seconds
+    return max(
+        self._min_hedge_delay_seconds,
+        latencies.percentile(self._hedge_percentile),
+    )
+
+  async def _timed(self, backend: str, call: Callable[[], Awaitable[_T]]) -> _T:
+    """Awaits a call, recording its latency if it succeeds or is cancelled.
+
+    A cancelled call is recorded with the time it ran, a lower bound of its
+    latency, so that slow calls still raise the percentiles.
+    """
+    start = time.monotonic()
+    try:
+      result = await call()
+    except asyncio.CancelledError:
+      self._latencies[backend].add(time.monotonic() - start)
+      raise
+    self._latencies[backend].add(time.monotonic() - start)
+    return result
+
+  async def _hedged(
+      self,
+      method: str,
+      call_primary: Callable[[], Awaitable[_T]],
+      call_fallback: Callable[[], Awaitable[_T]],
+  ) -> _T:
+    """Awaits the primary, hedged on the fallback if it is slow or fails.
+
+    Args:
+      method: the asynchronous method called, e.g. 'async_sample_text'.
+      call_primary: makes the call on the primary model.
+      call_fallback: makes the same call on the fallback model.
+
+    Returns:
+      The result of the first of the calls to succeed.
+
+    Raises:
+      Exception: the error of the fallback, if both calls fail.
+    """
+    with self._lock:
+      self._num_calls += 1
+    primary = asyncio.ensure_future(self._timed('primary', call_primary))
+    done, _ = await asyncio.wait({primary}, timeout=self._hedge_delay())
+    if done and primary.exception() is None:
+      return primary.result()
+    with self._lock:
+      if done:
+        self._num_failovers += 1
+      else:
+        self._num_hedged += 1
+    fallback = asyncio.ensure_future(self._timed('fallback', call_fallback))
+    pending = {fallback} if done else {primary, fallback}
+    try:
+      while True:
+        done, pending = await asyncio.wait(
+            pending, return_when=asyncio.FIRST_COMPLETED
+        )
+        for task in (fallback, primary):
+          if task in done and task.exception() is None:
+            if task is fallback:
+              with self._lock:
+                self._num_fallback_wins += 1
+            return task.result()
+        if not pending:
+          return fallback.result()
+    finally:
+      models = {
+          primary: self._primary_model,
+          fallback: self._fallback_model,
+      }
+      for task in pending:
+        task.cancel()
+        if not _has_native_async(models[task], method):
+          with self._lock:
+            self._num_abandoned += 1
 
   @override
   def sample_text(
@@ -39,6 +251,15 @@ class FallbackLanguageModel(language_model.LanguageModel):
       timeout: float = language_model.DEFAULT_TIMEOUT_SECONDS,
       seed: int | None = None,
   ) -> str:
+    if self._hedge_percentile is not None:
+      return concurrency.run_coroutine(self.async_sample_text(
+          prompt,
+          max_tokens=max_tokens,
+          terminators=terminators,
+          temperature=temperature,
+          timeout=timeout,
+          seed=seed,
+      ))
     try:
       # Decorator for the primary model with a limited number of retries.
       @retry.retry(
@@ -85,6 +306,10 @@ class FallbackLanguageModel(language_model.LanguageModel):
       *,
       seed: int | None = None,
   ) -> tuple[int, str, Mapping[str, Any]]:
+    if self._hedge_percentile is not None:
+      return concurrency.run_coroutine(
+          self.async_sample_choice(prompt, responses, seed=seed)
+      )
     try:
       @retry.retry(
           self._primary_retry_exceptions,
@@ -108,3 +333,87 @@ class FallbackLanguageModel(language_model.LanguageModel):
       def _call_fallback():
         return self._fallback_model.sample_choice(prompt, responses, seed=seed)
       return _call_fallback()
+
+  @override
+  async def async_sample_text(
+      self,
+      prompt: str,
+      *,
+      max_tokens: int = language_model.DEFAULT_MAX_TOKENS,
+      terminators: Collection[str] = language_model.DEFAULT_TERMINATORS,
+      temperature: float = language_model.DEFAULT_TEMPERATURE,
+      timeout: float = language_model.DEFAULT_TIMEOUT_SECONDS,
+      seed: int | None = None,
+  ) -> str:
+    if self._hedge_percentile is None:
+      return await super().async_sample_text(
+          prompt,
+          max_tokens=max_tokens,
+          terminators=terminators,
+          temperature=temperature,
+          timeout=timeout,
+          seed=seed,
+      )
+
+    def call(model: language_model.LanguageModel) -> Awaitable[str]:
+      return model.async_sample_text(
+          prompt,
+          max_tokens=max_tokens,
+          terminators=terminators,
+          temperature=temperature,
+          timeout=timeout,
+          seed=seed,
+      )
+
+    return await self._hedged(
+        'async_sample_text',
+        lambda: call(self._primary_model),
+        lambda: call(self._fallback_model),
+    )
+
+  @override
+  async def async_sample_choice(
+      self,
+      prompt: str,
+      responses: Sequence[str],
+      *,
+      seed: int | None = None,
+  ) -> tuple[int, str, Mapping[str, Any]]:
+    if self._hedge_percentile is None:
+      return await super().async_sample_choice(prompt, responses, seed=seed)
+    return await self._hedged(
+        'async_sample_choice',
+        lambda: self._primary_model.async_sample_choice(
+            prompt, responses, seed=seed
+        ),
+        lambda: self._fallback_model.async_sample_choice(
+            prompt, responses, seed=seed
+        ),
+    )
+
+  def get_stats(self) -> Mapping[str, Any]:
+    """Returns the hedging counts and the latencies of each backend.
+
+    Returns:
+      The number of hedged calls, the share of calls hedged (`hedge_rate`),
+      the calls moved to the fallback after the primary failed, the hedged
+      calls won by the fallback, the losing calls left running on a thread
+      because their model cannot cancel them, the current hedge delay, and
+      the count and 50th, 90th and 99th latency percentiles of each backend.
+    """
+    with self._lock:
+      stats = {
+          'num_calls': self._num_calls,
+          'num_hedged': self._num_hedged,
+          'hedge_rate': (
+              self._num_hedged / self._num_calls if self._num_calls else 0.0
+          ),
+          'num_failovers': self._num_failovers,
+          'num_fallback_wins': self._num_fallback_wins,
+          'num_abandoned': self._num_abandoned,
+      }
+    if self._hedge_percentile is not None:
+      stats['hedge_delay_seconds'] = self._hedge_delay()
+    for backend, latencies in self._latencies.items():
+      stats[f'{backend}_latency'] = latencies.get_stats()
+    return stats
@@ -0,0 +1,147 @@
+"""Tests for the fallback language model wrapper."""
+
+import asyncio
+import time
+
+from absl.testing import absltest
+from concordia.language_model import fallback_wrapper
+from concordia.language_model import retry_wrapper
+from concordia.testing import mock_model
+
+
+class _SlowModel(mock_model.MockModel):
+  """Mock model answering after a delay, or failing."""
+
+  def __init__(self, response: str, delay: float, error: bool = False):
+    super().__init__(response=response)
+    self._delay = delay
+    self._error = error
+    self.num_cancelled = 0
+
+  async def async_sample_text(self, prompt, **kwargs):
+    try:
+      await asyncio.sleep(self._delay)
+    except asyncio.CancelledError:
+      self.num_cancelled += 1
+      raise
+    if self._error:
+      raise ConnectionError(self._response)
+    return self.sample_text(prompt, **kwargs)
+
+
+class LatencyHistogramTest(absltest.TestCase):
+
+  def test_percentiles(self):
+    histogram = fallback_wrapper._LatencyHistogram()
+    for _ in range(90):
+      histogram.add(0.1)
+    for _ in range(10):
+      histogram.add(2.0)
+
+    self.assertAlmostEqual(histogram.percentile(50), 0.1, delta=0.02)
+    self.assertAlmostEqual(histogram.percentile(99), 2.0, delta=0.4)
+    self.assertLen(histogram, 100)
+
+
+class HedgingTest(absltest.TestCase):
+
+  def test_fast_primary_is_not_hedged(self):
+    primary = _SlowModel('primary', delay=0.0)
+    model = fallback_wrapper.FallbackLanguageModel(
+        primary, _SlowModel('fallback', delay=0.0), hedge_percentile=95
+    )
+
+    self.assertEqual(model.sample_text('prompt'), 'primary')
+    stats = model.get_stats()
+    self.assertEqual(stats['hedge_rate'], 0.0)
+    self.assertEqual(stats['primary_latency']['count'], 1)
+
+  def test_slow_primary_is_hedged_and_cancelled(self):
+    primary = _SlowModel('primary', delay=5.0)
+    model = fallback_wrapper.FallbackLanguageModel(
+        primary,
+        _SlowModel('fallback', delay=0.01),
+        hedge_percentile=95,
+        initial_hedge_delay_seconds=0.05,
+    )
+
+    start = time.monotonic()
+    self.assertEqual(model.sample_text('prompt'), 'fallback')
+    self.assertLess(time.monotonic() - start, 1.0)
+    time.sleep(0.05)
+    self.assertEqual(primary.num_cancelled, 1)
+    stats = model.get_stats()
+    self.assertEqual(stats['num_hedged'], 1)
+    self.assertEqual(stats['num_fallback_wins'], 1)
+    self.assertEqual(stats['hedge_rate'], 1.0)
+    self.assertEqual(stats['num_abandoned'], 0)
+
+  def test_hedge_delay_follows_primary_latency(self):
+    model = fallback_wrapper.FallbackLanguageModel(
+        _SlowModel('primary', delay=0.02),
+        _SlowModel('fallback', delay=0.0),
+        hedge_percentile=90,
+        min_hedge_delay_seconds=0.0,
+        min_latency_samples=3,
+    )
+    self.assertEqual(model.get_stats()['hedge_delay_seconds'], 10.0)
+
+    for _ in range(3):
+      model.sample_text('prompt')
+
+    self.assertLess(model.get_stats()['hedge_delay_seconds'], 0.1)
+
+  def test_failing_primary_fails_over_at_once(self):
+    model = fallback_wrapper.FallbackLanguageModel(
+        _SlowModel('primary', delay=0.0, error=True),
+        _SlowModel('fallback', delay=0.0),
+        hedge_percentile=95,
+    )
+
+    self.assertEqual(model.sample_text('prompt'), 'fallback')
+    stats = model.get_stats()
+    self.assertEqual(stats['num_failovers'], 1)
+    self.assertEqual(stats['num_hedged'], 0)
+
+  def test_hedged_primary_wins_if_fallback_fails(self):
+    model = fallback_wrapper.FallbackLanguageModel(
+        _SlowModel('primary', delay=0.1),
+        _SlowModel('fallback', delay=0.0, error=True),
+        hedge_percentile=95,
+        initial_hedge_delay_seconds=0.01,
+    )
+
+    self.assertEqual(model.sample_text('prompt'), 'primary')
+    self.assertEqual(model.get_stats()['num_fallback_wins'], 0)
+
+  def test_counts_losers_left_running_on_a_thread(self):
+
+    class SlowChoiceModel(mock_model.MockModel):
+
+      def sample_choice(self, prompt, responses, *, seed=None):
+        time.sleep(0.3)
+        return super().sample_choice(prompt, responses, seed=seed)
+
+    model = fallback_wrapper.FallbackLanguageModel(
+        retry_wrapper.RetryLanguageModel(SlowChoiceModel()),
+        _SlowModel('fallback', delay=0.0),
+        hedge_percentile=95,
+        initial_hedge_delay_seconds=0.01,
+    )
+
+    model.sample_choice('prompt', ['a', 'b'])
+    self.assertEqual(model.get_stats()['num_abandoned'], 1)
+
+  def test_raises_fallback_error_if_both_fail(self):
+    model = fallback_wrapper.FallbackLanguageModel(
+        _SlowModel('primary', delay=0.0, error=True),
+        _SlowModel('fallback', delay=0.0, error=True),
+        hedge_percentile=95,
+    )
+
+    with self.assertRaisesRegex(ConnectionError, 'fallback'):
+      model.sample_text('prompt')
+
+
+if __name__ == '__main__':
+  absltest.main()
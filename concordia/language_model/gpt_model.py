@@ -2,6 +2,7 @@
 
 import os
 
+from concordia.language_model import base_oai_compatible
 from concordia.language_model import language_model
 from concordia.language_model.base_oai_compatible import BaseOAICompatibleModel
 from concordia.utils import measurements as measurements_lib
@@ -18,6 +19,8 @@ class GptLanguageModel(BaseOAICompatibleModel):
       api_key: str | None = None,
       measurements: measurements_lib.Measurements | None = None,
       channel: str = language_model.DEFAULT_STATS_CHANNEL,
+      choice_scoring: str = base_oai_compatible.CHOICE_SCORING_LOGPROBS,
+      stream: bool = True,
   ):
     """Initializes the instance.
 
@@ -28,6 +31,10 @@ class GptLanguageModel(BaseOAICompatibleModel):
         use the OPENAI_API_KEY environment variable.
       measurements: The measurements object to log usage statistics to.
       channel: The channel to write the statistics to.
+      choice_scoring: How `sample_choice` answers, one of
+        `base_oai_compatible.CHOICE_SCORING_MODES`.
+      stream: Whether to stream the response from the model, closing the
+        stream as soon as a terminator is reached.
     """
     if api_key is None:
       api_key = os.environ['OPENAI_API_KEY']
@@ -36,4 +43,6 @@ class GptLanguageModel(BaseOAICompatibleModel):
     super().__init__(model_name=model_name,
                      client=client,
                      measurements=measurements,
-                     channel=channel)
+                     channel=channel,
+                     choice_scoring=choice_scoring,
+                     stream=stream)
@@ -6,6 +6,8 @@ from collections.abc import Mapping
 from collections.abc import Sequence
 from typing import Any
 
+from concordia.utils import concurrency
+
 DEFAULT_TEMPERATURE = 0.5
 DEFAULT_TERMINATORS = ()
 DEFAULT_TIMEOUT_SECONDS = 60
@@ -13,6 +15,21 @@ DEFAULT_MAX_TOKENS = 1500
 
 DEFAULT_STATS_CHANNEL = 'language_model_stats'
 
+# Rough number of characters per token of English text.
+_CHARACTERS_PER_TOKEN = 4
+
+
+def estimate_tokens(text: str) -> int:
+  """Returns a rough estimate of the number of tokens in a text.
+
+  The estimate does not depend on the model's tokenizer, so wrappers counting
+  tokens for rate limits and for telemetry agree on the same calls.
+
+  Args:
+    text: the text of a prompt or a response.
+  """
+  return (len(text) + _CHARACTERS_PER_TOKEN - 1) // _CHARACTERS_PER_TOKEN
+
 
 class InvalidResponseError(Exception):
   """Exception to throw when exceeding max attempts to get a choice."""
@@ -82,3 +99,73 @@ class LanguageModel(metaclass=abc.ABCMeta):
         a number of times.
     """
     raise NotImplementedError
+
+  async def async_sample_text(
+      self,
+      prompt: str,
+      *,
+      max_tokens: int = DEFAULT_MAX_TOKENS,
+      terminators: Collection[str] = DEFAULT_TERMINATORS,
+      temperature: float = DEFAULT_TEMPERATURE,
+      timeout: float = DEFAULT_TIMEOUT_SECONDS,
+      seed: int | None = None,
+  ) -> str:
+    """Samples text from the model without blocking the event loop.
+
+    The default implementation runs `sample_text` in a worker thread of the
+    event loop. Models with an asynchronous client override it so that many
+    requests can be in flight without a thread each.
+
+    Args:
+      prompt: the initial text to condition on.
+      max_tokens: the maximum number of tokens in the response.
+      terminators: the response will be terminated before any of these
+        characters.
+      temperature: temperature for the model.
+      timeout: timeout for the request.
+      seed: optional seed for the sampling. If None a random seed will be used.
+
+    Returns:
+      The sampled response (i.e. does not iclude the prompt).
+
+    Raises:
+      TimeoutError: if the operation times out.
+    """
+    return await concurrency.to_thread(
+        self.sample_text,
+        prompt,
+        max_tokens=max_tokens,
+        terminators=terminators,
+        temperature=temperature,
+        timeout=timeout,
+        seed=seed,
+    )
+
+  async def async_sample_choice(
+      self,
+      prompt: str,
+      responses: Sequence[str],
+      *,
+      seed: int | None = None,
+  ) -> tuple[int, str, Mapping[str, Any]]:
+    """Samples a response from those available without blocking the loop.
+
+    The default implementation runs `sample_choice` in a worker thread of the
+    event loop, see `async_sample_text`.
+
+    Args:
+      prompt: the initial text to condition on.
+      responses: the responses to score.
+      seed: optional seed for the sampling. If None a random seed will be used.
+
+    Returns:
+      (index, response, info). The index of the sampled response, the sampled
+      response, and some info about the sampling process.
+
+    Raises:
+      InvalidResponseError if unable to produce a valid choice after attempting
+        a number of times.
+    """
+    return await concurrency.to_thread(
+        self.sample_choice, prompt, responses, seed=seed
+    )
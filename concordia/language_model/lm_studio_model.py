@@ -1,13 +1,12 @@
 """Language Model that uses a local LM Studio server."""
 
 import os
-from collections.abc import Collection
 
+from concordia.language_model import base_oai_compatible
 from concordia.language_model import language_model
 from concordia.language_model.base_oai_compatible import BaseOAICompatibleModel
 from concordia.utils import measurements as measurements_lib
 import openai
-from typing_extensions import override
 
 
 class LmStudioModel(BaseOAICompatibleModel):
@@ -19,9 +18,10 @@ class LmStudioModel(BaseOAICompatibleModel):
       *,
       base_url: str | None = None,
       timeout: float | None = None,
-      stream: bool = False,
+      stream: bool = True,
       measurements: measurements_lib.Measurements | None = None,
       channel: str = language_model.DEFAULT_STATS_CHANNEL,
+      choice_scoring: str = base_oai_compatible.CHOICE_SCORING_LOGPROBS,
   ):
     """Initializes the instance.
 
@@ -35,9 +35,12 @@ class LmStudioModel(BaseOAICompatibleModel):
       timeout: The timeout for API requests in seconds. If None, will use the
         LM_STUDIO_TIMEOUT environment variable, falling back to 600.0 (10
         minutes).
-      stream: Whether to stream the response from the model.
+      stream: Whether to stream the response from the model, closing the
+        stream as soon as a terminator is reached.
       measurements: The measurements object to log usage statistics to.
       channel: The channel to write the statistics to.
+      choice_scoring: How `sample_choice` answers, one of
+        `base_oai_compatible.CHOICE_SCORING_MODES`.
     """
     if base_url is None:
       base_url = os.environ.get('LM_STUDIO_URL', 'http://127.0.0.1:1234/v1')
@@ -60,84 +63,11 @@ class LmStudioModel(BaseOAICompatibleModel):
         timeout=timeout,
     )
 
-    self._stream = stream
-
     super().__init__(
         model_name=model_name,
         client=client,
         measurements=measurements,
-        channel=channel
+        channel=channel,
+        choice_scoring=choice_scoring,
+        stream=stream,
     )
-
-  @override
-  def sample_text(
-      self,
-      prompt: str,
-      *,
-      max_tokens: int = language_model.DEFAULT_MAX_TOKENS,
-      terminators: Collection[str] = language_model.DEFAULT_TERMINATORS,
-      temperature: float = language_model.DEFAULT_TEMPERATURE,
-      timeout: float = language_model.DEFAULT_TIMEOUT_SECONDS,
-      seed: int | None = None,
-  ) -> str:
-    """Samples text from the model, with optional streaming."""
-    messages = [
-        {
-            'role': 'system',
-            'content': (
-                'You always continue sentences provided '
-                + 'by the user and you never repeat what '
-                + 'the user already said.'
-            ),
-        },
-        {
-            'role': 'user',
-            'content': 'Question: Is Jake a turtle?\nAnswer: Jake is ',
-        },
-        {'role': 'assistant', 'content': 'not a turtle.'},
-        {
-            'role': 'user',
-            'content': (
-                'Question: What is Priya doing right now?\nAnswer: '
-                + 'Priya is currently '
-            ),
-        },
-        {'role': 'assistant', 'content': 'sleeping.'},
-        {'role': 'user', 'content': prompt},
-    ]
-
-    if not self._stream:
-      response = self._client.chat.completions.create(
-          model=self._model_name,
-          messages=messages,
-          temperature=temperature,
-          max_tokens=max_tokens,
-          timeout=timeout,
-          stop=terminators,
-          seed=seed,
-      )
-      result = response.choices[0].message.content
-    else:
-      stream = self._client.chat.completions.create(
-          model=self._model_name,
-          messages=messages,
-          temperature=temperature,
-          max_tokens=max_tokens,
-          timeout=timeout,
-          stop=terminators,
-          seed=seed,
-          stream=True,
-      )
-      full_response = []
-      for chunk in stream:
-        content = chunk.choices[0].delta.content
-        if content is not None:
-          full_response.append(content)
-      result = "".join(full_response)
-
-    if self._measurements is not None:
-      self._measurements.publish_datum(
-          self._channel,
-          {'raw_text_length': len(result)},
-      )
-    return result
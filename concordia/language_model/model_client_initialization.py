@@ -2,26 +2,39 @@
 
 import os
 import numpy as np
-import sentence_transformers
 from dotenv import load_dotenv
 import openai
 
+from concordia.associative_memory import embedding_cache
 from concordia.language_model import gpt_model
 from concordia.language_model import openrouter_model
 from concordia.language_model import lm_studio_model
 from concordia.language_model import no_language_model
+from concordia.language_model import rate_limit_wrapper
 from concordia.language_model import retry_wrapper
 from concordia.language_model import fallback_wrapper # Import the new wrapper
+from concordia.language_model import batching_wrapper
+from concordia.language_model import caching_wrapper
+from concordia.language_model import routing_wrapper
+from concordia.language_model import telemetry_wrapper
 
 class ModelClient:
   """Initializes and holds the language model and sentence embedder."""
 
-  def __init__(self, provider: str | None = None, stream: bool = False):
+  def __init__(
+      self,
+      provider: str | None = None,
+      stream: bool = True,
+      load_embedder: bool = True,
+  ):
     """Initializes the ModelClient.
 
     Args:
       provider: The model provider to use.
-      stream: Whether to stream responses.
+      stream: Whether to stream responses, closing the stream as soon as a
+        terminator is reached.
+      load_embedder: Whether to load the sentence embedder, which is not
+        needed to only sample the language model.
     """
     load_dotenv()
 
@@ -30,30 +43,43 @@ class ModelClient:
 
     self.model = None
     self.embedder = None
+    self.batch_embedder = None
+    self.embedding_cache = None
     self._provider = provider
 
     if self._provider == 'disabled':
       print("Language model is disabled.")
       self.model = no_language_model.NoLanguageModel()
       self.embedder = lambda x: np.ones(3)
+      self.batch_embedder = lambda texts: np.ones((len(texts), 3))
       return
 
     print(f"Initializing model for provider: {self._provider}")
 
     # Special handling for OpenRouter to implement the fallback logic
     if self._provider == 'openrouter':
-      primary_openrouter_model = openrouter_model.OpenRouterModel()
+      primary_openrouter_model = openrouter_model.OpenRouterModel(
+          stream=stream
+      )
+      model_name = primary_openrouter_model.model_name
+      primary_openrouter_model = self._rate_limited(primary_openrouter_model)
       fallback_model_name = os.environ.get('OPENROUTER_FALLBACK_MODEL')
 
       if fallback_model_name:
         print(f"Fallback model configured: {fallback_model_name}")
         fallback_openrouter_model = openrouter_model.OpenRouterModel(
-            model_name=fallback_model_name
+            model_name=fallback_model_name, stream=stream
         )
+        # Set OPENROUTER_HEDGE_PERCENTILE, e.g. to 95, to also send calls to
+        # the fallback when the primary is slower than that percentile.
+        hedge_percentile = os.environ.get('OPENROUTER_HEDGE_PERCENTILE')
         self.model = fallback_wrapper.FallbackLanguageModel(
             primary_model=primary_openrouter_model,
             fallback_model=fallback_openrouter_model,
-            primary_retry_exceptions=(openai.RateLimitError, openai.APITimeoutError)
+            primary_retry_exceptions=(openai.RateLimitError, openai.APITimeoutError),
+            hedge_percentile=(
+                float(hedge_percentile) if hedge_percentile else None
+            ),
         )
       else:
         # If no fallback is specified, use the standard retry wrapper
@@ -69,24 +95,136 @@ class ModelClient:
       base_model = None
       if self._provider == 'openai':
         model_name = os.environ.get('OPENAI_MODEL_NAME', 'gpt-4')
-        base_model = gpt_model.GptLanguageModel(model_name=model_name)
+        base_model = gpt_model.GptLanguageModel(
+            model_name=model_name, stream=stream
+        )
       elif self._provider == 'lmstudio':
         base_model = lm_studio_model.LmStudioModel(stream=stream)
+        model_name = base_model.model_name
+        # Set LM_STUDIO_BATCH_WAIT_MS to send concurrent calls together, and
+        # LM_STUDIO_BATCH_ENDPOINT=1 to send them as one multi-prompt request.
+        batch_wait_ms = os.environ.get('LM_STUDIO_BATCH_WAIT_MS')
+        if batch_wait_ms:
+          batch_sampler = None
+          if os.environ.get('LM_STUDIO_BATCH_ENDPOINT') == '1':
+            batch_sampler = base_model.sample_text_batch
+          base_model = batching_wrapper.BatchingLanguageModel(
+              base_model,
+              batch_sampler=batch_sampler,
+              max_wait_seconds=float(batch_wait_ms) / 1000,
+          )
       else:
         raise ValueError(f"Unknown or unsupported provider for standard retry: {self._provider}")
 
       self.model = retry_wrapper.RetryLanguageModel(
-          model=base_model,
+          model=self._rate_limited(base_model),
           retry_on_exceptions=(openai.RateLimitError, openai.APITimeoutError),
           retry_tries=2,
           retry_delay=61,
       )
 
+    # Replay completed calls when a run is restarted. Set LLM_CACHE_POLICY to
+    # 'always' to also cache calls sampled without a seed.
+    llm_cache_dir = os.environ.get('LLM_CACHE_DIR')
+    if llm_cache_dir:
+      self.model = caching_wrapper.CachingLanguageModel(
+          self.model,
+          model_id=f"{self._provider}:{model_name}",
+          policy=os.environ.get(
+              'LLM_CACHE_POLICY', caching_wrapper.CACHE_DETERMINISTIC
+          ),
+          cache_dir=llm_cache_dir,
+      )
+
+    # Set CONTROL_MODEL_NAME to send multiple choice questions and the game
+    # master's control decisions to a small model served by LM Studio at
+    # CONTROL_MODEL_URL, and CONTROL_MAX_TOKENS to also send it text calls
+    # asking for at most that many tokens. Only the calls to the primary are
+    # cached.
+    control_model_name = os.environ.get('CONTROL_MODEL_NAME')
+    if control_model_name:
+      print(f"Control model configured: {control_model_name}")
+      control_model = retry_wrapper.RetryLanguageModel(
+          model=lm_studio_model.LmStudioModel(
+              model_name=control_model_name,
+              base_url=os.environ.get('CONTROL_MODEL_URL'),
+              stream=stream,
+          ),
+          retry_on_exceptions=(openai.APITimeoutError,),
+          retry_tries=2,
+      )
+      control_max_tokens = os.environ.get('CONTROL_MAX_TOKENS')
+      self.model = routing_wrapper.RoutingLanguageModel(
+          self.model,
+          control_model,
+          max_control_tokens=(
+              int(control_max_tokens) if control_max_tokens else None
+          ),
+      )
+
+    # Record the latency and tokens of each call, attributed to the component
+    # making it. Set the LLM_PRICE_PER_MILLION_* variables to also get costs.
+    self.model = telemetry_wrapper.TelemetryLanguageModel(
+        self.model,
+        price_per_million_prompt_tokens=float(
+            os.environ.get('LLM_PRICE_PER_MILLION_PROMPT_TOKENS', '0')
+        ),
+        price_per_million_completion_tokens=float(
+            os.environ.get('LLM_PRICE_PER_MILLION_COMPLETION_TOKENS', '0')
+        ),
+    )
+
+    if not load_embedder:
+      return
+
+    # Imported here: loading sentence_transformers takes several seconds.
+    import sentence_transformers  # pylint: disable=g-import-not-at-top
+
     # Initialize the sentence embedder
-    st_model = sentence_transformers.SentenceTransformer(
-        'sentence-transformers/all-mpnet-base-v2'
+    embedder_name = 'sentence-transformers/all-mpnet-base-v2'
+    st_model = sentence_transformers.SentenceTransformer(embedder_name)
+    # Identical texts (shared memories, repeated runs of a scenario) are only
+    # embedded once. Set EMBEDDING_CACHE_DIR to keep the cache across runs.
+    self.embedding_cache = embedding_cache.CachingEmbedder(
+        embedder=lambda x: st_model.encode(x, show_progress_bar=False),
+        # Encoding a list of sentences runs them through the model as a batch.
+        batch_embedder=lambda texts: st_model.encode(
+            list(texts), show_progress_bar=False
+        ),
+        model_name=embedder_name,
+        max_entries=int(os.environ.get('EMBEDDING_CACHE_SIZE', '100000')),
+        cache_dir=os.environ.get('EMBEDDING_CACHE_DIR'),
+    )
+    self.embedder = self.embedding_cache
+    self.batch_embedder = self.embedding_cache.embed_batch
+
+  def _rate_limited(self, model):
+    """Paces calls to the provider's limits, if set in the environment.
+
+    Set LLM_REQUESTS_PER_MINUTE and LLM_TOKENS_PER_MINUTE to the limits of the
+    account. Rate limit errors are then retried after short waits instead of
+    the one minute delay of the retry wrapper.
+
+    Args:
+      model: the model of the provider.
+
+    Returns:
+      The model, wrapped in a rate limiter if limits are set.
+    """
+    requests_per_minute = os.environ.get('LLM_REQUESTS_PER_MINUTE')
+    tokens_per_minute = os.environ.get('LLM_TOKENS_PER_MINUTE')
+    if not requests_per_minute and not tokens_per_minute:
+      return model
+    return rate_limit_wrapper.RateLimitedLanguageModel(
+        model,
+        requests_per_minute=(
+            float(requests_per_minute) if requests_per_minute else None
+        ),
+        tokens_per_minute=(
+            float(tokens_per_minute) if tokens_per_minute else None
+        ),
+        rate_limit_exceptions=(openai.RateLimitError,),
     )
-    self.embedder = lambda x: st_model.encode(x, show_progress_bar=False)
 
   def test_model(self, test_prompt: str):
     """Sends a sample prompt to the initialized model to test it."""
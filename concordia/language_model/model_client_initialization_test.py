@@ -0,0 +1,98 @@
+"""Tests for the language model stack of the model client."""
+
+import asyncio
+from concurrent import futures
+import http.server
+import json
+import os
+import tempfile
+import threading
+from unittest import mock
+
+from absl.testing import absltest
+from concordia.language_model import model_client_initialization
+
+
+class _StubHandler(http.server.BaseHTTPRequestHandler):
+  """Answers every chat request with the same reply."""
+
+  def do_POST(self):  # pylint: disable=invalid-name
+    request = json.loads(self.rfile.read(int(self.headers['Content-Length'])))
+    self.server.models.append(request['model'])
+    data = json.dumps({
+        'id': 'chat',
+        'object': 'chat.completion',
+        'created': 0,
+        'model': request['model'],
+        'choices': [{
+            'index': 0,
+            'message': {'role': 'assistant', 'content': 'reply'},
+            'finish_reason': 'stop',
+        }],
+    }).encode('utf-8')
+    self.send_response(200)
+    self.send_header('Content-Type', 'application/json')
+    self.send_header('Content-Length', str(len(data)))
+    self.end_headers()
+    self.wfile.write(data)
+
+  def log_message(self, *args):
+    pass
+
+
+class _NoThreadsExecutor(futures.ThreadPoolExecutor):
+  """Default executor of a loop that must not run anything on a thread."""
+
+  def submit(self, fn, /, *args, **kwargs):
+    raise AssertionError(f'{fn} was sent to the executor of the event loop.')
+
+
+class ModelClientTest(absltest.TestCase):
+
+  def setUp(self):
+    super().setUp()
+    server = http.server.ThreadingHTTPServer(('127.0.0.1', 0), _StubHandler)
+    server.models = []
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    self.addCleanup(server.server_close)
+    self.addCleanup(server.shutdown)
+    self._server = server
+    url = f'http://127.0.0.1:{server.server_port}/v1'
+    self.enter_context(mock.patch.dict(os.environ, {
+        'LM_STUDIO_URL': url,
+        'LM_STUDIO_MODEL': 'primary',
+        'LLM_REQUESTS_PER_MINUTE': '600',
+        'LLM_TOKENS_PER_MINUTE': '1000000',
+        'LLM_CACHE_DIR': self.enter_context(tempfile.TemporaryDirectory()),
+        'CONTROL_MODEL_NAME': 'control',
+        'CONTROL_MODEL_URL': url,
+    }))
+
+  def test_async_calls_do_not_use_the_executor(self):
+    client = model_client_initialization.ModelClient(
+        provider='lmstudio', stream=False, load_embedder=False
+    )
+
+    async def sample():
+      return await asyncio.gather(
+          client.model.async_sample_text('Tell a story.', max_tokens=500),
+          client.model.async_sample_text(
+              'Tell a story.', max_tokens=500, temperature=0.0
+          ),
+          client.model.async_sample_text(
+              'Tell a story.', max_tokens=500, temperature=0.0, seed=1
+          ),
+      )
+
+    async def run():
+      # The openai client reads the platform on a thread on its first call.
+      await client.model.async_sample_text('Hello.')
+      asyncio.get_running_loop().set_default_executor(_NoThreadsExecutor())
+      return [await sample(), await sample()]
+
+    self.assertEqual(asyncio.run(run()), [['reply'] * 3] * 2)
+    # Calls at temperature 0 or with a seed are answered from the cache.
+    self.assertEqual(self._server.models, ['primary'] * 5)
+
+if __name__ == '__main__':
+  absltest.main()
@@ -1,6 +1,7 @@
 """Language Model that uses OpenRouter."""
 import os
 
+from concordia.language_model import base_oai_compatible
 from concordia.language_model import language_model
 from concordia.language_model.base_oai_compatible import BaseOAICompatibleModel
 from concordia.utils import measurements as measurements_lib
@@ -18,6 +19,8 @@ class OpenRouterModel(BaseOAICompatibleModel):
       base_url: str | None = None,
       measurements: measurements_lib.Measurements | None = None,
       channel: str = language_model.DEFAULT_STATS_CHANNEL,
+      choice_scoring: str = base_oai_compatible.CHOICE_SCORING_LOGPROBS,
+      stream: bool = True,
   ):
     """Initializes the instance.
 
@@ -32,6 +35,10 @@ class OpenRouterModel(BaseOAICompatibleModel):
         "https://openrouter.ai/api/v1".
       measurements: The measurements object to log usage statistics to.
       channel: The channel to write the statistics to.
+      choice_scoring: How `sample_choice` answers, one of
+        `base_oai_compatible.CHOICE_SCORING_MODES`.
+      stream: Whether to stream the response from the model, closing the
+        stream as soon as a terminator is reached.
     """
     api_key = api_key or os.environ.get('OPENROUTER_API_KEY')
     if not api_key:
@@ -58,4 +65,6 @@ class OpenRouterModel(BaseOAICompatibleModel):
         client=client,
         measurements=measurements,
         channel=channel,
+        choice_scoring=choice_scoring,
+        stream=stream,
     )
@@ -0,0 +1,549 @@
+"""Wrapper to pace calls to an underlying language model to its rate limits."""
+
+import asyncio
+from collections.abc import Awaitable, Callable, Collection, Mapping, Sequence
+import threading
+import time
+from typing import Any, Type, TypeVar
+
+from concordia.language_model import language_model
+from concordia.utils import measurements as measurements_lib
+from concordia.utils import telemetry
+from typing_extensions import override
+
+_T = TypeVar('_T')
+
+def _retry_after_seconds(error: Exception) -> float | None:
+  """Returns the delay a rate limit error asks for, if any."""
+  headers = getattr(getattr(error, 'response', None), 'headers', None)
+  if not headers:
+    return None
+  try:
+    return float(headers.get('retry-after'))
+  except (TypeError, ValueError):
+    return None
+
+
+class _TokenBucket:
+  """A token bucket refilled continuously at a rate per minute.
+
+  Tokens are reserved before they are available, so concurrent callers queue
+  up behind each other and each waits just until its own tokens are refilled.
+  """
+
+  def __init__(self, per_minute: float):
+    if per_minute <= 0:
+      raise ValueError('Rate limits must be positive.')
+    self._rate = per_minute / 60.0
+    self._capacity = per_minute
+    self._tokens = per_minute
+    self._updated = time.monotonic()
+    self._lock = threading.Lock()
+
+  def _refill(self) -> None:
+    """Adds the tokens refilled since the last update. Assumes lock is held."""
+    now = time.monotonic()
+    self._tokens = min(
+        self._capacity, self._tokens + (now - self._updated) * self._rate
+    )
+    self._updated = now
+
+  def reserve(self, amount: float) -> float:
+    """Takes tokens from the bucket.
+
+    Args:
+      amount: the number of tokens to take.
+
+    Returns:
+      The number of seconds to wait until the tokens are refilled.
+    """
+    with self._lock:
+      self._refill()
+      self._tokens -= amount
+      return max(0.0, -self._tokens / self._rate)
+
+  def refund(self, amount: float) -> None:
+    """Returns reserved tokens that were not used."""
+    with self._lock:
+      self._refill()
+      self._tokens = min(self._capacity, self._tokens + amount)
+
+  def drain(self) -> None:
+    """Empties the bucket, after the provider reported a rate limit error."""
+    with self._lock:
+      self._refill()
+      self._tokens = min(self._tokens, 0.0)
+
+
+class _AdaptiveConcurrency:
+  """Bounds the calls in flight, adapting the bound to errors and latency.
+
+  The bound grows by one per round trip of calls while they succeed on time,
+  and is halved when the provider reports a rate limit error (additive
+  increase, multiplicative decrease). Threads and coroutines, of any event
+  loop, share the same slots: coroutines wait on a future of their loop
+  instead of blocking it.
+  """
+
+  def __init__(
+      self,
+      initial: int,
+      minimum: int,
+      maximum: int,
+      target_latency_seconds: float | None,
+  ):
+    if not 0 < minimum <= initial <= maximum:
+      raise ValueError(
+          'Expected 0 < min_concurrency <= initial_concurrency <= '
+          'max_concurrency.'
+      )
+    self._limit = float(initial)
+    self._minimum = minimum
+    self._maximum = maximum
+    self._target_latency_seconds = target_latency_seconds
+    self._in_flight = 0
+    self._waiting = 0
+    self._condition = threading.Condition()
+    self._async_waiters: list[
+        tuple[asyncio.AbstractEventLoop, asyncio.Future[None]]
+    ] = []
+
+  def _wake(self) -> None:
+    """Wakes the waiting calls to check for a slot. Assumes lock is held."""
+    self._condition.notify_all()
+    for loop, waiter in self._async_waiters:
+      loop.call_soon_threadsafe(
+          lambda waiter=waiter: waiter.done() or waiter.set_result(None)
+      )
+    self._async_waiters.clear()
+
+  def acquire(self) -> None:
+    """Waits until a call may start."""
+    with self._condition:
+      self._waiting += 1
+      while self._in_flight >= int(self._limit):
+        self._condition.wait()
+      self._waiting -= 1
+      self._in_flight += 1
+
+  async def async_acquire(self) -> None:
+    """Waits until a call may start, without blocking the event loop."""
+    loop = asyncio.get_running_loop()
+    with self._condition:
+      self._waiting += 1
+    try:
+      while True:
+        with self._condition:
+          if self._in_flight < int(self._limit):
+            self._in_flight += 1
+            return
+          waiter = loop.create_future()
+          self._async_waiters.append((loop, waiter))
+        await waiter
+    finally:
+      with self._condition:
+        self._waiting -= 1
+
+  def release(self) -> None:
+    with self._condition:
+      self._in_flight -= 1
+      self._wake()
+
+  def on_success(self, latency_seconds: float) -> None:
+    with self._condition:
+      if (
+          self._target_latency_seconds is not None
+          and latency_seconds > self._target_latency_seconds
+      ):
+        self._limit = max(self._minimum, self._limit * 0.9)
+        return
+      previous = int(self._limit)
+      self._limit = min(self._maximum, self._limit + 1.0 / self._limit)
+      if int(self._limit) > previous:
+        self._wake()
+
+  def on_rate_limited(self) -> None:
+    with self._condition:
+      self._limit = max(self._minimum, self._limit / 2)
+
+  def get_stats(self) -> Mapping[str, float]:
+    with self._condition:
+      return {
+          'concurrency_limit': int(self._limit),
+          'in_flight': self._in_flight,
+          'waiting_for_slot': self._waiting,
+      }
+
+
+class RateLimitedLanguageModel(language_model.LanguageModel):
+  """Wraps an underlying language model and paces calls to its rate limits.
+
+  All threads sharing the wrapper draw from the same requests-per-minute and
+  tokens-per-minute buckets, so a burst of calls is spread over time instead
+  of exceeding the provider's limits. Each call waits just until its request
+  and tokens are available. The tokens of a call are estimated from the
+  length of its prompt and its `max_tokens`, and the unused part is returned
+  once the response is known.
+
+  The number of calls in flight is bounded and adapted: it grows while calls
+  succeed within `target_latency_seconds`, shrinks when they are slower, and
+  is halved on a rate limit error. Calls failing with a rate limit error are
+  retried after the delay the provider asks for, or a short backoff, while
+  the buckets are emptied so that the other threads slow down too.
+
+  The async methods wait for slots and rate limits without blocking the
+  event loop, and call the async methods of the underlying model.
+
+  A call to `sample_choice` counts as a single request.
+  """
+
+  def __init__(
+      self,
+      model: language_model.LanguageModel,
+      *,
+      requests_per_minute: float | None = None,
+      tokens_per_minute: float | None = None,
+      initial_concurrency: int = 8,
+      min_concurrency: int = 1,
+      max_concurrency: int = 64,
+      target_latency_seconds: float | None = None,
+      rate_limit_exceptions: Collection[Type[Exception]] = (),
+      max_rate_limit_retries: int = 5,
+      backoff_seconds: float = 1.0,
+      measurements: measurements_lib.Measurements | None = None,
+      channel: str = language_model.DEFAULT_STATS_CHANNEL,
+  ) -> None:
+    """Wrap the underlying language model with a rate limiter.
+
+    Args:
+      model: A language model to wrap with a rate limiter.
+      requests_per_minute: the maximum number of calls per minute, or None
+        for no limit.
+      tokens_per_minute: the maximum number of prompt and response tokens per
+        minute, or None for no limit.
+      initial_concurrency: the initial bound on calls in flight.
+      min_concurrency: the lowest the bound on calls in flight can go.
+      max_concurrency: the highest the bound on calls in flight can go.
+      target_latency_seconds: optional latency above which the bound on calls
+        in flight is lowered.
+      rate_limit_exceptions: the exceptions the model raises when the provider
+        rejects a call for exceeding its rate limits.
+      max_rate_limit_retries: how many times a rejected call is retried.
+      backoff_seconds: the delay before retrying a rejected call, doubling on
+        each retry, when the provider does not ask for a delay.
+      measurements: The measurements object to log wait times to.
+      channel: The channel to write the statistics to.
+
+    Raises:
+      ValueError: if a limit is not positive or the concurrency bounds are
+        inconsistent.
+    """
+    self._model = model
+    self._requests = None
+    if requests_per_minute is not None:
+      self._requests = _TokenBucket(requests_per_minute)
+    self._tokens = None
+    if tokens_per_minute is not None:
+      self._tokens = _TokenBucket(tokens_per_minute)
+    self._concurrency = _AdaptiveConcurrency(
+        initial=initial_concurrency,
+        minimum=min_concurrency,
+        maximum=max_concurrency,
+        target_latency_seconds=target_latency_seconds,
+    )
+    self._rate_limit_exceptions = tuple(rate_limit_exceptions)
+    self._max_rate_limit_retries = max_rate_limit_retries
+    self._backoff_seconds = backoff_seconds
+    self._measurements = measurements
+    self._channel = channel
+
+    self._lock = threading.Lock()
+    self._waiting_for_rate = 0
+    self._num_calls = 0
+    self._num_rate_limited = 0
+    self._total_wait_seconds = 0.0
+    self._max_wait_seconds = 0.0
+
+  def _reserve(self, num_tokens: int) -> float:
+    """Reserves a request and tokens, returns how long to wait for them."""
+    wait = 0.0
+    if self._requests is not None:
+      wait = self._requests.reserve(1)
+    if self._tokens is not None:
+      wait = max(wait, self._tokens.reserve(num_tokens))
+    return wait
+
+  def _wait(self, seconds: float) -> None:
+    if seconds <= 0:
+      return
+    with self._lock:
+      self._waiting_for_rate += 1
+    try:
+      time.sleep(seconds)
+    finally:
+      with self._lock:
+        self._waiting_for_rate -= 1
+
+  async def _async_wait(self, seconds: float) -> None:
+    if seconds <= 0:
+      return
+    with self._lock:
+      self._waiting_for_rate += 1
+    try:
+      await asyncio.sleep(seconds)
+    finally:
+      with self._lock:
+        self._waiting_for_rate -= 1
+
+  def _on_rate_limited(self) -> None:
+    """Slows all calls down after a rate limit error."""
+    with self._lock:
+      self._num_rate_limited += 1
+    self._concurrency.on_rate_limited()
+    for bucket in (self._requests, self._tokens):
+      if bucket is not None:
+        bucket.drain()
+
+  def _call(
+      self,
+      call: Callable[[], _T],
+      num_tokens: int,
+      used_tokens: Callable[[_T], int],
+  ) -> _T:
+    """Makes a call once the limits allow it.
+
+    Args:
+      call: the call to the underlying model.
+      num_tokens: the number of tokens reserved for the call.
+      used_tokens: returns the number of tokens a response actually used.
+
+    Returns:
+      The response of the call.
+    """
+    start = time.monotonic()
+    self._concurrency.acquire()
+    try:
+      self._wait(self._reserve(num_tokens))
+      wait_seconds = time.monotonic() - start
+      backoff_seconds = self._backoff_seconds
+      for attempt in range(self._max_rate_limit_retries + 1):
+        call_start = time.monotonic()
+        try:
+          result = call()
+        except self._rate_limit_exceptions as error:
+          self._refund(num_tokens)
+          self._on_rate_limited()
+          if attempt == self._max_rate_limit_retries:
+            raise
+          telemetry.record_retry()
+          delay = _retry_after_seconds(error)
+          if delay is None:
+            delay = backoff_seconds
+            backoff_seconds *= 2
+          retry_start = time.monotonic()
+          self._wait(max(delay, self._reserve(num_tokens)))
+          wait_seconds += time.monotonic() - retry_start
+          continue
+        except BaseException:
+          self._refund(num_tokens)
+          raise
+        self._concurrency.on_success(time.monotonic() - call_start)
+        break
+    finally:
+      self._concurrency.release()
+    self._record(result, num_tokens, used_tokens, wait_seconds)
+    return result
+
+  async def _async_call(
+      self,
+      call: Callable[[], Awaitable[_T]],
+      num_tokens: int,
+      used_tokens: Callable[[_T], int],
+  ) -> _T:
+    """Makes a call once the limits allow it, without blocking the loop.
+
+    Args:
+      call: the call to the underlying model.
+      num_tokens: the number of tokens reserved for the call.
+      used_tokens: returns the number of tokens a response actually used.
+
+    Returns:
+      The response of the call.
+    """
+    start = time.monotonic()
+    await self._concurrency.async_acquire()
+    try:
+      await self._async_wait(self._reserve(num_tokens))
+      wait_seconds = time.monotonic() - start
+      backoff_seconds = self._backoff_seconds
+      for attempt in range(self._max_rate_limit_retries + 1):
+        call_start = time.monotonic()
+        try:
+          result = await call()
+        except self._rate_limit_exceptions as error:
+          self._refund(num_tokens)
+          self._on_rate_limited()
+          if attempt == self._max_rate_limit_retries:
+            raise
+          telemetry.record_retry()
+          delay = _retry_after_seconds(error)
+          if delay is None:
+            delay = backoff_seconds
+            backoff_seconds *= 2
+          retry_start = time.monotonic()
+          await self._async_wait(max(delay, self._reserve(num_tokens)))
+          wait_seconds += time.monotonic() - retry_start
+          continue
+        except BaseException:
+          self._refund(num_tokens)
+          raise
+        self._concurrency.on_success(time.monotonic() - call_start)
+        break
+    finally:
+      self._concurrency.release()
+    self._record(result, num_tokens, used_tokens, wait_seconds)
+    return result
+
+  def _refund(self, num_tokens: int) -> None:
+    """Returns the tokens reserved for a call that failed."""
+    if self._tokens is not None:
+      self._tokens.refund(num_tokens)
+
+  def _record(
+      self,
+      result: _T,
+      num_tokens: int,
+      used_tokens: Callable[[_T], int],
+      wait_seconds: float,
+  ) -> None:
+    """Refunds the unused tokens of a call and publishes its wait."""
+    if self._tokens is not None:
+      self._tokens.refund(max(0, num_tokens - used_tokens(result)))
+    with self._lock:
+      self._num_calls += 1
+      self._total_wait_seconds += wait_seconds
+      self._max_wait_seconds = max(self._max_wait_seconds, wait_seconds)
+    if self._measurements is not None:
+      self._measurements.publish_datum(
+          self._channel,
+          {
+              'rate_limit_wait_seconds': wait_seconds,
+              'rate_limit_queue_depth': self.get_stats()['queue_depth'],
+          },
+      )
+
+  @override
+  def sample_text(
+      self,
+      prompt: str,
+      *,
+      max_tokens: int = language_model.DEFAULT_MAX_TOKENS,
+      terminators: Collection[str] = language_model.DEFAULT_TERMINATORS,
+      temperature: float = language_model.DEFAULT_TEMPERATURE,
+      timeout: float = language_model.DEFAULT_TIMEOUT_SECONDS,
+      seed: int | None = None,
+  ) -> str:
+    prompt_tokens = language_model.estimate_tokens(prompt)
+    return self._call(
+        lambda: self._model.sample_text(
+            prompt,
+            max_tokens=max_tokens,
+            terminators=terminators,
+            temperature=temperature,
+            timeout=timeout,
+            seed=seed,
+        ),
+        num_tokens=prompt_tokens + max_tokens,
+        used_tokens=lambda result: (
+            prompt_tokens + language_model.estimate_tokens(result)
+        ),
+    )
+
+  @override
+  def sample_choice(
+      self,
+      prompt: str,
+      responses: Sequence[str],
+      *,
+      seed: int | None = None,
+  ) -> tuple[int, str, Mapping[str, Any]]:
+    num_tokens = language_model.estimate_tokens(prompt) + sum(
+        language_model.estimate_tokens(response) for response in responses
+    )
+    return self._call(
+        lambda: self._model.sample_choice(prompt, responses, seed=seed),
+        num_tokens=num_tokens,
+        used_tokens=lambda result: num_tokens,
+    )
+
+  @override
+  async def async_sample_text(
+      self,
+      prompt: str,
+      *,
+      max_tokens: int = language_model.DEFAULT_MAX_TOKENS,
+      terminators: Collection[str] = language_model.DEFAULT_TERMINATORS,
+      temperature: float = language_model.DEFAULT_TEMPERATURE,
+      timeout: float = language_model.DEFAULT_TIMEOUT_SECONDS,
+      seed: int | None = None,
+  ) -> str:
+    prompt_tokens = language_model.estimate_tokens(prompt)
+    return await self._async_call(
+        lambda: self._model.async_sample_text(
+            prompt,
+            max_tokens=max_tokens,
+            terminators=terminators,
+            temperature=temperature,
+            timeout=timeout,
+            seed=seed,
+        ),
+        num_tokens=prompt_tokens + max_tokens,
+        used_tokens=lambda result: (
+            prompt_tokens + language_model.estimate_tokens(result)
+        ),
+    )
+
+  @override
+  async def async_sample_choice(
+      self,
+      prompt: str,
+      responses: Sequence[str],
+      *,
+      seed: int | None = None,
+  ) -> tuple[int, str, Mapping[str, Any]]:
+    num_tokens = language_model.estimate_tokens(prompt) + sum(
+        language_model.estimate_tokens(response) for response in responses
+    )
+    return await self._async_call(
+        lambda: self._model.async_sample_choice(prompt, responses, seed=seed),
+        num_tokens=num_tokens,
+        used_tokens=lambda result: num_tokens,
+    )
+
+  def get_stats(self) -> Mapping[str, float]:
+    """Returns the state of the limiter and the time calls waited.
+
+    Returns:
+      The number of calls waiting for a slot or for the rate limits
+      (`queue_depth`), the calls in flight and their current bound, the
+      number of completed calls and of rate limit errors, and the mean and
+      maximum time a call waited before it was answered, excluding the time
+      the model took.
+    """
+    concurrency = self._concurrency.get_stats()
+    with self._lock:
+      return {
+          'queue_depth': (
+              concurrency['waiting_for_slot'] + self._waiting_for_rate
+          ),
+          'in_flight': concurrency['in_flight'],
+          'concurrency_limit': concurrency['concurrency_limit'],
+          'num_calls': self._num_calls,
+          'num_rate_limited': self._num_rate_limited,
+          'mean_wait_seconds': (
+              self._total_wait_seconds / self._num_calls
+              if self._num_calls
+              else 0.0
+          ),
+          'max_wait_seconds': self._max_wait_seconds,
+      }
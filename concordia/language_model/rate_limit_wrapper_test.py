@@ -0,0 +1,190 @@
+"""Tests for the rate limited language model wrapper."""
+
+import asyncio
+from concurrent import futures
+import threading
+import time
+import types
+
+from absl.testing import absltest
+from concordia.language_model import rate_limit_wrapper
+from concordia.testing import mock_model
+
+
+class _RateLimitError(Exception):
+
+  def __init__(self, retry_after: str | None = None):
+    super().__init__('rate limited')
+    headers = {} if retry_after is None else {'retry-after': retry_after}
+    self.response = types.SimpleNamespace(headers=headers)
+
+
+class _RecordingModel(mock_model.MockModel):
+  """Mock model recording how many calls are in flight."""
+
+  def __init__(
+      self,
+      latency: float = 0.0,
+      num_failures: int = 0,
+      error: Exception | None = None,
+  ):
+    super().__init__(response='ok')
+    self._latency = latency
+    self._num_failures = num_failures
+    self._error = error
+    self._lock = threading.Lock()
+    self.in_flight = 0
+    self.max_in_flight = 0
+    self.num_calls = 0
+
+  def sample_text(self, prompt, **kwargs):
+    with self._lock:
+      self.num_calls += 1
+      if self.num_calls <= self._num_failures:
+        raise self._error or _RateLimitError(retry_after='0.01')
+      self.in_flight += 1
+      self.max_in_flight = max(self.max_in_flight, self.in_flight)
+    time.sleep(self._latency)
+    with self._lock:
+      self.in_flight -= 1
+    return super().sample_text(prompt, **kwargs)
+
+  async def async_sample_text(self, prompt, **kwargs):
+    with self._lock:
+      self.in_flight += 1
+      self.max_in_flight = max(self.max_in_flight, self.in_flight)
+    await asyncio.sleep(self._latency)
+    with self._lock:
+      self.in_flight -= 1
+    return super().sample_text(prompt, **kwargs)
+
+
+class TokenBucketTest(absltest.TestCase):
+
+  def test_waits_for_refill(self):
+    bucket = rate_limit_wrapper._TokenBucket(per_minute=60)
+
+    self.assertEqual(bucket.reserve(60), 0.0)
+    self.assertAlmostEqual(bucket.reserve(1), 1.0, delta=0.05)
+    self.assertAlmostEqual(bucket.reserve(2), 3.0, delta=0.05)
+    bucket.refund(2)
+    self.assertAlmostEqual(bucket.reserve(1), 2.0, delta=0.05)
+
+
+class RateLimitedLanguageModelTest(absltest.TestCase):
+
+  def test_paces_requests(self):
+    model = rate_limit_wrapper.RateLimitedLanguageModel(
+        mock_model.MockModel(), requests_per_minute=1200
+    )
+    # Empty the bucket, leaving one request every 50ms.
+    model._requests.reserve(1200)
+    start = time.monotonic()
+    for _ in range(4):
+      model.sample_text('prompt')
+
+    self.assertGreater(time.monotonic() - start, 0.15)
+    stats = model.get_stats()
+    self.assertEqual(stats['num_calls'], 4)
+    self.assertGreater(stats['max_wait_seconds'], 0.04)
+
+  def test_bounds_calls_in_flight(self):
+    recording = _RecordingModel(latency=0.02)
+    model = rate_limit_wrapper.RateLimitedLanguageModel(
+        recording, initial_concurrency=2, max_concurrency=2
+    )
+
+    with futures.ThreadPoolExecutor(max_workers=8) as executor:
+      list(executor.map(lambda _: model.sample_text('prompt'), range(16)))
+
+    self.assertEqual(recording.max_in_flight, 2)
+    self.assertEqual(model.get_stats()['queue_depth'], 0)
+
+  def test_bounds_async_calls_in_flight(self):
+    recording = _RecordingModel(latency=0.2)
+    model = rate_limit_wrapper.RateLimitedLanguageModel(
+        recording,
+        requests_per_minute=1200,
+        initial_concurrency=2,
+        max_concurrency=2,
+    )
+    model._requests.reserve(1200)
+
+    async def sample_all():
+      return await asyncio.gather(
+          *(model.async_sample_text('prompt') for _ in range(8))
+      )
+
+    start = time.monotonic()
+    self.assertEqual(asyncio.run(sample_all()), ['ok'] * 8)
+    self.assertGreater(time.monotonic() - start, 0.35)
+    self.assertEqual(recording.max_in_flight, 2)
+    self.assertEqual(model.get_stats()['queue_depth'], 0)
+
+  def test_concurrency_grows_while_calls_succeed(self):
+    model = rate_limit_wrapper.RateLimitedLanguageModel(
+        mock_model.MockModel(), initial_concurrency=1, max_concurrency=4
+    )
+    for _ in range(20):
+      model.sample_text('prompt')
+
+    self.assertEqual(model.get_stats()['concurrency_limit'], 4)
+
+  def test_retries_rate_limited_calls(self):
+    recording = _RecordingModel(num_failures=2)
+    model = rate_limit_wrapper.RateLimitedLanguageModel(
+        recording,
+        initial_concurrency=8,
+        rate_limit_exceptions=(_RateLimitError,),
+    )
+
+    self.assertEqual(model.sample_text('prompt'), 'ok')
+    stats = model.get_stats()
+    self.assertEqual(stats['num_rate_limited'], 2)
+    self.assertEqual(stats['concurrency_limit'], 2)
+
+  def test_gives_up_after_retries(self):
+    model = rate_limit_wrapper.RateLimitedLanguageModel(
+        _RecordingModel(num_failures=3),
+        rate_limit_exceptions=(_RateLimitError,),
+        max_rate_limit_retries=2,
+    )
+
+    with self.assertRaises(_RateLimitError):
+      model.sample_text('prompt')
+    self.assertEqual(model.get_stats()['in_flight'], 0)
+
+  def test_refunds_tokens_of_failed_calls(self):
+    model = rate_limit_wrapper.RateLimitedLanguageModel(
+        _RecordingModel(num_failures=3, error=RuntimeError('server error')),
+        tokens_per_minute=100,
+    )
+
+    for _ in range(3):
+      with self.assertRaises(RuntimeError):
+        model.sample_text('prompt', max_tokens=90)
+    start = time.monotonic()
+    self.assertEqual(model.sample_text('prompt', max_tokens=90), 'ok')
+
+    self.assertLess(time.monotonic() - start, 1.0)
+
+  def test_refunds_tokens_of_cancelled_calls(self):
+    model = rate_limit_wrapper.RateLimitedLanguageModel(
+        _RecordingModel(latency=10.0), tokens_per_minute=100
+    )
+
+    async def cancel_call():
+      task = asyncio.create_task(
+          model.async_sample_text('prompt', max_tokens=90)
+      )
+      await asyncio.sleep(0.05)
+      task.cancel()
+      with self.assertRaises(asyncio.CancelledError):
+        await task
+
+    asyncio.run(cancel_call())
+    self.assertEqual(model._reserve(90), 0.0)
+
+
+if __name__ == '__main__':
+  absltest.main()
@@ -1,12 +1,17 @@
 """Wrapper to retry calls to an underlying language model."""
 
-from collections.abc import Collection, Sequence, Mapping
-from typing import Any, Type
+import asyncio
+from collections.abc import Awaitable, Callable, Collection, Sequence, Mapping
+import random
+from typing import Any, Type, TypeVar
 
 from concordia.language_model import language_model
+from concordia.utils import telemetry
 import retry
 from typing_extensions import override
 
+_T = TypeVar('_T')
+
 
 class RetryLanguageModel(language_model.LanguageModel):
   """Wraps an underlying language model and retries calls to it."""
@@ -54,6 +59,8 @@ class RetryLanguageModel(language_model.LanguageModel):
       timeout: float = language_model.DEFAULT_TIMEOUT_SECONDS,
       seed: int | None = None,
   ) -> str:
+    attempts = []
+
     @retry.retry(
         self._retry_on_exceptions,
         tries=self._retry_tries,
@@ -71,6 +78,9 @@ class RetryLanguageModel(language_model.LanguageModel):
         temperature=temperature,
         seed=seed,
     ):
+      attempts.append(None)
+      if len(attempts) > 1:
+        telemetry.record_retry()
       return model.sample_text(
           prompt,
           max_tokens=max_tokens,
@@ -96,6 +106,8 @@ class RetryLanguageModel(language_model.LanguageModel):
       *,
       seed: int | None = None,
   ) -> tuple[int, str, Mapping[str, Any]]:
+    attempts = []
+
     @retry.retry(
         self._retry_on_exceptions,
         tries=self._retry_tries,
@@ -105,6 +117,59 @@ class RetryLanguageModel(language_model.LanguageModel):
         jitter=self._jitter,
     )
     def _sample_choice(model, prompt, responses, *, seed):
+      attempts.append(None)
+      if len(attempts) > 1:
+        telemetry.record_retry()
       return model.sample_choice(prompt, responses, seed=seed)
 
     return _sample_choice(self._model, prompt, responses, seed=seed)
+
+  async def _retry_async(self, call: Callable[[], Awaitable[_T]]) -> _T:
+    """Awaits a call, retrying it like the `retry` decorator of the model."""
+    tries = self._retry_tries
+    delay = self._retry_delay
+    while True:
+      try:
+        return await call()
+      except self._retry_on_exceptions:
+        tries -= 1
+        if not tries:
+          raise
+        telemetry.record_retry()
+        await asyncio.sleep(delay)
+        if self._exponential_backoff:
+          delay *= self._backoff_factor
+        delay = min(delay + random.uniform(*self._jitter), self._max_delay)
+
+  @override
+  async def async_sample_text(
+      self,
+      prompt: str,
+      *,
+      max_tokens: int = language_model.DEFAULT_MAX_TOKENS,
+      terminators: Collection[str] = language_model.DEFAULT_TERMINATORS,
+      temperature: float = language_model.DEFAULT_TEMPERATURE,
+      timeout: float = language_model.DEFAULT_TIMEOUT_SECONDS,
+      seed: int | None = None,
+  ) -> str:
+    return await self._retry_async(
+        lambda: self._model.async_sample_text(
+            prompt,
+            max_tokens=max_tokens,
+            terminators=terminators,
+            temperature=temperature,
+            seed=seed,
+        )
+    )
+
+  @override
+  async def async_sample_choice(
+      self,
+      prompt: str,
+      responses: Sequence[str],
+      *,
+      seed: int | None = None,
+  ) -> tuple[int, str, Mapping[str, Any]]:
+    return await self._retry_async(
+        lambda: self._model.async_sample_choice(prompt, responses, seed=seed)
+    )
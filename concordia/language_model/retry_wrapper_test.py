@@ -0,0 +1,57 @@
+"""Tests for the retrying language model wrapper."""
+
+import asyncio
+
+from absl.testing import absltest
+from concordia.language_model import retry_wrapper
+from concordia.testing import mock_model
+
+
+class _FlakyModel(mock_model.MockModel):
+  """Mock model failing a number of times before answering."""
+
+  def __init__(self, num_failures: int):
+    super().__init__(response='ok')
+    self.num_failures = num_failures
+    self.num_calls = 0
+
+  async def async_sample_text(self, prompt, **kwargs):
+    self.num_calls += 1
+    if self.num_calls <= self.num_failures:
+      raise ConnectionError()
+    return await super().async_sample_text(prompt, **kwargs)
+
+
+class RetryLanguageModelTest(absltest.TestCase):
+
+  def _make_model(self, model, **kwargs):
+    return retry_wrapper.RetryLanguageModel(
+        model, retry_delay=0.0, jitter=(0.0, 0.0), **kwargs
+    )
+
+  def test_async_sample_text_retries(self):
+    flaky = _FlakyModel(num_failures=2)
+    model = self._make_model(flaky, retry_tries=3)
+
+    self.assertEqual(asyncio.run(model.async_sample_text('prompt')), 'ok')
+    self.assertEqual(flaky.num_calls, 3)
+
+  def test_async_sample_text_gives_up(self):
+    flaky = _FlakyModel(num_failures=3)
+    model = self._make_model(flaky, retry_tries=3)
+
+    with self.assertRaises(ConnectionError):
+      asyncio.run(model.async_sample_text('prompt'))
+    self.assertEqual(flaky.num_calls, 3)
+
+  def test_async_sample_choice_defaults_to_sync_model(self):
+    model = self._make_model(mock_model.MockModel())
+
+    self.assertEqual(
+        asyncio.run(model.async_sample_choice('prompt', ['a', 'b'])),
+        (0, 'a', {}),
+    )
+
+
+if __name__ == '__main__':
+  absltest.main()
@@ -0,0 +1,231 @@
+"""Wrapper routing cheap control calls to a small language model."""
+
+from collections.abc import Callable, Collection, Mapping, Sequence
+import dataclasses
+import threading
+from typing import Any
+
+from concordia.language_model import language_model
+from concordia.type_checks import entity
+from concordia.utils import measurements as measurements_lib
+from concordia.utils import telemetry
+from typing_extensions import override
+
+PRIMARY = 'primary'
+CONTROL = 'control'
+
+# The output types of the game master's control decisions: whether to stop,
+# who acts next, what they can do and which game master runs the next step.
+DEFAULT_CONTROL_OUTPUT_TYPES = (
+    entity.OutputType.TERMINATE,
+    entity.OutputType.NEXT_ACTING,
+    entity.OutputType.NEXT_ACTION_SPEC,
+    entity.OutputType.NEXT_GAME_MASTER,
+)
+
+
+@dataclasses.dataclass(frozen=True)
+class CallShape:
+  """What is known of a call when routing it.
+
+  Attributes:
+    method: the method called, 'sample_text' or 'sample_choice'.
+    max_tokens: the maximum number of tokens of a text call, None for a
+      choice.
+    scope: the entity, component, phase and output type making the call.
+  """
+
+  method: str
+  max_tokens: int | None
+  scope: telemetry.Scope
+
+
+class RoutingLanguageModel(language_model.LanguageModel):
+  """Sends control calls to a small model and the others to a primary model.
+
+  Most calls of a simulation are low-entropy control decisions, e.g. the
+  multiple choice questions of the game master and its termination checks,
+  which a small local model answers as well as a frontier model and much
+  faster. A call is sent to the control model when it is a `sample_choice`,
+  when it is made while taking an action of one of `control_output_types`,
+  or when it is made by one of `control_components`, as tagged with
+  `telemetry.scope` by the entities and engines. With `max_control_tokens`
+  set, text calls asking for at most that many tokens are also sent to it.
+  All other calls, e.g. long free-text generation, go to the primary model. A
+  `rule` can override these rules for any call.
+
+  Each decision is published to `measurements`, and counted in `get_stats`.
+  """
+
+  def __init__(
+      self,
+      primary_model: language_model.LanguageModel,
+      control_model: language_model.LanguageModel,
+      *,
+      route_choices: bool = True,
+      max_control_tokens: int | None = None,
+      control_output_types: Collection[str] = DEFAULT_CONTROL_OUTPUT_TYPES,
+      control_components: Collection[str] = (),
+      rule: Callable[[CallShape], str | None] | None = None,
+      measurements: measurements_lib.Measurements | None = None,
+      channel: str = language_model.DEFAULT_STATS_CHANNEL,
+  ) -> None:
+    """Wrap a primary and a control model with routing.
+
+    Args:
+      primary_model: the model for long free-text generation.
+      control_model: the small, fast model for control calls.
+      route_choices: whether to send every `sample_choice` to the control
+        model.
+      max_control_tokens: if set, text calls asking for at most this many
+        tokens go to the control model. By default text calls are routed by
+        their caller only, as a short answer can still need the primary.
+      control_output_types: calls made while an entity takes an action of
+        these output types go to the control model.
+      control_components: calls made by the components with these keys go to
+        the control model.
+      rule: optional function checked before the other rules, returning
+        PRIMARY or CONTROL to route a call, or None to leave it to the other
+        rules.
+      measurements: The measurements object to publish routing decisions to.
+      channel: The channel to write the statistics to.
+
+    Raises:
+      ValueError: if max_control_tokens is negative.
+    """
+    if max_control_tokens is not None and max_control_tokens < 0:
+      raise ValueError(
+          f'max_control_tokens must not be negative: {max_control_tokens}'
+      )
+    self._models = {PRIMARY: primary_model, CONTROL: control_model}
+    self._route_choices = route_choices
+    self._max_control_tokens = max_control_tokens
+    self._control_output_types = frozenset(control_output_types)
+    self._control_components = frozenset(control_components)
+    self._rule = rule
+    self._measurements = measurements
+    self._channel = channel
+
+    self._lock = threading.Lock()
+    self._num_calls = {PRIMARY: 0, CONTROL: 0}
+    self._num_by_reason = {}
+
+  def _route(self, method: str, max_tokens: int | None = None) -> str:
+    """Returns the route of a call, after counting and publishing it."""
+    shape = CallShape(
+        method=method, max_tokens=max_tokens, scope=telemetry.current_scope()
+    )
+    route, reason = self._decide(shape)
+    with self._lock:
+      self._num_calls[route] += 1
+      self._num_by_reason[reason] = self._num_by_reason.get(reason, 0) + 1
+    if self._measurements is not None:
+      self._measurements.publish_datum(
+          self._channel,
+          {'route': route, 'route_reason': reason, 'route_method': method},
+      )
+    return route
+
+  def _decide(self, shape: CallShape) -> tuple[str, str]:
+    """Returns the route of a call and the reason for it."""
+    if self._rule is not None:
+      route = self._rule(shape)
+      if route is not None:
+        if route not in self._models:
+          raise ValueError(f'Unknown route: {route!r}')
+        return route, 'rule'
+    if shape.method == 'sample_choice' and self._route_choices:
+      return CONTROL, 'choice'
+    if (
+        shape.max_tokens is not None
+        and self._max_control_tokens is not None
+        and shape.max_tokens <= self._max_control_tokens
+    ):
+      return CONTROL, 'max_tokens'
+    if shape.scope.output_type in self._control_output_types:
+      return CONTROL, 'output_type'
+    if shape.scope.component in self._control_components:
+      return CONTROL, 'component'
+    return PRIMARY, 'default'
+
+  @override
+  def sample_text(
+      self,
+      prompt: str,
+      *,
+      max_tokens: int = language_model.DEFAULT_MAX_TOKENS,
+      terminators: Collection[str] = language_model.DEFAULT_TERMINATORS,
+      temperature: float = language_model.DEFAULT_TEMPERATURE,
+      timeout: float = language_model.DEFAULT_TIMEOUT_SECONDS,
+      seed: int | None = None,
+  ) -> str:
+    model = self._models[self._route('sample_text', max_tokens)]
+    return model.sample_text(
+        prompt,
+        max_tokens=max_tokens,
+        terminators=terminators,
+        temperature=temperature,
+        timeout=timeout,
+        seed=seed,
+    )
+
+  @override
+  def sample_choice(
+      self,
+      prompt: str,
+      responses: Sequence[str],
+      *,
+      seed: int | None = None,
+  ) -> tuple[int, str, Mapping[str, Any]]:
+    model = self._models[self._route('sample_choice')]
+    return model.sample_choice(prompt, responses, seed=seed)
+
+  @override
+  async def async_sample_text(
+      self,
+      prompt: str,
+      *,
+      max_tokens: int = language_model.DEFAULT_MAX_TOKENS,
+      terminators: Collection[str] = language_model.DEFAULT_TERMINATORS,
+      temperature: float = language_model.DEFAULT_TEMPERATURE,
+      timeout: float = language_model.DEFAULT_TIMEOUT_SECONDS,
+      seed: int | None = None,
+  ) -> str:
+    model = self._models[self._route('sample_text', max_tokens)]
+    return await model.async_sample_text(
+        prompt,
+        max_tokens=max_tokens,
+        terminators=terminators,
+        temperature=temperature,
+        timeout=timeout,
+        seed=seed,
+    )
+
+  @override
+  async def async_sample_choice(
+      self,
+      prompt: str,
+      responses: Sequence[str],
+      *,
+      seed: int | None = None,
+  ) -> tuple[int, str, Mapping[str, Any]]:
+    model = self._models[self._route('sample_choice')]
+    return await model.async_sample_choice(prompt, responses, seed=seed)
+
+  def get_stats(self) -> Mapping[str, Any]:
+    """Returns the number of calls sent to each model and why.
+
+    Returns:
+      The calls sent to the primary and control models, the share sent to the
+      control model (`control_rate`), and the calls routed by each reason.
+    """
+    with self._lock:
+      num_calls = sum(self._num_calls.values())
+      return {
+          'num_primary': self._num_calls[PRIMARY],
+          'num_control': self._num_calls[CONTROL],
+          'control_rate': (
+              self._num_calls[CONTROL] / num_calls if num_calls else 0.0
+          ),
+          'num_by_reason': dict(self._num_by_reason),
+      }
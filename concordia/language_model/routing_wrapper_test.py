@@ -0,0 +1,119 @@
+"""Tests for the routing language model wrapper."""
+
+import asyncio
+
+from absl.testing import absltest
+from concordia.agents import entity_agent
+from concordia.language_model import routing_wrapper
+from concordia.testing import mock_model
+from concordia.type_checks import entity
+from concordia.type_checks import entity_component
+from concordia.utils import measurements as measurements_lib
+from concordia.utils import telemetry
+
+
+class _Act(entity_component.ActingComponent):
+  """Acts with a long free-text call to the model."""
+
+  def __init__(self, model):
+    super().__init__()
+    self._model = model
+
+  def get_action_attempt(self, contexts, action_spec):
+    return self._model.sample_text('act', max_tokens=1000)
+
+  def get_state(self):
+    return {}
+
+  def set_state(self, state):
+    pass
+
+
+def _routing_model(**kwargs):
+  return routing_wrapper.RoutingLanguageModel(
+      mock_model.MockModel(response='primary'),
+      mock_model.MockModel(response='control'),
+      **kwargs,
+  )
+
+
+class RoutingLanguageModelTest(absltest.TestCase):
+
+  def test_routes_by_call_shape(self):
+    model = _routing_model(max_control_tokens=10)
+
+    self.assertEqual(model.sample_text('prompt', max_tokens=1000), 'primary')
+    self.assertEqual(model.sample_text('prompt', max_tokens=10), 'control')
+    model.sample_choice('prompt', ['a', 'b'])
+    self.assertEqual(
+        asyncio.run(model.async_sample_text('prompt', max_tokens=5)), 'control'
+    )
+
+    stats = model.get_stats()
+    self.assertEqual(stats['num_primary'], 1)
+    self.assertEqual(stats['num_control'], 3)
+    self.assertEqual(stats['control_rate'], 0.75)
+    self.assertEqual(
+        stats['num_by_reason'], {'default': 1, 'max_tokens': 2, 'choice': 1}
+    )
+
+  def test_routes_short_calls_only_when_asked(self):
+    model = _routing_model()
+
+    self.assertEqual(model.sample_text('prompt', max_tokens=1), 'primary')
+
+  def test_routes_by_output_type_of_the_action(self):
+    model = _routing_model()
+    agent = entity_agent.EntityAgent(
+        agent_name='Game Master', act_component=_Act(model)
+    )
+
+    terminate = entity.ActionSpec(
+        call_to_action='Stop?',
+        output_type=entity.OutputType.TERMINATE,
+        options=('Yes', 'No'),
+    )
+    event = entity.ActionSpec(
+        call_to_action='What happens?', output_type=entity.OutputType.RESOLVE
+    )
+
+    self.assertEqual(agent.act(terminate), 'control')
+    self.assertEqual(agent.act(event), 'primary')
+    self.assertEqual(model.get_stats()['num_by_reason']['output_type'], 1)
+
+  def test_routes_by_component(self):
+    model = _routing_model(control_components=('plan',))
+
+    with telemetry.scope(component='plan'):
+      self.assertEqual(model.sample_text('prompt'), 'control')
+    self.assertEqual(model.sample_text('prompt'), 'primary')
+
+  def test_rule_overrides_the_other_rules(self):
+    model = _routing_model(
+        rule=lambda shape: (
+            routing_wrapper.PRIMARY if shape.method == 'sample_choice' else None
+        ),
+    )
+
+    model.sample_choice('prompt', ['a', 'b'])
+    stats = model.get_stats()
+    self.assertEqual(stats['num_primary'], 1)
+    self.assertEqual(stats['num_by_reason'], {'rule': 1})
+
+  def test_publishes_routing_decisions(self):
+    measurements = measurements_lib.Measurements()
+    model = _routing_model(measurements=measurements, channel='routing')
+
+    model.sample_choice('prompt', ['a', 'b'])
+    model.sample_text('prompt')
+
+    self.assertEqual(
+        [(datum['route'], datum['route_reason'])
+         for datum in measurements.get_channel('routing')],
+        [(routing_wrapper.CONTROL, 'choice'),
+         (routing_wrapper.PRIMARY, 'default')],
+    )
+
+
+if __name__ == '__main__':
+  absltest.main()
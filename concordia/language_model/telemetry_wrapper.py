@@ -0,0 +1,195 @@
+"""Wrapper recording the latency, tokens and cost of language model calls."""
+
+from collections.abc import Callable, Collection, Mapping, Sequence
+import time
+from typing import Any, TypeVar
+
+from concordia.language_model import language_model
+from concordia.utils import telemetry
+from typing_extensions import override
+
+_T = TypeVar('_T')
+
+
+class TelemetryLanguageModel(language_model.LanguageModel):
+  """Wraps an underlying language model and records each call made to it.
+
+  Each call is recorded with `telemetry.record_call`, attributed to the
+  entity, component and engine phase making it, into the call logs opened
+  with `telemetry.collect`, e.g. by `EntityAgentWithLogging` and
+  `Simulation.play`. A record holds the wall time of the call, the tokens of
+  its prompt and response, estimated from their length, the retries reported
+  by the wrappers below this one, and the price of its tokens.
+
+  Wrap the outermost model, so that the wall time includes the retries and
+  the time spent waiting on rate limits.
+  """
+
+  def __init__(
+      self,
+      model: language_model.LanguageModel,
+      *,
+      price_per_million_prompt_tokens: float = 0.0,
+      price_per_million_completion_tokens: float = 0.0,
+  ) -> None:
+    """Wrap the underlying language model with call recording.
+
+    Args:
+      model: A language model to record the calls of.
+      price_per_million_prompt_tokens: the price of a million prompt tokens.
+      price_per_million_completion_tokens: the price of a million response
+        tokens.
+    """
+    self._model = model
+    self._prompt_price = price_per_million_prompt_tokens / 1e6
+    self._completion_price = price_per_million_completion_tokens / 1e6
+
+  def _record(
+      self,
+      method: str,
+      prompt_tokens: int,
+      start: float,
+      retries: telemetry.RetryCounter,
+      completion_tokens: int = 0,
+      failed: bool = False,
+  ) -> None:
+    telemetry.record_call(
+        method,
+        wall_seconds=time.monotonic() - start,
+        prompt_tokens=prompt_tokens,
+        completion_tokens=completion_tokens,
+        retries=retries.count,
+        cost=(
+            prompt_tokens * self._prompt_price
+            + completion_tokens * self._completion_price
+        ),
+        failed=failed,
+    )
+
+  def _call(
+      self,
+      method: str,
+      call: Callable[[], _T],
+      prompt_tokens: int,
+      completion_tokens: Callable[[_T], int],
+  ) -> _T:
+    """Makes a call and records it, whether or not it succeeds."""
+    start = time.monotonic()
+    with telemetry.count_retries() as retries:
+      try:
+        result = call()
+      except Exception:
+        self._record(method, prompt_tokens, start, retries, failed=True)
+        raise
+    self._record(
+        method, prompt_tokens, start, retries, completion_tokens(result)
+    )
+    return result
+
+  @override
+  def sample_text(
+      self,
+      prompt: str,
+      *,
+      max_tokens: int = language_model.DEFAULT_MAX_TOKENS,
+      terminators: Collection[str] = language_model.DEFAULT_TERMINATORS,
+      temperature: float = language_model.DEFAULT_TEMPERATURE,
+      timeout: float = language_model.DEFAULT_TIMEOUT_SECONDS,
+      seed: int | None = None,
+  ) -> str:
+    return self._call(
+        'sample_text',
+        lambda: self._model.sample_text(
+            prompt,
+            max_tokens=max_tokens,
+            terminators=terminators,
+            temperature=temperature,
+            timeout=timeout,
+            seed=seed,
+        ),
+        prompt_tokens=language_model.estimate_tokens(prompt),
+        completion_tokens=language_model.estimate_tokens,
+    )
+
+  @override
+  def sample_choice(
+      self,
+      prompt: str,
+      responses: Sequence[str],
+      *,
+      seed: int | None = None,
+  ) -> tuple[int, str, Mapping[str, Any]]:
+    return self._call(
+        'sample_choice',
+        lambda: self._model.sample_choice(prompt, responses, seed=seed),
+        prompt_tokens=language_model.estimate_tokens(prompt) + sum(
+            language_model.estimate_tokens(response)
+            for response in responses
+        ),
+        completion_tokens=lambda result: language_model.estimate_tokens(
+            result[1]
+        ),
+    )
+
+  @override
+  async def async_sample_text(
+      self,
+      prompt: str,
+      *,
+      max_tokens: int = language_model.DEFAULT_MAX_TOKENS,
+      terminators: Collection[str] = language_model.DEFAULT_TERMINATORS,
+      temperature: float = language_model.DEFAULT_TEMPERATURE,
+      timeout: float = language_model.DEFAULT_TIMEOUT_SECONDS,
+      seed: int | None = None,
+  ) -> str:
+    prompt_tokens = language_model.estimate_tokens(prompt)
+    start = time.monotonic()
+    with telemetry.count_retries() as retries:
+      try:
+        result = await self._model.async_sample_text(
+            prompt,
+            max_tokens=max_tokens,
+            terminators=terminators,
+            temperature=temperature,
+            timeout=timeout,
+            seed=seed,
+        )
+      except Exception:
+        self._record('sample_text', prompt_tokens, start, retries, failed=True)
+        raise
+    self._record(
+        'sample_text',
+        prompt_tokens,
+        start,
+        retries,
+        language_model.estimate_tokens(result),
+    )
+    return result
+
+  @override
+  async def async_sample_choice(
+      self,
+      prompt: str,
+      responses: Sequence[str],
+      *,
+      seed: int | None = None,
+  ) -> tuple[int, str, Mapping[str, Any]]:
+    prompt_tokens = language_model.estimate_tokens(prompt) + sum(
+        language_model.estimate_tokens(response) for response in responses
+    )
+    start = time.monotonic()
+    with telemetry.count_retries() as retries:
+      try:
+        result = await self._model.async_sample_choice(
+            prompt, responses, seed=seed
+        )
+      except Exception:
+        self._record(
+            'sample_choice', prompt_tokens, start, retries, failed=True
+        )
+        raise
+    self._record(
+        'sample_choice', prompt_tokens, start, retries,
+        language_model.estimate_tokens(result[1]),
+    )
+    return result
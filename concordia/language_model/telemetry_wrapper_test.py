@@ -0,0 +1,129 @@
+"""Tests for the telemetry language model wrapper."""
+
+import asyncio
+
+from absl.testing import absltest
+from concordia.agents import entity_agent_with_logging
+from concordia.language_model import retry_wrapper
+from concordia.language_model import telemetry_wrapper
+from concordia.testing import mock_model
+from concordia.type_checks import entity_component
+from concordia.utils import telemetry
+
+
+class _FlakyModel(mock_model.MockModel):
+  """Mock model failing its first calls."""
+
+  def __init__(self, num_failures: int):
+    super().__init__(response='ok')
+    self._num_failures = num_failures
+
+  def sample_text(self, prompt, **kwargs):
+    if self._num_failures:
+      self._num_failures -= 1
+      raise ConnectionError()
+    return super().sample_text(prompt, **kwargs)
+
+
+class _Context(entity_component.ContextComponent):
+  """Samples the model before acting and observing."""
+
+  def __init__(self, model):
+    super().__init__()
+    self._model = model
+
+  def pre_act(self, action_spec):
+    return self._model.sample_text('context')
+
+  def pre_observe(self, observation):
+    return self._model.sample_text(observation)
+
+  def get_state(self):
+    return {}
+
+  def set_state(self, state):
+    pass
+
+
+class _Act(entity_component.ActingComponent):
+  """Acts with a choice of the model."""
+
+  def __init__(self, model):
+    super().__init__()
+    self._model = model
+
+  def get_action_attempt(self, contexts, action_spec):
+    return self._model.sample_choice('act', ['a', 'b'])[1]
+
+  def get_state(self):
+    return {}
+
+  def set_state(self, state):
+    pass
+
+
+class TelemetryLanguageModelTest(absltest.TestCase):
+
+  def test_records_tokens_and_cost(self):
+    model = telemetry_wrapper.TelemetryLanguageModel(
+        mock_model.MockModel(response='12345678'),
+        price_per_million_prompt_tokens=1e6,
+        price_per_million_completion_tokens=2e6,
+    )
+
+    with telemetry.collect() as calls, telemetry.scope(component='plan'):
+      model.sample_text('1234')
+
+    (record,) = calls.records()
+    self.assertEqual(record.method, 'sample_text')
+    self.assertEqual(record.component, 'plan')
+    self.assertEqual((record.prompt_tokens, record.completion_tokens), (1, 2))
+    self.assertEqual(record.cost, 5.0)
+
+  def test_records_retries_of_wrapped_models(self):
+    model = telemetry_wrapper.TelemetryLanguageModel(
+        retry_wrapper.RetryLanguageModel(
+            _FlakyModel(num_failures=2), retry_delay=0.0, jitter=(0.0, 0.0)
+        )
+    )
+
+    with telemetry.collect() as calls:
+      model.sample_text('prompt')
+      asyncio.run(model.async_sample_text('prompt'))
+
+    self.assertEqual([record.retries for record in calls.records()], [2, 0])
+
+  def test_records_failed_calls(self):
+    model = telemetry_wrapper.TelemetryLanguageModel(
+        _FlakyModel(num_failures=1)
+    )
+
+    with telemetry.collect() as calls:
+      with self.assertRaises(ConnectionError):
+        model.sample_text('prompt')
+
+    (record,) = calls.records()
+    self.assertTrue(record.failed)
+
+  def test_agent_logs_calls_by_component(self):
+    model = telemetry_wrapper.TelemetryLanguageModel(mock_model.MockModel())
+    agent = entity_agent_with_logging.EntityAgentWithLogging(
+        agent_name='Alice',
+        act_component=_Act(model),
+        context_components={'context': _Context(model)},
+    )
+
+    with telemetry.collect() as calls:
+      agent.observe('It rains.')
+      agent.act()
+
+    llm_calls = agent.get_last_log()[
+        entity_agent_with_logging.LLM_CALLS_CHANNEL
+    ]
+    self.assertEqual(llm_calls['context']['calls'], 2)
+    self.assertEqual(llm_calls['__act__']['calls'], 1)
+    self.assertEqual({record.entity for record in calls.records()}, {'Alice'})
+
+
+if __name__ == '__main__':
+  absltest.main()
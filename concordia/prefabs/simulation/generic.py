@@ -8,8 +8,10 @@ import copy
 import functools
 import json
 import os
+import re
 from typing import Any
 
+from concordia.associative_memory import ann_index
 from concordia.associative_memory import basic_associative_memory as associative_memory
 from concordia.environment import engine as engine_lib
 from concordia.environment.engines import sequential
@@ -20,6 +22,7 @@ from concordia.type_checks import prefab as prefab_lib
 from concordia.type_checks import simulation as simulation_lib
 from concordia.utils import helper_functions as helper_functions_lib
 from concordia.utils import html as html_lib
+from concordia.utils import telemetry
 import numpy as np
 
 
@@ -36,6 +39,15 @@ class Simulation(simulation_lib.Simulation):
       model: language_model.LanguageModel,
       embedder: Callable[[str], np.ndarray],
       engine: engine_lib.Engine = sequential.Sequential(),
+      batch_embedder: associative_memory.BatchEmbedder | None = None,
+      game_master_memory_index: ann_index.IVFIndex | None = None,
+      memory_bank_factory: (
+          Callable[
+              [prefab_lib.InstanceConfig],
+              associative_memory.AssociativeMemoryBank,
+          ]
+          | None
+      ) = None,
   ):
     """Initialize the simulation object.
 
@@ -53,10 +65,21 @@ class Simulation(simulation_lib.Simulation):
       model: the language model to use.
       embedder: the sentence transformer to use.
       engine: the engine to use, defaults to sequential.Sequential().
+      batch_embedder: optional sentence transformer that embeds many texts in
+        one call, used by the memory banks when committing memories in bulk.
+      game_master_memory_index: optional approximate nearest neighbour index
+        for the memory bank shared by all game masters, which collects every
+        event of the run. If None, retrieval from it is exact.
+      memory_bank_factory: optional function returning the memory bank of an
+        entity given its instance config, e.g. to keep the memories of some
+        entities in a `DiskAssociativeMemoryBank`. If None, every entity gets
+        an in-memory `AssociativeMemoryBank`.
     """
     self._config = config
     self._model = model
     self._embedder = embedder
+    self._batch_embedder = batch_embedder
+    self._memory_bank_factory = memory_bank_factory
     self._engine = engine
     self.game_masters = []
     self.entities = []
@@ -64,11 +87,18 @@ class Simulation(simulation_lib.Simulation):
     self._entity_to_prefab_config: dict[str, prefab_lib.InstanceConfig] = {}
     self._checkpoints_path = None
     self._checkpoint_counter = 0
+    # Memory banks by owner, so checkpoints can store them as binary files.
+    self._memory_banks: dict[str, associative_memory.AssociativeMemoryBank] = (
+        {}
+    )
 
     # All game masters share the same memory bank.
     self.game_master_memory_bank = associative_memory.AssociativeMemoryBank(
         sentence_embedder=embedder,
+        batch_embedder=batch_embedder,
+        ann_index=game_master_memory_index,
     )
+    self._memory_banks["game_masters"] = self.game_master_memory_bank
     all_data = self._config.instances
     gm_configs = [
         entity_cfg
@@ -167,9 +197,13 @@ class Simulation(simulation_lib.Simulation):
     entity_prefab = copy.deepcopy(self._config.prefabs[instance_config.prefab])
     entity_prefab.params = instance_config.params
 
-    memory_bank = associative_memory.AssociativeMemoryBank(
-        sentence_embedder=self._embedder,
-    )
+    if self._memory_bank_factory is not None:
+      memory_bank = self._memory_bank_factory(instance_config)
+    else:
+      memory_bank = associative_memory.AssociativeMemoryBank(
+          sentence_embedder=self._embedder,
+          batch_embedder=self._batch_embedder,
+      )
     entity = entity_prefab.build(model=self._model, memory_bank=memory_bank)
 
     if any(e.name == entity.name for e in self.entities):
@@ -192,6 +226,7 @@ class Simulation(simulation_lib.Simulation):
 
     self.entities.append(entity)
     self._entity_to_prefab_config[entity.name] = instance_config
+    self._memory_banks[f"entity_{entity.name}"] = memory_bank
 
     # Update game masters to be aware of the new entity
     for game_master in self.game_masters:
@@ -208,6 +243,10 @@ class Simulation(simulation_lib.Simulation):
   ) -> str:
     """Run the simulation.
 
+    When the model is a `TelemetryLanguageModel`, a table of its calls by
+    component and by engine phase is printed at the end, and added to the
+    HTML log.
+
     Args:
       premise: A string to use as the initial premise of the simulation.
       max_steps: The maximum number of steps to run the simulation for.
@@ -252,15 +291,18 @@ class Simulation(simulation_lib.Simulation):
     ]
     sorted_game_masters = initializers + other_gms
 
-    self._engine.run_loop(
-        game_masters=sorted_game_masters,
-        entities=self.entities,
-        premise=premise,
-        max_steps=max_steps,
-        verbose=True,
-        log=raw_log,
-        checkpoint_callback=checkpoint_callback,
-    )
+    with telemetry.collect() as llm_calls:
+      self._engine.run_loop(
+          game_masters=sorted_game_masters,
+          entities=self.entities,
+          premise=premise,
+          max_steps=max_steps,
+          verbose=True,
+          log=raw_log,
+          checkpoint_callback=checkpoint_callback,
+      )
+    if llm_calls:
+      print(telemetry.format_report(llm_calls.records()))
 
     player_logs = []
     player_log_names = []
@@ -292,6 +334,14 @@ class Simulation(simulation_lib.Simulation):
     ).convert()
     player_logs.append(game_master_html)
     player_log_names.append("Game Master Memories")
+    if llm_calls:
+      records = llm_calls.records()
+      player_logs.append(html_lib.PythonObjectToHTMLConverter({
+          "By component": telemetry.summarize(records, by=("component",)),
+          "By phase": telemetry.summarize(records, by=("phase",)),
+          "By entity": telemetry.summarize(records, by=("entity",)),
+      }).convert())
+      player_log_names.append("Language Model Calls")
     summary = ""
     if scores:
       summary = f"Player Scores: {scores[-1]}"
@@ -355,7 +405,24 @@ class Simulation(simulation_lib.Simulation):
     return checkpoint_data
 
   def save_checkpoint(self, step: int, checkpoint_path: str):
-    """Saves the state of all entities at the current step."""
+    """Saves the state of all entities at the current step.
+
+    Memory banks are written as binary segments under
+    `checkpoint_path/memories`, and each checkpoint only writes the memories
+    added since the previous one. The checkpoint file refers to the segments.
+
+    Args:
+      step: the current step.
+      checkpoint_path: the directory to save the checkpoint to. If empty, the
+        checkpoint is only passed to the state callback.
+    """
+    if checkpoint_path:
+      for owner, memory_bank in self._memory_banks.items():
+        memory_bank.set_checkpoint_directory(
+            os.path.join(
+                checkpoint_path, "memories", re.sub(r"[^\w.-]", "_", owner)
+            )
+        )
     checkpoint_data = self.make_checkpoint_data()
 
     if self._get_state_callback:
@@ -370,7 +437,7 @@ class Simulation(simulation_lib.Simulation):
     )
     try:
       with open(checkpoint_file, "w") as f:
-        json.dump(checkpoint_data, f, indent=2)
+        json.dump(checkpoint_data, f)
       print(f"Step {step}: Saved checkpoint to {checkpoint_file}")
     except IOError as e:
       print(f"Error saving checkpoint at step {step}: {e}")
@@ -17,6 +17,7 @@ from concordia.type_checks import prefab as prefab_lib
 from concordia.type_checks import simulation as simulation_lib
 from concordia.utils import helper_functions as helper_functions_lib
 from concordia.utils import html as html_lib
+from concordia.utils import telemetry
 import numpy as np
 
 
@@ -208,6 +209,10 @@ class QuestionnaireSimulation(simulation_lib.Simulation):
   ) -> str:
     """Run the simulation.
 
+    When the model is a `TelemetryLanguageModel`, a table of its calls by
+    component and by engine phase is printed at the end, and added to the
+    HTML log.
+
     Args:
       premise: A string to use as the initial premise of the simulation.
       max_steps: The maximum number of steps to run the simulation for.
@@ -251,17 +256,20 @@ class QuestionnaireSimulation(simulation_lib.Simulation):
     sorted_game_masters = initializers + other_gms
 
     try:
-      self._engine.run_loop(
-          game_masters=sorted_game_masters,
-          entities=self.entities,
-          premise=premise,
-          max_steps=max_steps,
-          verbose=verbose,
-          log=raw_log,
-          checkpoint_callback=checkpoint_callback,
-      )
+      with telemetry.collect() as llm_calls:
+        self._engine.run_loop(
+            game_masters=sorted_game_masters,
+            entities=self.entities,
+            premise=premise,
+            max_steps=max_steps,
+            verbose=verbose,
+            log=raw_log,
+            checkpoint_callback=checkpoint_callback,
+        )
     finally:
       self._engine.shutdown()
+    if llm_calls and verbose:
+      print(telemetry.format_report(llm_calls.records()))
 
     player_logs = []
     player_log_names = []
@@ -293,6 +301,14 @@ class QuestionnaireSimulation(simulation_lib.Simulation):
     ).convert()
     player_logs.append(game_master_html)
     player_log_names.append("Game Master Memories")
+    if llm_calls:
+      records = llm_calls.records()
+      player_logs.append(html_lib.PythonObjectToHTMLConverter({
+          "By component": telemetry.summarize(records, by=("component",)),
+          "By phase": telemetry.summarize(records, by=("phase",)),
+          "By entity": telemetry.summarize(records, by=("entity",)),
+      }).convert())
+      player_log_names.append("Language Model Calls")
     summary = ""
     if scores:
       summary = f"Player Scores: {scores[-1]}"
@@ -9,6 +9,8 @@ import enum
 import functools
 from typing import Any
 
+from concordia.utils import concurrency
+
 
 @enum.unique
 class OutputType(str, enum.Enum):
@@ -222,6 +224,34 @@ class Entity(metaclass=abc.ABCMeta):
     """
     raise NotImplementedError()
 
+  async def async_act(
+      self, action_spec: ActionSpec = DEFAULT_ACTION_SPEC
+  ) -> str:
+    """Returns the entity's intended action without blocking the event loop.
+
+    The default implementation runs `act` in a worker thread of the event
+    loop. Entities that only wait on asynchronous calls, e.g. to
+    `LanguageModel.async_sample_text`, override it to act without a thread.
+
+    Args:
+      action_spec: The specification of the action, see `act`.
+
+    Returns:
+      The entity's intended action.
+    """
+    return await concurrency.to_thread(self.act, action_spec)
+
+  async def async_observe(self, observation: str) -> None:
+    """Informs the Entity of an observation without blocking the event loop.
+
+    The default implementation runs `observe` in a worker thread of the event
+    loop, see `async_act`.
+
+    Args:
+      observation: The observation for the entity to process. Always a string.
+    """
+    await concurrency.to_thread(self.observe, observation)
+
 
 class EntityWithLogging(Entity):
   """An agent interface for taking actions."""
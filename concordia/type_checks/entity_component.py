@@ -10,6 +10,7 @@ from typing import TypeVar
 
 from concordia.type_checks import entity as entity_lib
 from concordia.type_checks import logging as logging_lib
+from concordia.utils import concurrency
 
 
 ComponentName = str
@@ -221,6 +222,26 @@ class ContextComponent(BaseComponent):
     del action_spec
     return ""
 
+  async def async_pre_act(
+      self,
+      action_spec: entity_lib.ActionSpec,
+  ) -> str:
+    """Returns the information for the entity to act, without blocking.
+
+    Called by `EntityAgent.async_act` instead of `pre_act`. The default
+    implementation runs `pre_act` in a worker thread of the event loop.
+    Components whose context comes from the language model override it with
+    `LanguageModel.async_sample_text` calls, so that an entity acts without a
+    thread.
+
+    Args:
+      action_spec: The action spec for the action attempt.
+
+    Returns:
+      The relevant information for the entity to act.
+    """
+    return await concurrency.to_thread(self.pre_act, action_spec)
+
   def post_act(
       self,
       action_attempt: str,
@@ -308,6 +329,28 @@ class ActingComponent(BaseComponent, metaclass=abc.ABCMeta):
     """
     raise NotImplementedError()
 
+  async def async_get_action_attempt(
+      self,
+      context: ComponentContextMapping,
+      action_spec: entity_lib.ActionSpec,
+  ) -> str:
+    """Decides the action of an entity without blocking the event loop.
+
+    Called by `EntityAgent.async_act` instead of `get_action_attempt`. The
+    default implementation runs `get_action_attempt` in a worker thread of
+    the event loop, see `ContextComponent.async_pre_act`.
+
+    Args:
+      context: The context for the action attempt, see `get_action_attempt`.
+      action_spec: The action spec for the action attempt.
+
+    Returns:
+      The action that the entity is attempting.
+    """
+    return await concurrency.to_thread(
+        self.get_action_attempt, context, action_spec
+    )
+
 
 class ContextProcessorComponent(BaseComponent, metaclass=abc.ABCMeta):
   """A component that processes context from EntityWithComponents."""
@@ -2,16 +2,26 @@
 
 """Concurrency helpers."""
 
-from collections.abc import Collection, Iterator, Mapping, Sequence
+import asyncio
+from collections.abc import Collection, Coroutine, Iterator, Mapping, Sequence
 from concurrent import futures
 import contextlib
+import contextvars
 import functools
+import threading
 from typing import Any, Callable, TypeVar
 
 from absl import logging
 
 _T = TypeVar('_T')
 
+_event_loop: asyncio.AbstractEventLoop | None = None
+_event_loop_lock = threading.Lock()
+# The executor of the `to_thread` calls made in a `using_executor` context.
+_worker_executor: contextvars.ContextVar[futures.Executor | None] = (
+    contextvars.ContextVar('concordia_worker_executor', default=None)
+)
+
 
 @contextlib.contextmanager
 def _executor(**kwargs) -> Iterator[futures.ThreadPoolExecutor]:
@@ -62,6 +72,8 @@ def _as_completed(
 
   IMPORTANT: Passed callables must be threadsafe.
 
+  Each callable runs in a copy of the caller's context variables.
+
   Args:
     tasks: callables to execute (MUST BE THREADSAFE)
     timeout: the maximum number of seconds to wait for all tasks to complete.
@@ -81,7 +93,8 @@ def _as_completed(
 
   def submit_tasks(exec_):
     return {
-        exec_.submit(_run_task, key, task): key for key, task in tasks.items()
+        exec_.submit(contextvars.copy_context().run, _run_task, key, task): key
+        for key, task in tasks.items()
     }
 
   if executor is not None:
@@ -206,3 +219,118 @@ def map_parallel(
       tasks, timeout=timeout, max_workers=max_workers, executor=executor
   )
   return [results[key] for key in tasks]
+
+
+def _get_event_loop() -> asyncio.AbstractEventLoop:
+  """Returns the shared event loop, starting its thread on first use."""
+  global _event_loop
+  with _event_loop_lock:
+    if _event_loop is None:
+      _event_loop = asyncio.new_event_loop()
+      threading.Thread(
+          target=_event_loop.run_forever,
+          name='concordia_event_loop',
+          daemon=True,
+      ).start()
+    return _event_loop
+
+
+def run_coroutine(
+    coroutine: Coroutine[Any, Any, _T],
+    *,
+    timeout: float | None = None,
+) -> _T:
+  """Runs a coroutine to completion and returns its result.
+
+  The coroutine runs on an event loop shared by all callers, in a background
+  thread. This lets synchronous code call asynchronous code from any thread,
+  including one already running an event loop, as in a notebook, and lets
+  the asynchronous clients of language models keep their connections across
+  calls. The coroutine runs in a copy of the caller's context variables.
+
+  Args:
+    coroutine: the coroutine to run.
+    timeout: the maximum number of seconds to wait.
+
+  Returns:
+    The result of the coroutine.
+
+  Raises:
+    RuntimeError: if called from a coroutine of the shared event loop, which
+      would deadlock.
+    TimeoutError: If the coroutine does not complete before the timeout.
+    Exception: If the coroutine raises.
+  """
+  loop = _get_event_loop()
+  try:
+    running_loop = asyncio.get_running_loop()
+  except RuntimeError:
+    running_loop = None
+  if running_loop is loop:
+    coroutine.close()
+    raise RuntimeError(
+        'run_coroutine cannot be called from the shared event loop, await the '
+        'coroutine instead.'
+    )
+  context = contextvars.copy_context()
+
+  async def run_in_context() -> _T:
+    return await loop.create_task(coroutine, context=context)
+
+  future = asyncio.run_coroutine_threadsafe(run_in_context(), loop)
+  try:
+    return future.result(timeout)
+  except futures.TimeoutError:
+    future.cancel()
+    raise
+
+
+@contextlib.contextmanager
+def using_executor(executor: futures.Executor | None) -> Iterator[None]:
+  """Runs the `to_thread` calls made in the context on an executor.
+
+  The context follows the work into asyncio tasks started in it, so that an
+  engine can size the threads its entities fall back to.
+
+  Args:
+    executor: the executor, or None for the default executor of the loop.
+
+  Yields:
+    Nothing.
+  """
+  token = _worker_executor.set(executor)
+  try:
+    yield
+  finally:
+    _worker_executor.reset(token)
+
+
+async def to_thread(fn: Callable[..., _T], /, *args, **kwargs) -> _T:
+  """Like `asyncio.to_thread`, on the executor of `using_executor`, if any."""
+  executor = _worker_executor.get()
+  if executor is None:
+    return await asyncio.to_thread(fn, *args, **kwargs)
+  context = contextvars.copy_context()
+  return await asyncio.get_running_loop().run_in_executor(
+      executor, functools.partial(context.run, fn, *args, **kwargs)
+  )
+
+
+def overrides_sync_only(obj: Any, sync_name: str, async_name: str) -> bool:
+  """Returns whether a class overrides a method but not its async version.
+
+  Classes implementing an asynchronous method natively, e.g. `async_act`,
+  call it in place of the synchronous one. A subclass overriding only the
+  synchronous method must still have it called, on a thread.
+
+  Args:
+    obj: the object whose class to check.
+    sync_name: the name of the synchronous method, e.g. 'act'.
+    async_name: the name of the asynchronous method, e.g. 'async_act'.
+  """
+  mro = type(obj).__mro__
+
+  def defined_at(name: str) -> int:
+    return next(i for i, cls in enumerate(mro) if name in vars(cls))
+
+  return defined_at(sync_name) < defined_at(async_name)
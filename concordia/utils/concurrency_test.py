@@ -1,6 +1,9 @@
 
 
+import asyncio
+from concurrent import futures
 import functools
+import threading
 import time
 
 from absl.testing import absltest
@@ -110,6 +113,70 @@ class ConcurrencyTest(absltest.TestCase):
     )
     self.assertEqual(results, ['a', 'b', 'c'])
 
+  def test_run_coroutine(self):
+
+    async def add(a, b):
+      await asyncio.sleep(0.01)
+      return a + b
+
+    self.assertEqual(concurrency.run_coroutine(add(1, 2)), 3)
+
+  def test_run_coroutine_from_running_loop(self):
+
+    async def outer():
+      # Synchronous code called from another event loop, as in a notebook.
+      return concurrency.run_coroutine(asyncio.sleep(0, result='done'))
+
+    self.assertEqual(asyncio.run(outer()), 'done')
+
+  def test_run_coroutine_error(self):
+    with self.assertRaises(ExpectedError):
+      concurrency.run_coroutine(asyncio.to_thread(error_after, 0))
+
+  def test_to_thread_uses_the_executor_of_the_context(self):
+    executor = futures.ThreadPoolExecutor(thread_name_prefix='sized')
+    self.addCleanup(executor.shutdown)
+
+    async def thread_name():
+      return await concurrency.to_thread(
+          lambda: threading.current_thread().name
+      )
+
+    async def thread_names():
+      default = await thread_name()
+      with concurrency.using_executor(executor):
+        sized = await asyncio.ensure_future(thread_name())
+      return default, sized
+
+    default, sized = asyncio.run(thread_names())
+    self.assertFalse(default.startswith('sized'))
+    self.assertStartsWith(sized, 'sized')
+
+  def test_overrides_sync_only(self):
+
+    class Base:
+
+      def act(self):
+        pass
+
+      async def async_act(self):
+        pass
+
+    class SyncOnly(Base):
+
+      def act(self):
+        pass
+
+    class Both(SyncOnly):
+
+      async def async_act(self):
+        pass
+
+    for obj, expected in ((Base(), False), (SyncOnly(), True), (Both(), False)):
+      self.assertEqual(
+          concurrency.overrides_sync_only(obj, 'act', 'async_act'), expected
+      )
+
 
 if __name__ == '__main__':
   absltest.main()
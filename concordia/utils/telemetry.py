@@ -0,0 +1,311 @@
+"""Attribution of language model calls to the entities and components.
+
+Entities, components and engines tag the work they do with `scope`, which sets
+context variables that follow the work into threads started with
+`concurrency` and into asyncio tasks. A language model wrapped with
+`telemetry_wrapper.TelemetryLanguageModel` records each call with the tags of
+its caller into every `CallLog` opened with `collect` around it.
+"""
+
+from collections.abc import Iterator, Mapping, Sequence
+import contextlib
+import contextvars
+import dataclasses
+import threading
+
+# The engine phases tagged by the engines.
+TERMINATE = 'terminate'
+NEXT_GAME_MASTER = 'next_game_master'
+NEXT_ACTING = 'next_acting'
+MAKE_OBSERVATION = 'make_observation'
+OBSERVE = 'observe'
+ACT = 'act'
+RESOLVE = 'resolve'
+
+# The key of calls made outside of any entity, component or phase.
+UNATTRIBUTED = '<none>'
+
+_entity: contextvars.ContextVar[str | None] = contextvars.ContextVar(
+    'telemetry_entity', default=None
+)
+_component: contextvars.ContextVar[str | None] = contextvars.ContextVar(
+    'telemetry_component', default=None
+)
+_phase: contextvars.ContextVar[str | None] = contextvars.ContextVar(
+    'telemetry_phase', default=None
+)
+_output_type: contextvars.ContextVar[str | None] = contextvars.ContextVar(
+    'telemetry_output_type', default=None
+)
+_call_logs: contextvars.ContextVar[tuple['CallLog', ...]] = (
+    contextvars.ContextVar('telemetry_call_logs', default=())
+)
+_retry_counter: contextvars.ContextVar['RetryCounter | None'] = (
+    contextvars.ContextVar('telemetry_retry_counter', default=None)
+)
+
+
+@dataclasses.dataclass(frozen=True)
+class Scope:
+  """The work being done, as tagged with `scope`.
+
+  Attributes:
+    entity: the name of the entity doing the work, if any.
+    component: the key of the component doing the work, if any.
+    phase: the engine phase the work is part of, if any.
+    output_type: the output type of the action being taken, if any.
+  """
+
+  entity: str | None = None
+  component: str | None = None
+  phase: str | None = None
+  output_type: str | None = None
+
+
+@dataclasses.dataclass(frozen=True)
+class CallRecord:
+  """A call to a language model and the work it was made for.
+
+  Attributes:
+    method: the method called, e.g. 'sample_text'.
+    entity: the name of the entity making the call, if any.
+    component: the key of the component making the call, if any.
+    phase: the engine phase the call was made in, if any.
+    wall_seconds: the time the call took, including retries.
+    prompt_tokens: the number of tokens in the prompt.
+    completion_tokens: the number of tokens in the response.
+    retries: the number of times the call was retried.
+    cost: the price of the tokens of the call.
+    failed: whether the call raised an error.
+    output_type: the output type of the action the call was made for, if any.
+  """
+
+  method: str
+  entity: str | None
+  component: str | None
+  phase: str | None
+  wall_seconds: float
+  prompt_tokens: int
+  completion_tokens: int
+  retries: int = 0
+  cost: float = 0.0
+  failed: bool = False
+  output_type: str | None = None
+
+
+class CallLog:
+  """The calls recorded while the log was open. Thread-safe."""
+
+  def __init__(self):
+    self._records = []
+    self._lock = threading.Lock()
+
+  def add(self, record: CallRecord) -> None:
+    with self._lock:
+      self._records.append(record)
+
+  def records(self) -> list[CallRecord]:
+    with self._lock:
+      return list(self._records)
+
+  def __len__(self) -> int:
+    with self._lock:
+      return len(self._records)
+
+
+class RetryCounter:
+  """Counts the retries of the call in progress."""
+
+  def __init__(self):
+    self.count = 0
+
+
+@contextlib.contextmanager
+def scope(
+    *,
+    entity: str | None = None,
+    component: str | None = None,
+    phase: str | None = None,
+    output_type: str | None = None,
+) -> Iterator[None]:
+  """Attributes the calls made in the scope, also usable as a decorator.
+
+  Args:
+    entity: the name of the entity doing the work, if it changes.
+    component: the key of the component doing the work, if it changes.
+    phase: the engine phase the work is part of, if it changes.
+    output_type: the output type of the action being taken, if it changes.
+
+  Yields:
+    Nothing.
+  """
+  resets = []
+  for variable, value in ((_entity, entity), (_component, component),
+                          (_phase, phase), (_output_type, output_type)):
+    if value is not None:
+      resets.append((variable, variable.set(value)))
+  try:
+    yield
+  finally:
+    for variable, token in reversed(resets):
+      variable.reset(token)
+
+
+def current_scope() -> Scope:
+  """Returns the tags of the work in progress."""
+  return Scope(
+      entity=_entity.get(),
+      component=_component.get(),
+      phase=_phase.get(),
+      output_type=_output_type.get(),
+  )
+
+
+@contextlib.contextmanager
+def collect() -> Iterator[CallLog]:
+  """Yields a log of the calls recorded until the context is closed."""
+  call_log = CallLog()
+  token = _call_logs.set(_call_logs.get() + (call_log,))
+  try:
+    yield call_log
+  finally:
+    _call_logs.reset(token)
+
+
+@contextlib.contextmanager
+def count_retries() -> Iterator[RetryCounter]:
+  """Yields a counter of the retries reported with `record_retry`."""
+  counter = RetryCounter()
+  token = _retry_counter.set(counter)
+  try:
+    yield counter
+  finally:
+    _retry_counter.reset(token)
+
+
+def record_retry() -> None:
+  """Reports that the call in progress is retried, e.g. by a retry wrapper."""
+  counter = _retry_counter.get()
+  if counter is not None:
+    counter.count += 1
+
+
+def record_call(
+    method: str,
+    *,
+    wall_seconds: float,
+    prompt_tokens: int,
+    completion_tokens: int,
+    retries: int = 0,
+    cost: float = 0.0,
+    failed: bool = False,
+) -> CallRecord:
+  """Records a call, attributed to the current scope, in the open logs.
+
+  Args:
+    method: the method called, e.g. 'sample_text'.
+    wall_seconds: the time the call took, including retries.
+    prompt_tokens: the number of tokens in the prompt.
+    completion_tokens: the number of tokens in the response.
+    retries: the number of times the call was retried.
+    cost: the price of the tokens of the call.
+    failed: whether the call raised an error.
+
+  Returns:
+    The record of the call.
+  """
+  current = current_scope()
+  record = CallRecord(
+      method=method,
+      entity=current.entity,
+      component=current.component,
+      phase=current.phase,
+      wall_seconds=wall_seconds,
+      prompt_tokens=prompt_tokens,
+      completion_tokens=completion_tokens,
+      retries=retries,
+      cost=cost,
+      failed=failed,
+      output_type=current.output_type,
+  )
+  for call_log in _call_logs.get():
+    call_log.add(record)
+  return record
+
+
+def summarize(
+    records: Sequence[CallRecord], by: Sequence[str] = ('component',)
+) -> dict[str, dict[str, float]]:
+  """Aggregates calls by their attribution.
+
+  Args:
+    records: the calls to aggregate.
+    by: the fields of the records to group by, e.g. ('phase', 'component').
+
+  Returns:
+    For each group, named by its values joined with '/', the number of calls
+    and failures, and the total wall time, tokens, retries and cost.
+  """
+  summary = {}
+  for record in records:
+    key = '/'.join(getattr(record, field) or UNATTRIBUTED for field in by)
+    totals = summary.setdefault(key, {
+        'calls': 0,
+        'failures': 0,
+        'wall_seconds': 0.0,
+        'prompt_tokens': 0,
+        'completion_tokens': 0,
+        'retries': 0,
+        'cost': 0.0,
+    })
+    totals['calls'] += 1
+    totals['failures'] += int(record.failed)
+    totals['wall_seconds'] += record.wall_seconds
+    totals['prompt_tokens'] += record.prompt_tokens
+    totals['completion_tokens'] += record.completion_tokens
+    totals['retries'] += record.retries
+    totals['cost'] += record.cost
+  return summary
+
+
+def format_summary(
+    summary: Mapping[str, Mapping[str, float]], title: str = 'Group'
+) -> str:
+  """Returns a text table of a summary, slowest groups first.
+
+  Args:
+    summary: the result of `summarize`.
+    title: the heading of the group column.
+  """
+  columns = ('calls', 'wall_seconds', 'prompt_tokens', 'completion_tokens',
+             'retries', 'cost')
+  headings = (title, 'calls', 'wall s', 'mean s', 'prompt tok',
+              'completion tok', 'retries', 'cost')
+  rows = []
+  for key, totals in sorted(
+      summary.items(), key=lambda item: -item[1]['wall_seconds']
+  ):
+    calls, wall, prompt, completion, retries, cost = (
+        totals[column] for column in columns
+    )
+    rows.append((key, str(calls), f'{wall:.2f}', f'{wall / calls:.2f}',
+                 str(prompt), str(completion), str(retries), f'{cost:.4f}'))
+  widths = [
+      max(len(row[i]) for row in (headings, *rows))
+      for i in range(len(headings))
+  ]
+  lines = []
+  for row in (headings, *rows):
+    cells = [row[0].ljust(widths[0])]
+    cells.extend(cell.rjust(width) for cell, width in zip(row[1:], widths[1:]))
+    lines.append('  '.join(cells).rstrip())
+  lines.insert(1, '-' * len(lines[0]))
+  return '\n'.join(lines)
+
+
+def format_report(records: Sequence[CallRecord]) -> str:
+  """Returns text tables of the calls by component and by engine phase."""
+  return '\n\n'.join([
+      format_summary(summarize(records, by=('component',)), 'Component'),
+      format_summary(summarize(records, by=('phase',)), 'Phase'),
+  ])
@@ -0,0 +1,105 @@
+"""Tests for the attribution of language model calls."""
+
+from absl.testing import absltest
+from concordia.utils import concurrency
+from concordia.utils import telemetry
+
+
+def _record(method='sample_text', wall_seconds=1.0):
+  return telemetry.record_call(
+      method, wall_seconds=wall_seconds, prompt_tokens=10, completion_tokens=2
+  )
+
+
+class TelemetryTest(absltest.TestCase):
+
+  def test_records_are_attributed_to_scopes(self):
+    with telemetry.collect() as calls:
+      with telemetry.scope(entity='Alice', phase=telemetry.ACT):
+        with telemetry.scope(component='plan'):
+          _record()
+        _record()
+      _record()
+
+    self.assertEqual(
+        [(r.entity, r.component, r.phase) for r in calls.records()],
+        [
+            ('Alice', 'plan', telemetry.ACT),
+            ('Alice', None, telemetry.ACT),
+            (None, None, None),
+        ],
+    )
+
+  def test_scope_decorates_functions(self):
+
+    @telemetry.scope(phase=telemetry.RESOLVE)
+    def resolve():
+      return _record()
+
+    self.assertEqual(resolve().phase, telemetry.RESOLVE)
+    self.assertIsNone(_record().phase)
+
+  def test_nested_logs_record_the_same_calls(self):
+    with telemetry.collect() as outer:
+      _record()
+      with telemetry.collect() as inner:
+        _record()
+
+    self.assertLen(outer, 2)
+    self.assertLen(inner, 1)
+
+  def test_attribution_follows_tasks_into_threads(self):
+
+    def task(component):
+      with telemetry.scope(component=component):
+        return _record()
+
+    with telemetry.collect() as calls, telemetry.scope(entity='Bob'):
+      concurrency.run_tasks({
+          name: lambda name=name: task(name) for name in ('a', 'b', 'c')
+      })
+
+    self.assertCountEqual(
+        [(r.entity, r.component) for r in calls.records()],
+        [('Bob', 'a'), ('Bob', 'b'), ('Bob', 'c')],
+    )
+
+  def test_attribution_follows_coroutines(self):
+
+    async def sample():
+      return _record()
+
+    with telemetry.collect() as calls, telemetry.scope(entity='Carol'):
+      concurrency.run_coroutine(sample())
+
+    (record,) = calls.records()
+    self.assertEqual(record.entity, 'Carol')
+
+  def test_retries_are_counted_per_call(self):
+    with telemetry.count_retries() as retries:
+      telemetry.record_retry()
+      telemetry.record_retry()
+    telemetry.record_retry()
+
+    self.assertEqual(retries.count, 2)
+
+  def test_summarize(self):
+    with telemetry.collect() as calls:
+      with telemetry.scope(component='plan'):
+        _record(wall_seconds=2.0)
+        _record(wall_seconds=1.0)
+      _record(wall_seconds=0.5)
+
+    summary = telemetry.summarize(calls.records())
+
+    self.assertEqual(summary['plan']['calls'], 2)
+    self.assertEqual(summary['plan']['wall_seconds'], 3.0)
+    self.assertEqual(summary['plan']['prompt_tokens'], 20)
+    self.assertEqual(summary[telemetry.UNATTRIBUTED]['calls'], 1)
+    table = telemetry.format_summary(summary, 'Component').splitlines()
+    self.assertStartsWith(table[0], 'Component')
+    self.assertStartsWith(table[2], 'plan')
+
+
+if __name__ == '__main__':
+  absltest.main()